@@ -0,0 +1,26 @@
+## Sort index backfill for STARK generated projects
+#  Each sortable column of an entity has its own sort index, which only lists records carrying the column's sort key
+#  attribute (see stark_core.data_abstraction.get_sort_key_value). Records written before a column was made sortable lack
+#  it, so sorted list views and reports that read the index would miss them, and so would a PK change of a parent looking
+#  for the records that point to it through a sortable has_one relationship column. This script writes it for every
+#  record of the entity. It is safe to run again.
+#
+#  To use this: deploy the entity with its new sortable columns, then run this from the bin folder of your stark generated
+#  project, with credentials for the project's AWS account
+#     AWS_REGION=<project region> python backfill_sort_indexes.py <Entity module, e.g. Customer>
+
+import importlib
+import os
+import sys
+
+os.chdir("../lambda")
+lambda_folder = os.getcwd()
+sys.path = [lambda_folder] + sys.path
+import stark_core
+from stark_core import data_abstraction
+
+entity_namespace = importlib.import_module(sys.argv[1])
+
+print(f"Writing sort keys of {sys.argv[1]} records of {stark_core.ddb_table} for: {', '.join(entity_namespace.sort_indexes)}...")
+updated = data_abstraction.backfill_sort_keys(entity_namespace.default_sk, entity_namespace.sort_indexes)
+print(f"Done: {updated} records updated")
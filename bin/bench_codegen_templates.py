@@ -0,0 +1,150 @@
+## Benchmark for the code generator's compiled templates
+#  Generates the entity files (Lambda, tests, fixtures, ETL scripts, HTML and JS) of a synthetic model twice:
+#     - legacy: the pre-template rendering, emulated by formatting every template afresh (as the old f-strings did,
+#               margin included) and running textwrap.dedent() over every generated file
+#     - compiled: `cg_template.render()` (templates parsed once with the margin removed, no dedent)
+#  reporting the time spent in each generator and whether both modes produced the same files.
+#  Files are compared ignoring trailing whitespace, which dedent() left on a few lines that continue a previous line.
+#
+#  To use this: run it from the bin folder of your stark generated project (or of the STARK repo)
+#     python bench_codegen_templates.py [entity_count ...]        (default: 100)
+
+import contextlib
+import importlib
+import io
+import os
+import random
+import sys
+import textwrap
+
+## require the code generators: libstark inside a generated project, or the lambda folder of the STARK repo
+bin_folder = os.getcwd()
+if os.path.isdir('libstark'):
+    sys.path = [bin_folder, os.path.abspath('../lambda/helpers')] + sys.path
+    dynamic_dir = "libstark.STARK_CodeGen_Dynamic."
+    static_dir  = "libstark.STARK_CodeGen_Static."
+else:
+    sys.path = [os.path.abspath('../lambda/STARK_CodeGen_Dynamic'), os.path.abspath('../lambda/STARK_CodeGen_Static'), os.path.abspath('../lambda/helpers')] + sys.path
+    dynamic_dir = ""
+    static_dir  = ""
+
+cgdynamic  = importlib.import_module(f"{dynamic_dir}cgdynamic_cli")
+cgstatic   = importlib.import_module(f"{static_dir}cgstatic_cli")
+import cg_workers
+import cg_template
+import stark_model
+
+def make_model(entity_count):
+    models = {}
+    for number in range(entity_count):
+        models[f"Entity {number:03}"] = {
+            "pk": f"Entity {number:03} ID",
+            "data": {
+                "Name": "string",
+                "Quantity": "int",
+                "Start Date": "date",
+                "Active": "yes-no",
+                "Status": {"type": "radio button", "values": ["Open", "In Progress", "Closed"]},
+                "Remarks": "multi-line-string"
+            },
+            "sequence": {}
+        }
+    return models
+
+def generate_files(models):
+    #Test cases and fixtures draw random sample data; the same seed gives both modes the same data
+    random.seed(1)
+    model   = stark_model.build({"Data Model": models})
+    files   = {}
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for entity in models:
+            job = {
+                "Entity": entity,
+                "Models": models,
+                "Model Entity": model["Entities"][entity],
+                "DynamoDB Name": "bench_table",
+                "Bucket Name": "bench-bucket",
+                "Raw Bucket Name": "bench-raw",
+                "Processed Bucket Name": "bench-processed",
+                "Project Name": "Bench",
+                "Analytics Incremental": False,
+                "Manifest": {"Files": {}},
+                "Project Basedir": bin_folder + os.sep
+            }
+            for cli in [cgdynamic, cgstatic]:
+                entity_files, entity_timings = cli.create_entity_files(job)
+                timings.append(entity_timings)
+                for item in entity_files:
+                    files[item['filePath']] = item['fileContent']
+    return files, cg_workers.merge_timings(timings)
+
+def get_generators():
+    #Generators the CLIs call directly, i.e., those whose output used to be dedented as a whole file
+    generators = []
+    for cli in [cgdynamic, cgstatic]:
+        for value in vars(cli).values():
+            if hasattr(value, "cg_template") and hasattr(value, "create") and value not in generators:
+                generators.append(value)
+    return generators
+
+@contextlib.contextmanager
+def legacy_rendering():
+    saved_render   = cg_template.render
+    generators     = get_generators()
+    saved_creates  = [generator.create for generator in generators]
+
+    def legacy_render(template_text, context, margin=0):
+        return template_text.format_map(context)
+
+    def dedented(create):
+        return lambda data: textwrap.dedent(create(data))
+
+    cg_template.render = legacy_render
+    for generator, create in zip(generators, saved_creates):
+        generator.create = dedented(create)
+    try:
+        yield
+    finally:
+        cg_template.render = saved_render
+        for generator, create in zip(generators, saved_creates):
+            generator.create = create
+
+def normalize(content):
+    return [line.rstrip() for line in content.decode().split("\n")]
+
+def run(models, legacy):
+    #Best of 3, so one-time costs (imports, compiling the templates) don't count against either mode
+    best_total   = None
+    best_timings = None
+    for attempt in range(3):
+        if legacy:
+            with legacy_rendering():
+                files, timings = generate_files(models)
+        else:
+            files, timings = generate_files(models)
+        total = sum(sum(durations) for durations in timings.values())
+        if best_total == None or total < best_total:
+            best_total   = total
+            best_timings = timings
+    return files, best_timings, best_total
+
+entity_counts = [int(entity_count) for entity_count in sys.argv[1:]] or [100]
+for entity_count in entity_counts:
+    models = make_model(entity_count)
+    legacy_files, legacy_timings, legacy_total       = run(models, legacy=True)
+    compiled_files, compiled_timings, compiled_total = run(models, legacy=False)
+
+    mismatched = [file_path for file_path in legacy_files if normalize(legacy_files[file_path]) != normalize(compiled_files.get(file_path, b""))]
+    print(f"{entity_count} entities, {len(compiled_files)} files, {len(mismatched)} differ between modes")
+    for file_path in mismatched:
+        print(f"   differs: {file_path}")
+
+    print(f"{'Generator':<32}{'Legacy ms':>12}{'Compiled ms':>13}{'Speedup':>9}")
+    ordered = sorted(legacy_timings, key=lambda generator_name: sum(legacy_timings[generator_name]), reverse=True)
+    for generator_name in ordered:
+        legacy_ms   = sum(legacy_timings[generator_name]) * 1000
+        compiled_ms = sum(compiled_timings[generator_name]) * 1000
+        print(f"{generator_name:<32}{legacy_ms:>12.1f}{compiled_ms:>13.1f}{legacy_ms / compiled_ms:>8.1f}x")
+    print(f"{'Total':<32}{legacy_total * 1000:>12.1f}{compiled_total * 1000:>13.1f}{legacy_total / compiled_total:>8.1f}x")
+    print()
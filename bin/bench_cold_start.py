@@ -0,0 +1,132 @@
+## Cold-start benchmark for generated Lambdas and stark_core
+#  Assembles the Lambda code of a generated project (stark_core, an admin module, stark_auth and an entity module generated
+#  from a synthetic entity) in a temp folder, then imports each module in a fresh Python process, as a Lambda cold start
+#  does, and reports the import time per module (best of --repeat runs).
+#  With --baseline <git ref>, the code generator at that ref is assembled and measured the same way for a before/after
+#  comparison (e.g., --baseline HEAD~1). Needs boto3 and fpdf2 installed, and git for --baseline.
+#
+#  To use this: run it from the bin folder of the STARK repo
+#     python bench_cold_start.py [--baseline git_ref] [--repeat count]        (default: no baseline, 5)
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+repo_dir = os.path.abspath('..')
+modules  = [
+    'stark_core',
+    'stark_core.utilities',
+    'stark_core.data_abstraction',
+    'stark_core.write_queue',
+    'stark_core.athena_query',
+    'stark_auth',
+    'STARK_User',
+    'Bench_Entity'
+]
+
+generate_script = """
+import sys
+sys.path[:0] = [sys.argv[1], sys.argv[2]]
+import cgdynamic_dynamodb
+data = {
+    "Entity": "Bench Entity",
+    "Sequence": {},
+    "Columns": {"Name": "string", "Quantity": "int", "Start Date": "date", "Active": "yes-no", "Remarks": "multi-line-string"},
+    "PK": "Bench Entity ID",
+    "DynamoDB Name": "bench_table",
+    "Bucket Name": "bench-bucket",
+    "Relationships": {},
+    "Rel Model": {},
+    "List View": [],
+    "Lookup": [],
+    "Raw Bucket Name": "bench-raw",
+    "Processed Bucket Name": "bench-processed",
+    "Project Name": "Bench",
+    "Analytics Incremental": False
+}
+source_code = cgdynamic_dynamodb.create(data)
+with open(sys.argv[3], "w") as f:
+    f.write(source_code)
+"""
+
+import_script = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+def fill_placeholders(source_code):
+    return re.sub(r"\[\[STARK_[A-Z_]+\]\]", "bench", source_code)
+
+def assemble(codegen_dir, helpers_dir, lambda_dir):
+    #Copies the bundled Lambda sources the way a generated project has them, then generates the entity module
+    source_dir = os.path.join(codegen_dir, 'source_files')
+    for folder in ['stark_core', 'stark_auth', 'STARK_User']:
+        for root, dirs, files in os.walk(os.path.join(source_dir, folder)):
+            for filename in files:
+                if not filename.endswith('.py'):
+                    continue
+                source_file = os.path.join(root, filename)
+                target_file = os.path.join(lambda_dir, os.path.relpath(source_file, source_dir))
+                os.makedirs(os.path.dirname(target_file), exist_ok=True)
+                with open(source_file) as f:
+                    source_code = fill_placeholders(f.read())
+                with open(target_file, "w") as f:
+                    f.write(source_code)
+
+    #STARK_User hashes passwords with stark_scrypt, a helper layer in deployed projects
+    shutil.copy(os.path.join(helpers_dir, 'stark_scrypt', '__init__.py'), os.path.join(lambda_dir, 'stark_scrypt.py'))
+
+    entity_file = os.path.join(lambda_dir, 'Bench_Entity', '__init__.py')
+    os.makedirs(os.path.dirname(entity_file))
+    subprocess.run([sys.executable, '-c', generate_script, codegen_dir, helpers_dir, entity_file], cwd=codegen_dir, check=True, stdout=subprocess.DEVNULL)
+
+def measure(lambda_dir, module, repeat):
+    env = dict(os.environ)
+    env.update({'PYTHONPATH': lambda_dir, 'AWS_REGION': 'us-east-1', 'AWS_DEFAULT_REGION': 'us-east-1'})
+    best = None
+    for attempt in range(repeat):
+        result = subprocess.run([sys.executable, '-c', import_script.format(module=module)], cwd=lambda_dir, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+arguments = sys.argv[1:]
+baseline  = None
+repeat    = 5
+while len(arguments) > 1:
+    if arguments[0] == '--baseline':
+        baseline = arguments[1]
+    elif arguments[0] == '--repeat':
+        repeat = int(arguments[1])
+    arguments = arguments[2:]
+
+work_dir = tempfile.mkdtemp(prefix="stark_bench_")
+try:
+    trees = [('current', os.path.join(repo_dir, 'lambda'))]
+    if baseline != None:
+        baseline_dir = os.path.join(work_dir, 'baseline_src')
+        os.makedirs(baseline_dir)
+        archive = subprocess.run(['git', '-C', repo_dir, 'archive', baseline, 'lambda/STARK_CodeGen_Dynamic', 'lambda/helpers'], capture_output=True, check=True)
+        subprocess.run(['tar', '-x', '-C', baseline_dir], input=archive.stdout, check=True)
+        trees.insert(0, (baseline, os.path.join(baseline_dir, 'lambda')))
+
+    timings = {}
+    for name, source_lambda_dir in trees:
+        lambda_dir = os.path.join(work_dir, f"lambda_{len(timings)}")
+        assemble(os.path.join(source_lambda_dir, 'STARK_CodeGen_Dynamic'), os.path.join(source_lambda_dir, 'helpers'), lambda_dir)
+        timings[name] = {module: measure(lambda_dir, module, repeat) for module in modules}
+finally:
+    shutil.rmtree(work_dir)
+
+print(f"Import time per module, fresh process, best of {repeat} (ms)")
+print(f"{'Module':<32}" + "".join(f"{name:>12}" for name in timings))
+for module in modules:
+    print(f"{module:<32}" + "".join(f"{timings[name][module] * 1000:>12.1f}" for name in timings))
@@ -0,0 +1,160 @@
+## Benchmark for the code generator's commit packing
+#  Generates the entity files (Lambda, tests, fixtures, ETL scripts, HTML and JS) of a synthetic model, adds prebuilt
+#  assets of realistic sizes, then commits everything to a throwaway local git repo twice:
+#     - legacy: the old sequential chunking (a new commit every 100 files or 6.5 MB, branch read before every commit)
+#     - packed: `cg_commit_packer.commit_files()` (first-fit decreasing bin-packing, branch read once)
+#  reporting the number of commits, the fullest commit and the total commit time. Needs git on the PATH.
+#  A local commit is much faster than a CodeCommit API call, so --api-latency adds a fixed delay to every
+#  branch read and commit to approximate the round trips the Lambda makes.
+#
+#  To use this: run it from the bin folder of your stark generated project (or of the STARK repo)
+#     python bench_commit_packer.py [--api-latency seconds] [entity_count ...]        (default: 0.2, 50 100)
+
+import contextlib
+import importlib
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+## require the code generators: libstark inside a generated project, or the lambda folder of the STARK repo
+bin_folder = os.getcwd()
+if os.path.isdir('libstark'):
+    sys.path = [bin_folder, os.path.abspath('../lambda/helpers')] + sys.path
+    dynamic_dir = "libstark.STARK_CodeGen_Dynamic."
+    static_dir  = "libstark.STARK_CodeGen_Static."
+else:
+    sys.path = [os.path.abspath('../lambda/STARK_CodeGen_Dynamic'), os.path.abspath('../lambda/STARK_CodeGen_Static'), os.path.abspath('../lambda/helpers')] + sys.path
+    dynamic_dir = ""
+    static_dir  = ""
+
+cgdynamic = importlib.import_module(f"{dynamic_dir}cgdynamic_cli")
+cgstatic  = importlib.import_module(f"{static_dir}cgstatic_cli")
+import cg_commit_packer as packer
+import stark_model
+
+class latency_backend:
+    #Adds a fixed delay to every backend call, standing in for the CodeCommit API round trip
+    def __init__(self, backend, latency):
+        self.backend = backend
+        self.latency = latency
+
+    def get_head(self):
+        time.sleep(self.latency)
+        return self.backend.get_head()
+
+    def create_commit(self, files, commit_message, parent_commit_id, author_name, email):
+        time.sleep(self.latency)
+        return self.backend.create_commit(files, commit_message, parent_commit_id, author_name, email)
+
+def make_model(entity_count):
+    models = {}
+    for number in range(entity_count):
+        models[f"Entity {number:03}"] = {
+            "pk": f"Entity {number:03} ID",
+            "data": {
+                "Name": "string",
+                "Quantity": "int",
+                "Start Date": "date",
+                "Active": "yes-no",
+                "Status": {"type": "radio button", "values": ["Open", "In Progress", "Closed"]},
+                "Remarks": "multi-line-string"
+            },
+            "sequence": {}
+        }
+    return models
+
+def generate_files(entity_count):
+    models = make_model(entity_count)
+    model  = stark_model.build({"Data Model": models})
+    files  = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for entity in models:
+            job = {
+                "Entity": entity,
+                "Models": models,
+                "Model Entity": model["Entities"][entity],
+                "DynamoDB Name": "bench_table",
+                "Bucket Name": "bench-bucket",
+                "Raw Bucket Name": "bench-raw",
+                "Processed Bucket Name": "bench-processed",
+                "Project Name": "Bench",
+                "Analytics Incremental": False,
+                "Manifest": {"Files": {}},
+                "Project Basedir": bin_folder + os.sep
+            }
+            files.extend(cgdynamic.create_entity_files(job)[0])
+            files.extend(cgstatic.create_entity_files(job)[0])
+
+    #Prebuilt files committed with every project: packaged layers (a few large zips) and web assets
+    rng = random.Random(1)
+    for number, size in enumerate([1500000, 790000, 230000, 40000, 4000, 4000, 4000]):
+        files.append({'filePath': f"lambda/packaged_layers/layer_{number}.zip", 'fileContent': rng.randbytes(size)})
+    for number in range(100):
+        files.append({'filePath': f"static/prebuilt/asset_{number:03}.bin", 'fileContent': rng.randbytes(rng.randint(2000, 70000))})
+    return files
+
+def legacy_chunks(files_to_commit):
+    #Pre-packer implementation, kept here only as the benchmark baseline
+    ctr                 = 0
+    key                 = 0
+    total_commit_size   = 0
+    total_commit_limit  = 6500000
+    chunked_commit_list = {}
+    for item in files_to_commit:
+        total_commit_size += len(item['fileContent'])
+        if ctr == 100 or total_commit_size > total_commit_limit:
+            key = key + 1
+            ctr = 0
+            total_commit_size = len(item['fileContent'])
+        ctr = ctr + 1
+        if chunked_commit_list.get(key, '') == '':
+            chunked_commit_list[key] = []
+        chunked_commit_list[key].append(item)
+    return list(chunked_commit_list.values())
+
+def legacy_commit(files_to_commit, backend):
+    batches = legacy_chunks(files_to_commit)
+    for ctr, batch in enumerate(batches, start=1):
+        parent = backend.get_head()
+        backend.create_commit(batch, f"Initial commit (commit {ctr} of {len(batches)})", parent, 'STARK::Bench', 'STARK@fakedomainstark.com')
+    return batches
+
+def packed_commit(files_to_commit, backend):
+    packer.commit_files(files_to_commit, backend, 'Initial commit', 'STARK::Bench')
+    return packer.pack_files(files_to_commit)
+
+def run(strategy, files_to_commit, api_latency):
+    repo_dir = tempfile.mkdtemp(prefix="stark_bench_")
+    try:
+        subprocess.run(['git', 'init', '-q', repo_dir], check=True)
+        backend = latency_backend(packer.local_git_backend(repo_dir), api_latency)
+        start   = time.perf_counter()
+        batches = strategy(files_to_commit, backend)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(repo_dir)
+
+    fullest_files = max(len(batch) for batch in batches)
+    fullest_bytes = max(sum(len(item['fileContent']) for item in batch) for batch in batches)
+    return len(batches), fullest_files, fullest_bytes, elapsed
+
+arguments   = sys.argv[1:]
+api_latency = 0.2
+if len(arguments) > 1 and arguments[0] == '--api-latency':
+    api_latency = float(arguments[1])
+    arguments   = arguments[2:]
+
+entity_counts = [int(entity_count) for entity_count in arguments] or [50, 100]
+print(f"API latency per call: {api_latency:.2f} s")
+print(f"{'entities':>8} {'files':>6} {'MB':>6} {'strategy':<8} {'commits':>8} {'max files':>10} {'max MB':>7} {'time (s)':>9}")
+for entity_count in entity_counts:
+    files_to_commit = generate_files(entity_count)
+    total_mb = sum(len(item['fileContent']) for item in files_to_commit) / 1000000
+    for name, strategy in [('legacy', legacy_commit), ('packed', packed_commit)]:
+        commits, fullest_files, fullest_bytes, elapsed = run(strategy, files_to_commit, api_latency)
+        print(f"{entity_count:>8} {len(files_to_commit):>6} {total_mb:>6.1f} {name:<8} {commits:>8} {fullest_files:>10} {fullest_bytes / 1000000:>7.2f} {elapsed:>9.2f}")
@@ -0,0 +1,77 @@
+## Benchmark for the precompiled data model artifact
+#  Builds the cloud resources document of a synthetic model (with has_many and repeater relationships), then times
+#  how a code generator gets to its per-entity structures:
+#     - yaml: yaml.safe_load() of the document, then get_relationship() for every entity (what each consumer used to do)
+#     - artifact: stark_model.loads() of the precompiled artifact (what each consumer does now, after a cache hit)
+#  and the one-time cost of building the artifact (paid once per deploy, by the CFWriter).
+#
+#  To use this: run it from the bin folder of your stark generated project (or of the STARK repo)
+#     python bench_model_artifact.py [entity_count ...]        (default: 50 100 200)
+
+import os
+import sys
+import time
+
+import yaml
+
+## require the STARK helpers: installed with install-layers-to-local.sh, or the lambda folder of the STARK repo
+sys.path = sys.path + [os.path.abspath('../lambda/helpers')]
+
+import get_relationship as get_rel
+import stark_model
+
+def make_cloud_resources(entity_count):
+    models = {}
+    for number in range(entity_count):
+        models[f"Entity {number:03}"] = {
+            "pk": f"Entity {number:03} ID",
+            "data": {
+                "Name": "string",
+                "Quantity": "int",
+                "Start Date": "date",
+                "Active": "yes-no",
+                "Status": {"type": "radio button", "values": ["Open", "In Progress", "Closed"]},
+                "Remarks": "multi-line-string"
+            },
+            "sequence": {}
+        }
+    #Every fifth entity owns the next one: alternately a has_many (multi-select) and a repeater relationship
+    entities = list(models)
+    for index in range(0, entity_count - 1, 5):
+        child = entities[index + 1]
+        relationship = {"type": "relationship", "has_many": child}
+        if index % 10 == 0:
+            relationship["has_many_ux"] = "repeater"
+        models[entities[index]]["data"][child] = relationship
+
+    return {"Project Name": "Bench", "Data Model": models}
+
+def load_yaml(yaml_content):
+    cloud_resources = yaml.safe_load(yaml_content)
+    models = cloud_resources["Data Model"]
+    for entity in models:
+        get_rel.get_relationship(models, entity)
+        get_rel.get_relationship(models, entity, entity)
+    return cloud_resources
+
+def best_of(repeat, func, *args):
+    best = None
+    for attempt in range(repeat):
+        start   = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+entity_counts = [int(entity_count) for entity_count in sys.argv[1:]] or [50, 100, 200]
+print(f"{'entities':>8} {'YAML KB':>8} {'artifact KB':>12} {'build ms':>9} {'yaml ms':>9} {'artifact ms':>12} {'speedup':>8}")
+for entity_count in entity_counts:
+    cloud_resources  = make_cloud_resources(entity_count)
+    yaml_content     = yaml.dump(cloud_resources, sort_keys=False)
+    artifact_content = stark_model.dumps(stark_model.build(cloud_resources))
+
+    build_time    = best_of(3, stark_model.build, cloud_resources)
+    yaml_time     = best_of(3, load_yaml, yaml_content)
+    artifact_time = best_of(10, stark_model.loads, artifact_content)
+    print(f"{entity_count:>8} {len(yaml_content) / 1000:>8.1f} {len(artifact_content) / 1000:>12.1f} {build_time * 1000:>9.1f} {yaml_time * 1000:>9.1f} {artifact_time * 1000:>12.2f} {yaml_time / artifact_time:>7.0f}x")
@@ -0,0 +1,126 @@
+## Micro-benchmark for 1-M report criteria
+#  Compares evaluating 1-M report criteria the old way (re-interpreting the operator and re-converting the criteria
+#  value for every child row) against the predicates compiled once by `utilities.compile_criteria_for_many_fields()`.
+#
+#  To use this: run it from the bin folder of your stark generated project
+#     python bench_report_filters.py [number_of_child_rows]
+
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+## require stark_core from the lambda folder of the project
+os.chdir("../lambda")
+lambda_folder = os.getcwd()
+sys.path = [lambda_folder] + sys.path
+from stark_core import utilities
+
+def legacy_filter_criteria_for_many_fields(str_value, criteria):
+    #Pre-compiler implementation, kept here only as the benchmark baseline
+    def convert_value_data_type(value, data_type):
+        converted_value = ""
+        if value != "":
+            if data_type == 'date':
+                converted_value = datetime.strptime(value, '%Y-%m-%d').date()
+            elif data_type == 'float':
+                converted_value = float(value)
+            elif data_type == 'integer':
+                converted_value = int(value)
+            else:
+                converted_value = str(value)
+        return converted_value
+
+    if criteria['operator'] not in ['IN', 'between']:
+        criteria_value = convert_value_data_type(criteria['value'], criteria['data_type'])
+        compare_value = convert_value_data_type(str_value, criteria['data_type'])
+
+    is_data_included = False
+    if str_value != "":
+        if criteria['operator'] == '=':
+            is_data_included = compare_value == criteria_value
+        elif criteria['operator'] == '<>':
+            is_data_included = compare_value != criteria_value
+        elif criteria['operator'] == '<':
+            is_data_included = compare_value < criteria_value
+        elif criteria['operator'] == '<=':
+            is_data_included = compare_value <= criteria_value
+        elif criteria['operator'] == '>':
+            is_data_included = compare_value > criteria_value
+        elif criteria['operator'] == '>=':
+            is_data_included = compare_value >= criteria_value
+        elif criteria['operator'] == 'contains':
+            is_data_included = criteria_value in compare_value
+        elif criteria['operator'] == 'begins_with':
+            is_data_included = str(str_value).startswith(criteria['value'])
+        elif criteria['operator'] == 'between':
+            between_values = criteria['value'].split(',')
+            first_value  = convert_value_data_type(str(between_values[0]).strip(), criteria['data_type'])
+            second_value = convert_value_data_type(str(between_values[1]).strip(), criteria['data_type'])
+            is_data_included = first_value <= convert_value_data_type(str_value, criteria['data_type']) <= second_value
+
+    return is_data_included
+
+def run_legacy(rows, criteria):
+    included = 0
+    for row in rows:
+        is_included = True
+        for field_name, field_criteria in criteria.items():
+            is_included = legacy_filter_criteria_for_many_fields(row[field_name], field_criteria)
+            if is_included == False:
+                break
+        if is_included:
+            included += 1
+    return included
+
+def run_compiled(rows, criteria):
+    #Compilation is part of the measured work, same as in report()
+    predicates = {}
+    for field_name, field_criteria in criteria.items():
+        predicates[field_name] = utilities.compile_criteria_for_many_fields(field_criteria)
+
+    included = 0
+    for row in rows:
+        is_included = True
+        for field_name, is_match in predicates.items():
+            is_included = is_match(row[field_name])
+            if is_included == False:
+                break
+        if is_included:
+            included += 1
+    return included
+
+row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+random.seed(7)
+rows = []
+for index in range(row_count):
+    rows.append({
+        'Transaction_Details_Amount': str(random.randint(1, 1000)),
+        'Transaction_Details_Quantity': f"{random.uniform(0, 50):.2f}",
+        'Transaction_Details_Date': f"2023-{random.randint(1, 12):02}-{random.randint(1, 28):02}",
+        'Transaction_Details_Item': random.choice(['Apple', 'Banana', 'Cherry', 'Durian']),
+    })
+
+scenarios = {
+    'integer >=': {
+        'Transaction_Details_Amount': {'operator': '>=', 'value': '100', 'data_type': 'integer'},
+    },
+    'date between': {
+        'Transaction_Details_Date': {'operator': 'between', 'value': '2023-03-01, 2023-09-30', 'data_type': 'date'},
+    },
+    'mixed (4 criteria)': {
+        'Transaction_Details_Amount': {'operator': '>=', 'value': '100', 'data_type': 'integer'},
+        'Transaction_Details_Quantity': {'operator': 'between', 'value': '1.5, 45', 'data_type': 'float'},
+        'Transaction_Details_Date': {'operator': '>', 'value': '2023-02-15', 'data_type': 'date'},
+        'Transaction_Details_Item': {'operator': 'contains', 'value': 'an', 'data_type': 'string'},
+    },
+}
+
+print(f"1-M report criteria over {row_count} child rows (best of 3)")
+print(f"{'scenario':<20} {'legacy (s)':>12} {'compiled (s)':>14} {'speedup':>9}")
+for scenario, criteria in scenarios.items():
+    assert run_legacy(rows, criteria) == run_compiled(rows, criteria)
+    legacy_time   = min(timeit.repeat(lambda: run_legacy(rows, criteria), number=1, repeat=3))
+    compiled_time = min(timeit.repeat(lambda: run_compiled(rows, criteria), number=1, repeat=3))
+    print(f"{scenario:<20} {legacy_time:>12.3f} {compiled_time:>14.3f} {legacy_time / compiled_time:>8.1f}x")
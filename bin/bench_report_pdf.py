@@ -0,0 +1,67 @@
+## Benchmark for report PDF rendering
+#  Compares the classic renderer (`utilities.create_pdf`) with the streamed renderer (`utilities.create_pdf_stream`),
+#  both uncapped and with the default `pdf_max_rows` / `pdf_max_pages` caps, reporting wall time and peak RSS.
+#  Every run happens in a fresh process so peak RSS is not carried over between runs.
+#
+#  To use this: run it from the bin folder of your stark generated project
+#     python bench_report_pdf.py [row_count ...]        (default: 1000 10000 50000)
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+modes = ['classic', 'stream (uncapped)', 'stream (capped)']
+
+def run_worker(mode, row_count):
+    ## require stark_core from the lambda folder of the project
+    os.chdir("../lambda")
+    lambda_folder = os.getcwd()
+    sys.path = [lambda_folder] + sys.path
+    import stark_core
+    from stark_core import utilities
+
+    metadata = {
+        'Customer_ID': {'data_type': 'string'},
+        'Customer_Name': {'data_type': 'string'},
+        'Join_Date': {'data_type': 'date'},
+        'Points': {'data_type': 'number'},
+        'Remarks': {'data_type': 'string'},
+    }
+    #Report rows are already in memory when report() renders the PDF, so they are not part of the measurement
+    report_list = []
+    for index in range(row_count):
+        report_list.append({
+            'Customer ID': f"C-{index:06}",
+            'Customer Name': f"Customer {index}",
+            'Join Date': f"2023-{index % 12 + 1:02}-{index % 28 + 1:02}",
+            'Points': str(index % 500),
+            'Remarks': "Prefers weekend deliveries, call before arriving" if index % 10 == 0 else "",
+        })
+
+    stark_core.stream_pdf_exports = mode != 'classic'
+    if mode == 'stream (uncapped)':
+        stark_core.pdf_max_rows  = 0
+        stark_core.pdf_max_pages = 0
+
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    pdf_file, pdf_output = utilities.prepare_pdf_data(report_list, list(report_list[0].keys()), {}, metadata, 'Customer_ID')
+    elapsed = time.perf_counter() - start
+    peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    #ru_maxrss is in KB on Linux
+    print(f"{elapsed:.2f} {(peak_after - peak_before) / 1024:.1f} {peak_after / 1024:.1f} {len(pdf_output) / 1024 / 1024:.2f}")
+
+if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+    run_worker(sys.argv[2], int(sys.argv[3]))
+    sys.exit()
+
+row_counts = [int(row_count) for row_count in sys.argv[1:]] or [1000, 10000, 50000]
+print(f"{'rows':>7} {'renderer':<18} {'time (s)':>9} {'RSS growth (MB)':>16} {'peak RSS (MB)':>14} {'PDF (MB)':>9}")
+for row_count in row_counts:
+    for mode in modes:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode, str(row_count)], capture_output=True, text=True, check=True)
+        elapsed, growth, peak, size = result.stdout.split()
+        print(f"{row_count:>7} {mode:<18} {elapsed:>9} {growth:>16} {peak:>14} {size:>9}")
@@ -0,0 +1,21 @@
+## Tombstone migration for STARK generated projects
+#  Records used to be soft-deleted in place (flagged with STARK-Is-Deleted at their original key), so they stayed in
+#  STARK-ListView-Index and every list, lookup and report read had to read them and filter them out until their TTL ran out.
+#  Deletes now move records to a tombstone sort key (see stark_core.data_abstraction.soft_delete); this script moves the
+#  records deleted before that change the same way, so the read paths can stop filtering them. It is safe to run again.
+#
+#  To use this: run it from the bin folder of your stark generated project, with credentials for the project's AWS account
+#     AWS_REGION=<project region> python migrate_tombstones.py
+
+import os
+import sys
+
+os.chdir("../lambda")
+lambda_folder = os.getcwd()
+sys.path = [lambda_folder] + sys.path
+import stark_core
+from stark_core import data_abstraction
+
+print(f"Moving soft-deleted records of {stark_core.ddb_table} to tombstone keys...")
+moved = data_abstraction.migrate_tombstones()
+print(f"Done: {moved} records moved")
@@ -0,0 +1,25 @@
+## List view resharding for STARK generated projects
+#  An entity's records are spread over list_view_shards STARK-ListView-Index partitions (see
+#  stark_core.data_abstraction.get_shard_sk). Records written before its list_view_shards was changed in the data model
+#  are still under their old sort key, where the entity's list, lookup and report reads no longer look for them;
+#  this script moves them to their shard under the entity's current setting. It is safe to run again.
+#
+#  To use this: deploy the entity with its new list_view_shards, then run this from the bin folder of your stark generated
+#  project, with credentials for the project's AWS account
+#     AWS_REGION=<project region> python reshard_list_view.py <Entity module, e.g. Customer>
+
+import importlib
+import os
+import sys
+
+os.chdir("../lambda")
+lambda_folder = os.getcwd()
+sys.path = [lambda_folder] + sys.path
+import stark_core
+from stark_core import data_abstraction
+
+entity_namespace = importlib.import_module(sys.argv[1])
+
+print(f"Moving {sys.argv[1]} records of {stark_core.ddb_table} to {entity_namespace.list_view_shards} list view shard(s)...")
+moved = data_abstraction.reshard_records(entity_namespace.default_sk, entity_namespace.list_view_shards)
+print(f"Done: {moved} records moved")
@@ -148,6 +148,16 @@ parser.add_argument('--resources',
                             [2.3] create-certificate - Create certificate for custom domain name specified ''')
 )
 
+parser.add_argument('--regenerate-all',
+                    required=False,
+                    dest='regenerate_all',
+                    action='store_true',
+                    help=dedent('''\
+                    Used with --new: regenerate every file, ignoring the generation manifest.
+                    By default, files whose inputs (entity model, relationships, generator version)
+                    did not change since the last run are skipped.''')
+)
+
 args = parser.parse_args()
 
 construct = args.construct
@@ -187,13 +197,13 @@ if isinstance(construct, tuple):
         #Replace STARK_Parser folder in sys.path with STARK_CodeGen_Dynamic
         print("Creating backend files..")
         import libstark.STARK_CodeGen_Dynamic.cgdynamic_cli as cgdynamic
-        cgdynamic.create(cloud_resources, project_basedir)
+        cgdynamic.create(cloud_resources, project_basedir, incremental=not args.regenerate_all)
 
         #4) CGStatic
         #Replace CGDynamic folder in sys.path with CGStatic
         print("Creating frontend files..")
         import libstark.STARK_CodeGen_Static.cgstatic_cli as cgstatic
-        cgstatic.create(cloud_resources, current_cloud_resources, project_basedir)
+        cgstatic.create(cloud_resources, current_cloud_resources, project_basedir, incremental=not args.regenerate_all)
 
         #5) Updating cloud resources doc
         #FIXME: We are purposely only updating the Data Model and Lambda, because all other entries are just entity lists and
@@ -14,6 +14,7 @@ import boto3
 
 #Private modules
 import convert_friendly_to_system as converter
+import stark_model
 
 
 
@@ -78,6 +79,9 @@ def lambda_handler(event, context):
             }
         )
 
+        #The same document, parsed and validated once here, for the code generators and pre-launch to load quickly
+        stark_model.save(s3, codegen_bucket_name, project_varname, cloud_resources)
+
     ###############################################################################################################
     #Load and sanitize data here, for whatever IaC rules that govern them (e.g., S3 Bucket names must be lowercase)
 
@@ -8,9 +8,9 @@ import pickle
 import os
 import textwrap
 import importlib
+import time
 
 #Extra modules
-import yaml
 import boto3
 from crhelper import CfnResource
 
@@ -36,7 +36,9 @@ cg_test     = importlib.import_module(f"{prepend_dir}cgdynamic_test_cases")
 cg_fixtures = importlib.import_module(f"{prepend_dir}cgdynamic_test_fixtures")
 
 import convert_friendly_to_system as converter
-import get_relationship as get_rel
+import cg_commit_packer as cg_packer
+import cg_workers
+import stark_model
 
 s3   = boto3.client('s3')
 lmb  = boto3.client('lambda')
@@ -66,87 +68,39 @@ def create_handler(event, context):
 
     #Cloud resources document
     codegen_bucket_name = os.environ['CODEGEN_BUCKET_NAME']
-    response = s3.get_object(
-        Bucket=codegen_bucket_name,
-        Key=f'codegen_dynamic/{project_varname}/{project_varname}.yaml'
-    )
-    cloud_resources = yaml.safe_load(response['Body'].read().decode('utf-8')) 
+    model               = stark_model.load(s3, codegen_bucket_name, project_varname)
+    cloud_resources     = model["Cloud Resources"]
+    write_queue_name    = cloud_resources.get("SQS", {}).get("Queue Name", "")
 
 
     models   = cloud_resources["Data Model"]
     entities = []
     for entity in models: entities.append(entity)
+    analytics_data = stark_model.get_analytics_data(cloud_resources, entities, project_varname)
 
     ##########################################
     #Create code for our entity Lambdas (API endpoint backing and test cases)
-    files_to_commit = []
+    #   Each entity is an independent job; jobs run in parallel worker processes and results come back in entity order
+    entity_jobs = []
     for entity in entities:
-        entity_varname = converter.convert_to_system_name(entity) 
-        #Step 1: generate source code.
-        #Step 1.1: extract relationship
-        relationships = get_rel.get_relationship(models, entity, entity)
-        rel_model = {}
-        for relationship in relationships.get('has_many', []):
-            if relationship.get('type') == 'repeater':
-                rel_col = models.get(relationship.get('entity'), '')
-                rel_model.update({(relationship.get('entity')) : rel_col})
-        #FIXME: For double checking 
-        for index, items in relationships.items():
-            if len(items) > 0:
-                for key in items:
-                    for value in key:
-                        key[value] = converter.convert_to_system_name(key[value]) 
-                        
-        seq = {}
-        if len(models[entity].get("sequence", {})) > 0:
-            seq = models[entity]["sequence"]
-
-        data = {
-                "Entity": entity, 
-                "Sequence": seq, 
-                "Columns": models[entity]["data"], 
-                "PK": models[entity]["pk"], 
-                "DynamoDB Name": ddb_table_name,
-                "Bucket Name": website_bucket,
-                "Relationships": relationships,
-                "Rel Model": rel_model,
-                "Raw Bucket Name": s3_analytics_raw_bucket_name,
-                "Processed Bucket Name": s3_analytics_processed_bucket_name,
-                "Project Name": project_varname
-            }
-        
-            
-        print(data)    
-        source_code            = cg_ddb.create(data)
-        test_source_code       = cg_test.create(data)
-        fixtures_source_code   = cg_fixtures.create(data)
-        etl_script_source_code = cg_etl_script.create(data)
-
-        #Step 2: Add source code to our commit list to the project repo
-        files_to_commit.append({
-            'filePath': f"lambda/{entity_varname}/__init__.py",
-            'fileContent': source_code.encode()
+        entity_jobs.append({
+            "Entity": entity,
+            "Models": models,
+            "Model Entity": model["Entities"][entity],
+            "DynamoDB Name": ddb_table_name,
+            "Bucket Name": website_bucket,
+            "Raw Bucket Name": s3_analytics_raw_bucket_name,
+            "Processed Bucket Name": s3_analytics_processed_bucket_name,
+            "Project Name": project_varname,
+            "Analytics Incremental": analytics_data["Incremental Export"]
         })
 
-        
-
-        # test cases
-        files_to_commit.append({
-            'filePath': f"lambda/test_cases/business_modules/test_{entity_varname.lower()}.py",
-            'fileContent': test_source_code.encode()
-        })
-
-        # fixtures
-        files_to_commit.append({
-            'filePath': f"lambda/test_cases/fixtures/{entity_varname}/__init__.py",
-            'fileContent': fixtures_source_code.encode()
-        })
-
-        # etl scripts
-        files_to_commit.append({
-            'filePath': f"lambda/STARK_Analytics/ETL_Scripts/{entity_varname}.py",
-            'fileContent': etl_script_source_code.encode()
-        })
+    codegen_start   = time.perf_counter()
+    entity_results  = cg_workers.run_jobs(create_entity_files, entity_jobs)
+    files_to_commit = []
+    for entity_files, timings in entity_results:
+        files_to_commit.extend(entity_files)
+    cg_workers.print_timing_report(cg_workers.merge_timings([timings for entity_files, timings in entity_results]), time.perf_counter() - codegen_start)
 
     ###########################################################
     #Create necessary files for test_cases directories
@@ -211,7 +165,6 @@ def create_handler(event, context):
     #########################################
     #Create Lambdas of built-in STARK modules 
     #    (Analytics)
-    analytics_data = { "Entities": entities, "S3 Bucket Athena" : s3_analytics_athena_bucket_name, "Project_Name" : project_varname }
     analytics_source_code = cg_analytics.create(analytics_data)
     files_to_commit.append({
         'filePath': f"lambda/STARK_Analytics/__init__.py",
@@ -228,6 +181,9 @@ def create_handler(event, context):
                 source_code = source_code.replace("[[STARK_PROCESSED_BUCKET]]", s3_analytics_processed_bucket_name)
                 source_code = source_code.replace("[[STARK_ATHENA_BUCKET]]", s3_analytics_athena_bucket_name)
                 source_code = source_code.replace("[[STARK_PROJECT_VARNAME]]", project_varname)
+                source_code = source_code.replace("[[STARK_SURGE_PROTECTION]]", str(bool(cloud_resources["DynamoDB"]["Surge Protection"])))
+                source_code = source_code.replace("[[STARK_SURGE_PROTECTION_FIFO]]", str(bool(cloud_resources["DynamoDB"]["Surge Protection FIFO"])))
+                source_code = source_code.replace("[[STARK_WRITE_QUEUE]]", write_queue_name)
                 #We use root[13:] because we want to strip out the "source_files/" part of the root path
                 files_to_commit.append({
                     'filePath': f"lambda/" + os.path.join(root[13:], source_file),
@@ -297,45 +253,66 @@ def create_handler(event, context):
 
     ##################################################
     #Commit files to the project repo
-    #   There's a codecommit limit of 100 files and 7mb - this will fail if more than 100 static files or >7mb are needed,
-    #   such as if a dozen or so entities are requested for code generation. Implement commit chunking here for safety.
-    ctr                 = 0
-    key                 = 0
-    total_commit_size   = 0
-    total_commit_limit  = 6500000 #we limit to 6500000 bytes
-    chunked_commit_list = {}
-    for item in files_to_commit:
-        total_commit_size += len(item['fileContent'])
-        if ctr == 100 or total_commit_size > total_commit_limit:
-            key = key + 1
-            ctr = 0
-            total_commit_size = len(item['fileContent'])
-        ctr = ctr + 1
-        if chunked_commit_list.get(key, '') == '':
-            chunked_commit_list[key] = []
-        chunked_commit_list[key].append(item)
-
-    ctr         = 0
-    batch_count = key + 1
-    for commit_batch in chunked_commit_list:
-        ctr = ctr + 1
-
-        response = git.get_branch(
-            repositoryName=repo_name,
-            branchName='master'        
-        )
-        commit_id = response['branch']['commitId']
-
-        response = git.create_commit(
-            repositoryName=repo_name,
-            branchName='master',
-            parentCommitId=commit_id,
-            authorName='STARK::CGDynamic',
-            email='STARK@fakedomainstark.com',
-            commitMessage=f'Initial commit of Lambda source codes (commit {ctr} of {batch_count})',
-            putFiles=files_to_commit
-        )
+    #   CodeCommit limits each commit to 100 files and 6 MB, so the files are bin-packed into as few commits as fit
+    commit_ids = cg_packer.commit_files(files_to_commit, cg_packer.codecommit_backend(repo_name, git_handler=git), 'Initial commit of Lambda source codes', 'STARK::CGDynamic')
+    print(f"Committed {len(files_to_commit)} files in {len(commit_ids)} commits")
+
+
+def create_entity_files(job):
+    #Generates the Lambda, test case, fixture and ETL script files of one entity.
+    #Returns (files_to_commit, timings) - timings are per generator, for cg_workers.print_timing_report()
+    entity = job["Entity"]
+    models = job["Models"]
+    timings = {}
+    files_to_commit = []
+
+    entity_varname = converter.convert_to_system_name(entity) 
+    #Step 1: generate source code.
+    #Step 1.1: data model part of the data (relationships are precomputed in the data model artifact)
+    data = stark_model.get_dynamic_entity_data(models, job["Model Entity"], entity)
+    data.update({
+            "DynamoDB Name": job["DynamoDB Name"],
+            "Bucket Name": job["Bucket Name"],
+            "Raw Bucket Name": job["Raw Bucket Name"],
+            "Processed Bucket Name": job["Processed Bucket Name"],
+            "Project Name": job["Project Name"],
+            "Analytics Incremental": job["Analytics Incremental"]
+        })
+    
+        
+    print(data)    
+    source_code            = cg_workers.timed("cgdynamic_dynamodb", cg_ddb.create, data, timings)
+    test_source_code       = cg_workers.timed("cgdynamic_test_cases", cg_test.create, data, timings)
+    fixtures_source_code   = cg_workers.timed("cgdynamic_test_fixtures", cg_fixtures.create, data, timings)
+    etl_script_source_code = cg_workers.timed("cgdynamic_etl_script", cg_etl_script.create, data, timings)
+
+    #Step 2: Add source code to our commit list to the project repo
+    files_to_commit.append({
+        'filePath': f"lambda/{entity_varname}/__init__.py",
+        'fileContent': source_code.encode()
+    })
+
+    
+
+    # test cases
+    files_to_commit.append({
+        'filePath': f"lambda/test_cases/business_modules/test_{entity_varname.lower()}.py",
+        'fileContent': test_source_code.encode()
+    })
+
+    # fixtures
+    files_to_commit.append({
+        'filePath': f"lambda/test_cases/fixtures/{entity_varname}/__init__.py",
+        'fileContent': fixtures_source_code.encode()
+    })
+
+    # etl scripts
+    files_to_commit.append({
+        'filePath': f"lambda/STARK_Analytics/ETL_Scripts/{entity_varname}.py",
+        'fileContent': etl_script_source_code.encode()
+    })
 
+    return files_to_commit, timings
 
 @helper.delete
 def no_op(_, __):
@@ -10,12 +10,15 @@ def create(data):
     s3_athena_bucket_name = data['S3 Bucket Athena']
     project_varname       = data['Project_Name']
     entities              = data["Entities"]
+    incremental_export    = data.get("Incremental Export", False)
     entities_varname = []
     for entity in entities:
         entities_varname.append(converter.convert_to_system_name(entity))
 
     source_code = f"""\
     import importlib
+    import itertools
+    import time
     import boto3
     import json
     import base64
@@ -25,7 +28,7 @@ def create(data):
     import stark_core
     from stark_core import data_abstraction
     from stark_core import utilities
-    from collections import OrderedDict
+    from stark_core import athena_query
 
     #######
     #CONFIG
@@ -35,11 +38,15 @@ def create(data):
     page_limit      = stark_core.page_limit
     bucket_url      = stark_core.bucket_url
     bucket_tmp      = stark_core.bucket_tmp
-    athena          = boto3.client('athena')
     database        = "stark_{project_varname.lower()}_db"
     ddb             = boto3.client('dynamodb')
     default_sk      = "Analytics|Settings"
     report_pk_field = "Report_Name"
+    watermark_sk    = "STARK|analytics|watermark"
+    data_version_sk = "STARK|analytics|data_version"
+
+    #Incremental export: only rows changed since the last export are written (see dump_changes)
+    incremental_export = {incremental_export}
 
     def lambda_handler(event, context):
         responseStatusCode = 200
@@ -88,63 +95,62 @@ def create(data):
                     valid_report = has_permission(table_from_query, table_with_permission)
                     query = compose_query(report_data)
 
-                query_error_list = validate_query(query)
+                #Each export changes the data version, so cached query results are only reused between exports
+                data_version = get_data_version()
+                query_error_list = validate_query(query, data_version)
                 error_exists = any('error' in item for item in query_error_list)
                 
                 if not error_exists:
                     if valid_report:
 
-                        temp_metadata = event.get('queryStringParameters').get('Metadata','')
-                        temp_response = get_query_result(query)
-        
-                        if(temp_metadata):
-                            metadata = eval(event.get('queryStringParameters').get('Metadata',''))
-                        else:
-                            tmp_metadata = get_query_metadata(query)
-                            metadata = {{
-                                item["column_name"].title(): {{'data_type': 'String' if item["data_type"] == 'varchar' 
-                                                            else 'Float' if item["data_type"] == 'real'
-                                                            else item["data_type"].capitalize()}}
-                                for item in tmp_metadata
-                            }}
-        
-                        if(temp_response):
-                            report_list = []
-                            for d in temp_response:
-                                customer_modified = {{}}
-                                for key, value in d.items():
-                                    if("Sum_of" not in key and "Count_of" not in key):
-                                        words = key.split('_')
-                                        words = [word.capitalize() for word in words]
-                                        new_key = ' '.join(words)
-                                        customer_modified[new_key] = value
-                                    else:
-                                        words = key.split('_of_')
-                                        words = [word.capitalize() for word in words]
-                                        new_key = ' of '.join(words)
-                                        customer_modified[new_key] = value
-                                report_list.append(customer_modified)
-        
-                            key_dict = OrderedDict()
-                            for customer_dict in report_list:
-                                for key in customer_dict.keys():
-                                    if key not in key_dict:
-                                        key_dict[key] = None
-        
-                            report_header = list(key_dict.keys())
-                            print(report_header)
-                            pk_field = ''
-                            report_param_dict = {{}}
-                            csv_file, file_buff_value = utilities.create_csv(report_list, report_header)
-                            utilities.save_object_to_bucket(file_buff_value, csv_file)
-                            pdf_file, pdf_output = utilities.prepare_pdf_data(report_list, report_header, report_param_dict, metadata, pk_field)
-                            utilities.save_object_to_bucket(pdf_output, pdf_file)
-        
-                            csv_bucket_key = bucket_tmp + csv_file
-                            pdf_bucket_key = bucket_tmp + pdf_file
-                            response = report_list, csv_bucket_key, pdf_bucket_key
+                        #Served from the query cache: validate_query() above already ran this query
+                        query_execution_id = athena_query.run_query(query, database, data_version)['QueryExecutionId']
+                        next_token = event.get('queryStringParameters').get('nt', None)
+
+                        if next_token != None:
+                            #Later pages of a report whose exports were already made: rows only
+                            rows, next_token = athena_query.get_result_page(query_execution_id, stark_core.athena_page_size, next_token)
+                            response = list(rename_report_columns(rows)), next_token
                         else:
-                            response = []
+                            temp_metadata = event.get('queryStringParameters').get('Metadata','')
+                            tmp_metadata = athena_query.get_result_columns(query_execution_id)
+
+                            if(temp_metadata):
+                                metadata = eval(event.get('queryStringParameters').get('Metadata',''))
+                            else:
+                                metadata = {{
+                                    item["column_name"].title(): {{'data_type': 'String' if item["data_type"] == 'varchar' 
+                                                                else 'Float' if item["data_type"] == 'real'
+                                                                else item["data_type"].capitalize()}}
+                                    for item in tmp_metadata
+                                }}
+
+                            rows, next_token = athena_query.get_result_page(query_execution_id, stark_core.athena_page_size)
+                            report_list = list(rename_report_columns(rows))
+
+                            if(report_list):
+                                report_header = [get_report_column_name(item["column_name"]) for item in tmp_metadata]
+                                print(report_header)
+                                pk_field = ''
+                                report_param_dict = {{}}
+
+                                #The exports page through the complete result instead of holding it in memory
+                                csv_rows = rename_report_columns(athena_query.iter_query_rows(query_execution_id, typed=False))
+                                if stark_core.stream_csv_exports:
+                                    csv_file = utilities.stream_csv_to_bucket(csv_rows, report_header)
+                                else:
+                                    csv_file, file_buff_value = utilities.create_csv(csv_rows, report_header)
+                                    utilities.save_object_to_bucket(file_buff_value, csv_file)
+                                pdf_rows = rename_report_columns(athena_query.iter_query_rows(query_execution_id, typed=False))
+                                pdf_file, pdf_output = utilities.prepare_pdf_data(pdf_rows, list(report_header), report_param_dict, metadata, pk_field)
+                                utilities.save_object_to_bucket(pdf_output, pdf_file)
+
+                                csv_bucket_key = bucket_tmp + csv_file
+                                pdf_bucket_key = bucket_tmp + pdf_file
+                                #The first page of rows only; pass next_token back as `nt` for the rest
+                                response = report_list, csv_bucket_key, pdf_bucket_key, next_token
+                            else:
+                                response = []
                     else:
                         rows = []
                         error_message = "Access is not allowed for other tables. Here is a list of the permitted tables: " + ', '.join(table_with_permission)
@@ -224,32 +230,16 @@ def create(data):
 
         return items
 
-    def validate_query(analytics_query):
+    def validate_query(analytics_query, data_version = None):
+        #Runs the query; get_query_result() and get_query_metadata() then reuse this execution through the query cache
+        if data_version == None:
+            data_version = get_data_version()
         try:
-            # print(analytics_query)
-            response = athena.start_query_execution(
-                QueryString=analytics_query, 
-                QueryExecutionContext={{'Database': database}}, 
-                ResultConfiguration={{'OutputLocation': 's3://{s3_athena_bucket_name}/result'}}
-            )
-
-            # get the query execution ID
-            query_execution_id = response['QueryExecutionId']
-
-            # wait for the query to complete
-            while True:
-                failure_reason = ''
-                query_status = athena.get_query_execution(QueryExecutionId=query_execution_id)
-                status = query_status['QueryExecution']['Status']['State']
-                if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                    if status == 'FAILED':
-                        failure_reason = query_status['QueryExecution']['Status']['StateChangeReason']
-                    break
+            query_execution = athena_query.run_query(analytics_query, database, data_version)
 
             rows = []
-            if failure_reason != '':
-                rows = []
-                rows.append({{"error": failure_reason}})
+            if query_execution['State'] != 'SUCCEEDED':
+                rows.append({{"error": query_execution['StateChangeReason']}})
 
         except ClientError as e:
             error_message = e.response['Error']['Message']
@@ -299,17 +289,12 @@ def create(data):
         if db_handler == None:
             db_handler = ddb
 
-        ExpressionAttributeNamesDict = {{
-            '#isDeleted' : 'STARK-Is-Deleted',
-        }}
         items = []
         ddb_arguments = {{}}
         ddb_arguments['TableName'] = ddb_table
         ddb_arguments['IndexName'] = "STARK-ListView-Index"
         ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-        ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
         ddb_arguments['ExpressionAttributeValues'] = {{ ':sk' : {{'S' : sk }} }}
-        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
         response = db_handler.query(**ddb_arguments)
         raw = response.get('Items')
@@ -322,72 +307,36 @@ def create(data):
 
         return items
 
-    def get_query_metadata(analytics_query):
+    def get_query_metadata(analytics_query, data_version = None):
         print(analytics_query)
-        response = athena.start_query_execution(
-            QueryString=analytics_query, 
-            QueryExecutionContext={{'Database': database}}, 
-            ResultConfiguration={{'OutputLocation': 's3://{s3_athena_bucket_name}/result'}}
-        )
+        if data_version == None:
+            data_version = get_data_version()
+        query_execution = athena_query.run_query(analytics_query, database, data_version)
 
-        # get the query execution ID
-        query_execution_id = response['QueryExecutionId']
+        return athena_query.get_result_columns(query_execution['QueryExecutionId'])
 
-        # wait for the query to complete
-        while True:
-            query_status = athena.get_query_execution(QueryExecutionId=query_execution_id)
-            status = query_status['QueryExecution']['Status']['State']
-            if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                break
-
-        # get the query results
-        query_results = athena.get_query_results(QueryExecutionId=query_execution_id)
+    def get_query_result(analytics_query, data_version = None):
+        #Yields every result row, paging through the query results instead of stopping at the first 1000 rows
+        print(analytics_query)
+        if data_version == None:
+            data_version = get_data_version()
+        query_execution = athena_query.run_query(analytics_query, database, data_version)
 
-        # extract the column names from the results
-        column_metadata = []
-        for column_info in query_results['ResultSet']['ResultSetMetadata']['ColumnInfo']:
-            column_metadata.append({{'column_name' : column_info['Name'], 'data_type' :column_info['Type']}})
-        
-        return column_metadata
+        return athena_query.iter_query_rows(query_execution['QueryExecutionId'])
 
-    def get_query_result(analytics_query):
-        print(analytics_query)
-        response = athena.start_query_execution(
-            QueryString=analytics_query, 
-            QueryExecutionContext={{'Database': database}}, 
-            ResultConfiguration={{'OutputLocation': 's3://{s3_athena_bucket_name}/result'}}
-        )
+    def get_report_column_name(column_name):
+        if("Sum_of" not in column_name and "Count_of" not in column_name):
+            words = column_name.split('_')
+            words = [word.capitalize() for word in words]
+            return ' '.join(words)
+        else:
+            words = column_name.split('_of_')
+            words = [word.capitalize() for word in words]
+            return ' of '.join(words)
 
-        # get the query execution ID
-        query_execution_id = response['QueryExecutionId']
-
-        # wait for the query to complete
-        while True:
-            query_status = athena.get_query_execution(QueryExecutionId=query_execution_id)
-            status = query_status['QueryExecution']['Status']['State']
-            if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                break
-
-        # get the query results
-        query_results = athena.get_query_results(QueryExecutionId=query_execution_id)
-
-        # extract the column names from the results
-        column_names = []
-        for column_info in query_results['ResultSet']['ResultSetMetadata']['ColumnInfo']:
-            column_names.append(column_info['Name'])
-
-        # create a list of rows, where each row is a dictionary mapping column names to values
-        rows = []
-        for result in query_results['ResultSet']['Rows'][1:]:
-            row = {{}}
-            for i in range(len(column_names)):
-                if(len(result['Data'][i]) != 0):
-                    row[column_names[i]] = result['Data'][i]['VarCharValue']
-                else:
-                    row[column_names[i]] = ''
-            rows.append(row)
-        
-        return rows
+    def rename_report_columns(rows):
+        for row in rows:
+            yield {{get_report_column_name(key): value for key, value in row.items()}}
 
     def convert_to_system_name(data):
         if(type(data) == 'list'):
@@ -568,6 +517,10 @@ def create(data):
     def dump_csv():
         entities = {entities_varname}
 
+        if incremental_export:
+            dump_changes(entities)
+            return
+
         #FIXME: Temporary solution to duplication of records due to multiple parquet files read in processed bucket
         #       Delete every files inside the processed bucket        
         client = boto3.client('s3')
@@ -575,65 +528,167 @@ def create(data):
         for val in resp:
             client.delete_object(Bucket=stark_core.analytics_processed_bucket_name, Key=val["Key"])
 
-        child_entity_for_one_to_many = []
-        entities_to_dump_list = {{}}
-        for entity in entities:
+        child_entity_for_one_to_many = get_child_entity_for_one_to_many(entities)
+        child_entities = [index['child'] for index in child_entity_for_one_to_many]
 
+        #Rows are generated page by page from DDB; only the pks of parent records are kept, to dump their 1-M children after
+        parent_pk_list = {{}}
+        for entity in entities:
+            if entity in child_entities:
+                continue
             entity_namespace = importlib.import_module(entity)
+            object_expression_values = {{':sk' : {{'S' : entity_namespace.default_sk}}}}
+            records = data_abstraction.iter_report_records(object_expression_values, "", entity_namespace.map_results, shard_count=entity_namespace.list_view_shards)
+            parent_pk_list[entity] = []
+            rows = get_dump_rows(records, entity_namespace.pk_field, parent_pk_list[entity])
+            save_dump_csv(rows, list(entity_namespace.metadata.keys()), entity)
+
+        for index in child_entity_for_one_to_many:
+            many_sk = f"{{index['parent']}}|{{index['child']}}"
+            pk_field = importlib.import_module(index['parent']).pk_field
+            headers = [pk_field, *importlib.import_module(index['child']).metadata.keys()]
+            rows = get_child_dump_rows(parent_pk_list[index['parent']], pk_field, many_sk)
+            save_dump_csv(rows, headers, index['child'])
 
+    def get_child_entity_for_one_to_many(entities):
+        child_entity_for_one_to_many = []
+        for entity in entities:
+            entity_namespace = importlib.import_module(entity)
             for fields, dictionary in entity_namespace.metadata.items():
                 if dictionary['relationship'] == "1-M":
                     child_entity_for_one_to_many.append({{'parent':entity, 'child': fields}})
+        return child_entity_for_one_to_many
 
-            object_expression_values = {{':sk' : {{'S' : entity_namespace.default_sk}}}}
-            items, aggregated_items = data_abstraction.get_report_data({{}} ,object_expression_values, "", False, entity_namespace.map_results)
+    def dump_changes(entities):
+        #Writes only the records created, edited or soft-deleted since each entity's last export (its high-water mark),
+        #   as a new file under <Entity>/changes/export_ts=<ts>/. Every row carries STARK_Change_Type ('upsert' or 'delete'
+        #   for soft-deleted rows, i.e. tombstones) and STARK_Change_TS; the Glue job merges these into the processed table.
+        #   1-M children are stored with their parent, so every changed parent re-exports all its children
+        #   (or a tombstone, if the parent was deleted or has no children left).
+        #Records written in the last few seconds may not be visible to the query yet, so they are left for the next run
+        export_ts = int(time.time()) - 5
+        change_fields = ['STARK_Change_Type', 'STARK_Change_TS']
 
-            master_fields = []
-            for key in entity_namespace.metadata.keys():
-                master_fields.append(key)
+        child_entity_for_one_to_many = get_child_entity_for_one_to_many(entities)
+        child_entities = [index['child'] for index in child_entity_for_one_to_many]
 
-            entities_to_dump_list.update({{entity: {{'data':items, 'headers': master_fields}}}})
+        for entity in entities:
+            if entity in child_entities:
+                continue
+            entity_namespace = importlib.import_module(entity)
+            pk_field = entity_namespace.pk_field
+            watermark = get_export_watermark(entity)
+            if watermark >= export_ts:
+                continue
+
+            records = data_abstraction.iter_changed_records(entity_namespace.default_sk, watermark + 1, export_ts, entity_namespace.map_results, shard_count=entity_namespace.list_view_shards)
+            changed_parents = []
+            rows = get_change_rows(records, pk_field, changed_parents)
+            save_dump_csv(rows, [*entity_namespace.metadata.keys(), *change_fields], entity, f"{{entity}}/changes/export_ts={{export_ts}}")
+
+            for index in child_entity_for_one_to_many:
+                if index['parent'] != entity:
+                    continue
+                many_sk = f"{{index['parent']}}|{{index['child']}}"
+                headers = [pk_field, *importlib.import_module(index['child']).metadata.keys(), *change_fields]
+                rows = get_child_change_rows(changed_parents, pk_field, many_sk)
+                save_dump_csv(rows, headers, index['child'], f"{{index['child']}}/changes/export_ts={{export_ts}}")
+
+            #Only move the high-water mark once the entity and its children are safely written
+            save_export_watermark(entity, export_ts)
+
+    def get_change_rows(records, pk_field, changed_parents):
+        for record, change_type, change_ts in records:
+            record.pop("sk", None)
+            record.pop("STARK_uploaded_s3_keys", None)
+            record['STARK_Change_Type'] = change_type
+            record['STARK_Change_TS'] = change_ts
+            changed_parents.append((record[pk_field], change_type, change_ts))
+            yield record
+
+    def get_child_change_rows(changed_parents, pk_field, many_sk, chunk_size = 100):
+        for start in range(0, len(changed_parents), chunk_size):
+            chunk = changed_parents[start:start + chunk_size]
+            many_records = data_abstraction.get_many_by_pk_batch([(pk, many_sk) for pk, change_type, change_ts in chunk])
+            for pk, change_type, change_ts in chunk:
+                many_record = many_records.get((pk, many_sk))
+                child_records = []
+                if change_type != 'delete' and many_record != None:
+                    child_records = json.loads(many_record[many_sk]['S'])
+                if len(child_records) == 0:
+                    yield {{pk_field: pk, 'STARK_Change_Type': 'delete', 'STARK_Change_TS': change_ts}}
+                for each_child_record in child_records:
+                    yield {{pk_field: pk, **each_child_record, 'STARK_Change_Type': 'upsert', 'STARK_Change_TS': change_ts}}
+
+    def get_export_watermark(entity, db_handler = None):
+        if db_handler == None:
+            db_handler = ddb
 
-        ##FIXME: might need refactoring
-        for index in child_entity_for_one_to_many:
-            ## get data one by one
-            child_items = []
-            many_sk = f"{{index['parent']}}|{{index['child']}}"
-            parent_entity_namespace = importlib.import_module(index['parent'])
-            pk_field = parent_entity_namespace.pk_field
-            parent_data_list = entities_to_dump_list[index['parent']]['data']
-            entities_to_dump_list[index['child']]['headers'] = [pk_field, *entities_to_dump_list[index['child']]['headers']]
-            for key in parent_data_list:
-                response = data_abstraction.get_many_by_pk(key[pk_field], many_sk)
-                for each_child_record in json.loads(response[0][many_sk]['S']):
-                    item = {{pk_field:key[pk_field], **each_child_record}}
-                    child_items.append(item)
-            entities_to_dump_list[index['child']]['data'] = child_items
-
-        for entity, entity_data in entities_to_dump_list.items():
-            items = entity_data['data']
-            headers = entity_data['headers']
-            report_list = []
-            # print(headers)
-            if len(items) > 0:
-                for key in items:
-                    temp_dict = {{}}
-                    #remove primary identifiers and STARK attributes
-                    if 'sk' in key:    
-                        key.pop("sk")
-                    if "STARK_uploaded_s3_keys" in key:
-                        key.pop("STARK_uploaded_s3_keys")
-                    for index, value in key.items():
-                        temp_dict[index] = value
-                    # print(temp_dict)
-                    report_list.append(temp_dict)
-
-                csv_file, file_buff_value = utilities.create_csv(report_list, headers)
-                ## Do not use csv filename provided by the create_csv function, instead use the entity varname
-                #  so that each entity will only have one csv file making the dumper overwrite the existing file 
-                #  everytime it runs.
-                key_filename = entity + ".csv"
-                utilities.save_object_to_bucket(file_buff_value, key_filename, stark_core.analytics_raw_bucket_name, entity)
+        response = db_handler.get_item(
+            TableName=ddb_table,
+            Key={{'pk': {{'S' : entity}}, 'sk': {{'S' : watermark_sk}}}}
+        )
+        return int(response.get('Item', {{}}).get('Last_Export_TS', {{}}).get('N', 0))
+
+    def save_export_watermark(entity, export_ts, db_handler = None):
+        if db_handler == None:
+            db_handler = ddb
+
+        item = {{}}
+        item['pk']             = {{'S' : entity}}
+        item['sk']             = {{'S' : watermark_sk}}
+        item['Last_Export_TS'] = {{'N' : str(export_ts)}}
+        db_handler.put_item(TableName=ddb_table, Item=item)
+
+    def get_data_version(db_handler = None):
+        #Written by the ETL scripts when they finish (not by dump_csv): Athena reads the processed files they write,
+        #   so results cached while an ETL run is pending are still for the previous data
+        if db_handler == None:
+            db_handler = ddb
+
+        response = db_handler.get_item(
+            TableName=ddb_table,
+            Key={{'pk': {{'S' : 'STARK|analytics'}}, 'sk': {{'S' : data_version_sk}}}}
+        )
+        return response.get('Item', {{}}).get('Data_Version', {{}}).get('N', '0')
+
+    def get_dump_rows(records, pk_field, pk_list):
+        for record in records:
+            #remove primary identifiers and STARK attributes
+            record.pop("sk", None)
+            record.pop("STARK_uploaded_s3_keys", None)
+            pk_list.append(record[pk_field])
+            yield record
+
+    def get_child_dump_rows(pk_list, pk_field, many_sk, chunk_size = 100):
+        for start in range(0, len(pk_list), chunk_size):
+            chunk = pk_list[start:start + chunk_size]
+            many_records = data_abstraction.get_many_by_pk_batch([(pk, many_sk) for pk in chunk])
+            for pk in chunk:
+                many_record = many_records.get((pk, many_sk))
+                if many_record == None:
+                    continue
+                for each_child_record in json.loads(many_record[many_sk]['S']):
+                    yield {{pk_field: pk, **each_child_record}}
+
+    def save_dump_csv(rows, headers, entity, directory = None):
+        #Entities without records do not get a file
+        first_row = next(rows, None)
+        if first_row == None:
+            return
+        rows = itertools.chain([first_row], rows)
+
+        ## Do not use a generated csv filename, instead use the entity varname
+        #  so that each entity will only have one csv file making the dumper overwrite the existing file 
+        #  everytime it runs.
+        key_filename = entity + ".csv"
+        if directory == None:
+            directory = entity
+        if stark_core.stream_csv_exports:
+            utilities.stream_csv_to_bucket(rows, headers, key_filename, stark_core.analytics_raw_bucket_name, directory)
+        else:
+            csv_file, file_buff_value = utilities.create_csv(rows, headers)
+            utilities.save_object_to_bucket(file_buff_value, key_filename, stark_core.analytics_raw_bucket_name, directory)
     """
     return textwrap.dedent(source_code)
 
@@ -27,11 +27,11 @@ def create(data):
     #CONFIG
     ddb_table = stark_core.ddb_table
 
+    @stark_core.log.handler
     def lambda_handler(event, context):
 
-        print("***EVENT DATA***")
-        print(event)
-        print("***END: EVENT DATA***")
+        #Full event dumps are DEBUG records: written only with STARK_LOG_LEVEL=DEBUG or for sampled invocations
+        stark_core.log.event(event)
 
         #Get cookies, if any
         eventCookies = event.get('cookies', {{}})
@@ -43,6 +43,7 @@ def create(data):
             cookies[info[0]] = info[2]
 
         isAuthorized = False
+        permissions  = ''
         sess_id = cookies.get('sessid','')
         if sess_id != '':
             #Get session record from DDB
@@ -52,41 +53,27 @@ def create(data):
                 #Get username from record 
                 username = sess_record['Username']
 
-                #FIXME: Optional/Future - immediately check permissions here and decide if API endpoint requested is authorized
-
         #Set authorized if everything is ok 
         if username != '':
             isAuthorized=True
 
+            #Resolve the user's permissions here, once, and hand them to the integration through `context`
+            #so business Lambdas can check them without their own DDB query. See stark_core.sec.is_authorized()
+            #They are read from DDB, not the per-container permission cache: API Gateway already caches this response.
+            permissions = stark_core.sec.encode_permissions(stark_core.sec.get_user_permissions(username, ddb, use_cache=False))
+
+        #NOTE: Response here is sent to the integration (i.e., the Lambda function behind the API call that the Authorizer has authorized)
+        #      and can be retrieved through: event['requestContext']['authorizer']['lambda'][$VARNAME].
+        #      API Gateway caches this response per session cookie (ReauthorizeEvery), so permission changes
+        #      can take up to that long to reach the integrations (this read itself is never cached).
         response = {{ 
             "isAuthorized": isAuthorized,
             "context": {{
                 "Username": username,
+                "Permissions": permissions,
             }} 
         }}
 
-        #FIXME:
-        # #Lambda Authorizer Simple Response can return optional `context`, as in below
-        # #This could be an efficient and performant way to allow STARK to get a Cobalt-like permissions system
-        # #by using `context` to cache frequently needed user information, either from session record, user record, or even
-        # #general permissions system infra (e.g., names and other metadata of modules)
-        # #NOTE: Format below is from NodeJS example, not necessarily 1:1 for Python 3.
-        # response = {{
-        #   "isAuthorized": isAuthorized,
-        #   "context": {{
-        #        "stringKey": "value",
-        #        "numberKey": 1,
-        #        "booleanKey": True,
-        #        "arrayKey": ["value1", "value2"],
-        #        "mapKey": {{"value1": "value2"}}
-        #    }}
-        # }}
-        # #NOTE: Response here is sent to the integration (i.e., the Lambda function behind the API call that the Authorizer has authorized)
-        # #      and can be retrieved through: event['requestContext']['authorizer']['lambda'][$VARNAME]. Our `username` context var, e.g.:
-        # #      username = event['requestContext']['authorizer']['lambda']['username']
-
-
-
         return response
 
     def get_session(sess_id):
@@ -6,6 +6,7 @@ import json
 import os
 import textwrap
 import importlib
+import time
 
 #Extra modules
 import yaml
@@ -26,11 +27,14 @@ cg_test     = importlib.import_module(f"{prepend_dir}cgdynamic_test_cases")
 cg_fixtures = importlib.import_module(f"{prepend_dir}cgdynamic_test_fixtures")
 
 import convert_friendly_to_system as converter
-import get_relationship as get_rel
+import cg_manifest
+import cg_workers
+import stark_model
 import suggest_graphic as set_graphic
 
-def create(cloud_resources, project_basedir):
+def create(cloud_resources, project_basedir, incremental=True):
 
+    model  = stark_model.from_cloud_resources(cloud_resources)
     models = cloud_resources["Data Model"]
     entities = []
     for entity in models:
@@ -43,7 +47,6 @@ def create(cloud_resources, project_basedir):
 
     s3_analytics_raw_bucket_name = converter.convert_to_system_name(project_varname + '-stark-analytics-raw', 's3')
     s3_analytics_processed_bucket_name = converter.convert_to_system_name(project_varname + '-stark-analytics-processed', 's3')
-    s3_analytics_athena_bucket_name = converter.convert_to_system_name(project_varname + '-stark-analytics-athena', 's3')
 
     with open("../cloud_resources.yml", "r") as f:
         current_cloud_resources = yaml.safe_load(f.read())
@@ -54,103 +57,57 @@ def create(cloud_resources, project_basedir):
     for each_entity in current_data_model:
         current_entities.append(each_entity)
 
+    analytics_data = stark_model.get_analytics_data(cloud_resources, [*current_entities, *entities], project_varname)
+
+    #Generation manifest: files whose inputs did not change since the last run are skipped.
+    #   A full (non-incremental) run regenerates everything but still records the new hashes.
+    manifest         = cg_manifest.load(project_basedir)
+    current_manifest = manifest if incremental else {"Files": {}}
+
     ##########################################
     #Create code for our entity Lambdas (API endpoint backing)
-    files_to_commit = []
+    #   Each entity is an independent job; jobs run in parallel worker processes and results come back in entity order
+    entity_jobs = []
     for entity in entities:
-        entity_varname = converter.convert_to_system_name(entity)
-        #Step 1: generate source code.
-        #Step 1.1: extract relationship
-        relationships = get_rel.get_relationship(models, entity, entity)
-        rel_model = {}
-        for relationship in relationships.get('has_many', []):
-            if relationship.get('type') == 'repeater':
-                rel_col = models.get(relationship.get('entity'), '')
-                rel_model.update({(relationship.get('entity')) : rel_col})
-
-        for index, items in relationships.items():
-            if len(items) > 0:
-                for key in items:
-                    for value in key:
-                        key[value] = converter.convert_to_system_name(key[value])
-        data = {
-            "Entity": entity_varname,
-            # "Sequence": models[entity]["sequence"], 
-            "Columns": models[entity]["data"],
-            "PK": models[entity]["pk"],
+        entity_jobs.append({
+            "Entity": entity,
+            "Models": models,
+            "Model Entity": model["Entities"][entity],
             "DynamoDB Name": ddb_table_name,
             "Bucket Name": web_bucket_name,
-            "Relationships": relationships,
-            "Rel Model": rel_model,
             "Raw Bucket Name": s3_analytics_raw_bucket_name,
             "Processed Bucket Name": s3_analytics_processed_bucket_name,
-            "Project Name": project_varname
-        }
-
-        if "sequence" in models[entity]:
-            data["Sequence"] = models[entity]["sequence"]
-            
-        print(data) 
-
-        source_code            = cg_ddb.create(data)
-        test_source_code       = cg_test.create(data)
-        fixtures_source_code   = cg_fixtures.create(data)
-        etl_script_source_code = cg_etl_script.create(data)
-
-        #Step 2: Add source code to our commit list to the project repo
-        files_to_commit.append({
-            'filePath': f"lambda/{entity_varname}/__init__.py",
-            'fileContent': source_code.encode()
+            "Project Name": project_varname,
+            "Analytics Incremental": analytics_data["Incremental Export"],
+            "Manifest": current_manifest,
+            "Project Basedir": project_basedir
         })
 
-        # test cases
-        files_to_commit.append({
-            'filePath': f"lambda/test_cases/business_modules/test_{entity_varname.lower()}.py",
-            'fileContent': test_source_code.encode()
-        })
-
-        # fixtures
-        files_to_commit.append({
-            'filePath': f"lambda/test_cases/fixtures/{entity_varname}/__init__.py",
-            'fileContent': fixtures_source_code.encode()
-        })
+    codegen_start   = time.perf_counter()
+    entity_results  = cg_workers.run_jobs(create_entity_files, entity_jobs)
+    files_to_commit = []
+    for entity_files, timings in entity_results:
+        files_to_commit.extend(entity_files)
+    entity_timings = [timings for entity_files, timings in entity_results]
 
-        # etl scripts
-        files_to_commit.append({
-            'filePath': f"lambda/STARK_Analytics/ETL_Scripts/{entity_varname}.py",
-            'fileContent': etl_script_source_code.encode()
-        })
     ########################################
     #Update conftest of test_cases 
     current_model.update(models)
-    data = {
-        "Entities": [*current_entities, *entities],
-        "Models": current_model,
-        "S3 Bucket Athena" : s3_analytics_athena_bucket_name,
-        "Project_Name" : project_varname
-    }
-    conftest_code = cg_conftest.create(data)
-
-    files_to_commit.append({
-        'filePath': f"lambda/test_cases/conftest.py",
-        'fileContent': conftest_code.encode()
-    })
+    data = analytics_data
+    data["Models"] = current_model
+    shared_timings = {}
+    cg_manifest.add_generated_file(files_to_commit, "lambda/test_cases/conftest.py", cg_conftest, data, current_manifest, project_basedir, shared_timings)
 
     #########################################
     #Update entities in STARK_Analytics 
-    analytics_source_code = cg_analytics.create(data)
-    files_to_commit.append({
-        'filePath': f"lambda/STARK_Analytics/__init__.py",
-        'fileContent': analytics_source_code.encode()
-    })
+    cg_manifest.add_generated_file(files_to_commit, "lambda/STARK_Analytics/__init__.py", cg_analytics, data, current_manifest, project_basedir, shared_timings)
 
     ##################################################
     #Write files
-    for code in files_to_commit:
-        filename = project_basedir + code['filePath']
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, "wb") as f:
-            f.write(code['fileContent'])
+    written = cg_manifest.write_files(files_to_commit, manifest, project_basedir)
+    cg_manifest.save(manifest, project_basedir)
+    cg_workers.print_timing_report(cg_workers.merge_timings([*entity_timings, shared_timings]), time.perf_counter() - codegen_start)
+    print(f"{len(files_to_commit)} files regenerated, {written} changed on disk")
 
 
     #####################################################
@@ -195,6 +152,40 @@ def create(cloud_resources, project_basedir):
     os.system("aws dynamodb batch-write-item --request-items file://STARK_modules_data.json")
 
 
+def create_entity_files(job):
+    #Generates the Lambda, test case, fixture and ETL script files of one entity (those whose inputs changed).
+    #Returns (files_to_commit, timings) - timings are per generator, for cg_workers.print_timing_report()
+    entity = job["Entity"]
+    models = job["Models"]
+    timings = {}
+    files_to_commit = []
+
+    entity_varname = converter.convert_to_system_name(entity)
+    #Step 1: generate source code.
+    #Step 1.1: data model part of the data, built the same way as STARK_CodeGen_Dynamic does
+    data = stark_model.get_dynamic_entity_data(models, job["Model Entity"], entity)
+    data.update({
+        "DynamoDB Name": job["DynamoDB Name"],
+        "Bucket Name": job["Bucket Name"],
+        "Raw Bucket Name": job["Raw Bucket Name"],
+        "Processed Bucket Name": job["Processed Bucket Name"],
+        "Project Name": job["Project Name"],
+        "Analytics Incremental": job["Analytics Incremental"]
+    })
+    print(data) 
+
+    #Step 2: Add source code to our commit list to the project repo, skipping files the manifest shows are up to date
+    generated_files = [
+        (f"lambda/{entity_varname}/__init__.py", cg_ddb),
+        (f"lambda/test_cases/business_modules/test_{entity_varname.lower()}.py", cg_test),
+        (f"lambda/test_cases/fixtures/{entity_varname}/__init__.py", cg_fixtures),
+        (f"lambda/STARK_Analytics/ETL_Scripts/{entity_varname}.py", cg_etl_script)
+    ]
+    for file_path, generator in generated_files:
+        cg_manifest.add_generated_file(files_to_commit, file_path, generator, data, job["Manifest"], job["Project Basedir"], timings)
+
+    return files_to_commit, timings
+
 def create_template_from_cloud_resources(data):
     cf_template = cg_sam.create(data, cli_mode=True)
     return cf_template
@@ -9,9 +9,10 @@ import textwrap
 import convert_friendly_to_system as converter
 
 def create(data):
-    print('data conftest')
-    print(data)
     entities       = data["Entities"]
+    models         = data["Models"]
+    #Sort indexes, as in the SAM template: the n-th sortable column of any entity uses STARK-Sort-<n>-Index
+    sort_index_count = max([len(models[entity].get("sortable", [])) for entity in entities] + [0])
     #Convert human-friendly names to variable-friendly names
 
     source_code = f"""\
@@ -61,7 +62,24 @@ def create(data):
                             }}],
                             'Projection': 
                                 {{'ProjectionType': 'ALL'}}
-                        }}
+                        }},"""
+    for number in range(1, sort_index_count + 1):
+        source_code += f"""
+                        {{
+                            'IndexName': 'STARK-Sort-{number}-Index',
+                            'KeySchema':[
+                            {{
+                                'AttributeName': 'sk',
+                                'KeyType': 'HASH'
+                            }},
+                            {{
+                                'AttributeName': 'STARK-Sort-{number}-sk',
+                                'KeyType': 'RANGE'
+                            }}],
+                            'Projection': 
+                                {{'ProjectionType': 'ALL'}}
+                        }},"""
+    source_code += f"""
                     ],
                     AttributeDefinitions=[
                         {{
@@ -75,7 +93,14 @@ def create(data):
                         {{
                             'AttributeName': 'STARK-ListView-sk',
                             'AttributeType': 'S'
-                        }},
+                        }},"""
+    for number in range(1, sort_index_count + 1):
+        source_code += f"""
+                        {{
+                            'AttributeName': 'STARK-Sort-{number}-sk',
+                            'AttributeType': 'S'
+                        }},"""
+    source_code += f"""
                     ],
                     KeySchema=[
                             {{
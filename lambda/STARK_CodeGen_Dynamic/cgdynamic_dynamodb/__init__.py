@@ -6,11 +6,13 @@ import base64
 import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
+#A DynamoDB table has at most 20 global secondary indexes, one of which is STARK-ListView-Index
+max_sort_indexes = 19
+
 def create(data):
-    print('data')
-    print(data)
     pk             = data["PK"]
     entity         = data["Entity"]
     sequence       = data["Sequence"]
@@ -19,13 +21,27 @@ def create(data):
     bucket_name    = data['Bucket Name']
     relationships  = data["Relationships"]
     rel_model      = data["Rel Model"]
-    print('sequence')
-    print(sequence)
+    list_view      = list(data.get("List View", []))
+    lookup         = list(data.get("Lookup", []))
+    lookup_references = list(data.get("Lookup References", []))
+    list_view_shards = data.get("List View Shards", 1)
+    if type(list_view_shards) != int or list_view_shards < 1:
+        raise ValueError(f"{entity}: list_view_shards must be a whole number of at least 1, got {list_view_shards!r}")
+    analytics_incremental = data.get("Analytics Incremental", False)
+    sortable       = list(data.get("Sortable", []))
     #Convert human-friendly names to variable-friendly names
     entity_varname = converter.convert_to_system_name(entity)
     pk_varname     = converter.convert_to_system_name(pk)
 
     default_sk     = entity_varname + "|info"
+
+    context = {
+        "relationships": relationships,
+        "entity_varname": entity_varname,
+        "pk_varname": pk_varname,
+        "default_sk": default_sk,
+        "list_view_shards": list_view_shards
+    }
     
     with_upload         = False
     with_upload_on_many = False
@@ -40,9 +56,8 @@ def create(data):
 
     #Create the dict value retrieval code for the add/edit function body
     
-    dict_to_var_code = f"""pk = data.get('pk', '')
-        sk = data.get('sk', '')    
-        if sk == '': sk = default_sk"""
+    dict_to_var_code = cg_template.render("""pk = data.get('pk', '')
+        sk = get_record_sk(pk, data.get('sk', ''))""", context, margin=4)
 
     
 
@@ -64,12 +79,14 @@ def create(data):
         col_type_id = set_type(col_type)
 
         if col_type_id in ['S', 'N']: 
-            dict_to_var_code += f"""
-        {col_varname} = str(data.get('{col_varname}', ''))"""
+            context["col_varname"] = col_varname
+            dict_to_var_code += cg_template.render("""
+        {col_varname} = str(data.get('{col_varname}', ''))""", context, margin=4)
 
         else:
-            dict_to_var_code += f"""
-        {col_varname} = data.get('{col_varname}', '')"""
+            context["col_varname"] = col_varname
+            dict_to_var_code += cg_template.render("""
+        {col_varname} = data.get('{col_varname}', '')""", context, margin=4)
     
     # if relationships.get('has_many', '') != '':
     #     for relation in relationships.get('has_many'):
@@ -78,6 +95,41 @@ def create(data):
     #             print(entity)
     repeater_fields = remove_repeater_col(relationships, columns)
 
+    #Columns read by the list view (get_all) and by other modules' lookups (get_fields).
+    #Unless the entity declares them, both default to what the list view shows: every column except 1-M relationships.
+    if len(list_view) == 0:
+        for col, col_type in columns.items():
+            if not (isinstance(col_type, dict) and col_type["type"] == "relationship" and col_type.get('has_many_ux', None) != None):
+                list_view.append(col)
+    if len(lookup) == 0:
+        lookup = list_view
+
+    list_view_fields = {}
+    for col in list_view:
+        list_view_fields[converter.convert_to_system_name(col)] = set_type(columns[col])
+
+    #Other entities' relationship dropdowns read their display and value columns through get_fields, whatever `lookup` says
+    lookup_fields = [pk_varname]
+    for col in lookup + lookup_references:
+        col_varname = converter.convert_to_system_name(col)
+        if col_varname not in lookup_fields:
+            lookup_fields.append(col_varname)
+
+    #Sortable columns, each with its own sort index (see data_abstraction.get_sort_key_value). A has_one relationship
+    #   column made sortable also lets a PK change of its parent find the records that point to it by key.
+    if len(sortable) > max_sort_indexes:
+        raise ValueError(f"{entity}: at most {max_sort_indexes} sortable columns are supported, got {len(sortable)}")
+    sort_indexes = {}
+    for number, col in enumerate(sortable, 1):
+        data_type = set_data_type(columns.get(col, ''))
+        if col not in columns or data_type not in ['string', 'integer', 'float', 'date']:
+            raise ValueError(f"{entity}: sortable column {col!r} must be a text, number or date column")
+        sort_indexes[converter.convert_to_system_name(col)] = {
+            'index': f"STARK-Sort-{number}-Index",
+            'attribute': f"STARK-Sort-{number}-sk",
+            'data_type': data_type
+        }
+
     #This is for our DDB update call
     update_expression = ""
     for col in columns:
@@ -87,10 +139,14 @@ def create(data):
             col_varname = converter.convert_to_system_name(col)
             update_expression += f"""#{col_varname} = :{col_varname}, """
     update_expression += " #STARKListViewsk = :STARKListViewsk, #STARKUpdatedBy = :STARKUpdatedBy, #STARKUpdatedTs = :STARKUpdatedTS"
+    for sort_index in sort_indexes.values():
+        sort_placeholder = sort_index['attribute'].replace('-', '')
+        update_expression += f", #{sort_placeholder} = :{sort_placeholder}"
     if with_upload or with_upload_on_many:
         update_expression += ", #STARK_uploaded_s3_keys = :STARK_uploaded_s3_keys"
 
-    source_code = f"""\
+    context.update({"list_view_fields": list_view_fields, "lookup_fields": lookup_fields, "sort_indexes": sort_indexes, "entity": entity})
+    source_code = cg_template.render("""\
     #Python Standard Library
     import base64
     import json
@@ -98,7 +154,6 @@ def create(data):
     from urllib.parse import unquote
 
     #Extra modules
-    import boto3
     import uuid
     import copy
 
@@ -107,9 +162,9 @@ def create(data):
     from stark_core import utilities
     from stark_core import validation
     from stark_core import data_abstraction
+    from stark_core import write_queue
 
-    ddb    = boto3.client('dynamodb')
-    s3_res = boto3.resource('s3')
+    ddb = stark_core.get_client('dynamodb')
 
     #######
     #CONFIG
@@ -121,30 +176,37 @@ def create(data):
     bucket_tmp        = stark_core.bucket_tmp
     pk_field          = "{pk_varname}"
     default_sk        = "{default_sk}"
+    #Records are spread over this many STARK-ListView-Index partitions (see data_abstraction.get_shard_sk)
+    list_view_shards  = {list_view_shards}
+    #Sortable columns and their indexes (see data_abstraction.choose_sort_index)
+    sort_indexes      = {sort_indexes}
     sort_fields       = ["{pk_varname}", ]
+    list_view_fields  = {list_view_fields}
+    lookup_fields     = {lookup_fields}
     relationships     = {relationships}
     entity_upload_dir = stark_core.upload_dir + "{entity_varname}/"
     entity_name       = "{entity}"
     metadata          = {{
                 "{pk_varname}": {{
                     'value': '',
-                    'key': 'pk',"""
+                    'key': 'pk',""", context, margin=4)
 
     if len(sequence) > 0:
         required = False
     else:
         required = True
         
-    source_code += f"""
-                    'required': {required},"""
+    context["required"] = required
+    source_code += cg_template.render("""
+                    'required': {required},""", context, margin=4)
                     
-    source_code += f"""                
+    source_code += cg_template.render("""                
                     'max_length': '',
                     'data_type': 'string',
                     'state': None,
                     'feedback': '',
                     'relationship': ''
-                }},"""
+                }},""", context, margin=4)
     
         
     
@@ -157,7 +219,8 @@ def create(data):
             if has_many_ux == 'repeater': 
                 rel = '1-M'
                 
-        source_code += f"""
+        context.update({"col_varname": col_varname, "data_type": data_type, "rel": rel})
+        source_code += cg_template.render("""
                 '{col_varname}': {{
                     'value': '',
                     'key': '',
@@ -167,12 +230,12 @@ def create(data):
                     'state': None,
                     'feedback': '',
                     'relationship': '{rel}'
-                }},""" 
+                }},""", context, margin=4) 
     # if relationships.get('has_many', '') != '':
     #     for relation in relationships.get('has_many'):
     #         if relation.get('type') == 'repeater':
     #             rel_entity = converter.convert_to_system_name(relation.get('entity'))
-    #             source_code += f"""
+    #             source_code += cg_template.render("""
     #             '{rel_entity}': {{
     #                 'value': '',
     #                 'key': '',
@@ -182,12 +245,12 @@ def create(data):
     #                 'state': None,
     #                 'feedback': '',
     #                 'relationship': '1-M'
-    #             }},"""
+    #             }},""", context, margin=4)
     # for rel_ent in rel_model:
     #     rel_cols = rel_model[rel_ent]["data"]
     #     rel_pk = rel_model[rel_ent]["pk"]
     #     var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-    #     source_code += f"""
+    #     source_code += cg_template.render("""
     #             '{var_pk}': {{
     #                 'value': '',
     #                 'required': False,
@@ -195,10 +258,10 @@ def create(data):
     #                 'data_type': '',
     #                 'state': None,
     #                 'feedback': ''
-    #             }},""" 
+    #             }},""", context, margin=4) 
     #     for rel_col, rel_col_type in rel_cols.items():
     #         var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-    #         source_code += f"""
+    #         source_code += cg_template.render("""
     #             '{var_data}': {{
     #                 'value': '',
     #                 'required': False,
@@ -206,7 +269,7 @@ def create(data):
     #                 'data_type': '',
     #                 'state': None,
     #                 'feedback': ''
-    #             }},""" 
+    #             }},""", context, margin=4) 
             
 
     # for col, col_type in columns.items():
@@ -215,15 +278,15 @@ def create(data):
     #     if isinstance(col_type, dict) and col_type["type"] == "relationship":
     #         has_many_ux = col_type.get('has_many_ux', None)
     #         if has_many_ux == 'repeater':
-    #             source_code += f"""
+    #             source_code += cg_template.render("""
     #         '{col_varname}': {{
     #             'value': '',
     #             'required': true,
     #             'max_length': '',
     #             'data_type': ''
-    #         }},""" 
+    #         }},""", context, margin=4) 
                     
-    source_code += f"""
+    source_code += cg_template.render("""
     }}
     resp_obj = None
     username = ""
@@ -238,6 +301,7 @@ def create(data):
         'report': '{entity}|Report'
     }}
 
+    @stark_core.log.handler
     def lambda_handler(event, context):
         responseStatusCode = 200
 
@@ -271,38 +335,42 @@ def create(data):
                 }}
             else:
                 isInvalidPayload = False
-                data['pk'] = payload.get('{pk_varname}')"""
+                data['pk'] = payload.get('{pk_varname}')""", context, margin=4)
     for col, col_type in columns.items():
         col_varname = converter.convert_to_system_name(col)
-        source_code +=f"""
-                data['{col_varname}'] = payload.get('{col_varname}','')"""
+        context["col_varname"] = col_varname
+        source_code +=cg_template.render("""
+                data['{col_varname}'] = payload.get('{col_varname}','')""", context, margin=4)
     
     
 
-    source_code +=f"""
+    source_code +=cg_template.render("""
 
-                if payload.get('STARK_isReport', False) == False:"""
+                if payload.get('STARK_isReport', False) == False:""", context, margin=4)
                 
                 #FIXME: should be refactored to use metadata of child entities
     if relationships.get('has_many', '') != '':
         for relation in relationships.get('has_many'):
             if relation.get('type') == 'repeater':
                 entity = converter.convert_to_system_name(relation.get('entity'))
-                source_code +=f"""
-                    data['{entity}'] = payload.get('{entity}','')"""
+                context["entity"] = entity
+                source_code +=cg_template.render("""
+                    data['{entity}'] = payload.get('{entity}','')""", context, margin=4)
     
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-        source_code +=f"""
-                    data['{var_pk}'] = payload.get('{var_pk}','')"""
+        context["var_pk"] = var_pk
+        source_code +=cg_template.render("""
+                    data['{var_pk}'] = payload.get('{var_pk}','')""", context, margin=4)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-            source_code +=f"""
-                    data['{var_data}'] = payload.get('{var_data}','')"""
+            context["var_data"] = var_data
+            source_code +=cg_template.render("""
+                    data['{var_data}'] = payload.get('{var_data}','')""", context, margin=4)
 
-    source_code +=f"""
+    source_code +=cg_template.render("""
                     data['orig_pk'] = payload.get('orig_{pk_varname}','')
                     data['sk'] = payload.get('sk', '')
                     if data['sk'] == "":
@@ -324,7 +392,9 @@ def create(data):
                     data['STARK_isReport'] = payload.get('STARK_isReport', False)
                     data['STARK_sum_fields'] = payload.get('STARK_sum_fields', [])
                     data['STARK_count_fields'] = payload.get('STARK_count_fields', [])
-                    data['STARK_group_by_1'] = payload.get('STARK_group_by_1', '')"""
+                    data['STARK_group_by_1'] = payload.get('STARK_group_by_1', '')
+                    data['STARK_sort_field'] = payload.get('STARK_sort_field', '')
+                    data['STARK_sort_order'] = payload.get('STARK_sort_order', '')""", context, margin=4)
     
     for rel_ent in rel_model:
         rel_ent_varname = converter.convert_to_system_name(rel_ent)
@@ -333,21 +403,23 @@ def create(data):
         rel_pk_varname = converter.convert_to_system_name(rel_pk)
         var_pk = rel_ent + '_' + rel_pk
         var_pk_varname = converter.convert_to_system_name(var_pk)
-        source_code +=f"""
+        context.update({"rel_ent_varname": rel_ent_varname, "rel_pk_varname": rel_pk_varname, "var_pk_varname": var_pk_varname})
+        source_code +=cg_template.render("""
                     temp_{rel_ent_varname} = {{
-                        '{rel_pk_varname}': payload.get('{var_pk_varname}',''),"""
+                        '{rel_pk_varname}': payload.get('{var_pk_varname}',''),""", context, margin=4)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent + '_' + rel_col
             rel_col_varname = converter.convert_to_system_name(rel_col)
             data_varname = converter.convert_to_system_name(var_data)
-            source_code +=f"""
-                        '{rel_col_varname}': payload.get('{data_varname}',''),"""
-        source_code += f"""
+            context.update({"rel_col_varname": rel_col_varname, "data_varname": data_varname})
+            source_code +=cg_template.render("""
+                        '{rel_col_varname}': payload.get('{data_varname}',''),""", context, margin=4)
+        source_code += cg_template.render("""
                     }}
                     data['{rel_ent_varname}'] = temp_{rel_ent_varname}
                     
-                    """
-    source_code +=f"""
+                    """, context, margin=4)
+    source_code +=cg_template.render("""
 
                 data['STARK_uploaded_s3_keys'] = payload.get('STARK_uploaded_s3_keys',{{}})
                 data['orig_STARK_uploaded_s3_keys'] = payload.get('orig_STARK_uploaded_s3_keys',{{}})
@@ -362,9 +434,14 @@ def create(data):
                         }}
                     }}
 
+            #Surge protection: writes are recorded instead of applied, then queued for STARK_Write_Consumer
+            write_recorder = None
+            if stark_core.ddb_surge_protection and 'STARK_isReport' not in data:
+                write_recorder = write_queue.write_recorder(ddb)
+
             if method == "DELETE":
                 if(stark_core.sec.is_authorized(stark_permissions['delete'], event, ddb)):
-                    response = delete_v2(data)
+                    response = delete_v2(data, write_recorder)
                 else:
                     responseStatusCode, response = stark_core.sec.authFailResponse
 
@@ -385,12 +462,9 @@ def create(data):
                         
                     else:
                         if data['orig_pk'] == data['pk']:
-                            response = edit(data)
+                            response = edit(data, write_recorder)
                         else:
-                            #We can't update DDB PK, so if PK is different, we need to do ADD + DELETE
-                            response   = add(data, method)
-                            data['pk'] = data['orig_pk']
-                            response   = delete(data)
+                            response = change_pk(data, write_recorder)
                 else:
                     responseStatusCode, response = stark_core.sec.authFailResponse
 
@@ -416,7 +490,7 @@ def create(data):
                             }}
                             
                         else:
-                            response = add(data)
+                            response = add(data, db_handler=write_recorder)
                     else:
                         responseStatusCode, response = stark_core.sec.authFailResponse
 
@@ -430,6 +504,10 @@ def create(data):
                     }}
                 }}
 
+            if write_recorder != None and len(write_recorder.requests) > 0:
+                responseStatusCode = 202
+                response = {{'Tracking_ID': write_queue.enqueue_writes(write_recorder.requests)}}
+
         else:
             ####################
             #Handle GET requests
@@ -440,7 +518,10 @@ def create(data):
                     lv_token = unquote(lv_token)
                     lv_token = json.loads(lv_token)
         
-                items, next_token = get_all(default_sk, lv_token)
+                #Optional sort by a sortable column: sort=<column>&order=desc
+                sort_field = event.get('queryStringParameters',{{}}).get('sort', '')
+                descending = event.get('queryStringParameters',{{}}).get('order', '') == 'desc'
+                items, next_token = get_all(default_sk, lv_token, sort_field=sort_field, descending=descending)
 
                 response = {{
                     'Next_Token': json.dumps(next_token),
@@ -449,15 +530,13 @@ def create(data):
             
             elif request_type == "get_fields":
                 fields = event.get('queryStringParameters').get('fields','')
-                fields = fields.split(",")
-                response = data_abstraction.get_fields(fields, pk_field, default_sk)
+                fields = [field for field in fields.split(",") if field in lookup_fields]
+                response = data_abstraction.get_fields(fields, pk_field, default_sk, shard_count=list_view_shards)
 
             elif request_type == "detail":
 
                 pk = event.get('queryStringParameters').get('{pk_varname}','')
-                sk = event.get('queryStringParameters').get('sk','')
-                if sk == "":
-                    sk = default_sk
+                sk = get_record_sk(pk, event.get('queryStringParameters').get('sk',''))
                 response = get_by_pk(pk, sk)
                 
             elif request_type == "get_metadata":
@@ -495,10 +574,7 @@ def create(data):
         #FIXME: THIS IS A STUB, WILL NEED TO BE UPDATED WITH
         #   ENHANCED LISTVIEW LOGIC LATER WHEN WE ACTUALLY IMPLEMENT REPORTING
         
-        string_filter = 'attribute_not_exists(#isDeleted) '
-        ExpressionAttributeNamesDict = {{
-            '#isDeleted' : 'STARK-Is-Deleted',
-        }}
+        string_filter = ""
         temp_string_filter = ""
         object_expression_value = {{':sk' : {{'S' : sk}}}}
         report_param_dict = {{}}
@@ -513,7 +589,7 @@ def create(data):
                     report_param_dict.update(processed_operator_and_parameter_dict['report_params'])
                     
         if temp_string_filter != "":
-            string_filter = string_filter + "AND "+temp_string_filter[1:-3]
+            string_filter = temp_string_filter[1:-3]
 
 
         #FIXME: 1-M SEARCH CRITERIA: filter result of 1-M report operators here
@@ -533,7 +609,11 @@ def create(data):
                             }}
                         composed_operator_for_one_to_many.update(temp_dict)
 
-        next_token = 'initial'
+        #Compile each 1-M criterion once; the resulting predicates are evaluated per child row below
+        many_field_predicates = {{}}
+        for field_name, field_criteria in composed_operator_for_one_to_many.items():
+            many_field_predicates[field_name] = utilities.compile_criteria_for_many_fields(field_criteria)
+
         items = []
         ddb_arguments = {{}}
         aggregated_results = {{}}
@@ -542,19 +622,21 @@ def create(data):
         ddb_arguments['Select'] = "ALL_ATTRIBUTES"
         ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
         ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-        ddb_arguments['FilterExpression'] = string_filter
         ddb_arguments['ExpressionAttributeValues'] = object_expression_value
-        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-            
-        while next_token != None:
-            next_token = '' if next_token == 'initial' else next_token
-
-            if next_token != '':
-                ddb_arguments['ExclusiveStartKey']=next_token
-
-            response = ddb.query(**ddb_arguments)
-            raw = response.get('Items')
-            next_token = response.get('LastEvaluatedKey')
+        if string_filter != "":
+            ddb_arguments['FilterExpression'] = string_filter
+
+        #Read through a sort index when the report is sorted by, or has a criterion on, a sortable column
+        index_field = data_abstraction.choose_sort_index(sort_indexes, data, data.get('STARK_sort_field', ''))
+        if index_field != '':
+            ExpressionAttributeNamesDict = {{}}
+            ddb_arguments['IndexName'] = sort_indexes[index_field]['index']
+            ddb_arguments['KeyConditionExpression'] = data_abstraction.compose_sort_key_condition(sort_indexes[index_field], data.get(index_field), object_expression_value, ExpressionAttributeNamesDict)
+            ddb_arguments['ScanIndexForward'] = data.get('STARK_sort_order', '') != 'desc'
+            if len(ExpressionAttributeNamesDict) > 0:
+                ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
+
+        for raw in data_abstraction.iter_list_view_pages(ddb_arguments, sk, list_view_shards, ddb):
             aggregate_report = False if data['STARK_group_by_1'] == '' else True
             # Checker if report has many in report fields
             has_many = False
@@ -578,6 +660,15 @@ def create(data):
                         many_val.append(report_fields.replace(ent_filter, '').replace(' ', '_').replace("_", "", 1))
                 many_entity_dict.update({{ent.replace(' ', '_') : many_val}})
 
+            #Fetch the 1-M records of every parent in this page in one batch, instead of one query per parent
+            many_records = {{}}
+            if has_many:
+                many_keys = []
+                for record in raw:
+                    for many_rel_entity in many_entity_dict:
+                        many_keys.append((record.get('pk', {{}}).get('S', ''), '{entity_varname}|' + many_rel_entity))
+                many_records = data_abstraction.get_many_by_pk_batch(many_keys)
+
             for record in raw:
                 item = []
                 item.append(map_results(record))
@@ -590,9 +681,9 @@ def create(data):
                         for many_rel_entity, many_rel_field in many_entity_dict.items():
                             many_sk = '{entity_varname}|' + many_rel_entity
                             
-                            many_result = data_abstraction.get_many_by_pk(many_pk, many_sk)
+                            many_record = many_records.get((many_pk, many_sk), {{}})
                             response = None
-                            response = json.loads(many_result[0].get(many_sk, '').get('S'))
+                            response = json.loads(many_record.get(many_sk, {{}}).get('S', '[]'))
                             temp_list = []
                             for res in response:  
                                 temp_item = {{}}
@@ -613,11 +704,11 @@ def create(data):
                                         no_val_items.update({{dict.replace(' ', '_') : ''}})       
                                 consolidated_items = temp_item | no_val_items
                             
-                                if len(composed_operator_for_one_to_many) > 0:
+                                if len(many_field_predicates) > 0:
                                     is_included = False
 
-                                for field_name, field_criteria in composed_operator_for_one_to_many.items():
-                                    is_included = utilities.filter_criteria_for_many_fields(consolidated_items[field_name], field_criteria)
+                                for field_name, is_match in many_field_predicates.items():
+                                    is_included = is_match(consolidated_items[field_name])
                                     if is_included == False:
                                         break
                                 
@@ -711,11 +802,11 @@ def create(data):
                 temp_dict = {{}}
                 #remove primary identifiers and STARK attributes
                 if not aggregate_report:
-                    key.pop("sk")"""
+                    key.pop("sk")""", context, margin=4)
     if with_upload or with_upload_on_many:
-        source_code += f"""
-                    key.pop("STARK_uploaded_s3_keys")"""
-    source_code += f"""
+        source_code += cg_template.render("""
+                    key.pop("STARK_uploaded_s3_keys")""", context, margin=4)
+    source_code += cg_template.render("""
                 for index, value in key.items():
                     temp_dict[index.replace("_"," ")] = value
                 report_list.append(temp_dict)
@@ -726,11 +817,14 @@ def create(data):
                         report.update({{dict : ''}})
 
             report_list = utilities.filter_report_list(report_list, diff_list)
-            csv_file, file_buff_value = utilities.create_csv(report_list, report_header)
-            utilities.save_object_to_bucket(file_buff_value, csv_file)"""
+            if stark_core.stream_csv_exports:
+                csv_file = utilities.stream_csv_to_bucket(report_list, report_header)
+            else:
+                csv_file, file_buff_value = utilities.create_csv(report_list, report_header)
+                utilities.save_object_to_bucket(file_buff_value, csv_file)""", context, margin=4)
             
     if len(rel_model) > 0:
-                source_code += f"""
+                source_code += cg_template.render("""
             merge_metadata = {{}}
             for relation in relationships.get('has_many', []):
                 if relation.get('type', '') == 'repeater':
@@ -741,9 +835,9 @@ def create(data):
                         new_child_ent = relation['entity'] + '_' + child_entity
                         new_child_metadata.update({{new_child_ent: child_data}})
                     merge_metadata.update(new_child_metadata)
-            metadata.update(merge_metadata)"""
+            metadata.update(merge_metadata)""", context, margin=4)
 
-    source_code += f"""
+    source_code += cg_template.render("""
             pdf_file, pdf_output = utilities.prepare_pdf_data(report_list, report_header, report_param_dict, metadata, pk_field)
             utilities.save_object_to_bucket(pdf_output, pdf_file)
 
@@ -762,43 +856,29 @@ def create(data):
 
         return report_list, csv_bucket_key, pdf_bucket_key
 
-    def get_all(sk=default_sk, lv_token=None, db_handler = None):
+    def get_all(sk=default_sk, lv_token=None, db_handler = None, sort_field = '', descending = False):
         if db_handler == None:
             db_handler = ddb
 
-        
-        ExpressionAttributeNamesDict = {{
-            '#isDeleted' : 'STARK-Is-Deleted',
-        }}
-        items = []
+        #Soft-deleted records are moved out of this index partition (see data_abstraction.soft_delete),
+        #   so a page is exactly page_limit records, read from all list_view_shards partitions in parallel.
+        #   Sorted by a sortable column, the page is read from that column's sort index instead.
+        ExpressionAttributeNamesDict = {{}}
         ddb_arguments = {{}}
         ddb_arguments['TableName'] = ddb_table
         ddb_arguments['IndexName'] = "STARK-ListView-Index"
-        ddb_arguments['Select'] = "ALL_ATTRIBUTES"
-        ddb_arguments['Limit'] = page_limit
+        if sort_field in sort_indexes:
+            ddb_arguments['IndexName'] = sort_indexes[sort_field]['index']
+            ddb_arguments['ScanIndexForward'] = not descending
         ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
         ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-        ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
+        ddb_arguments['ProjectionExpression'] = data_abstraction.compose_projection(['pk', 'sk', data_abstraction.get_index_sort_attribute(ddb_arguments)] + list(list_view_fields), ExpressionAttributeNamesDict)
         ddb_arguments['ExpressionAttributeValues'] = {{ ':sk' : {{'S' : sk }} }}
         ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
-        if lv_token != None:
-            ddb_arguments['ExclusiveStartKey'] = lv_token
-
-        next_token = ''
-        while len(items) < page_limit and next_token is not None:
-            if next_token != '':
-                ddb_arguments['ExclusiveStartKey']=next_token
-
-            response = db_handler.query(**ddb_arguments)
-            raw = response.get('Items')
-            next_token = response.get('LastEvaluatedKey')
-
-            for record in raw:
-                items.append(map_results(record))
-
         #Get the "next" token, pass to calling function. This enables a "next page" request later.
-        next_token = response.get('LastEvaluatedKey')
+        raw, next_token = data_abstraction.get_list_view_page(ddb_arguments, sk, list_view_shards, lv_token, page_limit, db_handler)
+        items = [map_list_view_results(record) for record in raw]
 
         return items, next_token
 
@@ -806,76 +886,42 @@ def create(data):
         if db_handler == None:
             db_handler = ddb
 
-        ddb_arguments = {{}}
-        ddb_arguments['TableName'] = ddb_table
-        ddb_arguments['Select'] = "ALL_ATTRIBUTES"
-        ddb_arguments['KeyConditionExpression'] = "#pk = :pk and #sk = :sk"
-        ddb_arguments['ExpressionAttributeNames'] = {{
-                                                    '#pk' : 'pk',
-                                                    '#sk' : 'sk'
-                                                }}
-        ddb_arguments['ExpressionAttributeValues'] = {{
-                                                    ':pk' : {{'S' : pk }},
-                                                    ':sk' : {{'S' : sk }}
-                                                }}
-        response = db_handler.query(**ddb_arguments)
-        raw = response.get('Items')
+        sk = get_record_sk(pk, sk)
+
+        #The record and its 1-M records share the pk and the '{entity_varname}|' sk prefix: one query reads them all
+        items = data_abstraction.get_item_collection(pk, '{entity_varname}|', db_handler)
 
         #Map to expected structure
         response = {{}}
-        response['item'] = map_results(raw[0])"""
+        response['item'] = map_results(items[sk])""", context, margin=4)
     
     if len(rel_model) > 0:
-        source_code+= f"""
+        source_code+= cg_template.render("""
         many_rel = relationships['has_many']
         for rel in many_rel:
             entity = rel['entity']
-            sk = '{entity_varname}|' + entity
-            many_result = data_abstraction.get_many_by_pk(pk, sk)
-            for result in many_result:
-                response[entity] = result.get(sk, '').get('S')
-        """
+            many_sk = '{entity_varname}|' + entity
+            if many_sk in items:
+                response[entity] = items[many_sk].get(many_sk, {{}}).get('S')
+        """, context, margin=4)
 
     if with_upload or with_upload_on_many: 
-        source_code +=f"""
-        response['object_url_prefix'] = bucket_url + entity_upload_dir"""
-    source_code+= f"""
+        source_code +=cg_template.render("""
+        response['object_url_prefix'] = bucket_url + entity_upload_dir""", context, margin=4)
+    source_code+= cg_template.render("""
 
-        return response"""
+        return response""", context, margin=4)
 
-    source_code+= f"""
+    source_code+= cg_template.render("""
     def delete_v2(data, db_handler = None):
         if db_handler == None:
             db_handler = ddb
 
-        UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-        ExpressionAttributeNamesDict = {{
-            '#STARKDeletedBy': 'STARK-Deleted-By',
-            '#STARKDeletedTs': 'STARK-Deleted-TS',
-            '#STARKIsDeleted': 'STARK-Is-Deleted',
-            '#ttl': 'TTL'
-        }}
-        ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
         pk = data.get('pk','')
-        sk = data.get('sk','')
-        if sk == '': sk = default_sk
-
-        ddb_arguments = {{}}
-        ddb_arguments['TableName'] = ddb_table
-        ddb_arguments['Key'] = {{
-                'pk' : {{'S' : pk}},
-                'sk' : {{'S' : sk}}
-            }}
-
-        ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-        ddb_arguments['UpdateExpression'] = UpdateExpressionString
-        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-        ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
+        sk = get_record_sk(pk, data.get('sk',''))
 
-        response = db_handler.update_item(**ddb_arguments)
-        global resp_obj
-        resp_obj = response
+        #Moves the record to its tombstone key, out of the list view index partition that get_all() and reports read
+        data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
         return "OK"
 
     def delete(data, db_handler = None):
@@ -883,8 +929,7 @@ def create(data):
             db_handler = ddb
 
         pk = data.get('pk','')
-        sk = data.get('sk','')
-        if sk == '': sk = default_sk
+        sk = get_record_sk(pk, data.get('sk',''))
 
         ddb_arguments = {{}}
         ddb_arguments['TableName'] = ddb_table
@@ -895,21 +940,21 @@ def create(data):
 
         response = db_handler.delete_item(**ddb_arguments)
         global resp_obj
-        resp_obj = response"""
+        resp_obj = response""", context, margin=4)
 
     if len(rel_model) > 0:
-            source_code+= f"""
+            source_code+= cg_template.render("""
         many_rel = relationships['has_many']
         for rel in many_rel:
             entity = rel['entity']
             sk = '{entity_varname}|' + entity
-            delete_many(pk, sk)"""
+            delete_many(pk, sk, db_handler)""", context, margin=4)
 
-    source_code+= f"""
+    source_code+= cg_template.render("""
         return "OK"
-    """
+    """, context, margin=4)
     if len(rel_model) > 0:
-        source_code+= f"""
+        source_code+= cg_template.render("""
     def delete_many(pk, sk, db_handler = None):
         if db_handler == None:
             db_handler = ddb
@@ -920,20 +965,21 @@ def create(data):
                 'pk' : {{'S' : pk}},
                 'sk' : {{'S' : sk}}
             }}
-        print(ddb_arguments)
+        stark_core.log.debug("DeleteItem", arguments=ddb_arguments)
         response = db_handler.delete_item(**ddb_arguments)
         global resp_obj
         resp_obj = response
-        """
+        """, context, margin=4)
 
-    source_code+= f"""
+    context["dict_to_var_code"] = dict_to_var_code
+    source_code+= cg_template.render("""
     def edit(data, db_handler = None):
         if db_handler == None:
             db_handler = ddb           
-        {dict_to_var_code}"""
+        {dict_to_var_code}""", context, margin=4)
 
     if with_upload or with_upload_on_many:
-        source_code += f"""
+        source_code += cg_template.render("""
         #FIXME: Simplify comparison using metadata after metadata separation in child entities
         temp_s3_keys = data.get('STARK_uploaded_s3_keys', {{}}) 
         orig_s3_keys = data.get('orig_STARK_uploaded_s3_keys', {{}}) 
@@ -958,28 +1004,34 @@ def create(data):
             else:  
                 upload_data = {{'S': items}}
             STARK_uploaded_s3_keys[key] = upload_data
-        """
-    source_code += f"""
+        """, context, margin=4)
+    context["update_expression"] = update_expression
+    source_code += cg_template.render("""
         UpdateExpressionString = "SET {update_expression}" 
-        ExpressionAttributeNamesDict = {{"""
+        ExpressionAttributeNamesDict = {{""", context, margin=4)
 
     for col in columns:
         col_varname = converter.convert_to_system_name(col)
         if col in repeater_fields:
             pass
         else:
-            source_code +=f"""
-            '#{col_varname}' : '{col_varname}',""" 
+            context["col_varname"] = col_varname
+            source_code +=cg_template.render("""
+            '#{col_varname}' : '{col_varname}',""", context, margin=4) 
     
     if with_upload or with_upload_on_many:
-        source_code += f"""
-            '#STARK_uploaded_s3_keys': 'STARK_uploaded_s3_keys',"""
-    source_code += f"""
+        source_code += cg_template.render("""
+            '#STARK_uploaded_s3_keys': 'STARK_uploaded_s3_keys',""", context, margin=4)
+    for col_varname, sort_index in sort_indexes.items():
+        context.update({"sort_attribute": sort_index['attribute'], "sort_placeholder": sort_index['attribute'].replace('-', '')})
+        source_code += cg_template.render("""
+            '#{sort_placeholder}' : '{sort_attribute}',""", context, margin=4)
+    source_code += cg_template.render("""
             '#STARKListViewsk' : 'STARK-ListView-sk',
             '#STARKUpdatedBy': 'STARK-Updated-By',
             '#STARKUpdatedTs': 'STARK-Updated-TS'
         }}
-        tempExpressionAttributeValuesDict = {{"""
+        tempExpressionAttributeValuesDict = {{""", context, margin=4)
 
 
     for col, col_type in columns.items():
@@ -988,13 +1040,19 @@ def create(data):
         if col in repeater_fields:
             pass
         else:    
-            source_code +=f"""
-            ':{col_varname}' : {{'{col_type_id}' : {col_varname} }},"""  
+            context.update({"col_varname": col_varname, "col_type_id": col_type_id})
+            source_code +=cg_template.render("""
+            ':{col_varname}' : {{'{col_type_id}' : {col_varname} }},""", context, margin=4)  
+
+    for col_varname, sort_index in sort_indexes.items():
+        context.update({"col_varname": col_varname, "sort_data_type": sort_index['data_type'], "sort_placeholder": sort_index['attribute'].replace('-', '')})
+        source_code += cg_template.render("""
+            ':{sort_placeholder}' : {{'S' : data_abstraction.get_sort_key_value({col_varname}, '{sort_data_type}')}},""", context, margin=4)
 
     if with_upload or with_upload_on_many:
-        source_code += f"""
-            ':STARK_uploaded_s3_keys': {{'M': STARK_uploaded_s3_keys }},"""
-    source_code += f"""
+        source_code += cg_template.render("""
+            ':STARK_uploaded_s3_keys': {{'M': STARK_uploaded_s3_keys }},""", context, margin=4)
+    source_code += cg_template.render("""
             ':STARKListViewsk' : {{'S' : data['STARK-ListView-sk']}}
         }}
         ExpressionAttributeValuesDict = tempExpressionAttributeValuesDict | utilities.append_record_metadata('edit', username)
@@ -1010,31 +1068,26 @@ def create(data):
         ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
 
         response = db_handler.update_item(**ddb_arguments)
-        """
+        """, context, margin=4)
 
     if len(rel_model) > 0:
-        source_code+= f"""
+        source_code+= cg_template.render("""
         many_rel = relationships['has_many']
         for rel in many_rel:
             entity = rel['entity']
             sk = '{entity_varname}|' + entity
             many_data = data.get(entity, '')
-            edit_many(pk, sk, many_data)"""
+            edit_many(pk, sk, many_data, db_handler)""", context, margin=4)
 
-    if len(relationships) > 0:
-        source_code += f"""
-        for relation in relationships.get('has_one', []):
-            cascade_pk_change_to_child(data, relation['entity'], relation['attribute'])
-        """
-    source_code += f"""
+    source_code += cg_template.render("""
 
         global resp_obj
         resp_obj = response
         return "OK"
-        """
+        """, context, margin=4)
 
     if len(rel_model) > 0:
-            source_code+= f"""
+            source_code+= cg_template.render("""
     def edit_many(pk, sk, data, db_handler = None):
         if db_handler == None:
             db_handler = ddb  
@@ -1059,20 +1112,18 @@ def create(data):
         ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
         ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
 
-        response = db_handler.update_item(**ddb_arguments)"""
+        response = db_handler.update_item(**ddb_arguments)""", context, margin=4)
             
-    source_code+= f"""
+    source_code+= cg_template.render("""
     def add(data, method='POST', db_handler=None):
-    """
+    """, context, margin=4)
 
     if len(sequence) > 0:
-        dict_to_var_code_add = f"""pk = data_abstraction.get_sequence(entity_name)
-        sk = data.get('sk', '')    
-        if sk == '': sk = default_sk"""
+        dict_to_var_code_add = cg_template.render("""pk = data_abstraction.get_sequence(entity_name)
+        sk = get_record_sk(pk, data.get('sk', ''))""", context, margin=4)
     else:
-        dict_to_var_code_add = f"""pk = data.get('pk', '')
-        sk = data.get('sk', '')    
-        if sk == '': sk = default_sk"""
+        dict_to_var_code_add = cg_template.render("""pk = data.get('pk', '')
+        sk = get_record_sk(pk, data.get('sk', ''))""", context, margin=4)
     
     #Check for file upload in child if 1-M is available
     for rel in rel_model:
@@ -1092,21 +1143,24 @@ def create(data):
         col_type_id = set_type(col_type)
 
         if col_type_id in ['S', 'N']: 
-            dict_to_var_code_add += f"""
-        {col_varname} = str(data.get('{col_varname}', ''))"""
+            context["col_varname"] = col_varname
+            dict_to_var_code_add += cg_template.render("""
+        {col_varname} = str(data.get('{col_varname}', ''))""", context, margin=4)
 
         else:
-            dict_to_var_code_add += f"""
-        {col_varname} = data.get('{col_varname}', '')"""
+            context["col_varname"] = col_varname
+            dict_to_var_code_add += cg_template.render("""
+        {col_varname} = data.get('{col_varname}', '')""", context, margin=4)
 
-    source_code+= f"""    
+    context["dict_to_var_code_add"] = dict_to_var_code_add
+    source_code+= cg_template.render("""
         if db_handler == None:
             db_handler = ddb
-        {dict_to_var_code_add}"""
+        {dict_to_var_code_add}""", context, margin=4)
 
 
     if with_upload or with_upload_on_many:
-        source_code += f"""
+        source_code += cg_template.render("""
         temp_s3_keys = data.get('STARK_uploaded_s3_keys', {{}}) 
         orig_s3_keys = data.get('orig_STARK_uploaded_s3_keys', {{}})
         STARK_uploaded_s3_keys = {{}}
@@ -1123,35 +1177,41 @@ def create(data):
                 utilities.copy_object_to_bucket(items, entity_upload_dir)
                 upload_data = {{'S': items}}
             STARK_uploaded_s3_keys[key] = upload_data
-        """
-    source_code += f"""
+        """, context, margin=4)
+    source_code += cg_template.render("""
         item = utilities.append_record_metadata('add', username)
         item['pk'] = {{'S' : pk}}
-        item['sk'] = {{'S' : sk}}"""
+        item['sk'] = {{'S' : sk}}""", context, margin=4)
 
     for col, col_type in columns.items():
         col_varname = converter.convert_to_system_name(col)
         col_type_id = set_type(col_type)
 
-        source_code +=f"""
-        item['{col_varname}'] = {{'{col_type_id}' : {col_varname}}}"""
+        context.update({"col_varname": col_varname, "col_type_id": col_type_id})
+        source_code +=cg_template.render("""
+        item['{col_varname}'] = {{'{col_type_id}' : {col_varname}}}""", context, margin=4)
+
+    for col_varname, sort_index in sort_indexes.items():
+        context.update({"col_varname": col_varname, "sort_data_type": sort_index['data_type'], "sort_attribute": sort_index['attribute']})
+        source_code += cg_template.render("""
+        item['{sort_attribute}'] = {{'S' : data_abstraction.get_sort_key_value({col_varname}, '{sort_data_type}')}}""", context, margin=4)
 
     if with_upload or with_upload_on_many:
-        source_code += f"""
-        item['STARK_uploaded_s3_keys'] = {{'M' : STARK_uploaded_s3_keys}}"""
+        source_code += cg_template.render("""
+        item['STARK_uploaded_s3_keys'] = {{'M' : STARK_uploaded_s3_keys}}""", context, margin=4)
 
-    source_code += f"""
+    source_code += cg_template.render("""
 
-        if data.get('STARK-ListView-sk','') == '':"""
+        if data.get('STARK-ListView-sk','') == '':""", context, margin=4)
 
     if len(sequence) > 0:
-        source_code += f"""    
-            data['pk'] = pk"""
+        source_code += cg_template.render("""    
+            data['pk'] = pk""", context, margin=4)
     
-    source_code += f"""    
-            item['STARK-ListView-sk'] = {{'S' : create_listview_index_value(data)}}"""
+    source_code += cg_template.render("""    
+            item['STARK-ListView-sk'] = {{'S' : create_listview_index_value(data)}}""", context, margin=4)
         
-    source_code += f"""
+    source_code += cg_template.render("""
         else:
             item['STARK-ListView-sk'] = {{'S' : data['STARK-ListView-sk']}}
 
@@ -1159,33 +1219,30 @@ def create(data):
         ddb_arguments['TableName'] = ddb_table
         ddb_arguments['Item'] = item
         response = db_handler.put_item(**ddb_arguments)
-        """
+        """, context, margin=4)
     if len(relationships) > 0:
-        source_code += f"""
+        source_code += cg_template.render("""
         if method == 'POST':
             data['orig_pk'] = pk
-
-        for relation in relationships.get('has_one', []):
-            cascade_pk_change_to_child(data, relation['entity'], relation['attribute'])
-        """
+        """, context, margin=4)
 
     if len(rel_model) > 0:
-            source_code+= f"""
+            source_code+= cg_template.render("""
         many_rel = relationships['has_many']
         for rel in many_rel:
             entity = rel['entity']
             sk = '{entity_varname}|' + entity
             many_data = data.get(entity, '')
-            add_many(pk, sk, many_data)"""
+            add_many(pk, sk, many_data, db_handler)""", context, margin=4)
     
-    source_code += f"""
+    source_code += cg_template.render("""
         global resp_obj
         resp_obj = response
         return "OK"
-        """
+        """, context, margin=4)
 
     if len(rel_model) > 0:
-            source_code+= f"""
+            source_code+= cg_template.render("""
     def add_many(pk, sk, data, db_handler=None):
         if db_handler == None:
             db_handler = ddb
@@ -1194,7 +1251,7 @@ def create(data):
         item['pk'] = {{'S' : pk}}
         item['sk'] = {{'S' : sk}}
         item[sk] = {{'S' : data}}
-        print(item)
+        stark_core.log.debug("PutItem", item=item)
 
         ddb_arguments = {{}}
         ddb_arguments['TableName'] = ddb_table
@@ -1204,10 +1261,17 @@ def create(data):
         global resp_obj
         resp_obj = response
         return "OK"
-        """
+        """, context, margin=4)
             
-    source_code+= f"""
+    source_code+= cg_template.render("""
     
+    def get_record_sk(pk, sk=''):
+        #Sort key of a record of this entity: its list view shard of default_sk. Callers may pass default_sk, or
+        #   no sk at all, without knowing which shard the record is in.
+        if sk == '' or data_abstraction.get_unsharded_sk(sk) == default_sk:
+            sk = data_abstraction.get_shard_sk(default_sk, pk, list_view_shards)
+        return sk
+
     def create_listview_index_value(data):
         ListView_index_values = []
         for field in sort_fields:
@@ -1221,16 +1285,17 @@ def create(data):
     def map_results(record):
         item = {{}}
         item['{pk_varname}'] = record.get('pk', {{}}).get('S','')
-        item['sk'] = record.get('sk',{{}}).get('S','')"""
+        item['sk'] = record.get('sk',{{}}).get('S','')""", context, margin=4)
     for col, col_type in columns.items():
         col_varname = converter.convert_to_system_name(col)
         col_type_id = set_type(col_type)
 
-        source_code +=f"""
-        item['{col_varname}'] = record.get('{col_varname}',{{}}).get('{col_type_id}','')"""
+        context.update({"col_varname": col_varname, "col_type_id": col_type_id})
+        source_code +=cg_template.render("""
+        item['{col_varname}'] = record.get('{col_varname}',{{}}).get('{col_type_id}','')""", context, margin=4)
 
     if with_upload or with_upload_on_many:
-        source_code += f"""
+        source_code += cg_template.render("""
         STARK_uploaded_s3_keys = {{}}
 
         for key, map_item in (record.get('STARK_uploaded_s3_keys',{{}}).get('M',{{}})).items():
@@ -1245,18 +1310,26 @@ def create(data):
                         else:
                             STARK_uploaded_s3_keys[key] = {{third_key: list_s3_keys}}
 
-        item['STARK_uploaded_s3_keys'] = STARK_uploaded_s3_keys"""
-    source_code += f"""
+        item['STARK_uploaded_s3_keys'] = STARK_uploaded_s3_keys""", context, margin=4)
+    source_code += cg_template.render("""
+        return item
+
+    def map_list_view_results(record):
+        #Lean version of map_results() for projected list view reads: only the list view columns are read from DDB
+        item = {{}}
+        item['{pk_varname}'] = record.get('pk', {{}}).get('S','')
+        item['sk'] = record.get('sk',{{}}).get('S','')
+        for field, type_id in list_view_fields.items():
+            item[field] = record.get(field,{{}}).get(type_id,'')
         return item
 
     def get_all_by_old_parent_value(old_pk_val, attribute, sk = default_sk):
     
-        string_filter = " attribute_not_exists(#isDeleted) AND #Attribute = :old_parent_value"
+        string_filter = "#Attribute = :old_parent_value"
         object_expression_value = {{':sk' : {{'S' : sk}},
                                     ':old_parent_value': {{'S' : old_pk_val}}}}
         ExpressionAttributeNamesDict = {{
-            '#Attribute' : attribute,
-            '#isDeleted' : 'STARK-Is-Deleted'
+            '#Attribute' : attribute
         }}
 
         ddb_arguments = {{}}
@@ -1269,46 +1342,69 @@ def create(data):
         ddb_arguments['ExpressionAttributeValues'] = object_expression_value
         ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
-        next_token = 'initial'
         items = []
-        while next_token != None:
-            next_token = '' if next_token == 'initial' else next_token
-
-            if next_token != '':
-                ddb_arguments['ExclusiveStartKey']=next_token
-
-            response = ddb.query(**ddb_arguments)
-            raw = response.get('Items')
-            next_token = response.get('LastEvaluatedKey')
-            for record in raw:
-                item = map_results(record)
-                #add pk as literal 'pk' value
-                #and STARK-ListView-Sk
-                item['pk'] = record.get('pk', {{}}).get('S','')
-                item['STARK-ListView-sk'] = record.get('STARK-ListView-sk',{{}}).get('S','')
-                items.append(item)
+        for record in data_abstraction.iter_list_view(ddb_arguments, sk, list_view_shards, ddb):
+            item = map_results(record)
+            #add pk as literal 'pk' value
+            #and STARK-ListView-Sk
+            item['pk'] = record.get('pk', {{}}).get('S','')
+            item['STARK-ListView-sk'] = record.get('STARK-ListView-sk',{{}}).get('S','')
+            items.append(item)
                 
         return items
-    """
+    """, context, margin=4)
     
+    source_code += cg_template.render("""
+    def change_pk(data, db_handler = None):
+        #We can't update DDB PK, so if PK is different, we need to do ADD + DELETE, and point the child records
+        #   of has_one relationships to the new PK. All of it is applied by data_abstraction.apply_transaction().
+        if db_handler == None:
+            db_handler = ddb
+
+        params   = {{'orig_pk': data['orig_pk'], 'pk': data['pk']}}
+        recorder = data_abstraction.transaction_recorder(db_handler)
+
+        response   = add(data, 'PUT', recorder)
+        data['pk'] = data['orig_pk']""", context, margin=4)
+    if analytics_incremental:
+        source_code += cg_template.render("""
+        #Soft-deleted, so the incremental analytics export sees the old pk go (it finds deletes through tombstones)
+        response   = delete_v2(data, recorder)""", context, margin=4)
+        if len(rel_model) > 0:
+            source_code += cg_template.render("""
+        for rel in relationships['has_many']:
+            delete_many(data['pk'], '{entity_varname}|' + rel['entity'], recorder)""", context, margin=4)
+    else:
+        source_code += cg_template.render("""
+        response   = delete(data, recorder)""", context, margin=4)
     if len(relationships) > 0:
-        source_code += f"""    
-    def cascade_pk_change_to_child(params, child_entity_name, attribute):
-        temp_import = importlib.import_module(child_entity_name)
+        source_code += cg_template.render("""
+        for relation in relationships.get('has_one', []):
+            cascade_pk_change_to_child(params, relation['entity'], relation['attribute'], recorder)""", context, margin=4)
+    source_code += cg_template.render("""
+
+        data_abstraction.apply_transaction(recorder.actions, db_handler)
+        return response
+    """, context, margin=4)
 
-        #fetch all records from child using old pk value
-        response = temp_import.get_all_by_old_parent_value(params['orig_pk'], attribute)
+    if len(relationships) > 0:
+        source_code += cg_template.render("""
+    def cascade_pk_change_to_child(params, child_entity_name, attribute, db_handler = None):
+        #Points the child records whose attribute is the old pk to the new one, found through the child's sort index on
+        #   attribute if it is sortable (see data_abstraction.iter_foreign_key_records). change_pk() passes its
+        #   transaction_recorder as db_handler, so the updates join its transaction.
+        if db_handler == None:
+            db_handler = ddb
+        temp_import = importlib.import_module(child_entity_name)
 
-        #loop through response and update each record
-        for record in response:
-            record[attribute] = params['pk']
-            record['orig_pk'] = params['pk']
-            temp_import.edit(record)
+        updated_metadata = utilities.append_record_metadata('edit', username)
+        for key in data_abstraction.iter_foreign_key_records(temp_import.default_sk, attribute, params['orig_pk'], temp_import.sort_indexes, temp_import.list_view_shards, ddb):
+            db_handler.update_item(**data_abstraction.get_foreign_key_update(key, attribute, params['pk'], temp_import.sort_indexes, updated_metadata))
 
         return "OK"
-    """
+    """, context, margin=4)
     if with_upload or with_upload_on_many:
-        source_code += f"""        
+        source_code += cg_template.render("""
     def compareDict(old_dict, new_dict):
         diff_orig = set(old_dict) - set(new_dict)
         diff_temp = set(new_dict) - set(old_dict)
@@ -1341,9 +1437,9 @@ def create(data):
         for b in diff_temp:
             modified.update({{b : new_dict[b]}})
                 
-        return copy.deepcopy(modified)"""
+        return copy.deepcopy(modified)""", context, margin=4)
 
-    return textwrap.dedent(source_code)
+    return source_code
 
 
 def set_type(col_type):
@@ -1,8 +1,8 @@
 #Python Standard Library
 import base64
-import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -14,17 +14,45 @@ def create(data):
     columns               = data["Columns"]
     pk                    = data["PK"]
     relationships         = data["Relationships"]
+    ddb_table_name        = data["DynamoDB Name"]
+    incremental           = data.get("Analytics Incremental", False)
 
     pk_varname     = converter.convert_to_system_name(pk)
     entity_varname = converter.convert_to_system_name(entity)
 
-    source_code = f"""\
+    #1-M children are merged per parent record, since a parent change re-exports all of its children
+    merge_key = pk_varname
+    for relation in relationships.get("belongs_to", []):
+        if relation['rel_type'] == 'has_many':
+            merge_key = converter.convert_to_system_name(relation['pk_field'])
+
+    catalog_database = f"stark_{project_varname.lower()}_db"
+    raw_path = f"s3://{raw_bucket_name}/{entity_varname}/{entity_varname}.csv"
+    if incremental:
+        raw_path = f"s3://{raw_bucket_name}/{entity_varname}/changes/"
+
+    context = {
+        "processed_bucket_name": processed_bucket_name,
+        "incremental": incremental,
+        "pk_varname": pk_varname,
+        "entity_varname": entity_varname,
+        "catalog_database": catalog_database,
+        "ddb_table_name": ddb_table_name
+    }
+
+    source_code = cg_template.render("""\
     import sys
+    import time
+    import boto3
     from awsglue.transforms import *
     from awsglue.utils import getResolvedOptions
     from pyspark.context import SparkContext
     from awsglue.context import GlueContext
     from awsglue.job import Job
+    from awsglue.dynamicframe import DynamicFrame
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+    from pyspark.sql.utils import AnalysisException
     
     metadata = {{
                 "{pk_varname}": {{
@@ -35,12 +63,14 @@ def create(data):
                     'data_type': 'string',
                     'state': None,
                     'feedback': ''
-                }},"""
+                }},""", context, margin=4)
 
     for relation in relationships.get("belongs_to", []):
         if relation['rel_type'] == 'has_many':
-            source_code += f"""
-                    "{converter.convert_to_system_name(relation['pk_field'])}": {{
+            parent_pk_varname = converter.convert_to_system_name(relation['pk_field'])
+            context["parent_pk_varname"] = parent_pk_varname
+            source_code += cg_template.render("""
+                    "{parent_pk_varname}": {{
                         'value': '',
                         'key': '',
                         'required': True,
@@ -48,13 +78,14 @@ def create(data):
                         'data_type': 'string',
                         'state': None,
                         'feedback': ''
-                    }},"""
+                    }},""", context, margin=4)
         
     
     for col, col_type in columns.items():
         col_varname = converter.convert_to_system_name(col)
         data_type = set_data_type(col_type)
-        source_code += f"""
+        context.update({"col_varname": col_varname, "data_type": data_type})
+        source_code += cg_template.render("""
                 '{col_varname}': {{
                     'value': '',
                     'key': '',
@@ -63,12 +94,13 @@ def create(data):
                     'data_type': '{data_type}',
                     'state': None,
                     'feedback': ''
-                }},""" 
+                }},""", context, margin=4) 
                     
-    source_code += f"""
+    context.update({"raw_path": raw_path, "merge_key": merge_key})
+    source_code += cg_template.render("""
     }}
                   
-    args = getResolvedOptions(sys.argv, ["JOB_NAME"])
+    args = getResolvedOptions(sys.argv, ["JOB_NAME", "stark_region"])
     sc = SparkContext()
     glueContext = GlueContext(sc)
     spark = glueContext.spark_session
@@ -87,7 +119,7 @@ def create(data):
         connection_type="s3",
         format="csv",
         connection_options={{
-            "paths": ["s3://{raw_bucket_name}/{entity_varname}/{entity_varname}.csv"],
+            "paths": ["{raw_path}"],
             "recurse": True,
         }},
         transformation_ctx="S3bucket_node1",
@@ -96,6 +128,10 @@ def create(data):
     metadata_mappings = []
     for field, item in metadata.items():
         metadata_mappings.append((field, 'string', field, item['data_type']))
+    incremental_export = {incremental}
+    if incremental_export:
+        metadata_mappings.append(('STARK_Change_Type', 'string', 'STARK_Change_Type', 'string'))
+        metadata_mappings.append(('STARK_Change_TS', 'string', 'STARK_Change_TS', 'long'))
 
     # Script generated for node ApplyMapping
     ApplyMapping_node2 = ApplyMapping.apply(
@@ -115,14 +151,51 @@ def create(data):
         transformation_ctx="S3bucket_node3",
     )
     S3bucket_node3.setCatalogInfo(
-        catalogDatabase="stark_{project_varname.lower()}_db", catalogTableName="{entity_varname}"
+        catalogDatabase="{catalog_database}", catalogTableName="{entity_varname}"
     )
     S3bucket_node3.setFormat("glueparquet")
-    S3bucket_node3.writeFrame(ApplyMapping_node2)
+
+    if not incremental_export:
+        S3bucket_node3.writeFrame(ApplyMapping_node2)
+    else:
+        #Job bookmarks make the raw read above return only the change files written since the last run
+        changes = ApplyMapping_node2.toDF()
+        if len(changes.head(1)) > 0:
+            processed_path = "s3://{processed_bucket_name}/{entity_varname}/"
+            try:
+                current = spark.read.parquet(processed_path)
+                current = current.withColumn("STARK_Change_Type", F.lit("upsert")).withColumn("STARK_Change_TS", F.lit(0).cast("long"))
+                merged = current.unionByName(changes, allowMissingColumns=True)
+            except AnalysisException:
+                #First incremental run: nothing processed yet
+                merged = changes
+
+            #The latest change per record wins; a winning tombstone removes the record
+            merged = merged.withColumn("STARK_Change_TS", F.coalesce(F.col("STARK_Change_TS"), F.lit(0).cast("long")))
+            latest = Window.partitionBy("{merge_key}")
+            merged = merged.withColumn("STARK_Latest_TS", F.max("STARK_Change_TS").over(latest))
+            merged = merged.filter((F.col("STARK_Change_TS") == F.col("STARK_Latest_TS")) & (F.col("STARK_Change_Type") != "delete"))
+            merged = merged.drop("STARK_Change_Type", "STARK_Change_TS", "STARK_Latest_TS")
+            #Materialize before the processed files it was read from are purged
+            merged = merged.localCheckpoint()
+
+            glueContext.purge_s3_path(processed_path, {{"retentionPeriod": 0}})
+            S3bucket_node3.writeFrame(DynamicFrame.fromDF(merged, glueContext, "merged"))
+
+    #New analytics data version: Athena results cached by STARK_Analytics before now were read from the previous
+    #   processed files, and are no longer reused
+    boto3.client('dynamodb', region_name=args["stark_region"]).put_item(
+        TableName="{ddb_table_name}",
+        Item={{
+            'pk': {{'S' : 'STARK|analytics'}},
+            'sk': {{'S' : 'STARK|analytics|data_version'}},
+            'Data_Version': {{'N' : str(int(time.time()))}}
+        }}
+    )
     job.commit()
 
-    """
-    return textwrap.dedent(source_code)
+    """, context, margin=4)
+    return source_code
     
 def set_data_type(col_type):
 
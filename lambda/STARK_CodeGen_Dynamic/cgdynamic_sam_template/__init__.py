@@ -100,6 +100,9 @@ def create(data, cli_mode=False):
     #Lambda-related data
     entities = cloud_resources['Data Model']
 
+    #Sort indexes: the n-th sortable column of any entity uses STARK-Sort-<n>-Index (see cgdynamic_dynamodb)
+    sort_index_count = max([len(entities[entity].get("sortable", [])) for entity in entities] + [0])
+
 
     #FIXME: Should this transformation be here or in the Parser?
     #Let this remain here now, but probably should be the job of the parser in the future.
@@ -325,6 +328,13 @@ def create(data, cli_mode=False):
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_processed_bucket_name}"] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", !Ref UserCICDPipelineBucketNameParameter, "/{project_varname}/*"] ]
                                         - "*" 
+                                - 
+                                    Sid: AnalyticsDataVersion
+                                    Effect: Allow
+                                    Action:
+                                        - 'dynamodb:PutItem'
+                                    Resource: 
+                                        - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}"] ]
         STARKProjectSchedulerInvokeRole:
             Type: AWS::IAM::Role
             Properties:
@@ -440,9 +450,11 @@ def create(data, cli_mode=False):
                                         - 's3:GetObjectAcl'
                                         - 's3:ListBucket'
                                         - 's3:DeleteObject'
+                                        - 's3:AbortMultipartUpload'
                                     Resource: 
                                         - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}"] ]
                                         - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}/index/STARK-ListView-Index", ] ]
+                                        - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}/index/STARK-Sort-*", ] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_bucket_name}", "/tmp/*"] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_bucket_name}", "/uploaded_files/*"] ]
         STARKProjectAnalyticsLambdaServiceRole:
@@ -486,9 +498,11 @@ def create(data, cli_mode=False):
                                         - 's3:GetObjectAcl'
                                         - 's3:ListBucket'
                                         - 's3:DeleteObject'
+                                        - 's3:AbortMultipartUpload'
                                     Resource: 
                                         - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}"] ]
                                         - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}/index/STARK-ListView-Index", ] ]
+                                        - !Join [ ":", [ "arn:aws:dynamodb", !Ref AWS::Region, !Ref AWS::AccountId, "table/{ddb_table_name}/index/STARK-Sort-*", ] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_bucket_name}", "/tmp/*"] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_bucket_name}", "/uploaded_files/*"] ]
                                         - !Join [ "",  [ "arn:aws:s3:::", "{s3_raw_bucket_name}"] ]
@@ -756,22 +770,33 @@ def create(data, cli_mode=False):
                         AttributeType: S
                     -
                         AttributeName: STARK-ListView-sk
-                        AttributeType: S
-                GlobalSecondaryIndexes:
+                        AttributeType: S"""
+
+    for sort_index_number in range(1, sort_index_count + 1):
+        cf_template += f"""
                     -
-                        IndexName: STARK-ListView-Index
+                        AttributeName: STARK-Sort-{sort_index_number}-sk
+                        AttributeType: S"""
+
+    cf_template += f"""
+                GlobalSecondaryIndexes:"""
+
+    for index_name, sort_attribute in [("STARK-ListView-Index", "STARK-ListView-sk")] + [(f"STARK-Sort-{number}-Index", f"STARK-Sort-{number}-sk") for number in range(1, sort_index_count + 1)]:
+        cf_template += f"""
+                    -
+                        IndexName: {index_name}
                         KeySchema:
                             -
                                 AttributeName: sk
                                 KeyType: HASH
                             -
-                                AttributeName: STARK-ListView-sk
+                                AttributeName: {sort_attribute}
                                 KeyType: RANGE
                         Projection: 
                             ProjectionType: ALL"""
 
-    if ddb_capacity_type == "PROVISIONED":
-        cf_template += f"""
+        if ddb_capacity_type == "PROVISIONED":
+            cf_template += f"""
                         ProvisionedThroughput:
                             ReadCapacityUnits: {ddb_rcu_provisioned}
                             WriteCapacityUnits: {ddb_wcu_provisioned}"""
@@ -846,6 +871,8 @@ def create(data, cli_mode=False):
                         Name: glueetl
                         PythonVersion: 3
                         ScriptLocation: lambda/STARK_Analytics/ETL_Scripts/{entity_endpoint_name}.py
+                    DefaultArguments:
+                        "--stark_region": !Ref AWS::Region
                     Description: Test template generated ETL Job
                     ExecutionClass: STANDARD
                     ExecutionProperty: 
@@ -1328,7 +1355,78 @@ def create(data, cli_mode=False):
                 Name: {project_varname}_GENAI_LAMBDA_FUNC
                 Type: String
                 Description: The STARK GenAI Function for this project
-                Value: !Ref GenAIforSTARK
+                Value: !Ref GenAIforSTARK"""
+
+    if ddb_surge_protection:
+        #Entity writes go through an SQS queue and are applied in batches by STARK_Write_Consumer.
+        #   The consumer's concurrency is capped so write bursts drain at a pace the table can absorb.
+        write_queue_name = cloud_resources["SQS"]["Queue Name"]
+        write_dlq_name   = cloud_resources["SQS"]["DLQ Name"]
+        fifo_properties  = ""
+        batching_window  = """
+                            MaximumBatchingWindowInSeconds: 5"""
+        if ddb_surge_protection_fifo:
+            fifo_properties = """
+                FifoQueue: true"""
+            batching_window = ""
+
+        cf_template += f"""
+        STARKWriteQueueDLQ:
+            Type: AWS::SQS::Queue
+            Properties:
+                QueueName: {write_dlq_name}{fifo_properties}
+                MessageRetentionPeriod: 1209600
+        STARKWriteQueue:
+            Type: AWS::SQS::Queue
+            Properties:
+                QueueName: {write_queue_name}{fifo_properties}
+                VisibilityTimeout: 360
+                RedrivePolicy:
+                    deadLetterTargetArn: !GetAtt STARKWriteQueueDLQ.Arn
+                    maxReceiveCount: 5
+        STARKWriteQueuePolicy:
+            Type: AWS::IAM::Policy
+            Properties:
+                PolicyName: PolicyForSTARKWriteQueue
+                Roles:
+                    - !Ref STARKProjectDefaultLambdaServiceRole
+                PolicyDocument:
+                    Version: '2012-10-17'
+                    Statement:
+                        - 
+                            Effect: Allow
+                            Action:
+                                - 'sqs:GetQueueUrl'
+                                - 'sqs:SendMessage'
+                                - 'sqs:ReceiveMessage'
+                                - 'sqs:DeleteMessage'
+                                - 'sqs:GetQueueAttributes'
+                            Resource: !GetAtt STARKWriteQueue.Arn
+        STARKWriteConsumer:
+            Type: AWS::Serverless::Function
+            Properties:
+                Events:
+                    WriteQueueEvent:
+                        Type: SQS
+                        Properties:
+                            Queue: !GetAtt STARKWriteQueue.Arn
+                            BatchSize: 10{batching_window}
+                            FunctionResponseTypes:
+                                - ReportBatchItemFailures
+                            ScalingConfig:
+                                MaximumConcurrency: 2
+                Runtime: python3.9
+                Handler: __init__.lambda_handler
+                CodeUri: lambda/STARK_Write_Consumer
+                Role: !GetAtt STARKProjectDefaultLambdaServiceRole.Arn
+                Architectures:
+                    - arm64
+                MemorySize: 128
+                Timeout: 60
+            DependsOn:
+                - STARKWriteQueuePolicy"""
+
+    cf_template += f"""
         """
 
     return textwrap.dedent(cf_template)
\ No newline at end of file
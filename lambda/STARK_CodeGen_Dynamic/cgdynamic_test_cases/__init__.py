@@ -4,9 +4,9 @@
 #Python Standard Library
 import base64
 from random import randint
-import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -29,12 +29,20 @@ def create(data):
     with_upload    = False
 
     cascade_function_string = ""
+    context = {
+        "entity": entity,
+        "entity_varname": entity_varname,
+        "entity_to_lower": entity_to_lower,
+        "pk_varname": pk_varname,
+        "default_sk": default_sk
+    }
+
     for one_to_one_relation in relationships.get("has_one",[]):
-        cascade_function_string += f"""
-        def mock_cascade_pk_change_to_child(data, entity, attribute):
+        cascade_function_string += cg_template.render("""
+        def mock_cascade_pk_change_to_child(data, entity, attribute, db_handler = None):
                 return 'OK'
         monkeypatch.setattr({entity_to_lower}, "cascade_pk_change_to_child", mock_cascade_pk_change_to_child)
-        """
+        """, context, margin=4)
 
     col_list = []
     ## removes child of many field in the selection of valid columns
@@ -61,7 +69,7 @@ def create(data):
 
     col_to_edit_varname = converter.convert_to_system_name(col_to_edit)
     
-    source_code = f"""\
+    source_code = cg_template.render("""\
     #Python Standard Library
     import json
     from moto import mock_dynamodb
@@ -82,37 +90,38 @@ def create(data):
         
     def test_create_listview_index_value(set_{entity_to_lower}_payload):
 
-        assert set_{entity_to_lower}_payload['pk'] == {entity_to_lower}.create_listview_index_value(set_{entity_to_lower}_payload)"""
+        assert set_{entity_to_lower}_payload['pk'] == {entity_to_lower}.create_listview_index_value(set_{entity_to_lower}_payload)""", context, margin=4)
     
     if len(sequence) > 0:
         concat_seq = "_sequence"
     else:
         concat_seq = ""
         
-    source_code += f"""
+    context.update({"concat_seq": concat_seq, "cascade_function_string": cascade_function_string})
+    source_code += cg_template.render("""
     @mock_dynamodb
     def test_add(use_moto,set_{entity_to_lower}_payload{concat_seq}, monkeypatch):
         use_moto()
         ddb = boto3.client('dynamodb', region_name=core.test_region)
         {cascade_function_string}
-    """
+    """, context, margin=4)
 
 
     if len(sequence) > 0:
-        source_code += f"""
+        source_code += cg_template.render("""
         def mock_get_sequence(pk, db_handler = None):
             return set_{entity_to_lower}_payload_sequence['pk']
         monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
-        """
+        """, context, margin=4)
 
-    source_code += f"""
+    source_code += cg_template.render("""
         {entity_to_lower}.add(set_{entity_to_lower}_payload{concat_seq}, 'POST', ddb)
         assert  {entity_to_lower}.resp_obj['ResponseMetadata']['HTTPStatusCode'] == 200
     
-    """
+    """, context, margin=4)
 
     if len(sequence) > 0:
-        source_code += f"""    
+        source_code += cg_template.render("""
     @mock_dynamodb
     def test_get_by_pk_sequence(use_moto,set_{entity_to_lower}_payload_sequence, monkeypatch):
         use_moto()
@@ -125,9 +134,9 @@ def create(data):
         {entity_to_lower}.add(set_{entity_to_lower}_payload_sequence, 'POST', ddb)
         response  = {entity_to_lower}.get_by_pk(set_{entity_to_lower}_payload_sequence['pk'], set_{entity_to_lower}_payload_sequence['sk'], ddb)
 
-        assert set_{entity_to_lower}_payload_sequence['pk'] == response['item']['{pk_varname}']"""
+        assert set_{entity_to_lower}_payload_sequence['pk'] == response['item']['{pk_varname}']""", context, margin=4)
     else:
-        source_code += f"""    
+        source_code += cg_template.render("""
     @mock_dynamodb
     def test_get_by_pk(use_moto,set_{entity_to_lower}_payload, monkeypatch):
         use_moto()
@@ -136,27 +145,28 @@ def create(data):
         {entity_to_lower}.add(set_{entity_to_lower}_payload, 'POST', ddb)
         response  = {entity_to_lower}.get_by_pk(set_{entity_to_lower}_payload['pk'], set_{entity_to_lower}_payload['sk'], ddb)
 
-        assert set_{entity_to_lower}_payload['pk'] == response['item']['{pk_varname}']"""
+        assert set_{entity_to_lower}_payload['pk'] == response['item']['{pk_varname}']""", context, margin=4)
 
     if len(sequence) > 0:
         concat_seq = "_sequence"
     else:
         concat_seq = ""
 
-    source_code += f"""
+    context["concat_seq"] = concat_seq
+    source_code += cg_template.render("""
     @mock_dynamodb
     def test_get_all(use_moto,set_{entity_to_lower}_payload{concat_seq}, monkeypatch):
         use_moto()
-        ddb = boto3.client('dynamodb', region_name=core.test_region)"""
+        ddb = boto3.client('dynamodb', region_name=core.test_region)""", context, margin=4)
 
     if len(sequence) > 0:
-        source_code += f"""
+        source_code += cg_template.render("""
         def mock_get_sequence(pk, db_handler = None):
             return set_{entity_to_lower}_payload_sequence['pk']
         monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
-        """
+        """, context, margin=4)
 
-    source_code += f"""        
+    source_code += cg_template.render("""
         {entity_to_lower}.add(set_{entity_to_lower}_payload{concat_seq}, 'POST', ddb)
         set_{entity_to_lower}_payload{concat_seq}['pk'] = 'Test3'
         {entity_to_lower}.add(set_{entity_to_lower}_payload{concat_seq}, 'POST', ddb)
@@ -172,15 +182,16 @@ def create(data):
     def test_edit(use_moto,set_{entity_to_lower}_payload{concat_seq}, monkeypatch):
         use_moto()
         ddb = boto3.client('dynamodb', region_name=core.test_region)
-        {cascade_function_string}"""
+        {cascade_function_string}""", context, margin=4)
 
     if len(sequence) > 0:
-        source_code += f"""
+        source_code += cg_template.render("""
         def mock_get_sequence(pk, db_handler = None):
             return set_{entity_to_lower}_payload_sequence['pk']
         monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
-        """
-    source_code += f"""
+        """, context, margin=4)
+    context.update({"col_to_edit_varname": col_to_edit_varname, "test_data_for_edit": test_data_for_edit, "col_type": col_type})
+    source_code += cg_template.render("""
         {entity_to_lower}.add(set_{entity_to_lower}_payload{concat_seq}, 'POST', ddb)
         set_{entity_to_lower}_payload{concat_seq}['{col_to_edit_varname}'] = {test_data_for_edit}
         {entity_to_lower}.edit(set_{entity_to_lower}_payload{concat_seq}, ddb)
@@ -190,15 +201,15 @@ def create(data):
     @mock_dynamodb
     def test_delete(use_moto,set_{entity_to_lower}_payload{concat_seq}, monkeypatch):
         use_moto()
-        ddb = boto3.client('dynamodb', region_name=core.test_region)"""
+        ddb = boto3.client('dynamodb', region_name=core.test_region)""", context, margin=4)
 
     if len(sequence) > 0:
-        source_code += f"""
+        source_code += cg_template.render("""
         def mock_get_sequence(pk, db_handler = None):
             return set_{entity_to_lower}_payload_sequence['pk']
         monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
-        """
-    source_code += f"""
+        """, context, margin=4)
+    source_code += cg_template.render("""
         {entity_to_lower}.add(set_{entity_to_lower}_payload{concat_seq}, 'POST', ddb)
         {entity_to_lower}.delete(set_{entity_to_lower}_payload{concat_seq}, ddb)
         response  = {entity_to_lower}.get_all('{default_sk}', None, ddb)
@@ -209,7 +220,7 @@ def create(data):
         assert '"Could not handle GET request - unknown request type"' == response['body']
         
     def test_lambda_handler_rt_all(monkeypatch):
-        def mock_get_all(sk, lv_token):
+        def mock_get_all(sk, lv_token, sort_field='', descending=False):
             return "always success", ''
         monkeypatch.setattr({entity_to_lower}, "get_all", mock_get_all)
         response = {entity_to_lower}.lambda_handler({{'queryStringParameters':{{'rt':'all'}}}}, '')
@@ -331,7 +342,7 @@ def create(data):
         def mock_is_authorized(permission, event, ddb):
             return True
 
-        def mock_delete(data):
+        def mock_delete(data, db_handler = None):
             assert set_{entity_to_lower}_payload == data
             return "OK"
 
@@ -353,7 +364,7 @@ def create(data):
         def mock_validate_form(payload, metadata):
             return []
 
-        def mock_edit(data):
+        def mock_edit(data, db_handler = None):
             data.pop('{pk_varname}')
             assert set_{entity_to_lower}_payload == data
             return "OK"
@@ -378,17 +389,18 @@ def create(data):
         def mock_validate_form(payload, metadata):
             return []
 
-        def mock_add(data, method):
+        def mock_add(data, method, db_handler = None):
             data.pop('{pk_varname}')
             set_{entity_to_lower}_payload['pk'] = 'Test1'
             set_{entity_to_lower}_payload['STARK-ListView-sk'] = 'Test1'
             assert set_{entity_to_lower}_payload == data
             return "OK"
 
-        def mock_delete(data):
+        def mock_delete(data, db_handler = None):
             set_{entity_to_lower}_payload['pk'] = 'Test2'
             assert set_{entity_to_lower}_payload == data
             return "OK"
+        {cascade_function_string}
 
         monkeypatch.setattr(security, "is_authorized", mock_is_authorized)
         monkeypatch.setattr(validation, "validate_form", mock_validate_form)
@@ -410,7 +422,7 @@ def create(data):
         def mock_validate_form(payload, metadata):
             return []
 
-        def mock_add(data):
+        def mock_add(data, db_handler = None):
             data.pop('{pk_varname}')
             assert set_{entity_to_lower}_payload == data
             return "OK"
@@ -421,9 +433,9 @@ def create(data):
         monkeypatch.setattr({entity_to_lower}, "add", mock_add)
         {entity_to_lower}.lambda_handler(event, '')
 
-    """
+    """, context, margin=4)
 
-    return textwrap.dedent(source_code)
+    return source_code
 
 def set_type(col_type):
 
@@ -4,9 +4,9 @@
 #Python Standard Library
 import base64
 from random import randint
-import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -33,99 +33,114 @@ def create(data):
     raw_rpt_payload_string = ""
     report_field_string    = ""
 
+    context = {
+        "entity_varname": entity_varname,
+        "pk_varname": pk_varname
+    }
+
     for col, col_type in columns.items():
         col_varname = converter.convert_to_system_name(col)
         col_type_id = set_type(col_type)
         test_data   = generate_test_data(col_type)
 
-        data_string += f"""
-        data['{col_varname}'] = {{'{col_type_id}': {test_data}}}"""
+        context.update({"col_varname": col_varname, "col_type_id": col_type_id, "test_data": test_data})
+        data_string += cg_template.render("""
+        data['{col_varname}'] = {{'{col_type_id}': {test_data}}}""", context, margin=4)
 
-        raw_payload_string += f"""
-                '{col_varname}': {test_data},"""
+        raw_payload_string += cg_template.render("""
+                '{col_varname}': {test_data},""", context, margin=4)
 
-        payload_string += f"""
-        payload['{col_varname}'] = {test_data}"""
+        payload_string += cg_template.render("""
+        payload['{col_varname}'] = {test_data}""", context, margin=4)
 
-        raw_rpt_payload_string += f"""
-                '{col_varname}': {{'operator': "",'type': "{col_type_id}",'value': ""}},"""
+        raw_rpt_payload_string += cg_template.render("""
+                '{col_varname}': {{'operator': "",'type': "{col_type_id}",'value': ""}},""", context, margin=4)
 
         report_field_string += f""""{col_varname}", """
         
     for rel, rel_data in rel_model.items():
         many_entity_varname = converter.convert_to_system_name(rel)
 
-        data_string += f"""
-        data['{many_entity_varname}'] = {{'{col_type_id}': {test_data}}}"""
+        context.update({"many_entity_varname": many_entity_varname, "col_type_id": col_type_id, "test_data": test_data})
+        data_string += cg_template.render("""
+        data['{many_entity_varname}'] = {{'{col_type_id}': {test_data}}}""", context, margin=4)
 
-        raw_payload_string += f"""
-                '{many_entity_varname}': {test_data},"""
+        raw_payload_string += cg_template.render("""
+                '{many_entity_varname}': {test_data},""", context, margin=4)
 
-        payload_string += f"""
-        payload['{many_entity_varname}'] = {test_data}"""
+        payload_string += cg_template.render("""
+        payload['{many_entity_varname}'] = {test_data}""", context, margin=4)
 
-        raw_rpt_payload_string += f"""
-                '{many_entity_varname}': {{'operator': "",'type': "{col_type_id}",'value': ""}},"""
+        raw_rpt_payload_string += cg_template.render("""
+                '{many_entity_varname}': {{'operator': "",'type': "{col_type_id}",'value': ""}},""", context, margin=4)
 
-    source_code = f"""\
+    context["data_string"] = data_string
+    source_code = cg_template.render("""\
     def get_data():
         data = {{}}
         data['pk'] = {{'S':'Test1'}}
         data['sk'] = {{'S':'{entity_varname}|info'}}{data_string}
         
-        return data"""
+        return data""", context, margin=4)
     if len(sequence) > 0:
-        source_code += f"""
+        context["payload_string"] = payload_string
+        source_code += cg_template.render("""
     def set_payload_sequence():
         payload = {{}}
         payload['pk'] = 'C-000001'
         payload['orig_pk'] = 'C-000001'
-        payload['sk'] = '{entity_varname}|info'{payload_string}"""
+        payload['sk'] = '{entity_varname}|info'{payload_string}""", context, margin=4)
 
         for rel_ent in rel_model:
             rel_cols = rel_model[rel_ent]["data"]
             rel_pk = rel_model[rel_ent]["pk"]
             var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-            source_code += f"""
-        payload['{var_pk}'] = ''"""
+            context["var_pk"] = var_pk
+            source_code += cg_template.render("""
+        payload['{var_pk}'] = ''""", context, margin=4)
             for rel_col, rel_col_type in rel_cols.items():
                 var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-                source_code += f"""
-        payload['{var_data}'] = ''"""
+                context["var_data"] = var_data
+                source_code += cg_template.render("""
+        payload['{var_data}'] = ''""", context, margin=4)
 
-        source_code += f"""
+        source_code += cg_template.render("""
         payload['STARK-ListView-sk'] = 'C-000001'
         payload['STARK_uploaded_s3_keys'] = {{}}
         payload['orig_STARK_uploaded_s3_keys'] = {{}}
         return payload
-    """
+    """, context, margin=4)
     
-    source_code += f"""
+    context["payload_string"] = payload_string
+    source_code += cg_template.render("""
     def set_payload():
         payload = {{}}
         payload['pk'] = 'Test2'
         payload['orig_pk'] = 'Test2'
-        payload['sk'] = '{entity_varname}|info'{payload_string}"""
+        payload['sk'] = '{entity_varname}|info'{payload_string}""", context, margin=4)
 
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-        source_code += f"""
-        payload['{var_pk}'] = ''"""
+        context["var_pk"] = var_pk
+        source_code += cg_template.render("""
+        payload['{var_pk}'] = ''""", context, margin=4)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-            source_code += f"""
-        payload['{var_data}'] = ''"""
+            context["var_data"] = var_data
+            source_code += cg_template.render("""
+        payload['{var_data}'] = ''""", context, margin=4)
 
-    source_code += f"""
+    source_code += cg_template.render("""
         payload['STARK-ListView-sk'] = 'Test2'
         payload['STARK_uploaded_s3_keys'] = {{}}
         payload['orig_STARK_uploaded_s3_keys'] = {{}}
         return payload
-    """
+    """, context, margin=4)
 
-    source_code += f"""
+    context.update({"raw_payload_string": raw_payload_string, "raw_rpt_payload_string": raw_rpt_payload_string})
+    source_code += cg_template.render("""
     def get_raw_payload():
         raw_payload = {{
             "{entity_varname}": {{
@@ -139,21 +154,24 @@ def create(data):
     def get_raw_report_payload():
         raw_payload = {{
             "{entity_varname}": {{
-                '{pk_varname}': {{'operator': "=",'type': "S",'value': "Hello"}},{raw_rpt_payload_string}"""
+                '{pk_varname}': {{'operator': "=",'type': "S",'value': "Hello"}},{raw_rpt_payload_string}""", context, margin=4)
 
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-        source_code += f"""
-                '{var_pk}':  {{'operator': "",'type': "S",'value': ""}},"""
+        context["var_pk"] = var_pk
+        source_code += cg_template.render("""
+                '{var_pk}':  {{'operator': "",'type': "S",'value': ""}},""", context, margin=4)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-            source_code += f"""
-                '{var_data}':  {{'operator': "",'type': "S",'value': ""}},"""
+            context["var_data"] = var_data
+            source_code += cg_template.render("""
+                '{var_data}':  {{'operator': "",'type': "S",'value': ""}},""", context, margin=4)
 
     
-    source_code += f"""
+    context["report_field_string"] = report_field_string
+    source_code += cg_template.render("""
                 'STARK_Chart_Type' : "",
                 'STARK_Report_Type' : "Tabular",
                 'STARK_X_Data_Source' : "",
@@ -168,9 +186,9 @@ def create(data):
         return raw_payload
 
 
-        """
+        """, context, margin=4)
         
-    return textwrap.dedent(source_code)
+    return source_code
 
 def generate_test_data(col_type):
 
@@ -6,7 +6,6 @@ from urllib.parse import unquote
 import sys
 
 #Extra modules
-import boto3
 import uuid
 
 #STARK
@@ -15,8 +14,7 @@ from stark_core import utilities
 from stark_core import validation
 from stark_core import data_abstraction
 
-ddb = boto3.client('dynamodb')
-s3_res = boto3.resource('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
@@ -118,6 +116,7 @@ stark_permissions = {
     'report': 'System Modules|Report'
 }
 
+@stark_core.log.handler
 def lambda_handler(event, context):
     responseStatusCode = 200
 
@@ -468,9 +467,6 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     items = []
     ddb_arguments = {}
     ddb_arguments['TableName'] = ddb_table
@@ -479,9 +475,7 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     ddb_arguments['Limit'] = page_limit
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
     ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk } }
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
     if lv_token != None:
         ddb_arguments['ExclusiveStartKey'] = lv_token
@@ -507,24 +501,11 @@ def get_by_pk(pk, sk=default_sk, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Select'] = "ALL_ATTRIBUTES"
-    ddb_arguments['KeyConditionExpression'] = "#pk = :pk and #sk = :sk"
-    ddb_arguments['ExpressionAttributeNames'] = {
-                                                '#pk' : 'pk',
-                                                '#sk' : 'sk'
-                                            }
-    ddb_arguments['ExpressionAttributeValues'] = {
-                                                ':pk' : {'S' : pk },
-                                                ':sk' : {'S' : sk }
-                                            }
-    response = db_handler.query(**ddb_arguments)
-    raw = response.get('Items')
+    items = data_abstraction.get_item_collection(pk, sk, db_handler)
 
     #Map to expected structure
     response = {}
-    response['item'] = map_results(raw[0])
+    response['item'] = map_results(items[sk])
 
     return response
 
@@ -532,34 +513,12 @@ def delete_v2(data, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-    ExpressionAttributeNamesDict = {
-        '#STARKDeletedBy': 'STARK-Deleted-By',
-        '#STARKDeletedTs': 'STARK-Deleted-TS',
-        '#STARKIsDeleted': 'STARK-Is-Deleted',
-        '#ttl': 'TTL'
-    }
-    ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
     pk = data.get('pk','')
     sk = data.get('sk','')
     if sk == '': sk = default_sk
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Key'] = {
-            'pk' : {'S' : pk},
-            'sk' : {'S' : sk}
-        }
-
-    ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-    ddb_arguments['UpdateExpression'] = UpdateExpressionString
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
-
-    response = db_handler.update_item(**ddb_arguments)
-    global resp_obj
-    resp_obj = response
+    #Moves the record to its tombstone key, out of the list view index partition that get_all() reads
+    data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
     return "OK"
 
 def delete(data, db_handler = None):
@@ -845,9 +804,6 @@ def get_all_by_old_parent_value(old_pk_val, attribute, sk = default_sk):
 
 def get_fields(fields, sk = default_sk):
 
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     ddb_arguments = {}
     next_token = 'initial'
     items = []
@@ -858,9 +814,7 @@ def get_fields(fields, sk = default_sk):
         ddb_arguments['Limit']=5
         ddb_arguments['ReturnConsumedCapacity']='TOTAL'
         ddb_arguments['KeyConditionExpression']='sk = :sk'
-        ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
         ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk}}
-        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
         if next_token != '':
             ddb_arguments['ExclusiveStartKey']=next_token
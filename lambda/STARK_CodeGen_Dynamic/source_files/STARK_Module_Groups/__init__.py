@@ -6,7 +6,6 @@ import importlib
 from urllib.parse import unquote
 
 #Extra modules
-import boto3
 import uuid
 
 #STARK
@@ -15,8 +14,7 @@ from stark_core import utilities
 from stark_core import validation
 from stark_core import data_abstraction
 
-ddb = boto3.client('dynamodb')
-s3_res = boto3.resource('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
@@ -78,6 +76,7 @@ stark_permissions = {
     'report': 'Module Groups|Report'
 }
 
+@stark_core.log.handler
 def lambda_handler(event, context):
     responseStatusCode = 200
     #Get request type
@@ -182,7 +181,7 @@ def lambda_handler(event, context):
         elif method == "POST":
             if 'STARK_isReport' in data:
                 if(stark_core.sec.is_authorized(stark_permissions['report'], event, ddb)):
-                    print(data)
+                    stark_core.log.debug("Report request", data=data)
                     response = report(data, default_sk)
                 else:
                     responseStatusCode, response = stark_core.sec.authFailResponse
@@ -242,9 +241,7 @@ def lambda_handler(event, context):
 
             pk = event.get('queryStringParameters').get('Group_Name','')
             sk = event.get('queryStringParameters').get('sk','')
-            print('pk')
-            print(pk)
-            print(sk)
+            stark_core.log.debug("Detail request", pk=pk, sk=sk)
             if sk == "":
                 sk = default_sk
 
@@ -418,9 +415,6 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
         db_handler = ddb
 
 
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     items = []
     ddb_arguments = {}
     ddb_arguments['TableName'] = ddb_table
@@ -429,9 +423,7 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     ddb_arguments['Limit'] = page_limit
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
     ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk } }
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
     if lv_token != None:
         ddb_arguments['ExclusiveStartKey'] = lv_token
@@ -482,34 +474,12 @@ def delete_v2(data, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-    ExpressionAttributeNamesDict = {
-        '#STARKDeletedBy': 'STARK-Deleted-By',
-        '#STARKDeletedTs': 'STARK-Deleted-TS',
-        '#STARKIsDeleted': 'STARK-Is-Deleted',
-        '#ttl': 'TTL'
-    }
-    ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
     pk = data.get('pk','')
     sk = data.get('sk','')
     if sk == '': sk = default_sk
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Key'] = {
-            'pk' : {'S' : pk},
-            'sk' : {'S' : sk}
-        }
-
-    ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-    ddb_arguments['UpdateExpression'] = UpdateExpressionString
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
-
-    response = db_handler.update_item(**ddb_arguments)
-    global resp_obj
-    resp_obj = response
+    #Moves the record to its tombstone key, out of the list view index partition that get_all() reads
+    data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
     return "OK"
 
 def delete(data, db_handler = None):
@@ -704,15 +674,18 @@ def get_module_groups(groups, sk=default_sk):
 
     return items
     
-def cascade_pk_change_to_child(params):
+def cascade_pk_change_to_child(params, db_handler=None):
+    if db_handler == None:
+        db_handler = ddb
     import STARK_Module as stark_module
 
-    #fetch all records from child using old pk value
-    response = stark_module.get_all_by_old_parent_value(params['orig_pk'])
+    #keys of the modules that still have the old group name, and the updates that point them to the new one
+    recorder = data_abstraction.transaction_recorder(db_handler)
+    updated_metadata = utilities.append_record_metadata('edit', username)
+    for key in data_abstraction.iter_foreign_key_records(stark_module.default_sk, 'Module_Group', params['orig_pk'], db_handler=ddb):
+        recorder.update_item(**data_abstraction.get_foreign_key_update(key, 'Module_Group', params['pk'], updated_metadata=updated_metadata))
 
-    #loop through response and update each record
-    for record in response:
-        record['Module_Group'] = params['pk']
-        stark_module.edit(record)
+    #applied in TransactWriteItems chunks instead of one edit() per module
+    data_abstraction.apply_transaction(recorder.actions, db_handler)
 
     return "OK"
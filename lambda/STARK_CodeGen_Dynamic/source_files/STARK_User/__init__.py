@@ -7,7 +7,6 @@ import stark_scrypt as scrypt
 import sys
 
 #Extra modules
-import boto3
 import uuid
 
 #STARK
@@ -16,8 +15,7 @@ from stark_core import utilities
 from stark_core import validation
 from stark_core import data_abstraction
 
-ddb = boto3.client('dynamodb')
-s3_res = boto3.resource('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
@@ -88,6 +86,7 @@ stark_permissions = {
     'report': 'Users|Report'
 }
 
+@stark_core.log.handler
 def lambda_handler(event, context):
     responseStatusCode = 200
 
@@ -203,8 +202,7 @@ def lambda_handler(event, context):
                 if(stark_core.sec.is_authorized(stark_permissions['add'], event, ddb)):
                     payload = data
                     payload['Username'] = data['pk']
-                    print(payload)
-                    print(metadata)
+                    stark_core.log.debug("Add request", payload=payload)
                     invalid_payload = validation.validate_form(payload, metadata)
                     
                     if len(invalid_payload) > 0:
@@ -281,9 +279,6 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     if db_handler == None:
         db_handler = ddb
         
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     items = []
     ddb_arguments = {}
     ddb_arguments['TableName'] = ddb_table
@@ -292,9 +287,7 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     ddb_arguments['Limit'] = page_limit
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
     ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk } }
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
     if lv_token != None:
         ddb_arguments['ExclusiveStartKey'] = lv_token
@@ -320,24 +313,11 @@ def get_by_pk(pk, sk=default_sk, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Select'] = "ALL_ATTRIBUTES"
-    ddb_arguments['KeyConditionExpression'] = "#pk = :pk and #sk = :sk"
-    ddb_arguments['ExpressionAttributeNames'] = {
-                                                '#pk' : 'pk',
-                                                '#sk' : 'sk'
-                                            }
-    ddb_arguments['ExpressionAttributeValues'] = {
-                                                ':pk' : {'S' : pk },
-                                                ':sk' : {'S' : sk }
-                                            }
-    response = db_handler.query(**ddb_arguments)
-    raw = response.get('Items')
+    items = data_abstraction.get_item_collection(pk, sk, db_handler)
 
     #Map to expected structure
     response = {}
-    response['item'] = map_results(raw[0])
+    response['item'] = map_results(items[sk])
 
     return response
 
@@ -345,34 +325,12 @@ def delete_v2(data, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-    ExpressionAttributeNamesDict = {
-        '#STARKDeletedBy': 'STARK-Deleted-By',
-        '#STARKDeletedTs': 'STARK-Deleted-TS',
-        '#STARKIsDeleted': 'STARK-Is-Deleted',
-        '#ttl': 'TTL'
-    }
-    ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
     pk = data.get('pk','')
     sk = data.get('sk','')
     if sk == '': sk = default_sk
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Key'] = {
-            'pk' : {'S' : pk},
-            'sk' : {'S' : sk}
-        }
-
-    ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-    ddb_arguments['UpdateExpression'] = UpdateExpressionString
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
-
-    response = db_handler.update_item(**ddb_arguments)
-    global resp_obj
-    resp_obj = response
+    #Moves the record to its tombstone key, out of the list view index partition that get_all() reads
+    data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
     return "OK"
 
 def delete(data, db_handler = None):
@@ -486,7 +444,6 @@ def add(data, method='POST', db_handler=None):
     response = db_handler.put_item(**ddb_arguments)
 
     assign_role_permissions({'Username': pk, 'Role': Role })
-    print(assign_role_permissions({'Username': pk, 'Role': Role }))
 
     # for relation in relationships['has_one']:
     #     cascade_pk_change_to_child(data, relation['entity'], relation['attribute'])
@@ -787,8 +744,6 @@ def create_listview_index_value(data):
     return STARK_ListView_sk
 
 def assign_role_permissions(data):
-    print("Line 643")
-
     username_from_data  = data['Username']
     role_name = data['Role']
  
@@ -798,8 +753,7 @@ def assign_role_permissions(data):
     import STARK_User_Roles as user_roles
 
     response = user_roles.get_by_pk(role_name)
-    print("Line 652")
-    print(response)
+    stark_core.log.debug("Role permissions", role=role_name, response=response)
     permissions = response["item"]['Permissions']
     
     sys.path[0] = getcwd() + '/STARK_User_Permissions'
@@ -809,7 +763,6 @@ def assign_role_permissions(data):
         'Permissions': permissions,
         'username': username
     }
-    print(data)
     response = user_permissions.add(data)
 
     return "OK"
@@ -854,15 +807,18 @@ def get_all_by_old_parent_value(old_pk_val, attribute, sk = default_sk):
 
     return items
 
-def cascade_pk_change_to_child(params, child_entity_name, attribute):
+def cascade_pk_change_to_child(params, child_entity_name, attribute, db_handler=None):
+    if db_handler == None:
+        db_handler = ddb
     temp_import = importlib.import_module(child_entity_name)
 
-    #fetch all records from child using old pk value
-    response = temp_import.get_all_by_old_parent_value(params['orig_pk'], attribute)
+    #keys of the child records that still have the old pk value, and the updates that point them to the new one
+    recorder = data_abstraction.transaction_recorder(db_handler)
+    updated_metadata = utilities.append_record_metadata('edit', username)
+    for key in data_abstraction.iter_foreign_key_records(temp_import.default_sk, attribute, params['orig_pk'], getattr(temp_import, 'sort_indexes', {}), db_handler=ddb):
+        recorder.update_item(**data_abstraction.get_foreign_key_update(key, attribute, params['pk'], getattr(temp_import, 'sort_indexes', {}), updated_metadata))
 
-    #loop through response and update each record
-    for record in response:
-        record[attribute] = params['pk']
-        temp_import.edit(record)
+    #applied in TransactWriteItems chunks instead of one edit() per child
+    data_abstraction.apply_transaction(recorder.actions, db_handler)
 
     return "OK"
\ No newline at end of file
@@ -6,7 +6,6 @@ from urllib.parse import unquote
 import sys
 
 #Extra modules
-import boto3
 import uuid
 
 #STARK
@@ -15,8 +14,7 @@ from stark_core import utilities
 from stark_core import validation
 from stark_core import data_abstraction
 
-ddb = boto3.client('dynamodb')
-s3_res = boto3.resource('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
@@ -62,6 +60,7 @@ stark_permissions = {
     'report': 'User Permissions|Report'
 }
 
+@stark_core.log.handler
 def lambda_handler(event, context):
     responseStatusCode = 200
     #Get request type
@@ -246,9 +245,6 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     items = []
     ddb_arguments = {}
     ddb_arguments['TableName'] = ddb_table
@@ -257,9 +253,7 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     ddb_arguments['Limit'] = page_limit
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
     ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk } }
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
     if lv_token != None:
         ddb_arguments['ExclusiveStartKey'] = lv_token
@@ -310,34 +304,12 @@ def delete_v2(data, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-    ExpressionAttributeNamesDict = {
-        '#STARKDeletedBy': 'STARK-Deleted-By',
-        '#STARKDeletedTs': 'STARK-Deleted-TS',
-        '#STARKIsDeleted': 'STARK-Is-Deleted',
-        '#ttl': 'TTL'
-    }
-    ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
     pk = data.get('pk','')
     sk = data.get('sk','')
     if sk == '': sk = default_sk
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Key'] = {
-            'pk' : {'S' : pk},
-            'sk' : {'S' : sk}
-        }
-
-    ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-    ddb_arguments['UpdateExpression'] = UpdateExpressionString
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
-
-    response = db_handler.update_item(**ddb_arguments)
-    global resp_obj
-    resp_obj = response
+    #Moves the record to its tombstone key, out of the list view index partition that get_all() reads
+    data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
     return "OK"
 
 def delete(data, db_handler = None):
@@ -355,6 +327,7 @@ def delete(data, db_handler = None):
         }
 
     response = db_handler.delete_item(**ddb_arguments)
+    stark_core.sec.invalidate_permission_cache(pk)
     global resp_obj
     resp_obj = response
 
@@ -398,7 +371,7 @@ def edit(data, db_handler = None):
     ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
 
     response = db_handler.update_item(**ddb_arguments)
-
+    stark_core.sec.invalidate_permission_cache(pk)
 
     global resp_obj
     resp_obj = response
@@ -432,6 +405,7 @@ def add(data, method='POST', db_handler=None):
     ddb_arguments['TableName'] = ddb_table
     ddb_arguments['Item'] = item
     response = db_handler.put_item(**ddb_arguments)
+    stark_core.sec.invalidate_permission_cache(pk)
 
     global resp_obj
     resp_obj = response
@@ -6,7 +6,6 @@ from urllib.parse import unquote
 import sys
 
 #Extra modules
-import boto3
 import uuid
 
 #STARK
@@ -15,8 +14,7 @@ from stark_core import utilities
 from stark_core import validation
 from stark_core import data_abstraction
 
-ddb = boto3.client('dynamodb')
-s3_res = boto3.resource('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
@@ -70,6 +68,7 @@ stark_permissions = {
     'report': 'User Roles|Report'
 }
 
+@stark_core.log.handler
 def lambda_handler(event, context):
     responseStatusCode = 200
     #Get request type
@@ -255,9 +254,6 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
     items = []
     ddb_arguments = {}
     ddb_arguments['TableName'] = ddb_table
@@ -266,9 +262,7 @@ def get_all(sk=default_sk, lv_token=None, db_handler = None):
     ddb_arguments['Limit'] = page_limit
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
     ddb_arguments['ExpressionAttributeValues'] = { ':sk' : {'S' : sk } }
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
     if lv_token != None:
         ddb_arguments['ExclusiveStartKey'] = lv_token
@@ -319,34 +313,12 @@ def delete_v2(data, db_handler = None):
     if db_handler == None:
         db_handler = ddb
 
-    UpdateExpressionString = "SET #STARKDeletedBy = :STARKDeletedBy, #STARKDeletedTs = :STARKDeletedTS, #STARKIsDeleted = :STARKIsDeleted, #ttl = :ttl" 
-    ExpressionAttributeNamesDict = {
-        '#STARKDeletedBy': 'STARK-Deleted-By',
-        '#STARKDeletedTs': 'STARK-Deleted-TS',
-        '#STARKIsDeleted': 'STARK-Is-Deleted',
-        '#ttl': 'TTL'
-    }
-    ExpressionAttributeValuesDict = utilities.append_record_metadata('delete', username)
-
     pk = data.get('pk','')
     sk = data.get('sk','')
     if sk == '': sk = default_sk
 
-    ddb_arguments = {}
-    ddb_arguments['TableName'] = ddb_table
-    ddb_arguments['Key'] = {
-            'pk' : {'S' : pk},
-            'sk' : {'S' : sk}
-        }
-
-    ddb_arguments['ReturnValues'] = 'UPDATED_NEW'
-    ddb_arguments['UpdateExpression'] = UpdateExpressionString
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
-
-    response = db_handler.update_item(**ddb_arguments)
-    global resp_obj
-    resp_obj = response
+    #Moves the record to its tombstone key, out of the list view index partition that get_all() reads
+    data_abstraction.soft_delete(pk, sk, utilities.append_record_metadata('delete', username), db_handler)
     return "OK"
 
 def delete(data, db_handler = None):
@@ -758,15 +730,18 @@ def create_listview_index_value(data):
     STARK_ListView_sk = "|".join(ListView_index_values)
     return STARK_ListView_sk
 
-def cascade_pk_change_to_child(params, child_entity_name, attribute):
+def cascade_pk_change_to_child(params, child_entity_name, attribute, db_handler=None):
+    if db_handler == None:
+        db_handler = ddb
     temp_import = importlib.import_module(child_entity_name)
 
-    #fetch all records from child using old pk value
-    response = temp_import.get_all_by_old_parent_value(params['orig_pk'], attribute)
+    #keys of the child records that still have the old pk value, and the updates that point them to the new one
+    recorder = data_abstraction.transaction_recorder(db_handler)
+    updated_metadata = utilities.append_record_metadata('edit', username)
+    for key in data_abstraction.iter_foreign_key_records(temp_import.default_sk, attribute, params['orig_pk'], getattr(temp_import, 'sort_indexes', {}), db_handler=ddb):
+        recorder.update_item(**data_abstraction.get_foreign_key_update(key, attribute, params['pk'], getattr(temp_import, 'sort_indexes', {}), updated_metadata))
 
-    #loop through response and update each record
-    for record in response:
-        record[attribute] = params['pk']
-        temp_import.edit(record)
+    #applied in TransactWriteItems chunks instead of one edit() per child
+    data_abstraction.apply_transaction(recorder.actions, db_handler)
 
     return "OK"
\ No newline at end of file
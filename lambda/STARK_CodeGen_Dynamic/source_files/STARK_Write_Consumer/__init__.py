@@ -0,0 +1,13 @@
+#STARK
+import stark_core
+from stark_core import write_queue
+
+@stark_core.log.handler
+def lambda_handler(event, context):
+    #Drains the surge protection write queue. Messages reported back as failures stay in the queue
+    #   and are retried, then moved to the DLQ once they run out of receives.
+    failed_messages = write_queue.process_messages(event.get('Records', []))
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_messages]
+    }
@@ -2,19 +2,16 @@
 import json
 import base64
 
-#Extra modules
-import boto3
-
 import stark_core
 
-ddb = boto3.client('dynamodb')
-s3 = boto3.client('s3')
+ddb = stark_core.get_client('dynamodb')
 
 #######
 #CONFIG
 ddb_table  = stark_core.ddb_table
 bucket_name = stark_core.bucket_name
 
+@stark_core.log.handler
 def lambda_handler(event, context):
 
     responseStatusCode = 200
@@ -30,10 +27,9 @@ def lambda_handler(event, context):
         #event must contain an array of permissions in payload.get('stark_permissions', [])
         permissions = payload.get('stark_permissions',[])
 
-        stark_permissions = {}
-        for permission in permissions:
-            print(permission)
-            stark_permissions[permission] = stark_core.sec.is_authorized(permission, event, ddb)
+        #All requested permissions are answered from a single lookup of the user's permission set
+        stark_permissions, backend_reads = stark_core.sec.check_permissions(permissions, event, ddb)
+        stark_permissions['STARK_permission_reads'] = backend_reads
 
         return {
             "isBase64Encoded": False,
@@ -83,5 +79,5 @@ def lambda_handler(event, context):
         }
 
 def generate_presigned_url(bucket_name, object_key, expiration=3600):
-    response = s3.generate_presigned_post(bucket_name, object_key, ExpiresIn=expiration)
+    response = stark_core.get_client('s3').generate_presigned_post(bucket_name, object_key, ExpiresIn=expiration)
     return response
\ No newline at end of file
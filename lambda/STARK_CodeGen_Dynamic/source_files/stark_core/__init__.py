@@ -5,12 +5,57 @@ import stark_core.logging as log
 
 region_name = os.environ['AWS_REGION']
 
+##AWS clients
+#Created on first use and shared by every stark_core module and entity module in the container,
+#   so a cold start only pays for the clients (and the boto3 import) that the request actually needs
+aws_clients = {}
+
+def get_client(service_name):
+    client = aws_clients.get(service_name)
+    if client == None:
+        import boto3
+        client = boto3.client(service_name)
+        aws_clients[service_name] = client
+    return client
+
+##Logging config (see stark_core.logging)
+#Lowest level written to CloudWatch: DEBUG, INFO, WARNING or ERROR. The STARK_LOG_LEVEL environment variable overrides it.
+log_level              = os.environ.get('STARK_LOG_LEVEL', 'INFO')
+#Share of invocations (0 to 1) that also write their DEBUG records, such as full event payloads, whatever the log level
+log_debug_sample_rate  = 0
+#Records an invocation keeps in memory before writing them early (they are otherwise written once, when it ends)
+log_buffer_max_records = 100
+
 ##DynamoDB related config
 ddb_table   = "[[STARK_DDB_TABLE_NAME]]"
 test_region = 'eu-west-2'
 page_limit  = 100
 
+#Threads used when a BatchGetItem request has to be split into several chunks (1 = sequential)
+batch_get_max_workers = 4
+#Threads used to query the shards of an entity with list_view_shards > 1 in parallel (see data_abstraction.iter_list_view)
+list_view_shard_max_workers = 8
+#Writes per TransactWriteItems request when a PK change is applied (the DDB limit is 100; see data_abstraction.apply_transaction),
+#   and threads applying the chunks of a change too large for one transaction
+transact_write_max_actions = 100
+transact_write_max_workers = 4
+
 TTL_for_deleted_records_in_days = 120
+#Soft-deleted records are moved to this prefix + their sk (see data_abstraction.soft_delete), which keeps them
+#   out of the STARK-ListView-Index partitions that list, lookup and report reads query
+tombstone_sk_prefix = "STARK-Deleted|"
+
+##Surge protection config
+#Entity add/edit/delete writes are queued to SQS and applied in batches by STARK_Write_Consumer (see stark_core.write_queue)
+ddb_surge_protection      = "[[STARK_SURGE_PROTECTION]]" == "True"
+#FIFO queue: writes to the same record are applied in the order they were made
+ddb_surge_protection_fifo = "[[STARK_SURGE_PROTECTION_FIFO]]" == "True"
+write_queue_name          = "[[STARK_WRITE_QUEUE]]"
+
+##Security config
+#Seconds a warm container may reuse a user's permissions before re-reading them (0 disables the cache)
+permission_cache_ttl       = 300
+permission_cache_max_users = 256
 
 ##Bucket Related Config
 bucket_name = "[[STARK_WEB_BUCKET]]"
@@ -22,5 +67,27 @@ analytics_raw_bucket_name       = "[[STARK_RAW_BUCKET]]"
 analytics_processed_bucket_name = "[[STARK_PROCESSED_BUCKET]]"
 analytics_athena_bucket_name    = "[[STARK_ATHENA_BUCKET]]"
 
+##Analytics query config
+#Seconds an Athena query may run before it is cancelled (the API Gateway integration itself times out at 30)
+athena_query_timeout = 20
+#Seconds a succeeded query is reused for the same SQL and analytics data version (0 disables the cache)
+athena_cache_ttl     = 900
+#Rows per page returned by the analytics report API (later pages are fetched with the returned Next_Token)
+athena_page_size     = 100
+
+##Report export config
+#Stream report and analytics CSV exports to S3 through multipart upload instead of building each file in memory
+stream_csv_exports = False
+#Bytes per multipart upload part when streaming CSV exports (S3 minimum is 5 MB, except for the last part)
+csv_part_size      = 8 * 1024 * 1024
+#Render report PDFs from a row stream with a column layout computed once from the first rows (see utilities.create_pdf_stream)
+stream_pdf_exports = False
+#Streamed PDFs stop rendering after this many rows or pages (0 = no cap) and end with a truncation notice instead
+pdf_max_rows       = 5000
+pdf_max_pages      = 200
+
 ##Sequence config
-separator = '-'
\ No newline at end of file
+separator = '-'
+#Sequence values each container claims per DDB update. 1 keeps sequences gap-free;
+#larger blocks cut DDB writes for bulk imports and high-rate inserts but leave gaps when containers recycle.
+sequence_block_size = 1
\ No newline at end of file
@@ -0,0 +1,186 @@
+import hashlib
+import re
+import time
+
+import stark_core
+
+name = "STARK Athena Query"
+
+#Athena result types converted when reading typed rows; everything else stays a string
+result_converters = {
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': float,
+    'boolean': lambda value: value == 'true'
+}
+
+#Finished executions reused by this container, keyed by get_cache_key(): {key: (QueryExecutionId, expires)}
+query_cache = {}
+cache_sk    = "STARK|athena_cache"
+
+
+def whoami():
+    return name
+
+def normalize_query(query):
+    #Whitespace and a trailing semicolon do not change a query; letter case may (string literals), so it is kept
+    return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+def get_cache_key(query, database, data_version):
+    cache_source = f"{database}|{data_version}|{normalize_query(query)}"
+    return hashlib.sha256(cache_source.encode('utf-8')).hexdigest()
+
+def run_query(query, database, data_version = '', athena_handler = None, db_handler = None):
+    #Runs an Athena query and waits for it, polling with exponential backoff. Queries still running after
+    #   stark_core.athena_query_timeout seconds are cancelled.
+    #Succeeded executions are reused for stark_core.athena_cache_ttl seconds for the same (normalized) query and
+    #   data version, first from this container's cache, then from the cache record other containers left in DDB.
+    #Returns {'QueryExecutionId', 'State', 'StateChangeReason'}
+    if athena_handler == None:
+        athena_handler = stark_core.get_client('athena')
+
+    cache_key = get_cache_key(query, database, data_version)
+    if stark_core.athena_cache_ttl > 0:
+        query_execution_id = get_cached_execution(cache_key, db_handler)
+        if query_execution_id != None:
+            return {'QueryExecutionId': query_execution_id, 'State': 'SUCCEEDED', 'StateChangeReason': ''}
+
+    response = athena_handler.start_query_execution(
+        QueryString=query,
+        QueryExecutionContext={'Database': database},
+        ResultConfiguration={'OutputLocation': f"s3://{stark_core.analytics_athena_bucket_name}/result"}
+    )
+    query_execution = wait_for_query(response['QueryExecutionId'], athena_handler)
+
+    if query_execution['State'] == 'SUCCEEDED' and stark_core.athena_cache_ttl > 0:
+        save_cached_execution(cache_key, query_execution['QueryExecutionId'], db_handler)
+
+    return query_execution
+
+def wait_for_query(query_execution_id, athena_handler = None, timeout = None):
+    if athena_handler == None:
+        athena_handler = stark_core.get_client('athena')
+    if timeout == None:
+        timeout = stark_core.athena_query_timeout
+
+    deadline = time.monotonic() + timeout
+    delay    = 0.1
+    while True:
+        response = athena_handler.get_query_execution(QueryExecutionId=query_execution_id)
+        status   = response['QueryExecution']['Status']
+        if status['State'] in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
+            return {
+                'QueryExecutionId': query_execution_id,
+                'State': status['State'],
+                'StateChangeReason': status.get('StateChangeReason', '')
+            }
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            athena_handler.stop_query_execution(QueryExecutionId=query_execution_id)
+            return {
+                'QueryExecutionId': query_execution_id,
+                'State': 'CANCELLED',
+                'StateChangeReason': f"Query did not finish within {timeout} seconds and was cancelled"
+            }
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 2)
+
+def get_cached_execution(cache_key, db_handler = None):
+    now = time.time()
+    if cache_key in query_cache:
+        query_execution_id, expires = query_cache[cache_key]
+        if expires > now:
+            return query_execution_id
+        query_cache.pop(cache_key)
+
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    response = db_handler.get_item(
+        TableName=stark_core.ddb_table,
+        Key={'pk': {'S' : 'STARK|athena|' + cache_key}, 'sk': {'S' : cache_sk}}
+    )
+    item = response.get('Item')
+    if item == None or int(item['Expires']['N']) <= now:
+        return None
+
+    query_cache[cache_key] = (item['QueryExecutionId']['S'], int(item['Expires']['N']))
+    return item['QueryExecutionId']['S']
+
+def save_cached_execution(cache_key, query_execution_id, db_handler = None):
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    expires = int(time.time()) + stark_core.athena_cache_ttl
+    query_cache[cache_key] = (query_execution_id, expires)
+
+    item = {}
+    item['pk']               = {'S' : 'STARK|athena|' + cache_key}
+    item['sk']               = {'S' : cache_sk}
+    item['QueryExecutionId'] = {'S' : query_execution_id}
+    item['Expires']          = {'N' : str(expires)}
+    item['TTL']              = {'N' : str(expires)}
+    db_handler.put_item(TableName=stark_core.ddb_table, Item=item)
+
+def get_result_columns(query_execution_id, athena_handler = None):
+    if athena_handler == None:
+        athena_handler = stark_core.get_client('athena')
+
+    #Column info comes with every page, so a single row is enough
+    response = athena_handler.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+    columns = []
+    for column_info in response['ResultSet']['ResultSetMetadata']['ColumnInfo']:
+        columns.append({'column_name' : column_info['Name'], 'data_type' : column_info['Type']})
+    return columns
+
+def get_result_page(query_execution_id, page_size = 1000, next_token = None, typed = True, athena_handler = None):
+    #Returns (rows, next_token) for one page of a finished query's results; next_token is None after the last page.
+    #Rows are dicts keyed by column name. Typed rows convert numbers and booleans (nulls become None);
+    #   untyped rows keep Athena's text values (nulls become ''), which is what the CSV and PDF exports use.
+    if athena_handler == None:
+        athena_handler = stark_core.get_client('athena')
+
+    athena_arguments = {}
+    athena_arguments['QueryExecutionId'] = query_execution_id
+    athena_arguments['MaxResults']       = page_size
+    if next_token != None:
+        athena_arguments['NextToken'] = next_token
+    else:
+        #The first page starts with the header row
+        athena_arguments['MaxResults'] = min(page_size + 1, 1000)
+
+    response    = athena_handler.get_query_results(**athena_arguments)
+    columns     = response['ResultSet']['ResultSetMetadata']['ColumnInfo']
+    result_rows = response['ResultSet']['Rows']
+    if next_token == None:
+        result_rows = result_rows[1:]
+
+    rows = [convert_result_row(result_row, columns, typed) for result_row in result_rows]
+    return rows, response.get('NextToken')
+
+def iter_query_rows(query_execution_id, typed = True, athena_handler = None):
+    #Yields every result row of a finished query, one page (up to 1000 rows) in memory at a time
+    next_token = None
+    while True:
+        rows, next_token = get_result_page(query_execution_id, 1000, next_token, typed, athena_handler)
+        yield from rows
+        if next_token == None:
+            break
+
+def convert_result_row(result_row, columns, typed):
+    row = {}
+    for column, data in zip(columns, result_row['Data']):
+        value = data.get('VarCharValue')
+        if value == None:
+            value = None if typed else ''
+        elif typed and column['Type'] in result_converters:
+            value = result_converters[column['Type']](value)
+        row[column['Name']] = value
+    return row
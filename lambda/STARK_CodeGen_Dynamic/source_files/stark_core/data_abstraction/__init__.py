@@ -1,59 +1,76 @@
+import decimal
+import heapq
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
 import stark_core
-import boto3
 
-ddb    = boto3.client('dynamodb')
 name = "STARK Data Abstraction"
 
+#Sequence ranges claimed by this container, keyed by sequence pk (see get_sequence)
+sequence_blocks = {}
+sequence_lock   = threading.Lock()
+
 
 def whoami():
     return name
 
-def get_fields(fields, pk_field, sk):
+def get_fields(fields, pk_field, sk, db_handler = None, shard_count = 1):
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
 
     ddb_arguments = {}
-    next_token = 'initial'
     items = []
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
-    while next_token != None:
-        next_token = '' if next_token == 'initial' else next_token
-        ddb_arguments['TableName'] = stark_core.ddb_table
-        ddb_arguments['IndexName'] = "STARK-ListView-Index"
-        ddb_arguments['Limit'] = stark_core.page_limit
-        ddb_arguments['ReturnConsumedCapacity'] ='TOTAL'
-        ddb_arguments['FilterExpression'] = 'attribute_not_exists(#isDeleted)'
-        ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-        ddb_arguments['ExpressionAttributeValues'] = {
-            ':sk' : {'S' : sk}
-        }
-        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
-
-        if next_token != '':
-            ddb_arguments['ExclusiveStartKey']=next_token
+    ExpressionAttributeNamesDict = {}
 
-        response = ddb.query(**ddb_arguments)
-        raw = response.get('Items')
+    #Only read the requested columns; the pk field lives in the `pk` attribute.
+    #   STARK-ListView-sk is what results from several shards are merged by.
+    attributes = []
+    for field in fields:
+        attributes.append('pk' if field == pk_field else field)
+    attributes.append('STARK-ListView-sk')
+    projection_expression = compose_projection(attributes, ExpressionAttributeNamesDict)
 
-        for record in raw:
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['IndexName'] = "STARK-ListView-Index"
+    ddb_arguments['Limit'] = stark_core.page_limit
+    ddb_arguments['ReturnConsumedCapacity'] ='TOTAL'
+    ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
+    ddb_arguments['ProjectionExpression'] = projection_expression
+    ddb_arguments['ExpressionAttributeValues'] = {
+        ':sk' : {'S' : sk}
+    }
+    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
 
-            item = {}
-            for field in fields:
-                if field == pk_field:
-                    get_record = record.get('pk',{}).get('S','')
-                else:
-                    get_record = record.get(field,{}).get('S','')
+    for record in iter_list_view(ddb_arguments, sk, shard_count, db_handler):
+        item = {}
+        for field in fields:
+            if field == pk_field:
+                get_record = record.get('pk',{}).get('S','')
+            else:
+                get_record = record.get(field,{}).get('S','')
 
-                item[field] = get_record
-            items.append(item)
-        next_token = response.get('LastEvaluatedKey')
+            item[field] = get_record
+        items.append(item)
 
     return items
 
+def compose_projection(attributes, expression_attribute_names):
+    #Builds a ProjectionExpression for `attributes`, registering a placeholder for each one in `expression_attribute_names`.
+    #Placeholders are always used since column names can collide with DDB reserved words (e.g., "Date", "Name").
+    projection = []
+    for attribute in dict.fromkeys(attributes):
+        placeholder = f"#proj{len(projection)}"
+        expression_attribute_names[placeholder] = attribute
+        projection.append(placeholder)
+    return ", ".join(projection)
+
 
 def get_many_by_pk(pk, sk, db_handler = None):
     if db_handler == None:
-        db_handler = ddb
+        db_handler = stark_core.get_client('dynamodb')
 
     ddb_arguments = {}
     ddb_arguments['TableName'] = stark_core.ddb_table
@@ -71,128 +88,813 @@ def get_many_by_pk(pk, sk, db_handler = None):
     response = db_handler.query(**ddb_arguments).get('Items')
     return response
 
+def get_item_collection(pk, sk_prefix, db_handler = None):
+    #Items of `pk` whose sk starts with sk_prefix, keyed by sk. An entity record and its 1-M records share the pk and the
+    #   '<Entity>|' sk prefix, so a detail read gets all of them with one query instead of one query per relationship.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['Select'] = "ALL_ATTRIBUTES"
+    ddb_arguments['KeyConditionExpression'] = "#pk = :pk and begins_with(#sk, :skPrefix)"
+    ddb_arguments['ExpressionAttributeNames'] = {
+                                                '#pk' : 'pk',
+                                                '#sk' : 'sk'
+                                            }
+    ddb_arguments['ExpressionAttributeValues'] = {
+                                                ':pk'       : {'S' : pk },
+                                                ':skPrefix' : {'S' : sk_prefix }
+                                            }
+
+    items = {}
+    next_token = 'initial'
+    while next_token != None:
+        next_token = '' if next_token == 'initial' else next_token
+
+        if next_token != '':
+            ddb_arguments['ExclusiveStartKey']=next_token
+
+        response = db_handler.query(**ddb_arguments)
+        next_token = response.get('LastEvaluatedKey')
+        for item in response.get('Items'):
+            items[item['sk']['S']] = item
+
+    return items
+
+def get_many_by_pk_batch(keys, db_handler = None, max_workers = None):
+    #BatchGetItem counterpart of get_many_by_pk(), for fetching the 1-M records of a whole page of parents at once.
+    #   keys is a list of (pk, sk) tuples; returns {(pk, sk): raw record} for every record found.
+    #   Keys are requested in chunks of 100 (the BatchGetItem limit), optionally spread over a small thread pool.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+    if max_workers == None:
+        max_workers = stark_core.batch_get_max_workers
+
+    unique_keys = list(dict.fromkeys(keys))
+    chunks = []
+    for index in range(0, len(unique_keys), 100):
+        chunks.append(unique_keys[index:index + 100])
+
+    def fetch_chunk(chunk):
+        return batch_get_chunk(chunk, db_handler)
+
+    if max_workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch_chunk, chunks))
+    else:
+        results = [fetch_chunk(chunk) for chunk in chunks]
+
+    records = {}
+    for result in results:
+        for record in result:
+            records[(record['pk']['S'], record['sk']['S'])] = record
+
+    return records
+
+def batch_get_chunk(keys, db_handler, max_attempts = 8):
+    request_items = {
+        stark_core.ddb_table: {
+            'Keys': [{'pk': {'S' : pk}, 'sk': {'S' : sk}} for pk, sk in keys]
+        }
+    }
+
+    records = []
+    attempt = 0
+    while len(request_items) > 0:
+        response = db_handler.batch_get_item(RequestItems=request_items)
+        records.extend(response.get('Responses', {}).get(stark_core.ddb_table, []))
 
-def get_report_data(report_payload, object_expression_value, string_filter, is_aggregate_report, map_results_func):
+        #Throttled or oversized batches come back as UnprocessedKeys; retry just those with exponential backoff
+        request_items = response.get('UnprocessedKeys', {})
+        if len(request_items) > 0:
+            attempt += 1
+            if attempt >= max_attempts:
+                raise Exception(f"BatchGetItem still had unprocessed keys after {max_attempts} attempts")
+            time.sleep(min(0.05 * (2 ** attempt), 2))
+
+    return records
+
+
+def get_report_data(report_payload, object_expression_value, string_filter, is_aggregate_report, map_results_func, shard_count = 1):
     ##FIXME: pass map_results function for now, it will be refactored soon and will just process meta data of an entity so that
     #        it can be dynamically used.
-    next_token = 'initial'
     items = []
-    ddb_arguments = {}
     aggregated_results = {}
-    ExpressionAttributeNamesDict = {
-        '#isDeleted' : 'STARK-Is-Deleted',
-    }
-    temp_string_filter = "attribute_not_exists(#isDeleted) "
-    if string_filter != "":
-        temp_string_filter = temp_string_filter +'AND ' +string_filter
 
+    for item in iter_report_records(object_expression_value, string_filter, map_results_func, shard_count=shard_count):
+        if is_aggregate_report:
+            aggregate_key = report_payload['STARK_group_by_1']
+            aggregate_key_value = item.get(aggregate_key)
+            if aggregate_key_value in aggregated_results:
+                for field in report_payload['STARK_count_fields']:
+                    count_index_name = f"Count of {field}"
+                    aggregated_results[aggregate_key_value][count_index_name] += 1
+
+                for field in report_payload['STARK_sum_fields']:
+                    sum_index_name = f"Sum of {field}"
+                    sum_value = float(item.get(field))
+                    aggregated_results[aggregate_key_value][sum_index_name] = round(aggregated_results[aggregate_key_value][sum_index_name], 1) + sum_value
+
+                for column in report_payload['STARK_report_fields']:
+                    if column != aggregate_key:  
+                        aggregated_results[aggregate_key_value][column] = item.get(column.replace(" ","_"))
+
+            else:
+                temp_dict = { aggregate_key : aggregate_key_value}
+                for field in report_payload['STARK_count_fields']:
+                    count_index_name = f"Count of {field}"
+                    temp_dict.update({
+                        count_index_name:  1
+                    })
+
+                for field in report_payload['STARK_sum_fields']:
+                    sum_index_name = f"Sum of {field}"
+                    sum_value = float(item.get(field))
+                    temp_dict.update({
+                        sum_index_name: sum_value
+                    })
+
+                for column in report_payload['STARK_report_fields']:
+                    if column != aggregate_key:  
+                        temp_dict.update({
+                            column: item.get(column.replace(" ","_"))
+                        })
+
+                aggregated_results[aggregate_key_value] = temp_dict
+        else:
+            items.append(item)
+
+    return items, aggregated_results
+
+def iter_report_records(object_expression_value, string_filter, map_results_func, db_handler = None, shard_count = 1):
+    #Yields mapped records one DDB page at a time, so callers that stream their output never hold the full result set
+    #   (e.g., CSV exports through utilities.stream_csv_to_bucket)
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    ddb_arguments = {}
     ddb_arguments['TableName'] = stark_core.ddb_table
     ddb_arguments['IndexName'] = "STARK-ListView-Index"
     ddb_arguments['Select'] = "ALL_ATTRIBUTES"
     ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
     ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
-    ddb_arguments['FilterExpression'] = temp_string_filter
     ddb_arguments['ExpressionAttributeValues'] = object_expression_value
-    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
+    #Soft-deleted records live under their tombstone sk (see soft_delete), so only the report criteria need filtering
+    if string_filter != "":
+        ddb_arguments['FilterExpression'] = string_filter
+
+    sk = object_expression_value[':sk']['S']
+    for record in iter_list_view(ddb_arguments, sk, shard_count, db_handler):
+        yield map_results_func(record)
+
+def iter_changed_records(sk, changed_from, changed_to, map_results_func, db_handler = None, shard_count = 1):
+    #Yields (mapped record, change type, change timestamp) for every `sk` record created, edited or soft-deleted within
+    #   [changed_from, changed_to] (epoch seconds). Change type is 'delete' for soft-deleted records, else 'upsert'.
+    #   Soft-deleted records are read from their tombstone partition(s) of the index (see soft_delete).
+    #   Used by incremental analytics exports.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
 
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['IndexName'] = "STARK-ListView-Index"
+    ddb_arguments['Select'] = "ALL_ATTRIBUTES"
+    ddb_arguments['ReturnConsumedCapacity'] = 'TOTAL'
+    ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
+    ddb_arguments['FilterExpression'] = '#createdTs BETWEEN :from AND :to OR #updatedTs BETWEEN :from AND :to OR #deletedTs BETWEEN :from AND :to'
+    ddb_arguments['ExpressionAttributeNames'] = {
+        '#createdTs' : 'STARK-Created-TS',
+        '#updatedTs' : 'STARK-Updated-TS',
+        '#deletedTs' : 'STARK-Deleted-TS'
+    }
+    ddb_arguments['ExpressionAttributeValues'] = {
+        ':sk'   : {'S' : sk},
+        ':from' : {'N' : str(changed_from)},
+        ':to'   : {'N' : str(changed_to)}
+    }
+
+    for partition_sk in [sk, get_tombstone_sk(sk)]:
+        for record in iter_list_view(ddb_arguments, partition_sk, shard_count, db_handler):
+            change_ts = 0
+            for ts_field in ['STARK-Created-TS', 'STARK-Updated-TS', 'STARK-Deleted-TS']:
+                change_ts = max(change_ts, int(record.get(ts_field, {}).get('N', 0)))
+            #Records soft-deleted in place (before migrate_tombstones ran) still count as deletes
+            change_type = 'delete' if 'STARK-Is-Deleted' in record else 'upsert'
+            yield map_results_func(record), change_type, change_ts
+
+##List view shards
+#An entity with list_view_shards > 1 in the data model keeps its records under list_view_shards sort keys instead of one:
+#   `<sk>#0` to `<sk>#<list_view_shards - 1>`, picked from a stable hash of the record's pk. Each one is its own
+#   STARK-ListView-Index partition, so list view writes and reads of a busy entity are spread over several index partitions.
+#   Reads query every shard in parallel and merge the results in index order, as one partition would return them.
+#   The same goes for queries of the sort indexes (see get_sort_key_value), which share the sk partition key.
+shard_separator = '#'
+
+def get_shard_sk(sk, pk, shard_count = 1):
+    #crc32 rather than hash(), which is salted per process
+    if shard_count <= 1:
+        return sk
+    return f"{sk}{shard_separator}{zlib.crc32(pk.encode()) % shard_count}"
+
+def get_shard_sks(sk, shard_count = 1):
+    if shard_count <= 1:
+        return [sk]
+    return [f"{sk}{shard_separator}{shard}" for shard in range(shard_count)]
+
+def get_unsharded_sk(sk):
+    return sk.partition(shard_separator)[0]
+
+def get_shard_arguments(ddb_arguments, shard_sk):
+    #Copy of a STARK-ListView-Index query (KeyConditionExpression 'sk = :sk') for one shard
+    arguments = dict(ddb_arguments)
+    arguments['ExpressionAttributeValues'] = dict(ddb_arguments['ExpressionAttributeValues'])
+    arguments['ExpressionAttributeValues'][':sk'] = {'S' : shard_sk}
+    return arguments
+
+def get_index_sort_attribute(ddb_arguments):
+    #Sort key attribute of the index a query reads: STARK-ListView-Index is sorted by STARK-ListView-sk,
+    #   STARK-Sort-<n>-Index by STARK-Sort-<n>-sk
+    return ddb_arguments['IndexName'][:-len('-Index')] + '-sk'
+
+def get_list_view_key(record, sort_attribute = 'STARK-ListView-sk'):
+    #ExclusiveStartKey of an index query that resumes right after `record`
+    return {'pk' : record['pk'], 'sk' : record['sk'], sort_attribute : record[sort_attribute]}
+
+def iter_list_view(ddb_arguments, sk, shard_count = 1, db_handler = None):
+    #Yields every record of a STARK-ListView-Index (or sort index) query of `sk`, over all its shards, in index order.
+    #   Results are merged as they stream in: each shard reads one page ahead, so callers hold about a page per shard.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    shard_sks = get_shard_sks(sk, shard_count)
+    if len(shard_sks) == 1:
+        arguments  = get_shard_arguments(ddb_arguments, sk)
+        next_token = 'initial'
+        while next_token != None:
+            if next_token != 'initial':
+                arguments['ExclusiveStartKey'] = next_token
+            response   = db_handler.query(**arguments)
+            next_token = response.get('LastEvaluatedKey')
+            for record in response.get('Items'):
+                yield record
+        return
+
+    sort_attribute = get_index_sort_attribute(ddb_arguments)
+    descending     = ddb_arguments.get('ScanIndexForward', True) == False
+    with ThreadPoolExecutor(max_workers=min(len(shard_sks), stark_core.list_view_shard_max_workers)) as executor:
+        shards = [iter_query_prefetch(get_shard_arguments(ddb_arguments, shard_sk), db_handler, executor) for shard_sk in shard_sks]
+        for record in heapq.merge(*shards, key=lambda record: record[sort_attribute]['S'], reverse=descending):
+            yield record
+
+def iter_query_prefetch(ddb_arguments, db_handler, executor):
+    #Iterator over the records of every page of a query. The first page is requested right away (so all shards start
+    #   together) and every next page as soon as the previous one arrives.
+    def request(arguments):
+        return executor.submit(lambda: db_handler.query(**arguments))
+
+    def iter_records(arguments, pending):
+        while pending != None:
+            response = pending.result()
+            pending  = None
+            if response.get('LastEvaluatedKey') != None:
+                arguments = dict(arguments, ExclusiveStartKey=response['LastEvaluatedKey'])
+                pending   = request(arguments)
+            for record in response.get('Items'):
+                yield record
+
+    return iter_records(ddb_arguments, request(ddb_arguments))
+
+def iter_list_view_pages(ddb_arguments, sk, shard_count = 1, db_handler = None, page_size = None):
+    #iter_list_view(), in lists of up to page_size records (for callers that batch work per page)
+    if page_size == None:
+        page_size = stark_core.page_limit
+
+    page = []
+    for record in iter_list_view(ddb_arguments, sk, shard_count, db_handler):
+        page.append(record)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if len(page) > 0:
+        yield page
+
+def get_list_view_page(ddb_arguments, sk, shard_count = 1, lv_token = None, page_limit = None, db_handler = None):
+    #One page of a STARK-ListView-Index (or sort index) query of `sk`: returns (records, next token), the token being None after the last page.
+    #   Unsharded, the token is the query's LastEvaluatedKey. Sharded, every shard is queried in parallel for a page from where
+    #   it left off, the results are merged and cut at page_limit, and the token is composite: {'STARK-Shards': {shard sk: key}},
+    #   the key of each shard's last record on the page (None if none read yet), leaving out shards with nothing left.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+    if page_limit == None:
+        page_limit = stark_core.page_limit
+
+    shard_sks = get_shard_sks(sk, shard_count)
+    if len(shard_sks) == 1:
+        arguments = get_shard_arguments(ddb_arguments, sk)
+        arguments['Limit'] = page_limit
+        if lv_token != None:
+            arguments['ExclusiveStartKey'] = lv_token
+        response = db_handler.query(**arguments)
+        return response.get('Items'), response.get('LastEvaluatedKey')
+
+    if lv_token == None:
+        positions = {shard_sk: None for shard_sk in shard_sks}
+    else:
+        positions = lv_token['STARK-Shards']
+
+    def query_shard(shard_sk):
+        arguments = get_shard_arguments(ddb_arguments, shard_sk)
+        arguments['Limit'] = page_limit
+        if positions[shard_sk] != None:
+            arguments['ExclusiveStartKey'] = positions[shard_sk]
+        response = db_handler.query(**arguments)
+        return shard_sk, response.get('Items'), response.get('LastEvaluatedKey')
+
+    with ThreadPoolExecutor(max_workers=min(len(positions), stark_core.list_view_shard_max_workers)) as executor:
+        results = list(executor.map(query_shard, list(positions)))
+
+    #sorted() is stable (reverse too), so records with the same sort key keep their order within each shard
+    sort_attribute = get_index_sort_attribute(ddb_arguments)
+    descending     = ddb_arguments.get('ScanIndexForward', True) == False
+    merged = []
+    for shard_sk, records, last_key in results:
+        merged.extend((record, shard_sk) for record in records)
+    merged = sorted(merged, key=lambda entry: entry[0][sort_attribute]['S'], reverse=descending)[:page_limit]
+
+    next_positions = {}
+    for shard_sk, records, last_key in results:
+        read = [record for record, record_shard_sk in merged if record_shard_sk == shard_sk]
+        if len(read) == len(records) and last_key == None:
+            continue
+        next_positions[shard_sk] = get_list_view_key(read[-1], sort_attribute) if len(read) > 0 else positions[shard_sk]
+
+    next_token = None
+    if len(next_positions) > 0:
+        next_token = {'STARK-Shards': next_positions}
+    return [record for record, shard_sk in merged], next_token
+
+def reshard_records(sk, shard_count, db_handler = None):
+    #Moves the records of `sk` to the shard their pk maps to under shard_count shards (1 = unsharded), for entities whose
+    #   list_view_shards was changed after they had records. A one-time table scan; safe to run again.
+    #   Returns the number of records moved.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    moved = 0
+    for item in iter_sk_records(sk, db_handler):
+        shard_sk = get_shard_sk(sk, item['pk']['S'], shard_count)
+        if item['sk']['S'] != shard_sk:
+            move_record(item, shard_sk, db_handler)
+            moved += 1
+
+    return moved
+
+def iter_sk_records(sk, db_handler):
+    #Table scan for the records of `sk`, whichever shard they are in (tombstones excluded)
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['FilterExpression'] = '#sk = :sk OR begins_with(#sk, :shardPrefix)'
+    ddb_arguments['ExpressionAttributeNames'] = {
+        '#sk' : 'sk'
+    }
+    ddb_arguments['ExpressionAttributeValues'] = {
+        ':sk'          : {'S' : sk},
+        ':shardPrefix' : {'S' : sk + shard_separator}
+    }
+
+    next_token = 'initial'
     while next_token != None:
         next_token = '' if next_token == 'initial' else next_token
 
         if next_token != '':
             ddb_arguments['ExclusiveStartKey']=next_token
 
-        response = ddb.query(**ddb_arguments)
-        raw = response.get('Items')
+        response = db_handler.scan(**ddb_arguments)
         next_token = response.get('LastEvaluatedKey')
-        for record in raw:
-            item = map_results_func(record)
-            if is_aggregate_report:
-                aggregate_key = report_payload['STARK_group_by_1']
-                aggregate_key_value = item.get(aggregate_key)
-                if aggregate_key_value in aggregated_results:
-                    for field in report_payload['STARK_count_fields']:
-                        count_index_name = f"Count of {field}"
-                        aggregated_results[aggregate_key_value][count_index_name] += 1
-
-                    for field in report_payload['STARK_sum_fields']:
-                        sum_index_name = f"Sum of {field}"
-                        sum_value = float(item.get(field))
-                        aggregated_results[aggregate_key_value][sum_index_name] = round(aggregated_results[aggregate_key_value][sum_index_name], 1) + sum_value
-
-                    for column in report_payload['STARK_report_fields']:
-                        if column != aggregate_key:  
-                            aggregated_results[aggregate_key_value][column] = item.get(column.replace(" ","_"))
-
-                else:
-                    temp_dict = { aggregate_key : aggregate_key_value}
-                    for field in report_payload['STARK_count_fields']:
-                        count_index_name = f"Count of {field}"
-                        temp_dict.update({
-                            count_index_name:  1
-                        })
+        for item in response.get('Items'):
+            yield item
+
+##Sort indexes
+#Columns listed under `sortable` in an entity's data model get an index each: STARK-Sort-<n>-Index for its n-th sortable
+#   column, partitioned by sk like STARK-ListView-Index (so list view shards apply) and sorted by STARK-Sort-<n>-sk.
+#   That attribute holds the column value encoded so that string order is the column's order (see get_sort_key_value),
+#   which lets a list be read sorted by the column, and a report criterion on it be a key condition instead of a filter.
+#   Entities describe them in their sort_indexes config: {column: {'index', 'attribute', 'data_type'}}.
+sort_key_number_digits   = 24
+sort_key_number_decimals = 10
+
+#Report operators a sort index key condition can take, best first: the rank picks the index a report reads
+sort_key_operator_ranks = {'=': 0, 'between': 1, 'begins_with': 2, '<': 3, '<=': 3, '>': 3, '>=': 3}
+
+def get_sort_key_value(value, data_type):
+    #'0' for a blank value, so blanks come first and the record stays in the index; '1' + the value otherwise.
+    #   Numbers are fixed-width decimals after a sign digit, negatives written as their distance below 10^digits.
+    value = str(value).strip()
+    if value == '':
+        return '0'
+    if data_type in ['integer', 'float']:
+        number = decimal.Decimal(value)
+        number_format = f"0{sort_key_number_digits + sort_key_number_decimals + 1}.{sort_key_number_decimals}f"
+        if number < 0:
+            return '10' + format(number + 10 ** sort_key_number_digits, number_format)
+        return '11' + format(number, number_format)
+    return '1' + value
+
+def choose_sort_index(sort_indexes, criteria, sort_field = ''):
+    #Column whose sort index a read should query ('' for STARK-ListView-Index): the column to sort by if it has one,
+    #   else the one whose criterion ({'operator', 'value'}) narrows the read the most
+    if sort_field in sort_indexes:
+        return sort_field
+
+    index_field = ''
+    index_rank  = None
+    for field, sort_index in sort_indexes.items():
+        field_criteria = criteria.get(field, {})
+        if field_criteria.get('value', '') == '':
+            continue
+        rank = sort_key_operator_ranks.get(field_criteria.get('operator'))
+        if rank == None or (field_criteria['operator'] == 'begins_with' and sort_index['data_type'] in ['integer', 'float']):
+            continue
+        if index_rank == None or rank < index_rank:
+            index_field = field
+            index_rank  = rank
+    return index_field
+
+def compose_sort_key_condition(sort_index, criteria, expression_values, expression_names):
+    #KeyConditionExpression of a query of `sort_index` for its column's criterion ({'operator', 'value'}, or None to read
+    #   the whole partition in column order), adding what it uses to the expression values and names. The criterion stays
+    #   in FilterExpression too, which keeps its exact semantics (blank values, types) while the key condition narrows the read.
+    condition = 'sk = :sk'
+    if criteria == None or criteria.get('value', '') == '':
+        return condition
+
+    operator  = criteria['operator']
+    data_type = sort_index['data_type']
+    if operator in ['=', '<', '<=', '>', '>=']:
+        expression_values[':sortKey'] = {'S' : get_sort_key_value(criteria['value'], data_type)}
+        condition += f" AND #sortKey {operator} :sortKey"
+    elif operator == 'between':
+        from_value, to_value = criteria['value'].split(',')
+        expression_values[':sortKeyFrom'] = {'S' : get_sort_key_value(from_value, data_type)}
+        expression_values[':sortKeyTo']   = {'S' : get_sort_key_value(to_value, data_type)}
+        condition += " AND #sortKey BETWEEN :sortKeyFrom AND :sortKeyTo"
+    elif operator == 'begins_with' and data_type not in ['integer', 'float']:
+        expression_values[':sortKey'] = {'S' : get_sort_key_value(criteria['value'], data_type)}
+        condition += " AND begins_with(#sortKey, :sortKey)"
+    else:
+        return condition
+
+    expression_names['#sortKey'] = sort_index['attribute']
+    return condition
+
+def get_sort_keys(record, sort_indexes):
+    #Sort key attributes of a DDB item (see get_sort_key_value), from its column values
+    sort_keys = {}
+    for field, sort_index in sort_indexes.items():
+        value = record.get(field, {})
+        value = value.get('N', value.get('S', ''))
+        sort_keys[sort_index['attribute']] = {'S' : get_sort_key_value(value, sort_index['data_type'])}
+    return sort_keys
+
+def backfill_sort_keys(sk, sort_indexes, db_handler = None):
+    #Writes the sort key attributes of the records of `sk` that lack them or have stale ones, for entities whose sortable
+    #   columns changed after they had records. A one-time table scan; safe to run again.
+    #   Returns the number of records updated.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    updated = 0
+    for item in iter_sk_records(sk, db_handler):
+        sort_keys = get_sort_keys(item, sort_indexes)
+        if all(item.get(attribute) == value for attribute, value in sort_keys.items()):
+            continue
+
+        ExpressionAttributeNamesDict  = {}
+        ExpressionAttributeValuesDict = {}
+        assignments = []
+        for number, (attribute, value) in enumerate(sort_keys.items()):
+            ExpressionAttributeNamesDict[f"#sortKey{number}"]  = attribute
+            ExpressionAttributeValuesDict[f":sortKey{number}"] = value
+            assignments.append(f"#sortKey{number} = :sortKey{number}")
+
+        ddb_arguments = {}
+        ddb_arguments['TableName'] = stark_core.ddb_table
+        ddb_arguments['Key'] = {'pk' : item['pk'], 'sk' : item['sk']}
+        ddb_arguments['UpdateExpression'] = "SET " + ", ".join(assignments)
+        ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
+        ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
+        db_handler.update_item(**ddb_arguments)
+        updated += 1
+
+    return updated
+
+def get_tombstone_sk(sk):
+    return stark_core.tombstone_sk_prefix + sk
+
+def soft_delete(pk, sk, deleted_metadata, db_handler = None):
+    #Soft-deletes a record by moving it to its tombstone sort key: the tombstone keeps the record's attributes (and its
+    #   STARK-ListView-sk), but falls in its own STARK-ListView-Index partition, so list, lookup and report reads of `sk`
+    #   never read it and need no filter for it. TTL removes it after stark_core.TTL_for_deleted_records_in_days.
+    #   deleted_metadata holds the values from utilities.append_record_metadata('delete', user).
+    #   A tombstone key, rather than removing STARK-ListView-sk in place, also keeps the record out of get_by_pk and the sort
+    #   indexes, and lets incremental analytics exports find deletes with a query of the tombstone partition.
+    #Returns False if there is no such record.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
 
-                    for field in report_payload['STARK_sum_fields']:
-                        sum_index_name = f"Sum of {field}"
-                        sum_value = float(item.get(field))
-                        temp_dict.update({
-                            sum_index_name: sum_value
-                        })
+    key = {
+        'pk' : {'S' : pk},
+        'sk' : {'S' : sk}
+    }
+    response = db_handler.get_item(TableName=stark_core.ddb_table, Key=key, ConsistentRead=True)
+    item = response.get('Item')
+    if item == None:
+        return False
+
+    item['STARK-Deleted-By'] = deleted_metadata[':STARKDeletedBy']
+    item['STARK-Deleted-TS'] = deleted_metadata[':STARKDeletedTS']
+    item['STARK-Is-Deleted'] = deleted_metadata[':STARKIsDeleted']
+    item['TTL']              = deleted_metadata[':ttl']
+    move_to_tombstone(item, db_handler)
+    return True
+
+def move_to_tombstone(item, db_handler):
+    move_record(item, get_tombstone_sk(item['sk']['S']), db_handler)
+
+def move_record(item, new_sk, db_handler):
+    #The copy and the delete are one transaction, so the record is never left both where it was and where it moved to.
+    #   Surge protection's write_recorder queues them, and a transaction_recorder adds them to its own transaction.
+    moved_item = dict(item)
+    moved_item['sk'] = {'S' : new_sk}
+    actions = [
+        {'Put': {'TableName': stark_core.ddb_table, 'Item': moved_item}},
+        {'Delete': {'TableName': stark_core.ddb_table, 'Key': {'pk' : item['pk'], 'sk' : item['sk']}}}
+    ]
+    apply_transaction(actions, db_handler)
+
+def migrate_tombstones(db_handler = None):
+    #Moves records soft-deleted in place (flagged STARK-Is-Deleted at their original key, as deletes did before
+    #   tombstone keys) to their tombstone key, taking them out of the list partitions of STARK-ListView-Index.
+    #   A one-time table scan; safe to run again. Returns the number of records moved.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
 
-                    for column in report_payload['STARK_report_fields']:
-                        if column != aggregate_key:  
-                            temp_dict.update({
-                                column: item.get(column.replace(" ","_"))
-                            })
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['FilterExpression'] = 'attribute_exists(#isDeleted) AND NOT begins_with(#sk, :tombstonePrefix)'
+    ddb_arguments['ExpressionAttributeNames'] = {
+        '#isDeleted' : 'STARK-Is-Deleted',
+        '#sk'        : 'sk'
+    }
+    ddb_arguments['ExpressionAttributeValues'] = {
+        ':tombstonePrefix' : {'S' : stark_core.tombstone_sk_prefix}
+    }
 
-                    aggregated_results[aggregate_key_value] = temp_dict
-            else:
-                items.append(item)
+    moved = 0
+    next_token = 'initial'
+    while next_token != None:
+        next_token = '' if next_token == 'initial' else next_token
 
-    return items, aggregated_results
+        if next_token != '':
+            ddb_arguments['ExclusiveStartKey']=next_token
+
+        response = db_handler.scan(**ddb_arguments)
+        next_token = response.get('LastEvaluatedKey')
+        for item in response.get('Items'):
+            move_to_tombstone(item, db_handler)
+            moved += 1
+
+    return moved
+
+##PK changes
+#A DDB key can't be updated, so a record changes pk by being added under the new pk and deleted under the old one, and the
+#   records that point to it through a has_one relationship need their foreign key changed too. Entities record all of
+#   those writes on a transaction_recorder and hand them to apply_transaction(), which applies them as TransactWriteItems.
+class transaction_recorder:
+    #Stands in for the DDB client passed as db_handler to entity add/edit/delete while the writes of a PK change are collected.
+    #   Reads go straight to DDB; writes are only recorded, as TransactWriteItems actions, in the order they were made.
+    def __init__(self, db_handler = None):
+        if db_handler == None:
+            db_handler = stark_core.get_client('dynamodb')
+        self.db_handler = db_handler
+        self.actions    = []
+
+    def __getattr__(self, attribute):
+        return getattr(self.db_handler, attribute)
+
+    def record(self, action, ddb_arguments):
+        #TransactWriteItems actions take no ReturnValues or ReturnConsumedCapacity of their own
+        arguments = {}
+        for argument, value in ddb_arguments.items():
+            if argument not in ['ReturnValues', 'ReturnConsumedCapacity']:
+                arguments[argument] = value
+        self.actions.append({action: arguments})
+
+    def put_item(self, **ddb_arguments):
+        self.record('Put', ddb_arguments)
+        return {}
+
+    def delete_item(self, **ddb_arguments):
+        self.record('Delete', ddb_arguments)
+        return {}
+
+    def update_item(self, **ddb_arguments):
+        self.record('Update', ddb_arguments)
+        return {'Attributes': {}}
+
+def iter_foreign_key_records(sk, attribute, value, sort_indexes = {}, shard_count = 1, db_handler = None):
+    #Yields the keys (pk and sk) of the records of `sk` whose foreign key `attribute` is value. A key condition on the
+    #   attribute's sort index finds them (a has_one relationship column made sortable has one); an attribute without one
+    #   falls back to a filtered read of the whole list view partition.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
 
+    ExpressionAttributeNamesDict  = {}
+    ExpressionAttributeValuesDict = {':sk' : {'S' : sk}}
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    sort_index = sort_indexes.get(attribute)
+    if sort_index != None:
+        ddb_arguments['IndexName'] = sort_index['index']
+        ddb_arguments['KeyConditionExpression'] = compose_sort_key_condition(sort_index, {'operator': '=', 'value': value}, ExpressionAttributeValuesDict, ExpressionAttributeNamesDict)
+    else:
+        ddb_arguments['IndexName'] = "STARK-ListView-Index"
+        ddb_arguments['KeyConditionExpression'] = 'sk = :sk'
+        ddb_arguments['FilterExpression'] = '#foreignKey = :foreignKey'
+        ExpressionAttributeNamesDict['#foreignKey']   = attribute
+        ExpressionAttributeValuesDict[':foreignKey'] = {'S' : value}
+    #The index sort key is what results from several shards are merged by
+    ddb_arguments['ProjectionExpression'] = compose_projection(['pk', 'sk', get_index_sort_attribute(ddb_arguments)], ExpressionAttributeNamesDict)
+    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
+    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
+
+    for record in iter_list_view(ddb_arguments, sk, shard_count, db_handler):
+        yield {'pk' : record['pk'], 'sk' : record['sk']}
+
+def get_foreign_key_update(key, attribute, value, sort_indexes = {}, updated_metadata = {}):
+    #UpdateItem arguments that set the foreign key `attribute` of the record at `key` to value, along with its sort key if
+    #   it has a sort index. updated_metadata holds the values from utilities.append_record_metadata('edit', user).
+    #   The condition keeps a record deleted since its key was read from being recreated as a bare foreign key.
+    UpdateExpressionString = "SET #foreignKey = :foreignKey"
+    ExpressionAttributeNamesDict  = {'#foreignKey' : attribute}
+    ExpressionAttributeValuesDict = {':foreignKey' : {'S' : value}}
+    if attribute in sort_indexes:
+        UpdateExpressionString += ", #sortKey = :sortKey"
+        ExpressionAttributeNamesDict['#sortKey']  = sort_indexes[attribute]['attribute']
+        ExpressionAttributeValuesDict[':sortKey'] = {'S' : get_sort_key_value(value, sort_indexes[attribute]['data_type'])}
+    if len(updated_metadata) > 0:
+        UpdateExpressionString += ", #STARKUpdatedBy = :STARKUpdatedBy, #STARKUpdatedTs = :STARKUpdatedTS"
+        ExpressionAttributeNamesDict['#STARKUpdatedBy'] = 'STARK-Updated-By'
+        ExpressionAttributeNamesDict['#STARKUpdatedTs'] = 'STARK-Updated-TS'
+        ExpressionAttributeValuesDict.update(updated_metadata)
+
+    ddb_arguments = {}
+    ddb_arguments['TableName'] = stark_core.ddb_table
+    ddb_arguments['Key'] = key
+    ddb_arguments['UpdateExpression'] = UpdateExpressionString
+    ddb_arguments['ConditionExpression'] = 'attribute_exists(pk)'
+    ddb_arguments['ExpressionAttributeNames'] = ExpressionAttributeNamesDict
+    ddb_arguments['ExpressionAttributeValues'] = ExpressionAttributeValuesDict
+    return ddb_arguments
+
+def apply_transaction(actions, db_handler = None, max_actions = None, max_workers = None):
+    #Applies the writes recorded by a transaction_recorder. Returns the number of them applied.
+    #   Up to max_actions writes (the TransactWriteItems limit) are one transaction: all of them are applied, or none.
+    #   A larger change, with more children than that, applies its first max_actions writes as one transaction (the rename,
+    #   which is recorded first, and the first children), then the remaining child updates in transactions of up to
+    #   max_actions each, in parallel. A child deleted in the meantime is skipped: the first transaction is retried without
+    #   it, and any other chunk it is in goes to one-by-one updates. Progress is logged after every chunk.
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+    if max_actions == None:
+        max_actions = stark_core.transact_write_max_actions
+    if max_workers == None:
+        max_workers = stark_core.transact_write_max_workers
+
+    if len(actions) == 0:
+        return 0
+
+    if isinstance(db_handler, transaction_recorder):
+        #Recorded as part of a larger change (e.g., a soft delete within a PK change), and applied with it
+        db_handler.actions.extend(actions)
+        return len(actions)
+
+    import stark_core.write_queue as write_queue
+    if isinstance(db_handler, write_queue.write_recorder):
+        #Surge protection: the writes are queued like any other, and STARK_Write_Consumer applies them in order, one batch at a time
+        for action in actions:
+            apply_action(action, db_handler)
+        return len(actions)
+
+    first_chunk = actions[:max_actions]
+    while len(first_chunk) > 0:
+        try:
+            db_handler.transact_write_items(TransactItems=first_chunk)
+            break
+        except db_handler.exceptions.TransactionCanceledException as error:
+            #A child deleted since its key was read fails its condition, which cancels the rename along with it: retry
+            #   without the child updates whose condition failed. Any other cancellation (e.g., a conflicting write) is raised.
+            reasons = error.response.get('CancellationReasons', [])
+            failed  = [index for index, reason in enumerate(reasons) if reason.get('Code', 'None') != 'None']
+            if len(failed) == 0 or any(reasons[index]['Code'] != 'ConditionalCheckFailed' or 'Update' not in first_chunk[index] for index in failed):
+                raise
+            first_chunk = [action for index, action in enumerate(first_chunk) if index not in failed]
+    applied = len(first_chunk)
+    if max_actions >= len(actions):
+        return applied
+    stark_core.log.info("Transaction chunk applied", applied=applied, total=len(actions))
+
+    chunks = []
+    for index in range(max_actions, len(actions), max_actions):
+        chunks.append(actions[index:index + max_actions])
+
+    def apply_chunk(chunk):
+        try:
+            db_handler.transact_write_items(TransactItems=chunk)
+            return len(chunk)
+        except db_handler.exceptions.TransactionCanceledException:
+            return sum(apply_action(action, db_handler) for action in chunk)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), max_workers))) as executor:
+        for count in executor.map(apply_chunk, chunks):
+            applied += count
+            stark_core.log.info("Transaction chunk applied", applied=applied, total=len(actions))
+
+    return applied
+
+def apply_action(action, db_handler):
+    #One TransactWriteItems action as a plain write. Returns 1, or 0 if its condition failed.
+    action_type, ddb_arguments = list(action.items())[0]
+    write = {'Put': db_handler.put_item, 'Delete': db_handler.delete_item, 'Update': db_handler.update_item}[action_type]
+    try:
+        write(**ddb_arguments)
+    except db_handler.exceptions.ConditionalCheckFailedException:
+        return 0
+    return 1
+
+
+def get_sequence(pk, db_handler = None, block_size = None):
+    #Hands out the next value of an entity's sequence.
+    #   The counter is claimed with a single atomic ADD, so concurrent adds never get the same number.
+    #   With block_size > 1, a warm container claims a whole range in one update and hands it out locally,
+    #   at the cost of gaps in the sequence for values left unused when the container is recycled.
+    if block_size == None:
+        block_size = stark_core.sequence_block_size
+
+    with sequence_lock:
+        block = sequence_blocks.get(pk)
+        if block == None or block['next'] >= block['end']:
+            block = reserve_sequence_block(pk, block_size, db_handler)
+            sequence_blocks[pk] = block
+
+        counter = block['next']
+        block['next'] += 1
+
+    sequence = block['Prefix'] + str(counter).rjust(block['Left_Pad'], '0')
+
+    return sequence
 
-def get_sequence(pk, db_handler = None):
+def reserve_sequence_block(pk, block_size, db_handler = None):
     if db_handler == None:
-        db_handler = ddb
+        db_handler = stark_core.get_client('dynamodb')
 
     sk = 'STARK|sequence'
 
     ddb_arguments = {}
     ddb_arguments['TableName'] = stark_core.ddb_table
-    ddb_arguments['Select'] = "ALL_ATTRIBUTES"
-    ddb_arguments['KeyConditionExpression'] = "#pk = :pk and #sk = :sk"
+    ddb_arguments['Key'] = {
+            'pk' : {'S' : pk},
+            'sk' : {'S' : sk}
+        }
+    #ALL_NEW instead of UPDATED_NEW so Prefix and Left_Pad come back in the same round trip
+    ddb_arguments['ReturnValues'] = 'ALL_NEW'
+    ddb_arguments['UpdateExpression'] = "ADD #Current_Counter :block_size"
+    ddb_arguments['ConditionExpression'] = "attribute_exists(#Current_Counter)"
     ddb_arguments['ExpressionAttributeNames'] = {
-                                                '#pk' : 'pk',
-                                                '#sk' : 'sk'
-                                            }
+        '#Current_Counter' : 'Current_Counter',
+    }
     ddb_arguments['ExpressionAttributeValues'] = {
-                                                ':pk' : {'S' : pk },
-                                                ':sk' : {'S' : sk }
-                                            }
-    response = db_handler.query(**ddb_arguments)
-    raw = response.get('Items')
-
-    response = {}
-    record = raw[0]
-
-    item = {}
-    item['Current_Counter'] = record.get('Current_Counter',{}).get('N','')
-    item['Left_Pad'] = record.get('Left_Pad',{}).get('S','')
-    item['Prefix'] = record.get('Prefix',{}).get('S','')
-    
-    response['item'] = item
-
-    sequence = item['Prefix'] + item['Current_Counter'].rjust(int(item['Left_Pad']), '0')
+        ':block_size' : {'N' : str(block_size) },
+    }
+    response = db_handler.update_item(**ddb_arguments)
+    record = response.get('Attributes')
 
-    edit_sequence(pk, sk, item['Current_Counter'])
+    #Current_Counter always holds the next value to hand out, so our block is the range just skipped over
+    end = int(record.get('Current_Counter',{}).get('N',''))
+    block = {}
+    block['next'] = end - block_size
+    block['end'] = end
+    block['Prefix'] = record.get('Prefix',{}).get('S','')
+    block['Left_Pad'] = int(record.get('Left_Pad',{}).get('S',''))
 
     global resp_obj
     resp_obj = response
-    return sequence
+    return block
 
 def edit_sequence(pk, sk, Current_Counter, db_handler = None):
     if db_handler == None:
-        db_handler = ddb
+        db_handler = stark_core.get_client('dynamodb')
         
     updated_counter = int(Current_Counter) + 1
     
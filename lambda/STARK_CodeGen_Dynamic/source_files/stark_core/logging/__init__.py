@@ -1,16 +1,125 @@
+#Python Standard Library
+import functools
+import json
+import random
+import sys
+import time
+import uuid
+
+import stark_core
+
 name = "STARK Logging"
 
+#Structured logging for STARK Lambdas: every record is one line of JSON (level, message, request id, extra fields),
+#   which CloudWatch Logs Insights can filter and aggregate without parsing free text.
+#   Inside a handler wrapped with @stark_core.log.handler, records are buffered and written with a single write
+#   when the invocation ends (or early, every stark_core.log_buffer_max_records records), instead of one print per line.
+#   Outside of one (imports, tests, scripts), records are written right away.
+levels = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+#State of the invocation being handled by this container
+invocation = {
+    "active": False,
+    "request_id": "",
+    "api_request_id": "",
+    "sampled": False,
+    "records": []
+}
+
 def whoami():
     return name
 
+def start(event=None, context=None):
+    #Begins an invocation: new correlation id, new sampling decision, empty buffer.
+    #   The id is the Lambda request id, so records line up with the platform's START/END/REPORT lines;
+    #   the API Gateway request id is added when there is one, to match the API access logs.
+    flush()
+    request_id = getattr(context, "aws_request_id", None) or str(uuid.uuid4())
+    api_request_id = ""
+    if isinstance(event, dict):
+        api_request_id = (event.get("requestContext") or {}).get("requestId", "")
+    invocation["active"]         = True
+    invocation["request_id"]     = request_id
+    invocation["api_request_id"] = api_request_id
+    invocation["sampled"]        = random.random() < stark_core.log_debug_sample_rate
+
+def end():
+    flush()
+    invocation["active"]         = False
+    invocation["request_id"]     = ""
+    invocation["api_request_id"] = ""
+
+def get_request_id():
+    return invocation["request_id"]
+
+def is_enabled(level):
+    if levels[level] >= levels.get(str(stark_core.log_level).upper(), levels["INFO"]):
+        return True
+    #Sampled invocations log everything, so a small share of traffic still shows full DEBUG detail
+    return invocation["active"] and invocation["sampled"]
+
+def write(level, message, **fields):
+    if not is_enabled(level):
+        return
+
+    record = {
+        "timestamp": int(time.time() * 1000),
+        "level": level,
+        "message": message,
+    }
+    if invocation["request_id"] != "":
+        record["request_id"] = invocation["request_id"]
+    if invocation["api_request_id"] != "":
+        record["api_request_id"] = invocation["api_request_id"]
+    record.update(fields)
+
+    line = json.dumps(record, default=str)
+    if invocation["active"]:
+        invocation["records"].append(line)
+        if len(invocation["records"]) >= stark_core.log_buffer_max_records:
+            flush()
+    else:
+        sys.stdout.write(line + "\n")
+
+def flush():
+    records = invocation["records"]
+    if len(records) > 0:
+        invocation["records"] = []
+        sys.stdout.write("\n".join(records) + "\n")
+        sys.stdout.flush()
+
+def debug(message, **fields):
+    write("DEBUG", message, **fields)
+
+def info(message, **fields):
+    write("INFO", message, **fields)
+
+def warning(message, **fields):
+    write("WARNING", message, **fields)
+
+def error(message, **fields):
+    write("ERROR", message, **fields)
+
 def event(event):
     #log the event payload of function
-    print("**EVENT LOG START**")
-    print(event)
-    print("**EVENT LOG END**")
-    pass
+    #Full payloads carry request bodies and cookies, so they are DEBUG records: off by default, and sampled
+    debug("Event payload", event=event)
 
 def msg(msg, ):
     #log a custom message
-    print(msg)
-    pass
\ No newline at end of file
+    info(str(msg))
+
+def handler(lambda_handler):
+    #Decorator for a Lambda handler: starts the invocation's log buffer and writes it once when the handler returns,
+    #   logging unhandled exceptions on the way out so they carry the request id too
+    @functools.wraps(lambda_handler)
+    def wrapper(event, context):
+        start(event, context)
+        try:
+            return lambda_handler(event, context)
+        except Exception as exception:
+            error("Unhandled exception", exception=repr(exception))
+            raise
+        finally:
+            end()
+    return wrapper
@@ -1,16 +1,66 @@
+import time
+from collections import OrderedDict
+
 import stark_core
 
 name = "STARK Security"
 authFailCode = 400
 authFailResponse = []
 
+#Per-container permission cache
+#   Warm Lambda containers reuse module globals, so we keep the parsed permission set of recently seen users here
+#   to skip the `STARK|user|permissions` query on every API call. Entries expire after `permission_cache_ttl` seconds
+#   and the least recently used user is evicted once `permission_cache_max_users` is reached.
+#   NOTE: invalidation only reaches the container that performed the write; other warm containers rely on the TTL.
+permission_cache       = OrderedDict()
+permission_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'backend_reads': 0}
+
 def whoami():
     return name
 
 
 def is_authorized(permission_required, event, ddb):
     username = event['requestContext']['authorizer']['lambda']['Username']
-    
+
+    permissions = get_event_permissions(event, ddb)
+    if permission_required in permissions:
+        return True
+
+    global authFailResponse, authFailCode
+    authFailResponse = [authFailCode, f"Could not find {permission_required} for {username}"]
+    return False
+
+def check_permissions(permissions_required, event, ddb):
+    #Batch version of is_authorized(): answers a whole list of permissions from a single permission set lookup.
+    #Also returns how many backend (DDB) reads that took, which is 0 when served by the authorizer context or the cache.
+    backend_reads = permission_cache_stats['backend_reads']
+    permissions   = get_event_permissions(event, ddb)
+    backend_reads = permission_cache_stats['backend_reads'] - backend_reads
+
+    results = {}
+    for permission_required in permissions_required:
+        results[permission_required] = permission_required in permissions
+
+    return results, backend_reads
+
+def get_event_permissions(event, ddb):
+    #The default authorizer resolves the user's permissions and passes them along in its `context`.
+    #Only fall back to reading them ourselves when that context is missing (e.g., older authorizer, direct invocation).
+    authorizer_context = event['requestContext']['authorizer']['lambda']
+    encoded_permissions = authorizer_context.get('Permissions')
+    if encoded_permissions is not None:
+        return decode_permissions(encoded_permissions)
+
+    return get_user_permissions(authorizer_context['Username'], ddb)
+
+def get_user_permissions(username, ddb, use_cache=True):
+    #use_cache=False always reads DDB (and leaves the cache alone), for callers whose result is cached elsewhere, like the authorizer
+    use_cache = use_cache and stark_core.permission_cache_ttl > 0
+    if use_cache:
+        permissions = get_cached_permissions(username)
+        if permissions is not None:
+            return permissions
+
     response = ddb.query(
         TableName=stark_core.ddb_table,
         Select='ALL_ATTRIBUTES',
@@ -25,18 +75,84 @@ def is_authorized(permission_required, event, ddb):
         }
     )
 
+    permission_cache_stats['backend_reads'] += 1
     raw = response.get('Items')
 
     permissions_string = ''
     for record in raw:
         permissions_string = record['Permissions']['S']
 
-    if permissions_string != '':
-        #Parse permissions_string to check if permission_required exists in it
-        permissions_list = permissions_string.split(", ")
-        if permission_required in permissions_list:
-            return True
+    permissions = parse_permissions(permissions_string)
 
-    global authFailResponse, authFailCode
-    authFailResponse = [authFailCode, f"Could not find {permission_required} for {username}"]
-    return False
+    if use_cache:
+        cache_permissions(username, permissions)
+
+    return permissions
+
+def parse_permissions(permissions_string):
+    #Permissions are stored as a single string delimited by comma+space (", ")
+    if permissions_string == '':
+        return frozenset()
+    return frozenset(permissions_string.split(", "))
+
+def encode_permissions(permissions):
+    #Compact form for the authorizer context: permissions are grouped by module so the shared prefix is sent once,
+    #   e.g., {"Customer|Add", "Customer|View", "Item|View"} -> "Customer|Add,View;Item|View"
+    grouped = {}
+    for permission in sorted(permissions):
+        module, _, action = permission.rpartition('|')
+        grouped.setdefault(module, []).append(action)
+
+    encoded = []
+    for module, actions in grouped.items():
+        if module == '':
+            encoded.append(",".join(actions))
+        else:
+            encoded.append(module + "|" + ",".join(actions))
+    return ";".join(encoded)
+
+def decode_permissions(encoded_permissions):
+    permissions = set()
+    if encoded_permissions == '':
+        return frozenset()
+    for group in encoded_permissions.split(";"):
+        module, separator, actions = group.rpartition('|')
+        for action in actions.split(","):
+            permissions.add(module + separator + action)
+    return frozenset(permissions)
+
+def get_cached_permissions(username):
+    entry = permission_cache.get(username)
+    if entry is None:
+        permission_cache_stats['misses'] += 1
+        return None
+
+    permissions, expires_at = entry
+    if time.monotonic() >= expires_at:
+        del permission_cache[username]
+        permission_cache_stats['misses'] += 1
+        return None
+
+    permission_cache.move_to_end(username)
+    permission_cache_stats['hits'] += 1
+    return permissions
+
+def cache_permissions(username, permissions):
+    permission_cache[username] = (permissions, time.monotonic() + stark_core.permission_cache_ttl)
+    permission_cache.move_to_end(username)
+    while len(permission_cache) > stark_core.permission_cache_max_users:
+        permission_cache.popitem(last=False)
+        permission_cache_stats['evictions'] += 1
+
+def invalidate_permission_cache(username=None):
+    #Pass a username to drop a single user, or nothing to flush the whole cache
+    if username is None:
+        permission_cache.clear()
+    else:
+        permission_cache.pop(username, None)
+    permission_cache_stats['invalidations'] += 1
+
+def get_permission_cache_stats():
+    stats = dict(permission_cache_stats)
+    stats['size'] = len(permission_cache)
+    return stats
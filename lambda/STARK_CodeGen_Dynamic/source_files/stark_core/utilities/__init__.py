@@ -1,19 +1,29 @@
 import math
+import operator
 import uuid
-import boto3
 from datetime import datetime
+from functools import lru_cache
 import time
 
-from io import StringIO
-from fpdf import FPDF
-import csv
+import itertools
 
 import stark_core
-s3     = boto3.client("s3")
-s3_res = boto3.resource('s3')
+
+#csv, io and fpdf are only needed for report exports; they are imported by the functions that use them,
+#   so CRUD-only cold starts do not pay for them (fpdf in particular).
 
 name = "STARK Utilities"
 
+#Comparison operators supported in 1-M report criteria (see compile_criteria_for_many_fields)
+compare_operators = {
+    '='  : operator.eq,
+    '<>' : operator.ne,
+    '<'  : operator.lt,
+    '<=' : operator.le,
+    '>'  : operator.gt,
+    '>=' : operator.ge,
+}
+
 def compose_report_operators_and_parameters(key, data, metadata):
     composed_filter_dict = {"filter_string":"","expression_values": {}}
     if data['operator'] == "IN":
@@ -73,63 +83,48 @@ def compose_report_operators_and_parameters(key, data, metadata):
     return composed_filter_dict
 
 def filter_criteria_for_many_fields(str_value, criteria):
+    return compile_criteria_for_many_fields(criteria)(str_value)
+
+def compile_criteria_for_many_fields(criteria):
+    #Turns a 1-M report criterion into a predicate that takes the child row value (a string) and returns True if it matches.
+    #The criterion value is converted once here, so evaluating a row only converts the row value itself.
+    #Compile once per report, then call the predicate per child row (see report() of the entity modules).
+    criteria_operator = criteria['operator']
+    convert_value     = get_data_type_converter(criteria['data_type'])
+
+    if criteria_operator in compare_operators:
+        compare        = compare_operators[criteria_operator]
+        criteria_value = convert_value(criteria['value'])
+        def is_match(str_value):
+            return str_value != "" and compare(convert_value(str_value), criteria_value)
+
+    elif criteria_operator == 'contains':
+        criteria_value = convert_value(criteria['value'])
+        def is_match(str_value):
+            return str_value != "" and criteria_value in convert_value(str_value)
+
+    elif criteria_operator == 'IN':
+        criteria_values = frozenset(value.strip() for value in criteria['value'].split(','))
+        def is_match(str_value):
+            return str_value != "" and str(str_value) in criteria_values
+
+    elif criteria_operator == 'begins_with':
+        criteria_value = criteria['value']
+        def is_match(str_value):
+            return str_value != "" and str(str_value).startswith(criteria_value)
+
+    elif criteria_operator == 'between':
+        between_values = criteria['value'].split(',')
+        first_value    = convert_value(str(between_values[0]).strip())
+        second_value   = convert_value(str(between_values[1]).strip())
+        def is_match(str_value):
+            return str_value != "" and first_value <= convert_value(str_value) <= second_value
 
-    if criteria['operator'] not in ['IN', 'between']:
-        criteria_value = convert_value_data_type(criteria['value'], criteria['data_type'])
-        compare_value = convert_value_data_type(str_value, criteria['data_type'])
-
-    is_data_included = False
-
-    if str_value != "":
-        if criteria['operator'] == '=':
-            if compare_value == criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == '<>':
-            if compare_value != criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == '<':
-            if  compare_value < criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == '<=':
-            if compare_value <= criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == '>':
-            if compare_value > criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == '>=':
-            if compare_value >= criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == 'contains':
-            if  criteria_value in compare_value:
-                is_data_included = True
-
-        elif criteria['operator'] == 'IN':
-            if str(str_value) != "" and str(str_value) in criteria_value:
-                is_data_included = True
-
-        elif criteria['operator'] == 'begins_with':
-            if str(str_value).startswith(criteria['value']):
-                is_data_included = True
-
-        elif criteria['operator'] == 'between':
-            between_values = criteria['value'].split(',')
-            first_value = str(between_values[0]).strip()
-            second_value = str(between_values[1]).strip()
-            
-            converted_first_value   = convert_value_data_type(first_value, criteria['data_type'])
-            converted_second_value  = convert_value_data_type(second_value, criteria['data_type'])
-            converted_compare_value = convert_value_data_type(str_value, criteria['data_type'])
-            
-            if converted_first_value <= converted_compare_value <= converted_second_value:
-                is_data_included = True
+    else:
+        def is_match(str_value):
+            return False
 
-    return is_data_included
+    return is_match
 
 def filter_report_list(report_list, diff_list):
     for rows in report_list:
@@ -139,7 +134,9 @@ def filter_report_list(report_list, diff_list):
     return report_list
 
 def create_csv(report_list, csv_header):
-    
+    import csv
+    from io import StringIO
+
     file_buff = StringIO()
     writer = csv.DictWriter(file_buff, fieldnames=csv_header,quoting=csv.QUOTE_ALL)
     writer.writeheader()
@@ -151,8 +148,76 @@ def create_csv(report_list, csv_header):
     
     return csv_file, file_buff.getvalue()
 
+def stream_csv_to_bucket(rows, csv_header, filename = None, bucket_name = None, directory = "tmp", part_size = None):
+    #Streaming counterpart of create_csv() + save_object_to_bucket(): `rows` can be any iterable (e.g., a generator over
+    #   paginated DDB results). Rows are encoded into `part_size` chunks sent as S3 multipart upload parts as soon as they
+    #   fill up, so memory stays flat regardless of row count. Exports smaller than one part use a single put_object.
+    import csv
+    from io import StringIO
+
+    if filename == None:
+        filename = f"{str(uuid.uuid4())}.csv"
+    if part_size == None:
+        part_size = stark_core.csv_part_size
+
+    canned_ACL = 'private'
+    if bucket_name == None:
+        bucket_name = stark_core.bucket_name
+        canned_ACL = 'public-read'
+    key = directory + '/' + filename
+    s3  = stark_core.get_client('s3')
+
+    text_buff = StringIO()
+    writer = csv.DictWriter(text_buff, fieldnames=csv_header,quoting=csv.QUOTE_ALL)
+    writer.writeheader()
+
+    pending   = bytearray()
+    upload_id = None
+    parts     = []
+    try:
+        for rows_written, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if rows_written % 1000 == 0:
+                pending += text_buff.getvalue().encode('utf-8')
+                text_buff.seek(0)
+                text_buff.truncate()
+
+            while len(pending) >= part_size:
+                if upload_id == None:
+                    upload_id = s3.create_multipart_upload(ACL=canned_ACL, Bucket=bucket_name, Key=key)['UploadId']
+                upload_csv_part(bytes(pending[:part_size]), bucket_name, key, upload_id, parts)
+                del pending[:part_size]
+
+        pending += text_buff.getvalue().encode('utf-8')
+        if upload_id == None:
+            s3.put_object(ACL=canned_ACL, Body=bytes(pending), Bucket=bucket_name, Key=key)
+        else:
+            if len(pending) > 0:
+                upload_csv_part(bytes(pending), bucket_name, key, upload_id, parts)
+            s3.complete_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+
+    except Exception:
+        #Do not leave an incomplete upload behind (S3 keeps billing for its parts until it is aborted).
+        #   A failed abort is only logged, so the error that stopped the export is the one raised.
+        if upload_id != None:
+            try:
+                s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+            except Exception as error:
+                stark_core.log.error("AbortMultipartUpload failed", key=key, error=str(error))
+        raise
+
+    return filename
+
+def upload_csv_part(body, bucket_name, key, upload_id, parts):
+    part_number = len(parts) + 1
+    response = stark_core.get_client('s3').upload_part(Body=body, Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number)
+    parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
 def prepare_pdf_data(data_to_tuple, master_fields, report_params, metadata, pk_field):
     #FIXME: PDF GENERATOR: can be outsourced to a layer, for refining 
+    if stark_core.stream_pdf_exports:
+        return prepare_pdf_stream(data_to_tuple, master_fields, report_params, metadata, pk_field)
+
     master_fields.insert(0, '#')
     numerical_columns = {}
     for key, items in metadata.items():
@@ -192,6 +257,7 @@ def prepare_pdf_data(data_to_tuple, master_fields, report_params, metadata, pk_f
 
 
 def create_pdf(header_tuple, data_tuple, report_params, pk_field, metadata):
+    from fpdf import FPDF
 
     pdf = FPDF(orientation='L')
     pdf.add_page()
@@ -252,6 +318,151 @@ def create_pdf(header_tuple, data_tuple, report_params, pk_field, metadata):
 
     return pdf
 
+def prepare_pdf_stream(data_to_tuple, master_fields, report_params, metadata, pk_field):
+    #Streaming counterpart of prepare_pdf_data(): rows are turned into tuples one at a time as the renderer consumes them
+    #   and the number columns are totalled on the way, instead of materializing every row up front.
+    header_tuple = tuple(['#'] + list(master_fields))
+    numerical_columns = {}
+    for key, items in metadata.items():
+        if items['data_type'] == 'number' and key in master_fields:
+            numerical_columns.update({key: 0})
+
+    def row_stream():
+        counter = 1
+        for key in data_to_tuple:
+            column_list = [str(counter)]
+            for index in master_fields:
+                if index in numerical_columns:
+                    numerical_columns[index] += int(key[index])
+                column_list.append(key[index])
+            yield tuple(column_list)
+            counter += 1
+
+    def total_row():
+        #Only complete once row_stream() is exhausted, which create_pdf_stream() guarantees before asking for it
+        if len(numerical_columns) == 0:
+            return None
+        return tuple(str(numerical_columns[field]) if field in numerical_columns else '' for field in header_tuple)
+
+    filename = f"{str(uuid.uuid4())}"
+    pdf_file = f"{filename}.pdf"
+
+    pdf = create_pdf_stream(header_tuple, row_stream(), report_params, pk_field, metadata, total_row)
+
+    return pdf_file, pdf.output()
+
+def create_pdf_stream(header_tuple, rows, report_params, pk_field, metadata, total_row = None, sample_size = 50):
+    #Renders `rows` (an iterator of tuples) without holding them: column widths, alignment and characters per line are
+    #   computed once from the first `sample_size` rows, and each row's height comes from that layout instead of being
+    #   re-estimated per cell. Single-line cells are drawn with cell(), only overflowing ones need multi_cell().
+    #   Rendering stops at pdf_max_rows / pdf_max_pages with a truncation notice; the remaining rows are still counted
+    #   (and totalled) but never drawn, which keeps memory bounded since FPDF holds every page until output().
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation='L')
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=10)
+    line_height = pdf.font_size * 2.5
+    row_number_width = 10
+    max_rows  = stark_core.pdf_max_rows
+    max_pages = stark_core.pdf_max_pages
+
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, sample_size))
+    col_widths, text_aligns, chars_per_line = compute_pdf_layout(pdf, header_tuple, sample, metadata, row_number_width)
+
+    render_page_header(pdf, line_height, report_params, pk_field)
+    render_table_header_layout(pdf, header_tuple, col_widths, line_height)
+
+    rows = itertools.chain(sample, rows)
+    counter = 0
+    truncated_rows = 0
+    for row in rows:
+        lines_needed = 1
+        for datum, max_chars in zip(row, chars_per_line):
+            lines_needed = max(lines_needed, math.ceil(len(str(datum)) / max_chars))
+        row_height = min(max(pdf.font_size * lines_needed, line_height), 120)
+
+        #On the last allowed page, keep room for the truncation notice and the total row
+        if (max_rows > 0 and counter >= max_rows) or (max_pages > 0 and pdf.page_no() >= max_pages and pdf.will_page_break(row_height + line_height * 2)):
+            truncated_rows = 1 + sum(1 for remaining_row in rows)
+            break
+
+        if pdf.will_page_break(row_height):
+            render_table_header_layout(pdf, header_tuple, col_widths, line_height)
+
+        if counter % 2 ==0:
+            pdf.set_fill_color(222,226,230)
+        else:
+            pdf.set_fill_color(255,255,255)
+        render_table_row(pdf, row, col_widths, text_aligns, chars_per_line, row_height, 0)
+        counter += 1
+
+    if truncated_rows > 0:
+        pdf.set_font(style="I")
+        pdf.multi_cell(0, line_height, f"Report truncated: showing the first {counter} of {counter + truncated_rows} rows. Download the CSV export for the complete report.",
+                border='T', new_x="LMARGIN", new_y="NEXT", max_line_height=pdf.font_size)
+        pdf.set_font(style="")
+
+    if total_row != None:
+        totals = total_row()
+        if totals != None:
+            pdf.set_fill_color(255,255,255)
+            render_table_row(pdf, totals, col_widths, text_aligns, chars_per_line, line_height, 'T')
+
+    return pdf
+
+def compute_pdf_layout(pdf, header_tuple, sample, metadata, row_number_width):
+    #Column widths are weighted by the header and the average sample content length (clamped so no column dominates)
+    average_char_width = pdf.get_string_width("abcdefghijklmnopqrstuvwxyz0123456789") / 36
+    weights = []
+    text_aligns = []
+    for column_counter, col_name in enumerate(header_tuple):
+        if column_counter == 0:
+            weights.append(0)
+            text_aligns.append('R')
+            continue
+        lengths = [len(str(row[column_counter])) for row in sample if column_counter < len(row)]
+        average_length = sum(lengths) / len(lengths) if len(lengths) > 0 else 0
+        weights.append(min(max(len(col_name), average_length, 4), 40))
+
+        if "Count of" in col_name or "Sum of" in col_name:
+            text_aligns.append('R')
+        elif metadata.get(col_name.replace(" ","_"), {}).get('data_type', '') in ['number', 'date']:
+            text_aligns.append('R')
+        else:
+            text_aligns.append('L')
+
+    available_width = pdf.epw - row_number_width
+    col_widths = [row_number_width] + [available_width * weight / sum(weights) for weight in weights[1:]]
+    #Cells have ~1mm of padding on each side
+    chars_per_line = [max(int((width - 2) / average_char_width), 1) for width in col_widths]
+
+    return col_widths, text_aligns, chars_per_line
+
+def render_table_row(pdf, row, col_widths, text_aligns, chars_per_line, row_height, border):
+    for datum, width, text_align, max_chars in zip(row, col_widths, text_aligns, chars_per_line):
+        text = str(datum)
+        if len(text) <= max_chars:
+            pdf.cell(width, row_height, text, border=border, new_x="RIGHT", new_y="TOP", fill=True, align=text_align)
+        else:
+            pdf.multi_cell(width, row_height, text, border=border, new_x="RIGHT", new_y="TOP", max_line_height=pdf.font_size, fill=True, align=text_align)
+    pdf.ln(row_height)
+
+def render_table_header_layout(pdf, header_tuple, col_widths, line_height):
+    #Same as render_table_header(), with per-column widths
+    pdf.set_font(style="B")  # enabling bold text
+    pdf.set_fill_color(52, 58,64)
+    pdf.set_text_color(255,255,255)
+    row_header_line_height = line_height * 1.5
+    for col_name, width in zip(header_tuple, col_widths):
+        pdf.multi_cell(width, row_header_line_height, col_name, border='TB', align='C',
+                new_x="RIGHT", new_y="TOP",max_line_height=pdf.font_size, fill=True)
+    pdf.ln(row_header_line_height)
+    pdf.set_font(style="")  # disabling bold text
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_fill_color(0, 0, 0)
+
 def render_table_header(pdf, header_tuple, col_width, line_height, row_number_width):
     pdf.set_font(style="B")  # enabling bold text
     pdf.set_fill_color(52, 58,64)
@@ -312,7 +523,7 @@ def save_object_to_bucket(body, filename, bucket_name = None, directory = "tmp")
         bucket_name = stark_core.bucket_name
         canned_ACL = 'public-read'
 
-    s3_action = s3.put_object(
+    s3_action = stark_core.get_client('s3').put_object(
         ACL= canned_ACL,
         Body= body,
         Bucket=bucket_name,
@@ -331,23 +542,31 @@ def copy_object_to_bucket(filename, destination_dir, bucket_name = None, source_
         extra_args = {
             'ACL': 'public-read'
         }
-        s3_res.meta.client.copy(copy_source, bucket, destination_dir + filename, extra_args)
+        stark_core.get_client('s3').copy(copy_source, bucket, destination_dir + filename, extra_args)
 
 def convert_value_data_type(value, data_type):
     converted_value = ""
     if value != "":
-        if data_type == 'date':
-            converted_value = datetime.strptime(value, '%Y-%m-%d').date()
-        elif data_type == 'float':
-            converted_value = float(value)
-        elif data_type == 'integer':
-            converted_value = int(value)
-        else:
-            #str default
-            converted_value = str(value)
+        converted_value = get_data_type_converter(data_type)(value)
 
     return converted_value
 
+def get_data_type_converter(data_type):
+    if data_type == 'date':
+        return parse_date
+    elif data_type == 'float':
+        return float
+    elif data_type == 'integer':
+        return int
+    else:
+        #str default
+        return str
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    #Report rows tend to repeat the same handful of dates, so parsed values are memoized
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
 def append_record_metadata(transaction_type, user ):
     metadata = {}
     timestamp = int(time.time())
@@ -0,0 +1,162 @@
+import json
+import time
+import uuid
+
+import stark_core
+
+name = "STARK Write Queue"
+
+#Write queue URL, looked up once per container
+queue_url = None
+
+
+def whoami():
+    return name
+
+class write_recorder:
+    #Stands in for the DDB client passed as db_handler to entity add/edit/delete when surge protection is on.
+    #   Reads go straight to DDB; writes are only recorded, to be queued with enqueue_writes().
+    def __init__(self, db_handler = None):
+        if db_handler == None:
+            db_handler = stark_core.get_client('dynamodb')
+        self.db_handler = db_handler
+        self.requests   = []
+
+    def __getattr__(self, attribute):
+        return getattr(self.db_handler, attribute)
+
+    def put_item(self, **ddb_arguments):
+        self.requests.append({'PutRequest': {'Item': ddb_arguments['Item']}})
+        return {}
+
+    def delete_item(self, **ddb_arguments):
+        self.requests.append({'DeleteRequest': {'Key': ddb_arguments['Key']}})
+        return {}
+
+    def update_item(self, **ddb_arguments):
+        update = {}
+        #ReturnValues and the like only shape the response, which the caller never gets from the queue
+        for argument in ['Key', 'UpdateExpression', 'ConditionExpression', 'ExpressionAttributeNames', 'ExpressionAttributeValues']:
+            if argument in ddb_arguments:
+                update[argument] = ddb_arguments[argument]
+        self.requests.append({'UpdateRequest': update})
+        return {'Attributes': {}}
+
+def get_queue_url(sqs_handler = None):
+    if sqs_handler == None:
+        sqs_handler = stark_core.get_client('sqs')
+
+    global queue_url
+    if queue_url == None:
+        queue_url = sqs_handler.get_queue_url(QueueName=stark_core.write_queue_name)['QueueUrl']
+    return queue_url
+
+def get_request_key(request):
+    if 'PutRequest' in request:
+        key = request['PutRequest']['Item']
+    elif 'DeleteRequest' in request:
+        key = request['DeleteRequest']['Key']
+    else:
+        key = request['UpdateRequest']['Key']
+    return key['pk']['S'], key['sk']['S']
+
+def enqueue_writes(requests, sqs_handler = None):
+    #Sends the writes recorded for one API call as a single message, so the consumer applies them together.
+    #Returns the tracking id given back to the client.
+    if sqs_handler == None:
+        sqs_handler = stark_core.get_client('sqs')
+
+    tracking_id = str(uuid.uuid4())
+    message = {
+        'Tracking_ID': tracking_id,
+        'Requests': requests
+    }
+
+    sqs_arguments = {}
+    sqs_arguments['QueueUrl']    = get_queue_url(sqs_handler)
+    sqs_arguments['MessageBody'] = json.dumps(message)
+    if stark_core.ddb_surge_protection_fifo:
+        #Ordering is kept per record pk; writes to different records are still consumed in parallel
+        sqs_arguments['MessageGroupId']         = get_request_key(requests[0])[0]
+        sqs_arguments['MessageDeduplicationId'] = tracking_id
+    sqs_handler.send_message(**sqs_arguments)
+
+    return tracking_id
+
+def process_messages(records, db_handler = None):
+    #Applies a batch of queued writes in queue order: puts and deletes through BatchWriteItem (25 per request),
+    #   updates one by one since BatchWriteItem cannot express them.
+    #Returns the messageIds of the messages that were not fully applied, so SQS retries only those
+    #   (and moves them to the DLQ once they run out of receives).
+    if db_handler == None:
+        db_handler = stark_core.get_client('dynamodb')
+
+    failed       = set()
+    pending      = []
+    pending_keys = set()
+    for index, record in enumerate(records):
+        message = json.loads(record['body'])
+        for request in message['Requests']:
+            key = get_request_key(request)
+            if 'UpdateRequest' in request or key in pending_keys:
+                #Keep queue order, and BatchWriteItem rejects two writes to the same item in one request
+                failed.update(flush_writes(pending, db_handler))
+                pending      = []
+                pending_keys = set()
+
+            if 'UpdateRequest' in request:
+                if not apply_update(request['UpdateRequest'], db_handler):
+                    failed.add(index)
+            else:
+                pending.append((index, request))
+                pending_keys.add(key)
+    failed.update(flush_writes(pending, db_handler))
+
+    if stark_core.ddb_surge_protection_fifo and len(failed) > 0:
+        #FIFO: everything from the first failure on goes back to the queue, so retries re-apply the writes in order
+        failed = set(range(min(failed), len(records)))
+
+    return [records[index]['messageId'] for index in sorted(failed)]
+
+def flush_writes(pending, db_handler):
+    failed = set()
+    for start in range(0, len(pending), 25):
+        failed.update(batch_write_chunk(pending[start:start + 25], db_handler))
+    return failed
+
+def batch_write_chunk(chunk, db_handler, max_attempts = 8):
+    #chunk is a list of (message index, request); returns the indexes of messages with writes left unapplied
+    request_items = {
+        stark_core.ddb_table: [request for index, request in chunk]
+    }
+
+    attempt = 0
+    while len(request_items) > 0:
+        try:
+            response = db_handler.batch_write_item(RequestItems=request_items)
+        except Exception as error:
+            stark_core.log.error("BatchWriteItem failed", error=str(error))
+            break
+
+        #Throttled writes come back as UnprocessedItems; retry just those with exponential backoff
+        request_items = response.get('UnprocessedItems', {})
+        if len(request_items) > 0:
+            attempt += 1
+            if attempt >= max_attempts:
+                break
+            time.sleep(min(0.05 * (2 ** attempt), 2))
+
+    unprocessed_keys = set(get_request_key(request) for request in request_items.get(stark_core.ddb_table, []))
+    return set(index for index, request in chunk if get_request_key(request) in unprocessed_keys)
+
+def apply_update(update, db_handler):
+    #An update whose ConditionExpression fails (e.g., its record was deleted since) is skipped, not failed:
+    #   retrying it can only fail again, all the way to the DLQ
+    try:
+        db_handler.update_item(TableName=stark_core.ddb_table, **update)
+    except db_handler.exceptions.ConditionalCheckFailedException:
+        stark_core.log.info("UpdateItem skipped, its condition failed", key=update['Key'])
+    except Exception as error:
+        stark_core.log.error("UpdateItem failed", error=str(error))
+        return False
+    return True
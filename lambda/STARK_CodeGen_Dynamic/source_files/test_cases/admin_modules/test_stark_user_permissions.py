@@ -94,6 +94,68 @@ def test_delete(use_moto,set_stark_user_permissions_payload_sequence, monkeypatc
     response  = stark_user_permissions.get_all('stark_module|info', None, ddb)
     assert len(response[0]) == 0
 
+@mock_dynamodb
+def test_permission_cache(use_moto,set_stark_user_permissions_payload_sequence, monkeypatch):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    def mock_get_sequence(pk, db_handler = None):
+        return set_stark_user_permissions_payload_sequence['pk']
+    monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
+    security.invalidate_permission_cache()
+
+    set_stark_user_permissions_payload_sequence['sk'] = 'STARK|user|permissions'
+    set_stark_user_permissions_payload_sequence['Permissions'] = 'Customer|Add, Customer|View'
+    stark_user_permissions.add(set_stark_user_permissions_payload_sequence, 'POST', ddb)
+    event = {'requestContext': {'authorizer': {'lambda': {'Username': set_stark_user_permissions_payload_sequence['pk']}}}}
+
+    stats = security.get_permission_cache_stats()
+    assert security.is_authorized('Customer|Add', event, ddb)
+    assert security.is_authorized('Customer|View', event, ddb)
+    assert security.get_permission_cache_stats()['misses'] == stats['misses'] + 1
+    assert security.get_permission_cache_stats()['hits'] == stats['hits'] + 1
+
+    #the authorizer reads DDB every time, its response being cached by API Gateway
+    stats = security.get_permission_cache_stats()
+    assert 'Customer|Add' in security.get_user_permissions(set_stark_user_permissions_payload_sequence['pk'], ddb, use_cache=False)
+    assert security.get_permission_cache_stats()['backend_reads'] == stats['backend_reads'] + 1
+    assert security.get_permission_cache_stats()['hits'] == stats['hits']
+
+    #writes through STARK_User_Permissions must drop the cached entry
+    set_stark_user_permissions_payload_sequence['Permissions'] = 'Customer|View'
+    stark_user_permissions.edit(set_stark_user_permissions_payload_sequence, ddb)
+    assert security.is_authorized('Customer|Add', event, ddb) == False
+
+@mock_dynamodb
+def test_check_permissions(use_moto,set_stark_user_permissions_payload_sequence, monkeypatch):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    def mock_get_sequence(pk, db_handler = None):
+        return set_stark_user_permissions_payload_sequence['pk']
+    monkeypatch.setattr(data_abstraction, "get_sequence", mock_get_sequence)
+    security.invalidate_permission_cache()
+
+    set_stark_user_permissions_payload_sequence['sk'] = 'STARK|user|permissions'
+    set_stark_user_permissions_payload_sequence['Permissions'] = 'Customer|Add, Customer|View'
+    stark_user_permissions.add(set_stark_user_permissions_payload_sequence, 'POST', ddb)
+    event = {'requestContext': {'authorizer': {'lambda': {'Username': set_stark_user_permissions_payload_sequence['pk']}}}}
+
+    requested = ['Customer|Add', 'Customer|Edit', 'Customer|Delete', 'Customer|View']
+    results, backend_reads = security.check_permissions(requested, event, ddb)
+    assert results == {'Customer|Add': True, 'Customer|Edit': False, 'Customer|Delete': False, 'Customer|View': True}
+    assert backend_reads == 1
+
+    results, backend_reads = security.check_permissions(requested, event, ddb)
+    assert backend_reads == 0
+
+def test_is_authorized_from_authorizer_context():
+    permissions = security.encode_permissions({'Customer|Add', 'Customer|View', 'Item|View'})
+    event = {'requestContext': {'authorizer': {'lambda': {'Username': 'Test2', 'Permissions': permissions}}}}
+
+    #permissions carried by the authorizer must be enough; no DDB handler is needed
+    assert security.is_authorized('Customer|View', event, None)
+    assert security.is_authorized('Item|View', event, None)
+    assert security.is_authorized('Item|Add', event, None) == False
+
 def test_lambda_handler_rt_fail():
     response = stark_user_permissions.lambda_handler({'queryStringParameters':{'rt':'incorrect_request_type'}}, '')
     assert '"Could not handle GET request - unknown request type"' == response['body']
@@ -0,0 +1,131 @@
+from moto import mock_dynamodb
+import boto3
+import pytest
+
+import stark_core as core
+from stark_core import athena_query
+
+class fake_athena:
+    def __init__(self, states):
+        self.states   = states
+        self.started  = []
+        self.stopped  = []
+        self.polls    = 0
+
+    def start_query_execution(self, QueryString, QueryExecutionContext, ResultConfiguration):
+        self.started.append(QueryString)
+        return {'QueryExecutionId': f"query-{len(self.started)}"}
+
+    def get_query_execution(self, QueryExecutionId):
+        state = self.states[min(self.polls, len(self.states) - 1)]
+        self.polls += 1
+        return {'QueryExecution': {'Status': {'State': state}}}
+
+    def stop_query_execution(self, QueryExecutionId):
+        self.stopped.append(QueryExecutionId)
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock  = {'now': 0.0}
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock['now'] += seconds
+    monkeypatch.setattr(athena_query.time, "sleep", sleep)
+    monkeypatch.setattr(athena_query.time, "monotonic", lambda: clock['now'])
+    return sleeps
+
+def test_wait_for_query_backoff(fake_clock):
+    athena = fake_athena(['QUEUED', 'RUNNING', 'RUNNING', 'RUNNING', 'SUCCEEDED'])
+
+    query_execution = athena_query.wait_for_query('query-1', athena, 20)
+
+    assert query_execution['State'] == 'SUCCEEDED'
+    assert fake_clock == [0.1, 0.2, 0.4, 0.8]
+
+def test_wait_for_query_timeout_cancels(fake_clock):
+    athena = fake_athena(['RUNNING'])
+
+    query_execution = athena_query.wait_for_query('query-1', athena, 5)
+
+    assert query_execution['State'] == 'CANCELLED'
+    assert athena.stopped == ['query-1']
+    assert sum(fake_clock) == pytest.approx(5)
+
+def test_normalize_query():
+    assert athena_query.normalize_query("SELECT *\n  FROM  Customer ;  ") == "SELECT * FROM Customer"
+
+@mock_dynamodb
+def test_run_query_cache(use_moto, monkeypatch, fake_clock):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    monkeypatch.setattr(athena_query, "query_cache", {})
+    athena = fake_athena(['SUCCEEDED'])
+
+    first  = athena_query.run_query("SELECT * FROM customer", 'db', '100', athena, ddb)
+    second = athena_query.run_query("SELECT *\n FROM customer;", 'db', '100', athena, ddb)
+    #A new container only has the cache record in DDB
+    monkeypatch.setattr(athena_query, "query_cache", {})
+    third  = athena_query.run_query("SELECT * FROM customer", 'db', '100', athena, ddb)
+    #A new export changes the data version
+    fourth = athena_query.run_query("SELECT * FROM customer", 'db', '200', athena, ddb)
+
+    assert first['QueryExecutionId'] == second['QueryExecutionId'] == third['QueryExecutionId'] == 'query-1'
+    assert fourth['QueryExecutionId'] == 'query-2'
+    assert len(athena.started) == 2
+
+@mock_dynamodb
+def test_run_query_failures_not_cached(use_moto, monkeypatch, fake_clock):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    monkeypatch.setattr(athena_query, "query_cache", {})
+    athena = fake_athena(['FAILED'])
+
+    athena_query.run_query("SELECT * FROM missing", 'db', '100', athena, ddb)
+    athena_query.run_query("SELECT * FROM missing", 'db', '100', athena, ddb)
+
+    assert len(athena.started) == 2
+
+class paged_athena:
+    #Serves result rows the way Athena does: the header row first, at most MaxResults rows per page
+    column_info = [{'Name': 'customer_name', 'Type': 'varchar'}, {'Name': 'points', 'Type': 'integer'}, {'Name': 'rate', 'Type': 'double'}]
+
+    def __init__(self, row_count):
+        self.rows = [{'Data': [{'VarCharValue': 'customer_name'}, {'VarCharValue': 'points'}, {'VarCharValue': 'rate'}]}]
+        for index in range(row_count):
+            rate = {'VarCharValue': '0.5'} if index % 2 == 0 else {}
+            self.rows.append({'Data': [{'VarCharValue': f"Customer {index}"}, {'VarCharValue': str(index)}, rate]})
+        self.calls = 0
+
+    def get_query_results(self, QueryExecutionId, MaxResults, NextToken = None):
+        self.calls += 1
+        start = int(NextToken or 0)
+        end   = start + MaxResults
+        response = {'ResultSet': {'Rows': self.rows[start:end], 'ResultSetMetadata': {'ColumnInfo': self.column_info}}}
+        if end < len(self.rows):
+            response['NextToken'] = str(end)
+        return response
+
+def test_iter_query_rows():
+    athena = paged_athena(2500)
+
+    rows = list(athena_query.iter_query_rows('query-1', True, athena))
+
+    assert len(rows) == 2500
+    assert athena.calls == 3
+    assert rows[0] == {'customer_name': 'Customer 0', 'points': 0, 'rate': 0.5}
+    assert rows[2499] == {'customer_name': 'Customer 2499', 'points': 2499, 'rate': None}
+
+def test_get_result_page():
+    athena = paged_athena(250)
+
+    first_page, next_token = athena_query.get_result_page('query-1', 100, None, False, athena)
+    second_page, next_token = athena_query.get_result_page('query-1', 100, next_token, False, athena)
+    last_page, next_token = athena_query.get_result_page('query-1', 100, next_token, False, athena)
+
+    assert [len(first_page), len(second_page), len(last_page)] == [100, 100, 50]
+    assert first_page[0] == {'customer_name': 'Customer 0', 'points': '0', 'rate': '0.5'}
+    assert second_page[0]['customer_name'] == 'Customer 100'
+    assert last_page[-1] == {'customer_name': 'Customer 249', 'points': '249', 'rate': ''}
+    assert next_token == None
+    assert athena_query.get_result_columns('query-1', athena)[1] == {'column_name': 'points', 'data_type': 'integer'}
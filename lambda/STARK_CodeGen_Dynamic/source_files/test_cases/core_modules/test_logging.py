@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import stark_core as core
+
+class lambda_context:
+    aws_request_id = 'req-0001'
+
+def read_records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def test_handler_buffers_records_into_one_write(monkeypatch, capsys):
+    monkeypatch.setattr(core, "log_level", "INFO")
+    writes = []
+    monkeypatch.setattr(core.log.sys.stdout, "write", lambda text: writes.append(text))
+
+    @core.log.handler
+    def lambda_handler(event, context):
+        core.log.info("First", entity="Customer")
+        core.log.warning("Second")
+        assert writes == []
+        return "OK"
+
+    assert lambda_handler({'requestContext': {'requestId': 'api-0001'}}, lambda_context()) == "OK"
+    assert len(writes) == 1
+    records = [json.loads(line) for line in writes[0].splitlines()]
+    assert [record['message'] for record in records] == ["First", "Second"]
+    assert records[0]['level'] == "INFO"
+    assert records[0]['entity'] == "Customer"
+    assert all(record['request_id'] == 'req-0001' and record['api_request_id'] == 'api-0001' for record in records)
+
+@pytest.mark.parametrize("log_level, sample_rate, expected_messages", [
+    ("INFO", 0, ["Info"]),
+    ("DEBUG", 0, ["Event payload", "Info"]),
+    ("WARNING", 0, []),
+    ("INFO", 1, ["Event payload", "Info"]),
+])
+def test_levels_and_sampling(monkeypatch, capsys, log_level, sample_rate, expected_messages):
+    monkeypatch.setattr(core, "log_level", log_level)
+    monkeypatch.setattr(core, "log_debug_sample_rate", sample_rate)
+
+    @core.log.handler
+    def lambda_handler(event, context):
+        core.log.event(event)
+        core.log.info("Info")
+
+    lambda_handler({'body': 'secret'}, None)
+    assert [record['message'] for record in read_records(capsys)] == expected_messages
+
+def test_buffer_is_written_early_when_full(monkeypatch, capsys):
+    monkeypatch.setattr(core, "log_level", "INFO")
+    monkeypatch.setattr(core, "log_buffer_max_records", 2)
+
+    @core.log.handler
+    def lambda_handler(event, context):
+        for number in range(3):
+            core.log.info(f"Record {number}")
+        assert len(read_records(capsys)) == 2
+
+    lambda_handler({}, None)
+    assert [record['message'] for record in read_records(capsys)] == ["Record 2"]
+
+def test_handler_logs_unhandled_exceptions(monkeypatch, capsys):
+    monkeypatch.setattr(core, "log_level", "INFO")
+
+    @core.log.handler
+    def lambda_handler(event, context):
+        core.log.info("Before")
+        raise ValueError("Bad payload")
+
+    with pytest.raises(ValueError):
+        lambda_handler({}, lambda_context())
+    records = read_records(capsys)
+    assert [record['level'] for record in records] == ["INFO", "ERROR"]
+    assert "Bad payload" in records[1]['exception']
+    #Records outside of an invocation are written right away, without the finished invocation's id
+    core.log.msg("Outside")
+    assert 'request_id' not in read_records(capsys)[0]
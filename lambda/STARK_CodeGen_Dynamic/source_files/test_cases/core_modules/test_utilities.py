@@ -0,0 +1,114 @@
+from moto import mock_s3
+import boto3
+import pytest
+
+import stark_core as core
+from stark_core import utilities
+
+@pytest.mark.parametrize("criteria, str_value, expected", [
+    ({'operator': '=', 'value': '10', 'data_type': 'integer'}, '10', True),
+    ({'operator': '=', 'value': '10', 'data_type': 'integer'}, '', False),
+    ({'operator': '<>', 'value': 'abc', 'data_type': 'string'}, 'abd', True),
+    ({'operator': '<', 'value': '2.5', 'data_type': 'float'}, '10', False),
+    ({'operator': '<=', 'value': '2023-01-10', 'data_type': 'date'}, '2023-01-09', True),
+    ({'operator': '>', 'value': '9', 'data_type': 'integer'}, '10', True),
+    ({'operator': '>=', 'value': '2023-01-10', 'data_type': 'date'}, '2022-12-31', False),
+    ({'operator': 'contains', 'value': 'ell', 'data_type': 'string'}, 'Hello', True),
+    ({'operator': 'IN', 'value': 'Red, Blue', 'data_type': 'string'}, 'Blue', True),
+    ({'operator': 'IN', 'value': 'Red, Blue', 'data_type': 'string'}, 'Green', False),
+    ({'operator': 'begins_with', 'value': 'He', 'data_type': 'string'}, 'Hello', True),
+    ({'operator': 'between', 'value': '1.5, 3', 'data_type': 'float'}, '2', True),
+    ({'operator': 'between', 'value': '2023-01-01, 2023-01-31', 'data_type': 'date'}, '2023-02-01', False),
+    ({'operator': 'unknown', 'value': 'x', 'data_type': 'string'}, 'x', False),
+])
+def test_compile_criteria_for_many_fields(criteria, str_value, expected):
+    is_match = utilities.compile_criteria_for_many_fields(criteria)
+
+    assert is_match(str_value) == expected
+    assert utilities.filter_criteria_for_many_fields(str_value, criteria) == expected
+
+def test_convert_value_data_type():
+    assert utilities.convert_value_data_type('', 'integer') == ''
+    assert utilities.convert_value_data_type('7', 'integer') == 7
+    assert utilities.convert_value_data_type('7.5', 'float') == 7.5
+    assert str(utilities.convert_value_data_type('2023-01-02', 'date')) == '2023-01-02'
+    assert utilities.convert_value_data_type('7', 'string') == '7'
+
+def csv_rows(row_count):
+    for index in range(row_count):
+        yield {'Customer_ID': f"C-{index:06}", 'Customer_Name': f"Customer {index}", 'Remarks': 'x' * 200}
+
+@pytest.mark.parametrize("row_count", [10, 60000])
+@mock_s3
+def test_stream_csv_to_bucket(monkeypatch, row_count):
+    #moto does not decode the aws-chunked checksum framing newer botocore versions use for upload_part
+    monkeypatch.setenv("AWS_REQUEST_CHECKSUM_CALCULATION", "WHEN_REQUIRED")
+    s3 = boto3.client('s3', region_name=core.test_region)
+    s3.create_bucket(Bucket='stark-test-bucket', CreateBucketConfiguration={'LocationConstraint': core.test_region})
+    monkeypatch.setitem(core.aws_clients, "s3", s3)
+    header = ['Customer_ID', 'Customer_Name', 'Remarks']
+
+    csv_file = utilities.stream_csv_to_bucket(csv_rows(row_count), header, 'Customer.csv', 'stark-test-bucket', 'Customer', 5 * 1024 * 1024)
+
+    expected_file, expected_body = utilities.create_csv(csv_rows(row_count), header)
+    response = s3.get_object(Bucket='stark-test-bucket', Key='Customer/Customer.csv')
+    assert csv_file == 'Customer.csv'
+    assert response['Body'].read().decode('utf-8') == expected_body
+    #60000 rows are ~14 MB: three 5 MB parts instead of a single put_object (multipart ETags end with "-<parts>")
+    if row_count == 10:
+        assert '-' not in response['ETag']
+    else:
+        assert response['ETag'].strip('"').endswith('-3')
+
+@mock_s3
+def test_stream_csv_to_bucket_aborts_on_error(monkeypatch):
+    #moto does not decode the aws-chunked checksum framing newer botocore versions use for upload_part
+    monkeypatch.setenv("AWS_REQUEST_CHECKSUM_CALCULATION", "WHEN_REQUIRED")
+    s3 = boto3.client('s3', region_name=core.test_region)
+    s3.create_bucket(Bucket='stark-test-bucket', CreateBucketConfiguration={'LocationConstraint': core.test_region})
+    monkeypatch.setitem(core.aws_clients, "s3", s3)
+
+    def failing_rows():
+        yield from csv_rows(30000)
+        raise RuntimeError("DDB read failed")
+
+    with pytest.raises(RuntimeError):
+        utilities.stream_csv_to_bucket(failing_rows(), ['Customer_ID', 'Customer_Name', 'Remarks'], 'Customer.csv', 'stark-test-bucket', 'Customer', 5 * 1024 * 1024)
+
+    assert s3.list_multipart_uploads(Bucket='stark-test-bucket').get('Uploads', []) == []
+    assert s3.list_objects_v2(Bucket='stark-test-bucket').get('KeyCount') == 0
+
+    #An abort that fails too (e.g., AccessDenied) does not hide the error that stopped the export
+    def abort_multipart_upload(**kwargs):
+        raise s3.exceptions.ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'AbortMultipartUpload')
+    monkeypatch.setattr(s3, "abort_multipart_upload", abort_multipart_upload)
+    with pytest.raises(RuntimeError):
+        utilities.stream_csv_to_bucket(failing_rows(), ['Customer_ID', 'Customer_Name', 'Remarks'], 'Customer.csv', 'stark-test-bucket', 'Customer', 5 * 1024 * 1024)
+
+def pdf_report_rows(row_count):
+    return [{'Customer ID': f"C-{index:06}", 'Name': f"Customer {index}", 'Points': '2'} for index in range(row_count)]
+
+pdf_metadata = {'Customer_ID': {'data_type': 'string'}, 'Name': {'data_type': 'string'}, 'Points': {'data_type': 'number'}}
+
+@pytest.mark.parametrize("max_rows, max_pages, rendered_rows", [(0, 0, 120), (50, 0, 50), (0, 1, None)])
+def test_create_pdf_stream(monkeypatch, max_rows, max_pages, rendered_rows):
+    monkeypatch.setattr(core, "stream_pdf_exports", True)
+    monkeypatch.setattr(core, "pdf_max_rows", max_rows)
+    monkeypatch.setattr(core, "pdf_max_pages", max_pages)
+    rendered = []
+    render_table_row = utilities.render_table_row
+    def record_table_row(pdf, row, *args):
+        rendered.append(row)
+        render_table_row(pdf, row, *args)
+    monkeypatch.setattr(utilities, "render_table_row", record_table_row)
+
+    pdf_file, pdf_output = utilities.prepare_pdf_data(iter(pdf_report_rows(120)), ['Customer ID', 'Name', 'Points'], {}, pdf_metadata, 'Customer_ID')
+
+    assert pdf_file.endswith('.pdf')
+    assert bytes(pdf_output).startswith(b'%PDF')
+    #The total row always covers every row, including the ones left out of a truncated PDF
+    assert rendered[-1] == ('', '', '', '240')
+    if rendered_rows != None:
+        assert len(rendered) - 1 == rendered_rows
+    else:
+        assert 0 < len(rendered) - 1 < 120
@@ -0,0 +1,88 @@
+from moto import mock_dynamodb, mock_sqs
+import boto3
+import pytest
+
+import stark_core as core
+from stark_core import write_queue
+
+def record_writes(ddb):
+    recorder = write_queue.write_recorder(ddb)
+    recorder.put_item(TableName=core.ddb_table, Item={'pk': {'S' : 'C-000001'}, 'sk': {'S' : 'Customer|info'}, 'Customer_Name': {'S' : 'Old'}})
+    recorder.put_item(TableName=core.ddb_table, Item={'pk': {'S' : 'C-000002'}, 'sk': {'S' : 'Customer|info'}, 'Customer_Name': {'S' : 'Two'}})
+    recorder.update_item(
+        TableName=core.ddb_table,
+        Key={'pk': {'S' : 'C-000001'}, 'sk': {'S' : 'Customer|info'}},
+        ReturnValues='UPDATED_NEW',
+        UpdateExpression='SET #name = :name',
+        ExpressionAttributeNames={'#name' : 'Customer_Name'},
+        ExpressionAttributeValues={':name' : {'S' : 'New'}}
+    )
+    recorder.delete_item(TableName=core.ddb_table, Key={'pk': {'S' : 'C-000002'}, 'sk': {'S' : 'Customer|info'}})
+    return recorder
+
+@pytest.mark.parametrize("fifo", [False, True])
+@mock_sqs
+@mock_dynamodb
+def test_write_queue_round_trip(use_moto, monkeypatch, fifo):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    sqs = boto3.client('sqs', region_name=core.test_region)
+    queue_name = 'proj_write_queue.fifo' if fifo else 'proj_write_queue'
+    attributes = {'FifoQueue': 'true'} if fifo else {}
+    sqs.create_queue(QueueName=queue_name, Attributes=attributes)
+    monkeypatch.setattr(core, "write_queue_name", queue_name)
+    monkeypatch.setattr(core, "ddb_surge_protection_fifo", fifo)
+    monkeypatch.setattr(write_queue, "queue_url", None)
+
+    recorder = record_writes(ddb)
+    #Nothing reaches the table until the consumer runs
+    assert ddb.scan(TableName=core.ddb_table)['Count'] == 0
+    tracking_id = write_queue.enqueue_writes(recorder.requests, sqs)
+
+    messages = sqs.receive_message(QueueUrl=write_queue.get_queue_url(sqs), MaxNumberOfMessages=10)['Messages']
+    records = [{'messageId': message['MessageId'], 'body': message['Body']} for message in messages]
+    failed_messages = write_queue.process_messages(records, ddb)
+
+    assert len(tracking_id) == 36
+    assert failed_messages == []
+    items = ddb.scan(TableName=core.ddb_table)['Items']
+    assert len(items) == 1
+    assert items[0]['Customer_Name']['S'] == 'New'
+
+@pytest.mark.parametrize("fifo, expected_failures", [(False, ['m-1']), (True, ['m-1', 'm-2'])])
+def test_process_messages_unprocessed_items(monkeypatch, fifo, expected_failures):
+    monkeypatch.setattr(write_queue.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(core, "ddb_surge_protection_fifo", fifo)
+    class throttled_ddb:
+        def batch_write_item(self, RequestItems):
+            #C-000002 never gets through
+            requests = RequestItems[core.ddb_table]
+            unprocessed = [request for request in requests if write_queue.get_request_key(request)[0] == 'C-000002']
+            return {'UnprocessedItems': {core.ddb_table: unprocessed} if len(unprocessed) > 0 else {}}
+
+    records = []
+    for index, pk in enumerate(['C-000001', 'C-000002', 'C-000003']):
+        recorder = write_queue.write_recorder(throttled_ddb())
+        recorder.put_item(TableName=core.ddb_table, Item={'pk': {'S' : pk}, 'sk': {'S' : 'Customer|info'}})
+        records.append({'messageId': f"m-{index}", 'body': write_queue.json.dumps({'Requests': recorder.requests})})
+
+    assert write_queue.process_messages(records, throttled_ddb()) == expected_failures
+
+@mock_dynamodb
+def test_process_messages_condition_failed(use_moto):
+    use_moto()
+    ddb = boto3.client('dynamodb', region_name=core.test_region)
+    recorder = write_queue.write_recorder(ddb)
+    recorder.update_item(
+        TableName=core.ddb_table,
+        Key={'pk': {'S' : 'C-000001'}, 'sk': {'S' : 'Customer|info'}},
+        UpdateExpression='SET #name = :name',
+        ConditionExpression='attribute_exists(pk)',
+        ExpressionAttributeNames={'#name' : 'Customer_Name'},
+        ExpressionAttributeValues={':name' : {'S' : 'New'}}
+    )
+    records = [{'messageId': 'm-0', 'body': write_queue.json.dumps({'Requests': recorder.requests})}]
+
+    #The record is gone: the update is skipped, not retried, and does not create it
+    assert write_queue.process_messages(records, ddb) == []
+    assert ddb.scan(TableName=core.ddb_table)['Count'] == 0
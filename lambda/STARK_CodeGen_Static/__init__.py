@@ -7,6 +7,7 @@ import json
 import pickle
 import os
 import textwrap
+import time
 
 #Extra modules
 import yaml
@@ -43,7 +44,9 @@ cg_loadmod           = importlib.import_module(f"{prepend_dir}cgstatic_html_gene
 cg_navbar            = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_navbar")
 
 import convert_friendly_to_system as converter
-import get_relationship as get_rel
+import cg_commit_packer as cg_packer
+import cg_workers
+import stark_model
 
 s3   = boto3.client('s3')
 api  = boto3.client('apigatewayv2')
@@ -70,16 +73,9 @@ def create_handler(event, context):
     #Bucket for our cloud resources document
     codegen_bucket_name = os.environ['CODEGEN_BUCKET_NAME']
 
-    #Cloud resources document
-    response = s3.get_object(
-        Bucket=codegen_bucket_name,
-        Key=f'codegen_dynamic/{project_varname}/{project_varname}.yaml'
-    )
-
-    #FIXME: Remove raw for now since we need to update cloud_resources with API gateway URL - hopefully using sort_keys=False will remove the need for the raw version) 
-    #raw_cloud_resources = response['Body'].read().decode('utf-8')
-    #cloud_resources     = yaml.safe_load(raw_cloud_resources) 
-    cloud_resources = yaml.safe_load(response['Body'].read().decode('utf-8')) 
+    #Cloud resources document, from the precompiled data model artifact
+    model           = stark_model.load(s3, codegen_bucket_name, project_varname)
+    cloud_resources = model["Cloud Resources"]
     print('cloud_resources here')
     print(cloud_resources)
 
@@ -101,47 +97,22 @@ def create_handler(event, context):
     
 
     #For each entity, we'll create a set of HTML and JS Files and uploaded folder
+    #   Each entity is an independent job; jobs run in parallel worker processes and results come back in entity order
+    entity_jobs = []
     for entity in models:
-        # print(models)
-        pk   = models[entity]["pk"]
-        cols = models[entity]["data"]
-        relationships = get_rel.get_relationship(models, entity)
-        rel_model = {}
-        
-        for relationship in relationships.get('has_many', []):
-            if relationship.get('type') == 'repeater':
-                rel_col = models.get(relationship.get('entity'), '')
-                rel_model.update({(relationship.get('entity')) : rel_col})
-            
-        cgstatic_data = { "Entity": entity, "PK": pk, "Columns": cols, "Project Name": project_name, "Relationships": relationships, "Rel Model": rel_model }
-        entity_varname = converter.convert_to_system_name(entity)
-        # print('static rel_model')
-        # print(rel_model)
-        for rel in rel_model:
-            # print('static rel_model')
-            # print(rel_model)
-            pk   = rel_model[rel]["pk"]
-            cols = rel_model[rel]["data"]
-            many_entity_varname = converter.convert_to_system_name(rel)
-            cgstatic_many_data = { "Entity": rel, "PK": pk, "Columns": cols, "Project Name": project_name, "Relationships": relationships }
-            add_to_commit(source_code=cg_js_many.create(cgstatic_many_data), key=f"js/many_{many_entity_varname}.js", files_to_commit=files_to_commit, file_path='static')
-        
-        cgstatic_data["Sequence"] = {}
-        if "sequence" in models[entity]:
-            cgstatic_data["Sequence"] = models[entity]["sequence"]
-        # print('cgstatic_data')
-        # print(cgstatic_data)
-        
-        add_to_commit(source_code=cg_add.create(cgstatic_data), key=f"{entity_varname}_add.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_edit.create(cgstatic_data), key=f"{entity_varname}_edit.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_delete.create(cgstatic_data), key=f"{entity_varname}_delete.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_view.create(cgstatic_data), key=f"{entity_varname}_view.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_listview.create(cgstatic_data), key=f"{entity_varname}.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_report.create(cgstatic_data), key=f"{entity_varname}_report.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_js_app.create(cgstatic_data), key=f"js/{entity_varname}_app.js", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_js_view.create(cgstatic_data), key=f"js/{entity_varname}_view.js", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=f"{entity} Uploaded files", key=f"uploaded_files/{entity_varname}/README.txt", files_to_commit=files_to_commit, file_path='')
-        
+        entity_jobs.append({
+            "Entity": entity,
+            "Models": models,
+            "Model Entity": model["Entities"][entity],
+            "Project Name": project_name
+        })
+
+    codegen_start  = time.perf_counter()
+    entity_results = cg_workers.run_jobs(create_entity_files, entity_jobs)
+    for entity_files, timings in entity_results:
+        files_to_commit.extend(entity_files)
+    cg_workers.print_timing_report(cg_workers.merge_timings([timings for entity_files, timings in entity_results]), time.perf_counter() - codegen_start)
+
     #HTML+JS for our homepage
     homepage_data = { "Project Name": project_name }
     add_to_commit(source_code=cg_homepage.create(homepage_data), key=f"home.html", files_to_commit=files_to_commit, file_path='static')
@@ -221,44 +192,9 @@ def create_handler(event, context):
 
     ##################################################
     #Commit files to the project repo
-    #   There's a codecommit limit of 100 files and 7mb - this will fail if more than 100 static files or >7mb are needed,
-    #   such as if a dozen or so entities are requested for code generation. Implement commit chunking here for safety.
-    ctr                 = 0
-    key                 = 0
-    total_commit_size   = 0
-    total_commit_limit  = 6500000 #we limit to 6500000 bytes
-    chunked_commit_list = {}
-    for item in files_to_commit:
-        total_commit_size += len(item['fileContent'])
-        if ctr == 100 or total_commit_size > total_commit_limit:
-            key = key + 1
-            ctr = 0
-            total_commit_size = len(item['fileContent'])
-        ctr = ctr + 1
-        if chunked_commit_list.get(key, '') == '':
-            chunked_commit_list[key] = []
-        chunked_commit_list[key].append(item)
-
-    ctr         = 0
-    batch_count = key + 1
-    for commit_batch in chunked_commit_list:
-        ctr = ctr + 1
-
-        response = git.get_branch(
-            repositoryName=repo_name,
-            branchName='master'        
-        )
-        commit_id = response['branch']['commitId']
-
-        response = git.create_commit(
-            repositoryName=repo_name,
-            branchName='master',
-            parentCommitId=commit_id,
-            authorName='STARK::CGStatic',
-            email='STARK@fakedomainstark.com',
-            commitMessage=f"Initial commit of static and prebuilt files (commit {ctr} of {batch_count})",
-            putFiles=chunked_commit_list[commit_batch]
-        )
+    #   CodeCommit limits each commit to 100 files and 6 MB, so the files are bin-packed into as few commits as fit
+    commit_ids = cg_packer.commit_files(files_to_commit, cg_packer.codecommit_backend(repo_name, git_handler=git), 'Initial commit of static and prebuilt files', 'STARK::CGStatic')
+    print(f"Committed {len(files_to_commit)} files in {len(commit_ids)} commits")
 
     ##################################################
     # Optimization Attempt
@@ -275,6 +211,45 @@ def create_handler(event, context):
     #Bugfix: removed line below to avoid double-trigger of pipeline
     #cdpl.start_pipeline_execution(name=f"STARK_{project_varname}_pipeline")
 
+def create_entity_files(job):
+    #Generates the HTML and JS files of one entity.
+    #Returns (files_to_commit, timings) - timings are per generator, for cg_workers.print_timing_report()
+    entity = job["Entity"]
+    models = job["Models"]
+    timings = {}
+    files_to_commit = []
+
+    cgstatic_data = stark_model.get_static_entity_data(models, job["Model Entity"], entity)
+    cgstatic_data["Project Name"] = job["Project Name"]
+    relationships = cgstatic_data["Relationships"]
+    rel_model     = cgstatic_data["Rel Model"]
+    entity_varname = converter.convert_to_system_name(entity)
+    # print('static rel_model')
+    # print(rel_model)
+    for rel in rel_model:
+        # print('static rel_model')
+        # print(rel_model)
+        pk   = rel_model[rel]["pk"]
+        cols = rel_model[rel]["data"]
+        many_entity_varname = converter.convert_to_system_name(rel)
+        cgstatic_many_data = { "Entity": rel, "PK": pk, "Columns": cols, "Project Name": job["Project Name"], "Relationships": relationships }
+        add_to_commit(source_code=cg_workers.timed("cgstatic_js_many", cg_js_many.create, cgstatic_many_data, timings), key=f"js/many_{many_entity_varname}.js", files_to_commit=files_to_commit, file_path='static')
+    
+    # print('cgstatic_data')
+    # print(cgstatic_data)
+    
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_add", cg_add.create, cgstatic_data, timings), key=f"{entity_varname}_add.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_edit", cg_edit.create, cgstatic_data, timings), key=f"{entity_varname}_edit.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_delete", cg_delete.create, cgstatic_data, timings), key=f"{entity_varname}_delete.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_view", cg_view.create, cgstatic_data, timings), key=f"{entity_varname}_view.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_listview", cg_listview.create, cgstatic_data, timings), key=f"{entity_varname}.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_html_report", cg_report.create, cgstatic_data, timings), key=f"{entity_varname}_report.html", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_js_app", cg_js_app.create, cgstatic_data, timings), key=f"js/{entity_varname}_app.js", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=cg_workers.timed("cgstatic_js_view", cg_js_view.create, cgstatic_data, timings), key=f"js/{entity_varname}_view.js", files_to_commit=files_to_commit, file_path='static')
+    add_to_commit(source_code=f"{entity} Uploaded files", key=f"uploaded_files/{entity_varname}/README.txt", files_to_commit=files_to_commit, file_path='')
+
+    return files_to_commit, timings
+
 @helper.delete
 def no_op(_, __):
     pass
@@ -5,6 +5,7 @@
 import json
 import os
 import textwrap
+import time
 
 #Extra modules
 import yaml
@@ -34,9 +35,12 @@ cg_js_many           = importlib.import_module(f"{prepend_dir}cgstatic_js_many")
 # import cgstatic_html_login as cg_login
 
 import convert_friendly_to_system as converter
-import get_relationship as get_rel
+import cg_manifest
+import cg_workers
+import stark_model
 
-def create(cloud_resources, current_cloud_resources, project_basedir):
+def create(cloud_resources, current_cloud_resources, project_basedir, incremental=True):
+    model  = stark_model.from_cloud_resources(cloud_resources)
     models = cloud_resources["Data Model"]
     print('models here')
     print(models)
@@ -64,40 +68,29 @@ def create(cloud_resources, current_cloud_resources, project_basedir):
     #Collect list of files to commit to project repository
     files_to_commit = []
 
+    #Generation manifest: files whose inputs did not change since the last run are skipped.
+    #   A full (non-incremental) run regenerates everything but still records the new hashes.
+    manifest         = cg_manifest.load(project_basedir)
+    current_manifest = manifest if incremental else {"Files": {}}
+
     #For each entity, we'll create a set of HTML and JS Files
+    #   Each entity is an independent job; jobs run in parallel worker processes and results come back in entity order
+    entity_jobs = []
     for entity in models:
-        pk   = models[entity]["pk"]
-        cols = models[entity]["data"]
-        relationships = get_rel.get_relationship(models, entity)
-        rel_model = {}
-        for relationship in relationships.get('has_many', []):
-            if relationship.get('type') == 'repeater':
-                rel_col = models.get(relationship.get('entity'), '')
-                rel_model.update({(relationship.get('entity')) : rel_col})
-
-        seq = {}
-        if len(models[entity].get("sequence", {})) > 0:
-            seq = models[entity]["sequence"]
-
-        cgstatic_data = { "Entity": entity, "PK": pk, "Columns": cols, "Project Name": project_name, "Relationships" : relationships, "Rel Model": rel_model, "Sequence": seq }
-        entity_varname = converter.convert_to_system_name(entity)
-        for rel in rel_model:
-            pk   = rel_model[rel]["pk"]
-            cols = rel_model[rel]["data"]
-            many_entity_varname = converter.convert_to_system_name(rel)
-            cgstatic_many_data = { "Entity": rel, "PK": pk, "Columns": cols, "Project Name": project_name, "Relationships": relationships }
-            add_to_commit(source_code=cg_js_many.create(cgstatic_many_data), key=f"js/many_{many_entity_varname}.js", files_to_commit=files_to_commit, file_path='static')
-
-        add_to_commit(source_code=cg_add.create(cgstatic_data), key=f"{entity_varname}_add.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_edit.create(cgstatic_data), key=f"{entity_varname}_edit.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_delete.create(cgstatic_data), key=f"{entity_varname}_delete.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_view.create(cgstatic_data), key=f"{entity_varname}_view.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_listview.create(cgstatic_data), key=f"{entity_varname}.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_report.create(cgstatic_data), key=f"{entity_varname}_report.html", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_js_app.create(cgstatic_data), key=f"js/{entity_varname}_app.js", files_to_commit=files_to_commit, file_path='static')
-        add_to_commit(source_code=cg_js_view.create(cgstatic_data), key=f"js/{entity_varname}_view.js", files_to_commit=files_to_commit, file_path='static')
-    
-
+        entity_jobs.append({
+            "Entity": entity,
+            "Models": models,
+            "Model Entity": model["Entities"][entity],
+            "Project Name": project_name,
+            "Manifest": current_manifest,
+            "Project Basedir": project_basedir
+        })
+
+    codegen_start  = time.perf_counter()
+    entity_results = cg_workers.run_jobs(create_entity_files, entity_jobs)
+    for entity_files, timings in entity_results:
+        files_to_commit.extend(entity_files)
+    entity_timings = [timings for entity_files, timings in entity_results]
 
     #STARK main JS file - modify to add new models.
     #   Requires a list of the old models from existing cloud_resources
@@ -105,17 +98,49 @@ def create(cloud_resources, current_cloud_resources, project_basedir):
     combined_models.update(models)
 
     data = { 'API Endpoint': endpoint, 'Entities': combined_models, "Bucket Name": web_bucket_name, "Project Name": project_varname }
-    add_to_commit(cg_js_stark.create(data), key=f"js/STARK.js", files_to_commit=files_to_commit, file_path='static')
+    shared_timings = {}
+    cg_manifest.add_generated_file(files_to_commit, "static/js/STARK.js", cg_js_stark, data, current_manifest, project_basedir, shared_timings)
 
 
     ##################################################
     #Write files
-    for code in files_to_commit:
-        filename = project_basedir + code['filePath']
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, "wb") as f:
-            f.write(code['fileContent'])
+    written = cg_manifest.write_files(files_to_commit, manifest, project_basedir)
+    cg_manifest.save(manifest, project_basedir)
+    cg_workers.print_timing_report(cg_workers.merge_timings([*entity_timings, shared_timings]), time.perf_counter() - codegen_start)
+    print(f"{len(files_to_commit)} files regenerated, {written} changed on disk")
+
+
+def create_entity_files(job):
+    #Generates the HTML and JS files of one entity (those whose inputs changed).
+    #Returns (files_to_commit, timings) - timings are per generator, for cg_workers.print_timing_report()
+    entity = job["Entity"]
+    models = job["Models"]
+    timings = {}
+    files_to_commit = []
 
+    #Built the same way as STARK_CodeGen_Static does
+    cgstatic_data = stark_model.get_static_entity_data(models, job["Model Entity"], entity)
+    cgstatic_data["Project Name"] = job["Project Name"]
+    relationships = cgstatic_data["Relationships"]
+    rel_model     = cgstatic_data["Rel Model"]
+    entity_varname = converter.convert_to_system_name(entity)
+    for rel in rel_model:
+        pk   = rel_model[rel]["pk"]
+        cols = rel_model[rel]["data"]
+        many_entity_varname = converter.convert_to_system_name(rel)
+        cgstatic_many_data = { "Entity": rel, "PK": pk, "Columns": cols, "Project Name": job["Project Name"], "Relationships": relationships }
+        cg_manifest.add_generated_file(files_to_commit, f"static/js/many_{many_entity_varname}.js", cg_js_many, cgstatic_many_data, job["Manifest"], job["Project Basedir"], timings)
+
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}_add.html", cg_add, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}_edit.html", cg_edit, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}_delete.html", cg_delete, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}_view.html", cg_view, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}.html", cg_listview, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/{entity_varname}_report.html", cg_report, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/js/{entity_varname}_app.js", cg_js_app, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+    cg_manifest.add_generated_file(files_to_commit, f"static/js/{entity_varname}_view.js", cg_js_view, cgstatic_data, job["Manifest"], job["Project Basedir"], timings)
+
+    return files_to_commit, timings
 
 def add_to_commit(source_code, key, files_to_commit, file_path=''):
 
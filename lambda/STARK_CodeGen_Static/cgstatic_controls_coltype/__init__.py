@@ -6,6 +6,7 @@ import base64
 import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -44,13 +45,25 @@ def create(data):
         rel_list = f'root' 
         date_picker = f'id="{col_varname}"'
         preview_class = f':class="{{show_preview_icon:show_preview({field_entity_varname}.STARK_uploaded_s3_keys.{file_upload_col_varname})}}"'
-        preview_tooltip = f'''
+        preview_tooltip = cg_template.render('''
                         <template v-if="show_preview({field_entity_varname}.STARK_uploaded_s3_keys.{file_upload_col_varname})">        
                             <b-button style="width:5%"><img src="images/search.svg" id="{file_upload_col_varname}_Preview"></b-button>
                             <b-tooltip target="{file_upload_col_varname}_Preview" title="Preview" triggers="hover" placement="left">
                                 <img :src="STARK_upload_elements.{file_upload_col_varname}.tmp_location" alt="" class="img-preview">
                             </b-tooltip>
-                        </template>'''
+                        </template>''', {"field_entity_varname": field_entity_varname, "file_upload_col_varname": file_upload_col_varname}, margin=8)
+
+    context = {
+        "col_varname": col_varname,
+        "field_entity_varname": field_entity_varname,
+        "file_upload_col_varname": file_upload_col_varname,
+        "js_object": js_object,
+        "dot_compound": dot_compound,
+        "s3_upload_index_param": s3_upload_index_param,
+        "state_control": state_control,
+        "preview_class": preview_class,
+        "preview_tooltip": preview_tooltip
+    }
 
 
     if col_type == "date":
@@ -79,11 +92,11 @@ def create(data):
         html_code=f"""<b-form-textarea id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" class="mb-2" rows="4" max-rows="8" {state_control}></b-form-textarea>"""
 
     elif isinstance(col_type, list):
-        html_code=f"""<b-form-select id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :options="lists.{col_varname}" {state_control}>
+        html_code=cg_template.render("""<b-form-select id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :options="lists.{col_varname}" {state_control}>
                                     <template v-slot:first>
                                         <b-form-select-option :value="null" disabled>-- Please select an option --</b-form-select-option>
                                     </template>
-                                </b-form-select>"""
+                                </b-form-select>""", context, margin=8)
 
     elif isinstance(col_type, dict):
         #These are the complex data types that need additional settings as part of their spec
@@ -139,8 +152,9 @@ def create(data):
             html_code=f"""<b-form-tags input-id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :limit="{tag_limit}" remove-on-delete {attribs_for_tags_list} {state_control}></b-form-tags>"""
 
             if datalist_helper != '':
-                html_code+=f"""
-                            {datalist_helper}"""
+                context["datalist_helper"] = datalist_helper
+                html_code+=cg_template.render("""
+                            {datalist_helper}""", context, margin=8)
             #FIXME: Eventually (later sprint) we may have to make datalist helper creation more generic (reusable by most other control types)
 
         #Rating - nice UI to give a 1-5 (or 1-N) feedback
@@ -172,8 +186,8 @@ def create(data):
 
             html_code=f"""{ugly_hack}<b-form-radio-group id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :options="lists.{col_varname}" {buttons} {state_control}></b-form-radio-group>"""
         elif col_type["type"] == "multi select combo":
-            dropup_flag = col_type.get('dropup',"false") #dropup by default is false as for now, only reporting is using this property
-            html_code=f"""<b-form-group label-for="tags-with-dropdown">
+            context["dropup_flag"] = col_type.get('dropup',"false") #dropup by default is false as for now, only reporting is using this property
+            html_code=cg_template.render("""<b-form-group label-for="tags-with-dropdown">
                                 <b-form-tags id="tags-with-dropdown" v-model="multi_select_values.{col_varname}" no-outer-focus {state_control}>
                                     <template v-slot="{{ tags, disabled, addTag, removeTag, inputAttrs, inputHandlers}}">
                                         <b-form-tags style="border:0px" no-outer-focus input-id="{col_varname}" v-model="multi_select_values.{col_varname}" remove-on-delete :input-attrs="{{autocomplete: 'off' }}" add-on-change>
@@ -212,11 +226,11 @@ def create(data):
                                     </template>
                                 </b-form-tags>
                             </b-form-group>
-            """
+            """, context, margin=8)
         elif col_type["type"] == "file-upload":
-            html_code=f"""<b-form-file {preview_class} v-model="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.file" :placeholder="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.file" drop-placeholder="Drop file here..." @input="{js_object}{dot_compound}s3upload('{col_varname}'{s3_upload_index_param})" {state_control}></b-form-file>
+            html_code=cg_template.render("""<b-form-file {preview_class} v-model="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.file" :placeholder="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.file" drop-placeholder="Drop file here..." @input="{js_object}{dot_compound}s3upload('{col_varname}'{s3_upload_index_param})" {state_control}></b-form-file>
                             {preview_tooltip}
-                          <b-progress :value="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.progress_bar_val" :max="100" class="mt-2"></b-progress>"""
+                          <b-progress :value="{js_object}{dot_compound}STARK_upload_elements.{file_upload_col_varname}.progress_bar_val" :max="100" class="mt-2"></b-progress>""", context, margin=8)
         elif col_type["type"] == "relationship":
             has_one = col_type.get('has_one', '')
             has_many = col_type.get('has_many', '')
@@ -224,12 +238,13 @@ def create(data):
             if  has_one != '':
                 #simple 1-1 relationship
                 foreign_entity  = converter.convert_to_system_name(has_one)
+                context["foreign_entity"] = foreign_entity
 
-                html_code=f"""<b-form-select id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :options="lists.{col_varname}" onmouseover="root{dot_compound}{js_object}.list_{foreign_entity}()" onfocus="root{dot_compound}{js_object}.list_{foreign_entity}()" {state_control}>
+                html_code=cg_template.render("""<b-form-select id="{col_varname}" v-model="{field_entity_varname}.{col_varname}" :options="lists.{col_varname}" onmouseover="root{dot_compound}{js_object}.list_{foreign_entity}()" onfocus="root{dot_compound}{js_object}.list_{foreign_entity}()" {state_control}>
                                 <template v-slot:first>
                                     <b-form-select-option :value="null" disabled>-- Please select an option --</b-form-select-option>
                                 </template>
-                            </b-form-select>"""
+                            </b-form-select>""", context, margin=8)
 
             if  has_many != '':
                 # 1-M relationship
@@ -245,16 +260,18 @@ def create(data):
                 else:
                     #default has many ux
                     #multi-select pill
-                    html_code=f"""
+                    context["foreign_entity"] = foreign_entity
+                    context["has_many_lower"] = has_many.lower()
+                    html_code=cg_template.render("""
                             <b-form-group label-for="tags-with-dropdown">
                                 <b-form-tags id="tags-with-dropdown" v-model="multi_select_values.{foreign_entity}" no-outer-focus class="mb-2">
                                     <template v-slot="{{ tags, disabled, addTag, removeTag }}">
                                         <b-dropdown size="sm" variant="outline-secondary" block menu-class="w-50" right no-flip ref="{foreign_entity}" onmouseover="root.list_{foreign_entity}()" onfocus="root.list_{foreign_entity}()">
                                             <template #button-content>
-                                                <b-icon icon="tag-fill"></b-icon> Choose {has_many.lower()}s
+                                                <b-icon icon="tag-fill"></b-icon> Choose {has_many_lower}s
                                             </template>
                                             <b-dropdown-form @submit.stop.prevent="() => {{}}">
-                                                <b-form-group label="Search {has_many.lower()}s" label-for="tag-search-input" label-cols-md="auto" class="mb-2" label-size="sm" :description="{foreign_entity}_search_desc" :disabled="disabled" >
+                                                <b-form-group label="Search {has_many_lower}s" label-for="tag-search-input" label-cols-md="auto" class="mb-2" label-size="sm" :description="{foreign_entity}_search_desc" :disabled="disabled" >
                                                     <b-form-input v-model="search.{foreign_entity}" id="tag-search-input" type="search" size="sm" autocomplete="off"></b-form-input>
                                                 </b-form-group>
                                             </b-dropdown-form>
@@ -265,7 +282,7 @@ def create(data):
                                                 </b-dropdown-item-button>
                                             </b-dropdown-form>
                                             <b-dropdown-text v-if="{foreign_entity}.length === 0">
-                                                There are no {has_many.lower()}s available to select
+                                                There are no {has_many_lower}s available to select
                                             </b-dropdown-text>
                                         </b-dropdown>
                                         <ul v-if="tags.length > 0" class="list-inline d-inline-block mt-1">
@@ -275,7 +292,7 @@ def create(data):
                                         </ul>
                                     </template>
                                 </b-form-tags>
-                            </b-form-group>"""
+                            </b-form-group>""", context, margin=8)
             
             
 
@@ -319,20 +336,20 @@ def create_list(data):
 
     if isinstance(col_type, list):
         for item in col_type:
-            js_code += f"""
-                        {{ value: '{item}', text: '{item}' }},"""
+            js_code += cg_template.render("""
+                        {{ value: '{item}', text: '{item}' }},""", {"item": item}, margin=8)
 
     elif isinstance(col_type, dict):
         items = col_type.get('values', [])
 
         for item in items:
-            js_code += f"""
-                        {{ value: '{item}', text: '{item}' }},"""
+            js_code += cg_template.render("""
+                        {{ value: '{item}', text: '{item}' }},""", {"item": item}, margin=8)
 
 
     #############
     #Close the list to end
-    js_code += f"""
-                    ],"""
+    js_code += cg_template.render("""
+                    ],""", {}, margin=8)
 
     return js_code
\ No newline at end of file
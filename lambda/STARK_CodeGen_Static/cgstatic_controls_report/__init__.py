@@ -28,6 +28,8 @@ def create(data):
     if isinstance(col_type, dict):
         col_values = col_type.get("values", "")
         if isinstance(col_values, list):
+            #Copy instead of changing the column type in place: the same model is used by the generators that run after this one
+            col_type = dict(col_type)
             col_type['type'] = "multi select combo"
             col_type['dropup'] = "true"
             html_code= cg_coltype.create({
@@ -17,6 +17,7 @@ cg_header   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_heade
 cg_footer   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_footer")
 cg_bodyhead = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_bodyhead")
 cg_loadmod  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingmodal")
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -37,10 +38,17 @@ def create(data):
     entity_varname = converter.convert_to_system_name(entity)
     pk_varname     = converter.convert_to_system_name(pk)
 
+    context = {
+        "entity_varname": entity_varname,
+        "pk": pk,
+        "pk_varname": pk_varname,
+        "disabled": disabled
+    }
+
     source_code  = cg_header.create(data, "Edit")
     source_code += cg_bodyhead.create(data, "Edit")
 
-    source_code += f"""\
+    source_code += cg_template.render("""\
             <div class="container hidden" :style="{{visibility: visibility}}">
                 <div class="row">
                     <div class="col">
@@ -51,7 +59,7 @@ def create(data):
                                 <label for="{pk_varname}">{pk}</label>
                                 <b-form-input type="text" class="form-control" id="{pk_varname}" placeholder="" v-model="{entity_varname}.{pk_varname}" :state="validation_properties.{pk_varname}.state" {disabled}></b-form-input>
                                 <b-form-invalid-feedback>{{{{validation_properties.{pk_varname}.feedback}}}}</b-form-invalid-feedback>
-                            </div>"""
+                            </div>""", context, margin=8)
 
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
@@ -65,6 +73,7 @@ def create(data):
             "is_many_control": False
         }
         html_control_code = cg_coltype.create(html_controls)
+        context.update({"col": col, "col_varname": col_varname, "html_control_code": html_control_code})
 
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
@@ -73,7 +82,8 @@ def create(data):
                 rel_pk = rel_model[child_entity].get('pk')
                 rel_pk_varname = converter.convert_to_system_name(rel_pk)
                 child_entity_varname = converter.convert_to_system_name(child_entity)
-                source_code += f"""
+                context.update({"child_entity": child_entity, "child_entity_varname": child_entity_varname, "rel_pk": rel_pk, "rel_pk_varname": rel_pk_varname})
+                source_code += cg_template.render("""
                             <template>
                                 <!-- <a v-b-toggle class="text-decoration-none" :href="'#group-collapse-'+index" @click.prevent> -->
                                 <a v-b-toggle class="text-decoration-none" @click.prevent>
@@ -92,12 +102,12 @@ def create(data):
                                                                 <b-form-group class="form-group" label="#">
                                                                     {{{{ index + 1 }}}}
                                                                 </b-form-group>
-                                                            </div>"""
+                                                            </div>""", context, margin=8)
 
-                source_code += f"""
+                source_code += cg_template.render("""
                                                             <b-form-group class="form-group col-sm" label="{rel_pk}" label-for="{rel_pk_varname}" :invalid-feedback="many_entity.{child_entity_varname}.validation_properties[index].{rel_pk_varname}.feedback">
                                                                 <b-form-input type="text" class="form-control" id="{rel_pk_varname}" placeholder="" v-model="field.{rel_pk_varname}" :state="many_entity.{child_entity_varname}.validation_properties[index].{rel_pk_varname}.state"></b-form-input>
-                                                            </b-form-group>"""
+                                                            </b-form-group>""", context, margin=8)
 
                 for rel_col_key, rel_col_type in rel_model.get(child_entity).get('data').items():
                     rel_col_varname = converter.convert_to_system_name(rel_col_key)
@@ -109,13 +119,14 @@ def create(data):
                         "entity_varname": child_entity_varname,
                         "is_many_control": True
                     })
+                    context.update({"rel_col_key": rel_col_key, "rel_col_varname": rel_col_varname, "rel_html_control_code": rel_html_control_code})
                     
-                    source_code += f"""
+                    source_code += cg_template.render("""
                                                             <b-form-group class="form-group col-lg-2" label="{rel_col_key}" label-for="{rel_col_varname}" :invalid-feedback="many_entity.{child_entity_varname}.validation_properties[index].{rel_col_varname}.feedback">
                                                                 {rel_html_control_code}
-                                                            </b-form-group>"""
+                                                            </b-form-group>""", context, margin=8)
 
-                source_code += f"""
+                source_code += cg_template.render("""
                                                             <div class="form-group col-lg-2 ">
                                                                 <b-form-group class="form-group" label="Remove">
                                                                     <input type="button" class="btn bg-danger" alt="Delete" width="40" height="40" @click="many_{child_entity_varname}.remove_row(index)" value="X">
@@ -133,19 +144,19 @@ def create(data):
                                 </b-collapse>
                                 <hr><br>
                             </template>      
-                """
+                """, context, margin=8)
             else:
-                source_code += f"""
+                source_code += cg_template.render("""
                             <b-form-group class="form-group" label="{col}" label-for="{col_varname}" :state="validation_properties.{col_varname}.state" :invalid-feedback="validation_properties.{col_varname}.feedback">
                                 {html_control_code}
-                            </b-form-group>"""
+                            </b-form-group>""", context, margin=8)
         else:
-            source_code += f"""
+            source_code += cg_template.render("""
                             <b-form-group class="form-group" label="{col}" label-for="{col_varname}" :state="validation_properties.{col_varname}.state" :invalid-feedback="validation_properties.{col_varname}.feedback">
                                 {html_control_code}
-                            </b-form-group>"""
+                            </b-form-group>""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                             <button type="button" class="btn btn-secondary" onClick="window.location.href='{entity_varname}.html'">Back</button>
                             <button type="button" class="btn btn-primary float-right" onClick="root.update()">Update</button>
                             </form>
@@ -154,9 +165,9 @@ def create(data):
                 </div>
             </div>
         </div>
-"""
+""", context, margin=8)
 
     source_code += cg_loadmod.create()
     source_code += cg_footer.create()
 
-    return textwrap.dedent(source_code)
\ No newline at end of file
+    return source_code
\ No newline at end of file
@@ -15,7 +15,8 @@ prepend_dir = ""
 if 'libstark' in os.listdir():
     prepend_dir = "libstark.STARK_CodeGen_Static."
 
-cg_navbar  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_navbar")
+cg_navbar   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_navbar")
+import cg_template
 
 
 def create(data, breadcrumb):
@@ -28,13 +29,17 @@ def create(data, breadcrumb):
         #Convert human-friendly names to variable-friendly names
         entity_varname = converter.convert_to_system_name(entity)
 
-    source_code = f"""\
+    context = {"project": project, "breadcrumb": breadcrumb}
+    if breadcrumb != "_HomePage":
+        context.update({"entity": entity, "entity_varname": entity_varname})
+
+    source_code = cg_template.render("""\
         <body>
-"""
+""", context, margin=8)
     source_code += navbar
 
     #Purposely makes a new line after navbar to make navbar code also reusable for semi-static code generation
-    source_code += f"""
+    source_code += cg_template.render("""
         <div class="container-fluid" id="vue-root">
             <div class="row bg-primary mb-3 p-3 text-white" style="background-image: url('images/banner_generic_blue.png')">
                 <div class="col-12 col-md-10">
@@ -61,26 +66,26 @@ def create(data, breadcrumb):
                     </b-button>
                 </div>
             </div>
-"""
+""", context, margin=8)
     if breadcrumb == "_Listview":
-        source_code += f"""\
+        source_code += cg_template.render("""\
             <nav aria-label="breadcrumb">
                 <ol class="breadcrumb">
                     <li class="breadcrumb-item"><a href="home.html">Home</a></li>
                     <li class="breadcrumb-item active" aria-current="page">{entity}</li>
                 </ol>
             </nav>
-"""
+""", context, margin=8)
     elif breadcrumb == "_HomePage":
-        source_code += f"""\
+        source_code += cg_template.render("""\
             <nav aria-label="breadcrumb">
                 <ol class="breadcrumb">
                     <li class="breadcrumb-item active" aria-current="page">Home</li>
                 </ol>
             </nav>
-"""
+""", context, margin=8)
     else:
-        source_code += f"""\
+        source_code += cg_template.render("""\
             <nav aria-label="breadcrumb">
                 <ol class="breadcrumb">
                     <li class="breadcrumb-item"><a href="home.html">Home</a></li>
@@ -88,6 +93,6 @@ def create(data, breadcrumb):
                     <li class="breadcrumb-item active" aria-current="page">{breadcrumb}</li>
                 </ol>
             </nav>
-"""
+""", context, margin=8)
 
     return source_code
@@ -5,11 +5,14 @@
 import base64
 import textwrap
 
+#Private modules
+import cg_template
+
 def create():
 
-    source_code = f"""\
+    source_code = cg_template.render("""\
         </body>
         </html>
-    """
+    """, {}, margin=8)
 
     return source_code
@@ -12,7 +12,8 @@ prepend_dir = ""
 if 'libstark' in os.listdir():
     prepend_dir = "libstark.STARK_CodeGen_Static."
 
-cg_rel  = importlib.import_module(f"{prepend_dir}cgstatic_relationships")
+cg_rel      = importlib.import_module(f"{prepend_dir}cgstatic_relationships")
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data, special="none"):
@@ -29,7 +30,11 @@ def create(data, special="none"):
         #Convert human-friendly names to variable-friendly names
         entity_varname = converter.convert_to_system_name(entity)
 
-    source_code = f"""\
+    context = {"project": project}
+    if special != "HomePage":
+        context.update({"entity": entity, "entity_varname": entity_varname})
+
+    source_code = cg_template.render("""\
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -50,31 +55,31 @@ def create(data, special="none"):
             <script src="js/STARK_spinner.js" defer></script>
             <script src="js/STARK_loading_modal.js" defer></script>
             <script src="js/STARK_nav_bar.js" defer></script>
-            """
+            """, context, margin=8)
 
     if special == "HomePage":
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/STARK_home.js" defer></script>
-            """
+            """, context, margin=8)
 
     else:
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/{entity_varname}_app.js" defer></script>
-            <script src="js/{entity_varname}_view.js" defer></script>"""
+            <script src="js/{entity_varname}_view.js" defer></script>""", context, margin=8)
 
         for rel, rel_data in rel_model.items():
-            many_entity_varname = converter.convert_to_system_name(rel)
-            source_code += f"""
-            <script src="js/many_{many_entity_varname}.js"></script>"""
+            context["many_entity_varname"] = converter.convert_to_system_name(rel)
+            source_code += cg_template.render("""
+            <script src="js/many_{many_entity_varname}.js"></script>""", context, margin=8)
             for rel_col, rel_col_data in rel_data.get('data').items():
                 if isinstance(rel_col_data, dict) and rel_col_data["type"] == 'file-upload':
                     with_upload_on_many = True
                     
                 if isinstance(rel_col_data, dict) and rel_col_data['type'] == 'relationship':
                     # print(rel_col)
-                    rel_entity_varname = converter.convert_to_system_name(rel_col)
-                    source_code += f"""
-            <script src="js/{rel_entity_varname}_app.js" defer></script>"""
+                    context["rel_entity_varname"] = converter.convert_to_system_name(rel_col)
+                    source_code += cg_template.render("""
+            <script src="js/{rel_entity_varname}_app.js" defer></script>""", context, margin=8)
 
         #Figure out which other _app.js files we need to add based on relationships
         for col, col_type in cols.items():
@@ -84,56 +89,56 @@ def create(data, special="none"):
             })
         
             for related in entities:
-                related_varname = converter.convert_to_system_name(related)
-                source_code += f"""
-            <script src="js/{related_varname}_app.js" defer></script>"""
+                context["related_varname"] = converter.convert_to_system_name(related)
+                source_code += cg_template.render("""
+            <script src="js/{related_varname}_app.js" defer></script>""", context, margin=8)
 
             if isinstance(col_type, dict):
                 if col_type["type"] == 'file-upload': 
                     with_upload = True 
 
     if special in ['New', 'Edit'] and (with_upload or with_upload_on_many):
-        source_code += f"""
-            <script src="https://sdk.amazonaws.com/js/aws-sdk-2.1.24.min.js"></script>"""
+        source_code += cg_template.render("""
+            <script src="https://sdk.amazonaws.com/js/aws-sdk-2.1.24.min.js"></script>""", context, margin=8)
 
     if(special in ['none']):
-        source_code += f"""
-            <script src="js/generic_root_get.js" defer></script>"""
+        source_code += cg_template.render("""
+            <script src="js/generic_root_get.js" defer></script>""", context, margin=8)
     elif(special == "New"):
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/generic_check_auth_add.js" defer></script>
-            <script src="js/generic_root_get.js" defer></script>"""
+            <script src="js/generic_root_get.js" defer></script>""", context, margin=8)
     elif(special == "Edit"):
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/generic_root_get.js" defer></script>
-            <script src="js/generic_check_auth_edit.js" defer></script>"""
+            <script src="js/generic_check_auth_edit.js" defer></script>""", context, margin=8)
     elif(special == "Delete"):
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/generic_root_get.js" defer></script>
-            <script src="js/generic_check_auth_delete.js" defer></script>"""
+            <script src="js/generic_check_auth_delete.js" defer></script>""", context, margin=8)
     elif(special == "View"):
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/generic_root_get.js" defer></script>
-            <script src="js/generic_check_auth_view.js" defer></script>"""
+            <script src="js/generic_check_auth_view.js" defer></script>""", context, margin=8)
     elif(special == "Report"):
-        source_code += f"""
-            <script src="js/generic_check_auth_report.js" defer></script>"""
+        source_code += cg_template.render("""
+            <script src="js/generic_check_auth_report.js" defer></script>""", context, margin=8)
     elif(special == "Listview"):
-        source_code += f"""
+        source_code += cg_template.render("""
             <script src="js/generic_root_list.js" defer></script>
-            <script src="js/generic_check_auth_listview.js" defer></script>"""
+            <script src="js/generic_check_auth_listview.js" defer></script>""", context, margin=8)
 
     if special != "HomePage":
-        source_code += f"""
+        source_code += cg_template.render("""
 
             <title>{project} - {entity}</title>
         </head>
-"""
+""", context, margin=8)
     else:
-        source_code += f"""
+        source_code += cg_template.render("""
 
             <title>{project}</title>
         </head>
-"""
+""", context, margin=8)
 
     return source_code
@@ -1,9 +1,14 @@
 #STARK Code Generator component.
 #Produces the customized static content for a STARK system
 
+#Python Standard Library
+
+#Private modules
+import cg_template
+
 def create():
 
-    source_code = f"""\
+    source_code = cg_template.render("""\
         <div>
             <b-modal id="loading-modal"
                 no-close-on-backdrop
@@ -22,6 +27,6 @@ def create():
                 </div>
             </b-modal>
         </div>
-"""
+""", {}, margin=8)
 
     return source_code
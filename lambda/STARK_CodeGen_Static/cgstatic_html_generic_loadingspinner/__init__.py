@@ -1,14 +1,19 @@
 #STARK Code Generator component.
 #Produces the customized static content for a STARK system
 
+#Python Standard Library
+
+#Private modules
+import cg_template
+
 def create():
 
-    source_code = f"""\
+    source_code = cg_template.render("""\
         <div class="d-flex justify-content-center" id="loading-spinner" :style="{{visibility: visibility}}">
             <div class="spinner-border" role="status">
                 <span class="sr-only">Loading...</span>
             </div>
         </div>
-"""
+""", {}, margin=8)
 
     return source_code
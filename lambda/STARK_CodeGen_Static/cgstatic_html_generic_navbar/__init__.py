@@ -5,9 +5,12 @@
 import base64
 import textwrap
 
+#Private modules
+import cg_template
+
 def create():
 
-    source_code = f"""\
+    source_code = cg_template.render("""\
         <div id="mySidenav" class="sidenav">
             <a href="javascript:void(0)" class="sidenav-close-btn" onclick="closeNav()">&times;</a>
             <template v-for="(group, index) in modules" id="nav-groups-template">
@@ -26,6 +29,6 @@ def create():
                     </div>
                 </b-collapse>
             </template>
-        </div>"""
+        </div>""", {}, margin=8)
 
     return source_code
@@ -16,13 +16,14 @@ cg_footer   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_foote
 cg_bodyhead = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_bodyhead")
 cg_loadmod  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingmodal")
 cg_loadspin = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingspinner")
+import cg_template
 
 def create(data):
 
     source_code  = cg_header.create(data, "HomePage")
     source_code += cg_bodyhead.create(data, "_HomePage")
 
-    source_code += f"""\
+    source_code += cg_template.render("""\
             <template v-for="(group, index) in modules" id="groups-template">
                 <!-- <b-button squared size="lg" v-b-toggle="'group-collapse-'+index" variant="light" class="mb-0 pl-2"> -->        
                 <h4>
@@ -48,9 +49,9 @@ def create(data):
             </template>
 
         </div>
-"""
+""", {}, margin=8)
     source_code += cg_loadspin.create()
     source_code += cg_loadmod.create()
     source_code += cg_footer.create()
 
-    return textwrap.dedent(source_code)
+    return source_code
@@ -17,6 +17,7 @@ cg_footer   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_foote
 cg_bodyhead = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_bodyhead")
 cg_loadmod  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingmodal")
 cg_loadspin = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingspinner")
+import cg_template
 
 import convert_friendly_to_system as converter
 
@@ -27,15 +28,26 @@ def create(data):
     cols    = data["Columns"]
     pk      = data["PK"]
     rel_model   = data["Rel Model"]
+    list_view   = data.get("List View", [])
+
+    #Only show the declared list view columns, if any - the list view API only returns those (see cgdynamic_dynamodb)
+    if len(list_view) > 0:
+        cols = {col: cols[col] for col in list_view}
 
     #Convert human-friendly names to variable-friendly names
     entity_varname = converter.convert_to_system_name(entity)
     pk_varname = converter.convert_to_system_name(pk)
 
+    context = {
+        "entity_varname": entity_varname,
+        "pk": pk,
+        "pk_varname": pk_varname
+    }
+
     source_code  = cg_header.create(data, "Listview")
     source_code += cg_bodyhead.create(data, "_Listview")
 
-    source_code += f"""\
+    source_code += cg_template.render("""\
             <div class="row">
                 <div class="col-6">
                     <button type="button" class="btn btn-primary mb-2" onClick="window.location.href='{entity_varname}_add.html'" v-if="auth_list.Add.allowed"> <b>+</b> Add </button>
@@ -54,19 +66,20 @@ def create(data):
                         <thead class="thead-dark">
                             <tr>
                                 <th scope="col">Edit</th>
-                                <th scope="col">{pk}</th>"""
+                                <th scope="col">{pk}</th>""", context, margin=8)
 
     for col, col_type in cols.items():
+        context["col"] = col
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
             if has_many_ux == None:
-                source_code += f"""
-                                <th scope="col">{col}</th>"""
+                source_code += cg_template.render("""
+                                <th scope="col">{col}</th>""", context, margin=8)
         else:
-            source_code += f"""
-                                <th scope="col">{col}</th>"""
+            source_code += cg_template.render("""
+                                <th scope="col">{col}</th>""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                                 <th scope="col">Del</th>
                             </tr>
                         </thead>
@@ -83,21 +96,22 @@ def create(data):
                                         <template id="detail-view" v-if="!auth_list.View.allowed">
                                             {{{{ {entity_varname}.{pk_varname} }}}}
                                         </template>
-                                    </th>"""
+                                    </th>""", context, margin=8)
 
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
+        context["col_varname"] = col_varname
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
             
             if has_many_ux == None:
-                source_code += f"""
-                                    <td>{{{{ {entity_varname}.{col_varname} }}}}</td>"""
+                source_code += cg_template.render("""
+                                    <td>{{{{ {entity_varname}.{col_varname} }}}}</td>""", context, margin=8)
         else:
-            source_code += f"""
-                                    <td>{{{{ {entity_varname}.{col_varname} }}}}</td>"""
+            source_code += cg_template.render("""
+                                    <td>{{{{ {entity_varname}.{col_varname} }}}}</td>""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                                     <td><a :href="'{entity_varname}_delete.html?{pk_varname}=' + {entity_varname}.{pk_varname}"><img src="images/x-square.svg" class="bg-danger" v-if="auth_list.Delete.allowed"></a></td>
                                 </tr>
                             </template>
@@ -106,9 +120,9 @@ def create(data):
                 </div>
             </div>
         </div>
-"""
+""", context, margin=8)
     source_code += cg_loadspin.create()
     source_code += cg_loadmod.create()
     source_code += cg_footer.create()
 
-    return textwrap.dedent(source_code)
+    return source_code
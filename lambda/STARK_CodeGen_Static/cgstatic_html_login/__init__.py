@@ -4,11 +4,15 @@
 #Python Standard Library
 import textwrap
 
+#Private modules
+import cg_template
+
 def create(data):
 
     project_name = data["Project Name"]
+    context      = {"project_name": project_name}
 
-    source_code = f"""\
+    source_code = cg_template.render("""\
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -105,6 +109,6 @@ def create(data):
         
         </div>
         </body>
-        </html>"""
+        </html>""", context, margin=8)
 
-    return textwrap.dedent(source_code)
\ No newline at end of file
+    return source_code
\ No newline at end of file
@@ -18,6 +18,7 @@ cg_bodyhead = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_bodyh
 cg_loadmod  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingmodal")
 cg_loadspin = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingspinner")
 cg_colreport = importlib.import_module(f"{prepend_dir}cgstatic_controls_report")
+import cg_template
 
 import convert_friendly_to_system as converter
 
@@ -33,10 +34,16 @@ def create(data):
     entity_varname = converter.convert_to_system_name(entity)
     pk_varname = converter.convert_to_system_name(pk)
 
+    context = {
+        "entity_varname": entity_varname,
+        "pk": pk,
+        "pk_varname": pk_varname
+    }
+
     source_code  = cg_header.create(data, "Report")
     source_code += cg_bodyhead.create(data, "Report")
 
-    source_code += f"""\
+    source_code += cg_template.render("""\
             <div class="container" v-if="!showReport && !showGraph">
                 <div class="row">
                     <div class="col">
@@ -86,7 +93,7 @@ def create(data):
                                         <td>
                                             <input type="radio" onclick="root.toggle_group_by(event)" class="checkbox-med"  name="check_checkbox" value="{pk_varname}" id="{pk_varname}" v-model="custom_report.STARK_group_by_1" onchange="root.set_x_data_source('{pk_varname}')">
                                         </td>
-                                    </tr>"""
+                                    </tr>""", context, margin=8)
     
 
     for col, col_type in cols.items():
@@ -104,10 +111,11 @@ def create(data):
             "is_many_control": False
         }
         html_control_code = cg_colreport.create(html_control_code)
+        context.update({"col": col, "col_varname": col_varname, "html_control_code": html_control_code})
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
             if has_many_ux == None:
-                source_code += f"""
+                source_code += cg_template.render("""
                                         <tr>
                                             <td>
                                                 <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{col}" id="{col_varname}" v-model="checked_fields">
@@ -137,9 +145,9 @@ def create(data):
                                                 <input type="radio" onclick="root.toggle_group_by(event)" class="checkbox-med" name="check_checkbox" value="{col_varname}" id="{col_varname}" v-model="custom_report.STARK_group_by_1" onchange="root.set_x_data_source('{col_varname}')">
                                             </td>
                                         </tr>
-                                    """                      
+                                    """, context, margin=8)                      
         else:
-            source_code += f"""
+            source_code += cg_template.render("""
                                         <tr>
                                             <td>
                                                 <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{col}" id="{col_varname}" v-model="checked_fields">
@@ -169,17 +177,18 @@ def create(data):
                                                 <input type="radio" onclick="root.toggle_group_by(event)" class="checkbox-med" name="check_checkbox" value="{col_varname}" id="{col_varname}" v-model="custom_report.STARK_group_by_1" onchange="root.set_x_data_source('{col_varname}')">
                                             </td>
                                         </tr>
-                                    """
+                                    """, context, margin=8)
                                     
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
         pk_label = '[' + rel_ent + '] ' + rel_pk
-        source_code += f"""
+        context.update({"var_pk": var_pk, "var_pk_spaced": var_pk.replace('_', ' '), "pk_label": pk_label})
+        source_code += cg_template.render("""
                                         <tr>
                                             <td>
-                                                <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{var_pk.replace('_', ' ')}" id="{var_pk}" v-model="checked_fields">
+                                                <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{var_pk_spaced}" id="{var_pk}" v-model="checked_fields">
                                             </td>
                                             <td>
                                                     <label for="{var_pk}">{pk_label}</label>
@@ -204,14 +213,15 @@ def create(data):
                                                 <input type="radio" onclick="root.toggle_group_by(event)" class="checkbox-med" name="check_checkbox" value="{var_pk}" id="{var_pk}" v-model="custom_report.STARK_group_by_1" onchange="root.set_x_data_source('{var_pk}')">
                                             </td>
                                         </tr>
-                            """
+                            """, context, margin=8)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
             data_label = '[' + rel_ent + '] ' + rel_col
-            source_code += f"""
+            context.update({"var_data": var_data, "var_data_spaced": var_data.replace('_', ' '), "data_label": data_label})
+            source_code += cg_template.render("""
                                         <tr>
                                             <td>
-                                                <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{var_data.replace('_', ' ')}" id="{var_data}" v-model="checked_fields">
+                                                <input type="checkbox" class="checkbox-med" name="check_checkbox" value="{var_data_spaced}" id="{var_data}" v-model="checked_fields">
                                             </td>
                                             <td>
                                                     <label for="{var_data}">{data_label}</label>
@@ -236,11 +246,11 @@ def create(data):
                                                 <input type="radio" onclick="root.toggle_group_by(event)" class="checkbox-med" name="check_checkbox" value="{var_data}" id="{var_data}" v-model="custom_report.STARK_group_by_1" onchange="root.set_x_data_source('{var_data}')">
                                             </td>
                                         </tr>
-                            """
+                            """, context, margin=8)
 
                                     
 
-    source_code += f"""
+    source_code += cg_template.render("""
                                     </table>    
                                     <table class="table table-dark table-striped report">
                                         <tr>
@@ -308,9 +318,9 @@ def create(data):
                             </div>
                         </div>
                     </div>
-                </div>"""
+                </div>""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
             <div v-if="!showReport && showGraph">
                 <div class="row">
                     <div class="col-6 text-left d-inline-block">
@@ -348,8 +358,8 @@ def create(data):
                                     <th v-if="showOperations" scope="col" width = "20px"> Operations </th>
                                     <template v-for="column in STARK_report_fields" id="STARK_report_fields">
                                         <th scope="col">{{{{column}}}}</th>
-                                    </template>"""
-    source_code += f"""         
+                                    </template>""", context, margin=8)
+    source_code += cg_template.render("""         
                                 </tr>
                             </thead>
                             <tbody>
@@ -361,8 +371,8 @@ def create(data):
                                         </td>
                                         <template v-for="column in STARK_report_fields">
                                             <td>{{{{ {entity_varname}[column] }}}}</td>
-                                        </template>"""
-    source_code += f"""             
+                                        </template>""", context, margin=8)
+    source_code += cg_template.render("""             
                                     </tr>
                                 </template>
                                 <template v-if="listview_table.length < 1">
@@ -374,8 +384,8 @@ def create(data):
                 </div>
             </div>
         </div>
-"""
+""", context, margin=8)
     source_code += cg_loadmod.create()
     source_code += cg_footer.create()
 
-    return textwrap.dedent(source_code)
+    return source_code
@@ -16,6 +16,7 @@ cg_header   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_heade
 cg_footer   = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_footer")
 cg_bodyhead = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_bodyhead")
 cg_loadmod  = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingmodal")
+import cg_template
 cg_loadspin = importlib.import_module(f"{prepend_dir}cgstatic_html_generic_loadingspinner")
 
 import convert_friendly_to_system as converter
@@ -32,10 +33,16 @@ def create(data):
     entity_varname = converter.convert_to_system_name(entity)
     pk_varname     = converter.convert_to_system_name(pk)
 
+    context = {
+        "entity_varname": entity_varname,
+        "pk": pk,
+        "pk_varname": pk_varname
+    }
+
     source_code  = cg_header.create(data, "View")
     source_code += cg_bodyhead.create(data, "View")
 
-    source_code += f"""\
+    source_code += cg_template.render("""\
             <div class="container hidden" :style="{{visibility: visibility}}">
                 <div class="row">
                     <div class="col">
@@ -47,10 +54,11 @@ def create(data):
                                 <div class="col-sm-10">
                                     <input type="text" class="form-control-plaintext" readonly id="{pk_varname}" placeholder="" v-model="{entity_varname}.{pk_varname}">
                                 </div>
-                            </div>"""
+                            </div>""", context, margin=8)
 
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
+        context.update({"col": col, "col_varname": col_varname})
         if isinstance(col_type, dict):
             if col_type["type"] == "relationship":
                 has_one = col_type.get('has_one', '')
@@ -58,22 +66,24 @@ def create(data):
                 has_many_ux = col_type.get('has_many_ux', None)
 
                 if  has_one != '':
-                    source_code += f"""
+                    source_code += cg_template.render("""
                             <div class="form-group row">
                                 <label for="{col_varname}" class="col-sm-2 col-form-label">{col}</label>
-                                <div class="col-sm-10">"""
+                                <div class="col-sm-10">""", context, margin=8)
                 #simple 1-1 relationship
                     foreign_entity  = converter.convert_to_system_name(has_one)
-                    source_code += f"""
-                                    <input type="text" class="form-control-plaintext" readonly id="{foreign_entity}" placeholder="" v-model="{entity_varname}.{foreign_entity}">"""
-                    source_code += f"""
+                    context["foreign_entity"] = foreign_entity
+                    source_code += cg_template.render("""
+                                    <input type="text" class="form-control-plaintext" readonly id="{foreign_entity}" placeholder="" v-model="{entity_varname}.{foreign_entity}">""", context, margin=8)
+                    source_code += cg_template.render("""
                                 </div>
-                            </div>"""
+                            </div>""", context, margin=8)
                 if  has_many != '':
                 # 1-M relationship
                     foreign_entity  = converter.convert_to_system_name(has_many)
+                    context["foreign_entity"] = foreign_entity
                     if has_many_ux == None:
-                        source_code += f"""
+                        source_code += cg_template.render("""
                             <div class="form-group row">
                                 <label for="{col_varname}" class="col-sm-2 col-form-label">{col}</label>
                                 <div class="col-sm-10">
@@ -95,12 +105,13 @@ def create(data):
                                         </b-form-tags>
                                     </b-form-group>
                                 </div>
-                            </div>"""  
+                            </div>""", context, margin=8)  
                     else:
                         rel_pk = rel_model[has_many].get('pk')
                         rel_pk_varname = converter.convert_to_system_name(rel_pk)
                         child_entity_varname = converter.convert_to_system_name(foreign_entity)
-                        source_code += f"""
+                        context.update({"has_many": has_many, "child_entity_varname": child_entity_varname, "rel_pk": rel_pk, "rel_pk_varname": rel_pk_varname})
+                        source_code += cg_template.render("""
                             <template>
                             <a v-b-toggle class="text-decoration-none" @click.prevent>
                                 <span class="when-open"><img src="images/chevron-up.svg" class="filter-fill-svg-link" height="20rem"></span><span class="when-closed"><img src="images/chevron-down.svg" class="filter-fill-svg-link" height="20rem"></span>
@@ -120,24 +131,25 @@ def create(data):
                                                         </div>
                                                         <b-form-group class="form-group col-sm"  label="{rel_pk}" label-for="{rel_pk_varname}">
                                                             <b-form-input type="text" class="form-control" readonly id="{rel_pk_varname}" placeholder="" v-model="field.{rel_pk_varname}"></b-form-input>
-                                                        </b-form-group>"""
+                                                        </b-form-group>""", context, margin=8)
 
                         for rel_col_key, rel_col_type in rel_model.get(has_many).get('data').items():
                             rel_col_varname = converter.convert_to_system_name(rel_col_key)
+                            context.update({"rel_col_key": rel_col_key, "rel_col_varname": rel_col_varname})
                             if isinstance(rel_col_type, dict) and rel_col_type["type"] == "file-upload":
-                                source_code += f"""
+                                source_code += cg_template.render("""
                                                         <b-form-group class="form-group col-sm" label="{rel_col_key}" label-for="{rel_col_varname}">
                                                             <a :href="'https://'+ object_url_prefix + many_entity.{col_varname}.STARK_uploaded_s3_keys.{rel_col_varname}[index]">
                                                                 <b-form-input type="text" class="form-control-link" readonly id="{rel_col_varname}" placeholder="" v-model="field.{rel_col_varname}">
                                                             </a>
-                                                        </b-form-group>"""
+                                                        </b-form-group>""", context, margin=8)
                             else:
-                                source_code += f"""
+                                source_code += cg_template.render("""
                                                         <b-form-group class="form-group col-sm" label="{rel_col_key}" label-for="{rel_col_varname}">
                                                             <b-form-input type="text" class="form-control" readonly id="{rel_col_varname}" placeholder="" v-model="field.{rel_col_varname}">
-                                                        </b-form-group>"""
+                                                        </b-form-group>""", context, margin=8)
 
-                        source_code += f"""
+                        source_code += cg_template.render("""
                                                     </div>
                                                 </form>
                                             </div>
@@ -146,9 +158,9 @@ def create(data):
                                 </div>
                             </b-collapse>
                             <hr><br>
-                            </template>"""
+                            </template>""", context, margin=8)
             elif col_type["type"] == 'file-upload':
-                source_code += f""" 
+                source_code += cg_template.render(""" 
                             <div class="form-group row">
                                 <label for="{col_varname}" class="col-sm-2 col-form-label">{col}</label>
                                     <a :href="'https://'+ object_url_prefix + {entity_varname}.STARK_uploaded_s3_keys.{col_varname}">
@@ -160,24 +172,24 @@ def create(data):
                                             <img :src="'https://'+ object_url_prefix + {entity_varname}.STARK_uploaded_s3_keys.{col_varname}" alt="" class="img-preview">
                                         </b-tooltip>
                                     </template>
-                                </div>"""  
+                                </div>""", context, margin=8)  
             else:
-                source_code += f"""
+                source_code += cg_template.render("""
                             <div class="form-group row">
                                 <label for="{col_varname}" class="col-sm-2 col-form-label">{col}</label>
                                 <div class="col-sm-10">
                                     <input type="text" class="form-control-plaintext" readonly id="{col_varname}" placeholder="" v-model="{entity_varname}.{col_varname}">
                                 </div>
-                            </div>"""
+                            </div>""", context, margin=8)
         else:
-            source_code += f"""
+            source_code += cg_template.render("""
                             <div class="form-group row">
                                 <label for="{col_varname}" class="col-sm-2 col-form-label">{col}</label>
                                 <div class="col-sm-10">
                                     <input type="text" class="form-control-plaintext" readonly id="{col_varname}" placeholder="" v-model="{entity_varname}.{col_varname}">
                                 </div>
-                            </div>"""
-    source_code += f"""
+                            </div>""", context, margin=8)
+    source_code += cg_template.render("""
                             <button type="button" class="btn btn-secondary" onClick="window.location.href='{entity_varname}.html'">Back</button>
                             </form>
                         </div>
@@ -185,9 +197,9 @@ def create(data):
                 </div>
             </div>
         </div>
-"""
+""", context, margin=8)
         
     source_code += cg_loadmod.create()
     source_code += cg_footer.create()
 
-    return textwrap.dedent(source_code)
\ No newline at end of file
+    return source_code
\ No newline at end of file
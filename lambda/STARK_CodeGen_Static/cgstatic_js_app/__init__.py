@@ -2,9 +2,9 @@
 #Produces the customized static content for a STARK system
 
 #Python Standard Library
-import textwrap
 
 #Private modules
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -17,7 +17,13 @@ def create(data):
     entity_app     = entity_varname + '_app'
     pk_varname     = converter.convert_to_system_name(pk)
 
-    source_code = f"""\
+    context = {
+        "entity_varname": entity_varname,
+        "entity_app": entity_app,
+        "pk_varname": pk_varname
+    }
+
+    source_code = cg_template.render("""\
         var {entity_app} = {{
             
             api_endpoint: STARK.{entity_varname}_url,
@@ -62,6 +68,6 @@ def create(data):
                     return STARK.request('GET', fetchUrl)
             }},
         }}
-        """
+        """, context, margin=8)
         
-    return textwrap.dedent(source_code)
\ No newline at end of file
+    return source_code
\ No newline at end of file
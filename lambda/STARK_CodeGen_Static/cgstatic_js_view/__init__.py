@@ -12,7 +12,8 @@ prepend_dir = ""
 if 'libstark' in os.listdir():
     prepend_dir = "libstark.STARK_CodeGen_Static."
 
-cg_coltype = importlib.import_module(f"{prepend_dir}cgstatic_controls_coltype")  
+cg_coltype  = importlib.import_module(f"{prepend_dir}cgstatic_controls_coltype")
+import cg_template
 import convert_friendly_to_system as converter
 
 def create(data):
@@ -43,24 +44,32 @@ def create(data):
                 if rel_col_type["type"] == 'file-upload': 
                     with_upload_on_many = True
 
-    source_code = f"""\
+    context = {
+        "entity": entity,
+        "entity_varname": entity_varname,
+        "entity_app": entity_app,
+        "pk_varname": pk_varname
+    }
+
+    source_code = cg_template.render("""\
         var root = new Vue({{
             el: "#vue-root",
             data: {{
                 metadata: {{
                     '{pk_varname}': {{
-                        'value': '',"""
+                        'value': '',""", context, margin=8)
     if len(sequence) > 0:
         required = "false"
     else:
         required = "true"
         
-    source_code += f"""
-                        'required': {required},"""
-    source_code += f"""                
+    context["required"] = required
+    source_code += cg_template.render("""
+                        'required': {required},""", context, margin=8)
+    source_code += cg_template.render("""                
                         'max_length': '',
                         'data_type': 'String'
-                    }},"""
+                    }},""", context, margin=8)
     
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
@@ -68,44 +77,48 @@ def create(data):
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
             if has_many_ux == None:
-                source_code += f"""
+                context.update({"col_varname": col_varname, "data_type": data_type})
+                source_code += cg_template.render("""
                     '{col_varname}': {{
                         'value': '',
                         'required': true,
                         'max_length': '',
                         'data_type': '{data_type}'
-                    }},""" 
+                    }},""", context, margin=8) 
         else:
-            source_code += f"""
+            context.update({"col_varname": col_varname, "data_type": data_type})
+            source_code += cg_template.render("""
                     '{col_varname}': {{
                         'value': '',
                         'required': true,
                         'max_length': '',
                         'data_type': '{data_type}'
-                    }},""" 
+                    }},""", context, margin=8) 
     
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-        source_code += f"""
+        context["var_pk"] = var_pk
+        source_code += cg_template.render("""
                     '{var_pk}': {{
                         'value': '',
                         'required': false,
                         'max_length': '',
                         'data_type': '',
-                    }},""" 
+                    }},""", context, margin=8) 
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-            source_code += f"""
+            context["var_data"] = var_data
+            source_code += cg_template.render("""
                     '{var_data}': {{
                         'value': '',
                         'required': false,
                         'max_length': '',
                         'data_type': '',
-                    }},"""
+                    }},""", context, margin=8)
                     
-    source_code += f"""
+    source_code += cg_template.render("""
                     'STARK_Report_Type': {{
                         'value': '',
                         'required': true,
@@ -136,7 +149,7 @@ def create(data):
                     '{pk_varname}': {{
                         'state': null,
                         'feedback': ''
-                    }},"""
+                    }},""", context, margin=8)
     
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
@@ -144,19 +157,21 @@ def create(data):
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many_ux = col_type.get('has_many_ux', None)
             if has_many_ux == None:
-                source_code += f"""
+                context["col_varname"] = col_varname
+                source_code += cg_template.render("""
                     '{col_varname}': {{
                         'state': null,
                         'feedback': ''
-                    }},""" 
+                    }},""", context, margin=8) 
         else:
-            source_code += f"""
+            context["col_varname"] = col_varname
+            source_code += cg_template.render("""
                     '{col_varname}': {{
                         'state': null,
                         'feedback': ''
-                    }},""" 
+                    }},""", context, margin=8) 
                     
-    source_code += f"""
+    source_code += cg_template.render("""
                     'STARK_Report_Type': {{
                         'state': null,
                         'feedback': ''
@@ -190,36 +205,40 @@ def create(data):
                 STARK_report_fields: [],
                 {entity_varname}: {{
                     '{pk_varname}': '',
-                    'sk': '',"""
+                    'sk': '',""", context, margin=8)
 
     for col in cols:
         col_varname = converter.convert_to_system_name(col)
-        source_code += f"""
-                    '{col_varname}': '',""" 
+        context["col_varname"] = col_varname
+        source_code += cg_template.render("""
+                    '{col_varname}': '',""", context, margin=8) 
 
-    source_code += f"""
+    source_code += cg_template.render("""
                     'STARK_uploaded_s3_keys':{{}}
                 }},
                 custom_report:{{
-                    '{pk_varname}': {{"operator": "", "value": "", "type":"S"}},"""
+                    '{pk_varname}': {{"operator": "", "value": "", "type":"S"}},""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         col_type_id = set_type(col_type)
-        source_code += f"""
-                    '{col_varname}':  {{"operator": "", "value": "", "type":"{col_type_id}"}},""" 
+        context.update({"col_varname": col_varname, "col_type_id": col_type_id})
+        source_code += cg_template.render("""
+                    '{col_varname}':  {{"operator": "", "value": "", "type":"{col_type_id}"}},""", context, margin=8) 
 
     for rel_ent in rel_model:
         rel_cols = rel_model[rel_ent]["data"]
         rel_pk = rel_model[rel_ent]["pk"]
         var_pk = rel_ent.replace(' ', '_') + '_' + rel_pk.replace(' ', '_')
-        source_code += f"""
-                    '{var_pk}':  {{"operator": "", "value": "", "type":"S"}},"""
+        context["var_pk"] = var_pk
+        source_code += cg_template.render("""
+                    '{var_pk}':  {{"operator": "", "value": "", "type":"S"}},""", context, margin=8)
         for rel_col, rel_col_type in rel_cols.items():
             var_data = rel_ent.replace(' ', '_') + '_' + rel_col.replace(' ', '_')
-            source_code += f"""
-                    '{var_data}':  {{"operator": "", "value": "", "type":"S"}},"""
+            context["var_data"] = var_data
+            source_code += cg_template.render("""
+                    '{var_data}':  {{"operator": "", "value": "", "type":"S"}},""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                     'STARK_isReport':true,
                     'STARK_report_fields':[],
                     'STARK_Report_Type': '',
@@ -255,7 +274,7 @@ def create(data):
                     ],
                     'STARK_Data_Source': [
 
-                    ],"""
+                    ],""", context, margin=8)
 
     for rel in rel_model:
         rel_cols = rel_model[rel]["data"]
@@ -263,9 +282,10 @@ def create(data):
             if isinstance(col_type, dict) and col_type["type"] == "relationship":
                 has_one = col_type.get('has_one', '')
                 if has_one != '':
-                    source_code += f"""
+                    context["has_one"] = has_one
+                    source_code += cg_template.render("""
                     '{has_one}': [
-                    ],"""
+                    ],""", context, margin=8)
         
                     
 
@@ -278,12 +298,13 @@ def create(data):
         })
 
         if js_list_code != None:
-            source_code += f"""
-                    {js_list_code}"""
+            context["js_list_code"] = js_list_code
+            source_code += cg_template.render("""
+                    {js_list_code}""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                 }},
-                list_status: {{"""
+                list_status: {{""", context, margin=8)
 
     #FIXME: These kinds of logic (determining col types, lists, retreiving settings, etc) are repetitive, should be refactored shipped to a central lib
     for col, col_type in cols.items():
@@ -296,14 +317,15 @@ def create(data):
                 #simple 1-1 relationship
                     col_varname = converter.convert_to_system_name(col)
 
-                    source_code += f"""
-                    '{col_varname}': 'empty',"""
+                    context["col_varname"] = col_varname
+                    source_code += cg_template.render("""
+                    '{col_varname}': 'empty',""", context, margin=8)
 
 
 
-    source_code += f"""
+    source_code += cg_template.render("""
                 }},
-                multi_select_values: {{"""
+                multi_select_values: {{""", context, margin=8)
 
     #FIXME: These kinds of logic (determining col types, lists, retreiving settings, etc) are repetitive, should be refactored shipped to a central lib
     for col, col_type in cols.items():
@@ -315,13 +337,15 @@ def create(data):
                 has_many_ux = col_type.get('has_many_ux', '')
                 if  has_many != '':
                     if has_many_ux == '':
-                        source_code += f"""
-                        '{col_varname}': [],"""
+                        context["col_varname"] = col_varname
+                        source_code += cg_template.render("""
+                        '{col_varname}': [],""", context, margin=8)
             elif isinstance(col_values, list):
-                    source_code += f"""
-                        '{col_varname}': [],"""
+                    context["col_varname"] = col_varname
+                    source_code += cg_template.render("""
+                        '{col_varname}': [],""", context, margin=8)
                 
-    source_code += f"""
+    source_code += cg_template.render("""
 
                 }},
                 visibility: 'hidden',
@@ -340,7 +364,7 @@ def create(data):
                 error_message: '',
                 authFailure: false,
                 authTry: false,
-                all_selected: true,"""
+                all_selected: true,""", context, margin=8)
     field_strings = f"['{pk}',"
     for col, col_type in cols.items():
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
@@ -360,9 +384,10 @@ def create(data):
             field_strings += f"""'{var_data.replace('_', ' ')}',"""
 
     field_strings += f"""]"""
-    source_code += f"""
+    context["field_strings"] = field_strings
+    source_code += cg_template.render("""
                 temp_checked_fields: {field_strings},
-                checked_fields: {field_strings},"""
+                checked_fields: {field_strings},""", context, margin=8)
                 
     search_string       = ""
     for col, col_type in cols.items():
@@ -371,22 +396,27 @@ def create(data):
             col_values = col_type.get("values", "")
             if col_type["type"] == "relationship" or isinstance(col_values, list):
                 has_many = col_type.get('has_many', '')
-                search_string += f"""
-                    {col_varname}: '',"""
+                context["col_varname"] = col_varname
+                search_string += cg_template.render("""
+                    {col_varname}: '',""", context, margin=8)
             if col_type["type"] == 'file-upload': 
                 with_upload = True 
-                ext_string += f"""
-                         "{col_varname}": {col_type.get("allowed_ext",[])},"""
-                allowed_size = col_type.get("max_upload_size", 1)
-                allowed_size_string += f"""
-                         "{col_varname}": {float(allowed_size)},"""
-                upload_elems_string += f"""
-                        "{col_varname}": {{"file": '', "progress_bar_val": 0, "tmp_location": ""}},"""
+                allowed_ext  = col_type.get("allowed_ext",[])
+                context.update({"col_varname": col_varname, "allowed_ext": allowed_ext})
+                ext_string += cg_template.render("""
+                         "{col_varname}": {allowed_ext},""", context, margin=8)
+                allowed_size = float(col_type.get("max_upload_size", 1))
+                context["allowed_size"] = allowed_size
+                allowed_size_string += cg_template.render("""
+                         "{col_varname}": {allowed_size},""", context, margin=8)
+                upload_elems_string += cg_template.render("""
+                        "{col_varname}": {{"file": '', "progress_bar_val": 0, "tmp_location": ""}},""", context, margin=8)
     if with_upload or with_upload_on_many:
-        source_code += f"""
-                s3_access: "","""
+        source_code += cg_template.render("""
+                s3_access: "",""", context, margin=8)
     if with_upload:
-        source_code += f"""
+        context.update({"upload_elems_string": upload_elems_string, "ext_string": ext_string, "allowed_size_string": allowed_size_string})
+        source_code += cg_template.render("""
                 STARK_upload_elements: {{{upload_elems_string}
                 }},
                 ext_whitelist: {{{ext_string}
@@ -394,8 +424,9 @@ def create(data):
                 allowed_size: {{{allowed_size_string}
                 }},
                 ext_whitelist_table: "",
-                allowed_size_table: 0,"""
-    source_code += f"""
+                allowed_size_table: 0,""", context, margin=8)
+    context["search_string"] = search_string
+    source_code += cg_template.render("""
                 search:{{{search_string}
                 }},
                 showGraph: false,
@@ -409,17 +440,18 @@ def create(data):
                 STARK_group_by_1: '',
                 Y_Data: [],
                 showOperations: true,
-                many_entity: {{"""
+                many_entity: {{""", context, margin=8)
             
     if relationships.get('has_many', '') != '':
         for relation in relationships.get('has_many'):
             if relation.get('type') == 'repeater':
                 many_entity = relation.get('entity')
                 many_entity_varname = converter.convert_to_system_name(many_entity)
-                source_code += f"""    
-                    '{many_entity_varname}': many_{many_entity_varname},"""
+                context["many_entity_varname"] = many_entity_varname
+                source_code += cg_template.render("""    
+                    '{many_entity_varname}': many_{many_entity_varname},""", context, margin=8)
     
-    source_code += f"""
+    source_code += cg_template.render("""
                 }},
             }},
             methods: {{
@@ -434,23 +466,24 @@ def create(data):
                 }},
 
                 add: function () {{
-                    console.log("VIEW: Inserting!")"""
+                    console.log("VIEW: Inserting!")""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
             has_many = col_type.get('has_many', '')
             has_many_ux = col_type.get('has_many_ux', '')
             if has_many != "" and has_many_ux != 'repeater':
-                source_code += f"""
-                    this.{entity_varname}.{col_varname} = (root.multi_select_values.{col_varname}.sort()).join(', ')"""
+                context["col_varname"] = col_varname
+                source_code += cg_template.render("""
+                    this.{entity_varname}.{col_varname} = (root.multi_select_values.{col_varname}.sort()).join(', ')""", context, margin=8)
     
-    source_code += f"""
-                    response = STARK.validate_form(root.metadata, root.{entity_varname}""" 
+    source_code += cg_template.render("""
+                    response = STARK.validate_form(root.metadata, root.{entity_varname}""", context, margin=8) 
     if with_upload:
         source_code += f", root.STARK_upload_elements"
 
-    source_code += f""")
-                    this.validation_properties = response['validation_properties']"""
+    source_code += cg_template.render(""")
+                    this.validation_properties = response['validation_properties']""", context, margin=8)
     validation = ''
     for col, col_type in cols.items():
         if isinstance(col_type, dict):
@@ -461,13 +494,15 @@ def create(data):
                 has_many = col_type.get('has_many', '')
                 if has_many != '':
                     if has_many_ux == 'repeater':
-                        source_code += f"""
-                    many_{col_varname}_validation = many_{col_varname}.many_validation()"""
+                        context["col_varname"] = col_varname
+                        source_code += cg_template.render("""
+                    many_{col_varname}_validation = many_{col_varname}.many_validation()""", context, margin=8)
                         validation += f" && many_{col_varname}_validation"
                         
-    source_code += f"""
+    context["validation"] = validation
+    source_code += cg_template.render("""
                     if(response['is_valid_form']{validation}) {{
-                        loading_modal.show()"""
+                        loading_modal.show()""", context, margin=8)
     for col, col_type in cols.items():
         if isinstance(col_type, dict):
             col_varname = converter.convert_to_system_name(col)
@@ -477,24 +512,26 @@ def create(data):
                 has_many = col_type.get('has_many', '')
                 if has_many != '':
                     if has_many_ux == 'repeater':
-                        source_code += f"""
-                        this.{entity_varname}.{col_varname} = JSON.stringify(root.many_entity.{col_varname}.module_fields)"""
+                        context["col_varname"] = col_varname
+                        source_code += cg_template.render("""
+                        this.{entity_varname}.{col_varname} = JSON.stringify(root.many_entity.{col_varname}.module_fields)""", context, margin=8)
 
                     if with_upload_on_many:
-                        source_code += f"""
+                        source_code += cg_template.render("""
                         for (const key in root.many_entity) {{
                             if (Object.hasOwnProperty.call(root.many_entity, key)) {{
                                 var element = root.many_entity[key];
                                 this.{entity_varname}.STARK_uploaded_s3_keys[`many_${{key}}`] = element.STARK_uploaded_s3_keys
                             }}
-                        }}"""
+                        }}""", context, margin=8)
                         
-    source_code += f"""    
+    source_code += cg_template.render("""    
                         let data = {{ {entity_varname}: this.{entity_varname} }}
 
                         {entity_app}.add(data).then( function(data) {{
                             loading_modal.hide()
-                            if(data != "OK")
+                            //Surge protection queues the write and answers with a tracking id instead of "OK"
+                            if(data != "OK" && !data.hasOwnProperty('Tracking_ID'))
                             {{
                                 for (var key in data) {{
                                     if (data.hasOwnProperty(key)) {{
@@ -537,7 +574,7 @@ def create(data):
                 }},
 
                 update: function () {{
-                    console.log("VIEW: Updating!")"""
+                    console.log("VIEW: Updating!")""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
@@ -545,16 +582,17 @@ def create(data):
             has_many_ux = col_type.get('has_many_ux', '')
             if has_many != "":
                 if has_many_ux == '':
-                    source_code += f"""
-                    this.{entity_varname}.{col_varname} = (root.multi_select_values.{col_varname}.sort()).join(', ')"""
+                    context["col_varname"] = col_varname
+                    source_code += cg_template.render("""
+                    this.{entity_varname}.{col_varname} = (root.multi_select_values.{col_varname}.sort()).join(', ')""", context, margin=8)
     
-    source_code += f"""
-                    response = STARK.validate_form(root.metadata, root.{entity_varname}""" 
+    source_code += cg_template.render("""
+                    response = STARK.validate_form(root.metadata, root.{entity_varname}""", context, margin=8) 
     if with_upload:
         source_code += f", root.STARK_upload_elements"
 
-    source_code += f""")
-                    this.validation_properties = response['validation_properties']"""
+    source_code += cg_template.render(""")
+                    this.validation_properties = response['validation_properties']""", context, margin=8)
     validation = ''
     for col, col_type in cols.items():
         if isinstance(col_type, dict):
@@ -565,13 +603,15 @@ def create(data):
                 has_many = col_type.get('has_many', '')
                 if has_many != '':
                     if has_many_ux == 'repeater':
-                        source_code += f"""
-                    many_{col_varname}_validation = many_{col_varname}.many_validation()"""
+                        context["col_varname"] = col_varname
+                        source_code += cg_template.render("""
+                    many_{col_varname}_validation = many_{col_varname}.many_validation()""", context, margin=8)
                         validation += f" && many_{col_varname}_validation"  
                         
-    source_code += f"""
+    context["validation"] = validation
+    source_code += cg_template.render("""
                     if(response['is_valid_form']{validation}) {{
-                        loading_modal.show()"""
+                        loading_modal.show()""", context, margin=8)
     for col, col_type in cols.items():
         if isinstance(col_type, dict):
             col_varname = converter.convert_to_system_name(col)
@@ -582,15 +622,17 @@ def create(data):
                 if has_many != '':
                     if has_many_ux == 'repeater':
                         # print(has_many)
-                        source_code += f"""
-                        this.{entity_varname}.{col_varname} = JSON.stringify(root.many_entity.{col_varname}.module_fields)"""
+                        context["col_varname"] = col_varname
+                        source_code += cg_template.render("""
+                        this.{entity_varname}.{col_varname} = JSON.stringify(root.many_entity.{col_varname}.module_fields)""", context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                         let data = {{ {entity_varname}: this.{entity_varname} }}
 
                         {entity_app}.update(data).then( function(data) {{
                             loading_modal.hide()
-                            if(data != "OK")
+                            //Surge protection queues the write and answers with a tracking id instead of "OK"
+                            if(data != "OK" && !data.hasOwnProperty('Tracking_ID'))
                             {{
                                 for (var key in data) {{
                                     if (data.hasOwnProperty(key)) {{
@@ -634,23 +676,24 @@ def create(data):
                         console.log("VIEW: Getting!")
 
                         {entity_app}.get(data).then( function(data) {{
-                            root.{entity_varname} = data["item"];"""
+                            root.{entity_varname} = data["item"];""", context, margin=8)
     if with_upload or with_upload_on_many:
-        source_code += f"""
-                            root.object_url_prefix = data['object_url_prefix']"""
-    source_code += f"""
-                            root.{entity_varname}.orig_{pk_varname} = root.{entity_varname}.{pk_varname};"""
+        source_code += cg_template.render("""
+                            root.object_url_prefix = data['object_url_prefix']""", context, margin=8)
+    source_code += cg_template.render("""
+                            root.{entity_varname}.orig_{pk_varname} = root.{entity_varname}.{pk_varname};""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         if isinstance(col_type, dict) and col_type['type'] == 'file-upload':
-            source_code += f"""
+            context["col_varname"] = col_varname
+            source_code += cg_template.render("""
                             root.{entity_varname}.STARK_uploaded_s3_keys['{col_varname}'] = root.{entity_varname}.{col_varname} != "" ? root.{entity_varname}.STARK_uploaded_s3_keys.{col_varname} : ""
                             root.{entity_varname}.orig_STARK_uploaded_s3_keys = structuredClone(Object.fromEntries(Object.entries(data["item"]['STARK_uploaded_s3_keys'])))
                             root.STARK_upload_elements['{col_varname}'].file = root.{entity_varname}.{col_varname} != "" ? root.{entity_varname}.{col_varname} : ""
                             root.STARK_upload_elements['{col_varname}'].progress_bar_val = root.{entity_varname}.{col_varname} != "" ? 100 : 0
                             root.STARK_upload_elements['{col_varname}'].tmp_location = `https://${{root.object_url_prefix}}${{root.{entity_varname}.STARK_uploaded_s3_keys.{col_varname}}}`
                             
-                            """
+                            """, context, margin=8)
 
     #If there are 1:1 rel fields, we need to assign their initial value to the still-unpopulated drop-down list so that it displays 
     #   a value even before the lazy-loading is triggered.
@@ -666,35 +709,39 @@ def create(data):
 
             if  has_one != '':
                 #simple 1-1 relationship
-                source_code += f"""
+                context.update({"foreign_field": foreign_field, "foreign_entity": foreign_entity})
+                source_code += cg_template.render("""
                             root.lists.{foreign_field} = [  {{ value: root.{entity_varname}.{foreign_field}, text: root.{entity_varname}.{foreign_field} }},]
-                            root.list_{foreign_entity}()"""
+                            root.list_{foreign_entity}()""", context, margin=8)
             
             elif has_many != "" and has_many_ux != 'repeater':
-                source_code += f"""
+                context["foreign_entity"] = foreign_entity
+                source_code += cg_template.render("""
                             root.multi_select_values.{foreign_entity} = root.{entity_varname}.{foreign_entity}.split(', ')
-                            root.list_{foreign_entity}()"""
+                            root.list_{foreign_entity}()""", context, margin=8)
 
     for rel, rel_data in rel_model.items():
         col_varname = converter.convert_to_system_name(rel)
-        source_code += f"""
-                            if(data["{col_varname}"].length > 0) {{"""
+        context["col_varname"] = col_varname
+        source_code += cg_template.render("""
+                            if(data["{col_varname}"].length > 0) {{""", context, margin=8)
         if with_upload_on_many:
-            source_code += f"""
-                                root.many_entity.{col_varname}.STARK_uploaded_s3_keys = root.{entity_varname}.STARK_uploaded_s3_keys['many_{col_varname}']"""
-        source_code += f"""
+            source_code += cg_template.render("""
+                                root.many_entity.{col_varname}.STARK_uploaded_s3_keys = root.{entity_varname}.STARK_uploaded_s3_keys['many_{col_varname}']""", context, margin=8)
+        source_code += cg_template.render("""
                                 var many_object = JSON.parse(data["{col_varname}"])
                                 many_object.forEach(element => {{
                                     root.many_entity.{col_varname}.add_row(element)
                                 }});
-                            }}"""
+                            }}""", context, margin=8)
         for col, col_type in rel_data.get('data').items():
             if isinstance(col_type, dict) and col_type["type"] == "relationship":
                 rel_foreign_entity = converter.convert_to_system_name(col)
-                source_code += f"""
-                            root.many_entity.{col_varname}.list_{rel_foreign_entity}()"""
+                context["rel_foreign_entity"] = rel_foreign_entity
+                source_code += cg_template.render("""
+                            root.many_entity.{col_varname}.list_{rel_foreign_entity}()""", context, margin=8)
     
-    source_code += f"""
+    source_code += cg_template.render("""
                             console.log("VIEW: Retreived module data.")
                             root.show()
                             loading_modal.hide()
@@ -750,7 +797,7 @@ def create(data):
                     }}
                     
                     if(fetch_from_db) {{
-                        {entity_app}.list(payload).then( function(data) {{"""
+                        {entity_app}.list(payload).then( function(data) {{""", context, margin=8)
 
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
@@ -759,13 +806,14 @@ def create(data):
             has_many_ux = col_type.get('has_many_ux', '')
             if has_many != "" and has_many_ux != 'repeater':
                 foreign_entity  = converter.convert_to_system_name(has_many)
-                source_code += f"""
+                context["foreign_entity"] = foreign_entity
+                source_code += cg_template.render("""
                             for (let x = 0; x < (data['Items']).length; x++) {{
                                 data['Items'][x]['{foreign_entity}'] = ((data['Items'][x]['{foreign_entity}'].split(', ')).sort()).join(', ')      
                             }}
-                """
+                """, context, margin=8)
                         
-    source_code += f"""
+    source_code += cg_template.render("""
                             token = data['Next_Token'];
                             root.listview_table = data['Items'];
                             var data_to_store = {{}}
@@ -838,15 +886,16 @@ def create(data):
                             root.showGraph = true
                         }}
 
-                        root.custom_report['STARK_report_fields'] = root.checked_fields"""
+                        root.custom_report['STARK_report_fields'] = root.checked_fields""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         if isinstance(col_type, dict):
             col_values = col_type.get("values", "")
             if isinstance(col_values, list):
-                source_code += f"""
-                        root.custom_report['{col_varname}']['value'] = root.custom_report['{col_varname}']['value'] == "" ? root.multi_select_values['{col_varname}'].join(', '): root.custom_report['{col_varname}']['value']"""
-    source_code += f"""
+                context["col_varname"] = col_varname
+                source_code += cg_template.render("""
+                        root.custom_report['{col_varname}']['value'] = root.custom_report['{col_varname}']['value'] == "" ? root.multi_select_values['{col_varname}'].join(', '): root.custom_report['{col_varname}']['value']""", context, margin=8)
+    source_code += cg_template.render("""
                         let report_payload = {{ {entity_varname}: root.custom_report }}
                         if(root.formValidation())
                         {{
@@ -972,10 +1021,10 @@ def create(data):
                     root.checked_fields = [field.replaceAll("_", " ")]
                     root.all_selected = false
                 }},
-        """
+        """, context, margin=8)
         
     if with_upload:
-        source_code += f"""
+        source_code += cg_template.render("""
                 show_preview(filename) {{
                     if(typeof filename == 'string') {{
                         ext = filename.split('.').pop()
@@ -1118,8 +1167,8 @@ def create(data):
                         xhr.open('POST', preSignedUrl);
                         xhr.send(formData);
                     }});
-                }},"""
-    source_code += f"""
+                }},""", context, margin=8)
+    source_code += cg_template.render("""
                 onOptionClick({{ option, addTag }}, reference) {{
                     addTag(option.value)
                     this.search[reference] = ''
@@ -1134,14 +1183,16 @@ def create(data):
                 }},
                 refresh_child () {{
                     //NOTE: this is empty if this entity does not have a child, might need refactoring
-                """
+                """, context, margin=8)
     if relationships.get('has_one', '') != '':
         for relation in relationships.get('has_one'):
-                source_code += f""" 
-                            STARK.local_storage_delete_key('Listviews', '{relation.get('entity')}');"""
-    source_code += f"""
+                relation_entity = relation.get('entity')
+                context["relation_entity"] = relation_entity
+                source_code += cg_template.render("""
+                            STARK.local_storage_delete_key('Listviews', '{relation_entity}');""", context, margin=8)
+    source_code += cg_template.render("""
                 }},
-                """
+                """, context, margin=8)
 
     for col, col_type in cols.items():
         if isinstance(col_type, dict) and col_type["type"] == "relationship":
@@ -1167,7 +1218,8 @@ def create(data):
                     foreign_display += array_item
                 foreign_display = foreign_display[:-len(separator)]
 
-                source_code += f"""
+                context.update({"foreign_entity": foreign_entity, "arr_fields": arr_fields})
+                source_code += cg_template.render("""
                 list_{foreign_entity}: function () {{
                     if (this.list_status.{foreign_entity} == 'empty') {{
                         loading_modal.show();
@@ -1177,15 +1229,16 @@ def create(data):
                         fields = {arr_fields}
                         
                         {foreign_entity}_app.get_fields(fields).then( function(data) {{
-                            data.forEach(function(arrayItem) {{"""  
-                source_code += f"""
+                            data.forEach(function(arrayItem) {{""", context, margin=8)  
+                context.update({"foreign_display": foreign_display, "foreign_field_value": foreign_field_value})
+                source_code += cg_template.render("""
                                 text = {foreign_display}
-                                value = arrayItem['{foreign_field_value}']"""
+                                value = arrayItem['{foreign_field_value}']""", context, margin=8)
                 
-                source_code += f"""            
-                                root.lists.{foreign_entity}.push({{ value: value, text: text }})"""
+                source_code += cg_template.render("""            
+                                root.lists.{foreign_entity}.push({{ value: value, text: text }})""", context, margin=8)
 
-                source_code += f""" 
+                source_code += cg_template.render(""" 
                 }})
                             root.list_status.{foreign_entity} = 'populated'
                             loading_modal.hide();
@@ -1195,9 +1248,9 @@ def create(data):
                         }});
                     }}
                 }},
-                """
+                """, context, margin=8)
                 if has_many != '':
-                    source_code += f"""
+                    source_code += cg_template.render("""
                 split_string: function(str) {{
                     var arr = str.split(", ")
                     var return_str = ''
@@ -1220,9 +1273,9 @@ def create(data):
                     }}
                     return display_text
                 }},
-                    """
+                    """, context, margin=8)
 
-    source_code += f"""
+    source_code += cg_template.render("""
                 //Charting ------------------------------------------------
                 set_x_data_source: function (field) {{
                     X_Data_Source = (field).replace(/_/g," ")
@@ -1452,11 +1505,11 @@ def create(data):
                         }}
                     }}
                     return conso_subtext
-                }},"""
+                }},""", context, margin=8)
                 
-    source_code+= f"""  
+    source_code+= cg_template.render("""  
             }},
-            computed: {{"""
+            computed: {{""", context, margin=8)
     for col, col_type in cols.items():
         col_varname = converter.convert_to_system_name(col)
         if isinstance(col_type, dict):
@@ -1465,7 +1518,8 @@ def create(data):
                 has_many = col_type.get('has_many', '')
                 has_many_ux = col_type.get('has_many_ux', '')
                 if has_many_ux != 'repeater':
-                    source_code += f"""
+                    context["col_varname"] = col_varname
+                    source_code += cg_template.render("""
             {col_varname}_criteria() {{
                 return this.search['{col_varname}'].trim().toLowerCase()
             }},
@@ -1485,14 +1539,14 @@ def create(data):
                 return 'There are no tags matching your search criteria'
                 }}
                 return ''
-            }},"""
-    source_code += f"""
+            }},""", context, margin=8)
+    source_code += cg_template.render("""
             }}    
         }})
         
-        """
+        """, context, margin=8)
 
-    return textwrap.dedent(source_code)
+    return source_code
 
 
 def set_type(col_type):
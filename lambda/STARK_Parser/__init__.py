@@ -27,10 +27,10 @@ layer_parser       = importlib.import_module(f"{prepend_dir}parse_layers")
 s3_parser          = importlib.import_module(f"{prepend_dir}parse_s3")
 cloudfront_parser  = importlib.import_module(f"{prepend_dir}parse_cloudfront")
 analytics_parser   = importlib.import_module(f"{prepend_dir}parse_analytics")
+sqs_parser         = importlib.import_module(f"{prepend_dir}parse_sqs")
 
 ## unused imports
 # import parse_api_gateway as api_gateway_parser
-# import parse_sqs as sqs_parser
 
 
 import convert_friendly_to_system as converter
@@ -237,8 +237,7 @@ def lambda_handler(event, context):
         cloud_resources["Analytics"] = analytics_parser.parse(data)
 
         #SQS #######################
-        #Disable for now, not yet implemented, just contains stub
-        #cloud_resources["SQS"] = sqs_parser.parse(data)
+        cloud_resources["SQS"] = sqs_parser.parse(data)
         
 
         #For debugging: pretty-print the resulting JSON
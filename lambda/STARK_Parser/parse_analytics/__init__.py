@@ -10,6 +10,7 @@ def parse(data):
     enabled   = False
     cron      = ""
     activated = False
+    incremental = False
 
     for key in data_model:
         if key == "__STARK_advanced__":
@@ -18,12 +19,14 @@ def parse(data):
                     enabled                    = data_model[key][advance_config].get('enabled', enabled)
                     cron                       = data_model[key][advance_config].get('cron', cron)
                     activated                  = data_model[key][advance_config].get('activated', True if enabled else False)
+                    incremental                = data_model[key][advance_config].get('incremental', incremental)
     #ANALYTICS-SETTINGS-END
 
     parsed = {
         "enabled": enabled,
         "cron": cron,
-        "activated": activated
+        "activated": activated,
+        "incremental": incremental
     }
 
 
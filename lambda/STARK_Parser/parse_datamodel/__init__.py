@@ -45,5 +45,10 @@ def parse(data):
                 value   = data_model.get(entity).get("sequence")[column_dict]
                 parsed[entity]["sequence"][key] = value
 
+        #for list view, lookup and sortable columns, and list view shards (optional, see cgdynamic_dynamodb)
+        for setting in ["list_view", "lookup", "list_view_shards", "sortable"]:
+            if setting in data_model.get(entity):
+                parsed[entity][setting] = data_model.get(entity).get(setting)
+
 
     return parsed
\ No newline at end of file
@@ -111,6 +111,14 @@ def parse(data):
         }
     }
     
+    #Surge protection: consumer that applies the queued entity writes
+    if data['data_model'].get('__STARK_advanced__', {}).get('ddb_surge_protection', False):
+        parsed["STARK_Write_Consumer"] = {
+            "Memory": 128,
+            "Arch": "arm64",
+            "Timeout": 60
+        }
+
     for entity in entities:
         relationships = get_rel.get_relationship(data_model, entity)
         dependencies = []
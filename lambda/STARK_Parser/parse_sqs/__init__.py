@@ -25,7 +25,9 @@ def parse(data):
     if ddb_surge_protection:
         if ddb_surge_protection_fifo:
             parsed["Queue Type"] = "FIFO"
-            parsed["Queue Name"] = project_varname + "_write_queue_fifo"
+            #SQS requires FIFO queue names, including their DLQ, to end in .fifo
+            parsed["Queue Name"] = project_varname + "_write_queue.fifo"
+            parsed["DLQ Name"]   = project_varname + "_write_queue_dlq.fifo"
         else:
             parsed["Queue Type"] = "Standard"
             parsed["Queue Name"] = project_varname + "_write_queue"
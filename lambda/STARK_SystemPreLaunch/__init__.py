@@ -17,7 +17,7 @@ import yaml
 #Private modules
 import convert_friendly_to_system as converter
 import suggest_graphic as set_graphic
-import get_relationship as get_rel
+import stark_model
 
 ddb = boto3.client('dynamodb')
 s3  = boto3.client('s3')
@@ -37,11 +37,8 @@ def create_handler(event, context):
 
     #Cloud resources document
     codegen_bucket_name = os.environ['CODEGEN_BUCKET_NAME']
-    response = s3.get_object(
-        Bucket=codegen_bucket_name,
-        Key=f'codegen_dynamic/{project_varname}/{project_varname}.yaml'
-    )
-    cloud_resources = yaml.safe_load(response['Body'].read().decode('utf-8')) 
+    model               = stark_model.load(s3, codegen_bucket_name, project_varname)
+    cloud_resources     = model["Cloud Resources"]
 
     #Default password
     response = s3.get_object(
@@ -202,7 +199,7 @@ def create_handler(event, context):
                 title = module_type + ' ' + entity
                 is_menu_item = False
             
-            relationships = get_rel.get_relationship(models, entity, entity)
+            relationships = model["Entities"][entity]["All Relationships"]
             for relationship in relationships.get('belongs_to', []):
                 if relationship.get('rel_type') == 'has_many':
                     is_menu_item = False
@@ -0,0 +1,126 @@
+#Shared by the STARK code generators (CodeGen Dynamic and Static), shipped in the STARK_get_relationship layer.
+#Packs generated files into as few commits as the repository limits allow, and commits them through a backend:
+#   codecommit_backend for project repos in CodeCommit, local_git_backend for a local git repo (offline benchmarks and tests)
+
+#Python Standard Library
+import os
+import subprocess
+
+#Extra modules
+import boto3
+
+#CodeCommit caps commits made through the API at 100 files and 6 MB of file content
+max_commit_files = 100
+max_commit_bytes = 6000000
+
+class codecommit_backend:
+    def __init__(self, repo_name, branch_name='master', git_handler=None):
+        if git_handler == None:
+            git_handler = boto3.client('codecommit')
+        self.git_handler = git_handler
+        self.repo_name   = repo_name
+        self.branch_name = branch_name
+
+    def get_head(self):
+        #Commit id at the tip of the branch, or None if the branch does not exist yet
+        try:
+            response = self.git_handler.get_branch(repositoryName=self.repo_name, branchName=self.branch_name)
+        except self.git_handler.exceptions.BranchDoesNotExistException:
+            return None
+        return response['branch']['commitId']
+
+    def create_commit(self, files, commit_message, parent_commit_id, author_name, email):
+        git_arguments = {}
+        git_arguments['repositoryName'] = self.repo_name
+        git_arguments['branchName']     = self.branch_name
+        git_arguments['authorName']     = author_name
+        git_arguments['email']          = email
+        git_arguments['commitMessage']  = commit_message
+        git_arguments['putFiles']       = [{'filePath': item['filePath'], 'fileContent': item['fileContent']} for item in files]
+        if parent_commit_id != None:
+            git_arguments['parentCommitId'] = parent_commit_id
+
+        response = self.git_handler.create_commit(**git_arguments)
+        return response['commitId']
+
+class local_git_backend:
+    def __init__(self, repo_dir, branch_name='master'):
+        self.repo_dir    = repo_dir
+        self.branch_name = branch_name
+
+    def run_git(self, *git_arguments, env=None):
+        result = subprocess.run(['git', '-C', self.repo_dir, *git_arguments], capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {git_arguments[0]} failed: {result.stderr.strip()}")
+        return result.stdout.strip()
+
+    def get_head(self):
+        try:
+            return self.run_git('rev-parse', '--verify', '--quiet', f"refs/heads/{self.branch_name}")
+        except RuntimeError:
+            return None
+
+    def create_commit(self, files, commit_message, parent_commit_id, author_name, email):
+        #Same contract as CodeCommit: the commit fails if the branch moved past parent_commit_id
+        if self.get_head() != parent_commit_id:
+            raise RuntimeError(f"Branch {self.branch_name} is no longer at the expected parent commit {parent_commit_id}")
+
+        self.run_git('checkout', '-q', '-B', self.branch_name)
+        for item in files:
+            filename = os.path.join(self.repo_dir, item['filePath'])
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "wb") as f:
+                f.write(item['fileContent'])
+        self.run_git('add', '--', *[item['filePath'] for item in files])
+
+        env = dict(os.environ)
+        env.update({'GIT_AUTHOR_NAME': author_name, 'GIT_AUTHOR_EMAIL': email, 'GIT_COMMITTER_NAME': author_name, 'GIT_COMMITTER_EMAIL': email})
+        self.run_git('commit', '-q', '--allow-empty', '-m', commit_message, env=env)
+        return self.get_head()
+
+def get_file_size(item):
+    return len(item['fileContent'])
+
+def pack_files(files_to_commit, max_files=None, max_bytes=None):
+    #Bin-packs files into the fewest commits that stay under max_files and max_bytes, using first-fit decreasing:
+    #   the largest files are placed first, each into the first commit that still has room for it.
+    #Files keep their original relative order within a commit, and the same input always gives the same commits.
+    if max_files == None:
+        max_files = max_commit_files
+    if max_bytes == None:
+        max_bytes = max_commit_bytes
+
+    #A later file with the same path replaces an earlier one, as it would if they were committed in order
+    latest_files = {}
+    for index, item in enumerate(files_to_commit):
+        latest_files[item['filePath']] = index
+    indexes = sorted(latest_files.values(), key=lambda index: (-get_file_size(files_to_commit[index]), index))
+
+    batches     = []
+    batch_sizes = []
+    for index in indexes:
+        size = get_file_size(files_to_commit[index])
+        if size > max_bytes:
+            raise ValueError(f"{files_to_commit[index]['filePath']} is {size} bytes, over the {max_bytes} byte limit for a single commit")
+
+        for batch_index, batch in enumerate(batches):
+            if len(batch) < max_files and batch_sizes[batch_index] + size <= max_bytes:
+                batch.append(index)
+                batch_sizes[batch_index] += size
+                break
+        else:
+            batches.append([index])
+            batch_sizes.append(size)
+
+    return [[files_to_commit[index] for index in sorted(batch)] for batch in batches]
+
+def commit_files(files_to_commit, backend, commit_message, author_name, email='STARK@fakedomainstark.com', max_files=None, max_bytes=None):
+    #Commits files_to_commit in as few commits as the limits allow. Each commit's id becomes the parent of the next,
+    #   so the branch is only read once. Returns the list of commit ids, in order.
+    batches    = pack_files(files_to_commit, max_files, max_bytes)
+    parent     = backend.get_head()
+    commit_ids = []
+    for ctr, batch in enumerate(batches, start=1):
+        parent = backend.create_commit(batch, f"{commit_message} (commit {ctr} of {len(batches)})", parent, author_name, email)
+        commit_ids.append(parent)
+    return commit_ids
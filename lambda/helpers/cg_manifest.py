@@ -0,0 +1,130 @@
+#Generation manifest for incremental code generation in the STARK CLI, shared by its dynamic and static code generators.
+#   Records, per generated file, a hash of the inputs that produced it (the generator's data and the generator version)
+#   and a hash of the content written, so files whose inputs did not change are neither regenerated nor rewritten.
+
+#Python Standard Library
+import hashlib
+import inspect
+import json
+import os
+
+#Private modules
+import cg_workers
+
+manifest_filename = "stark_codegen_manifest.json"
+manifest_version  = 1
+
+#Generator versions already computed by this process: {module name: hash}
+generator_versions = {}
+
+#Shared code generator modules (e.g., cg_template) live next to this one
+helpers_dir = os.path.dirname(os.path.abspath(__file__))
+
+def load(project_basedir):
+    manifest = {"Version": manifest_version, "Files": {}}
+    try:
+        with open(project_basedir + manifest_filename, "r") as f:
+            saved_manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return manifest
+
+    if saved_manifest.get("Version") == manifest_version:
+        manifest = saved_manifest
+    return manifest
+
+def save(manifest, project_basedir):
+    with open(project_basedir + manifest_filename, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+def get_generator_version(generator):
+    #Hash of the generator's source and of the codegen modules it imports (e.g., shared header and column-type generators,
+    #   and the template engine),
+    #   so upgrading STARK regenerates exactly the files whose generators changed
+    if generator.__name__ not in generator_versions:
+        sources = {}
+        collect_sources(generator, sources)
+        version_hash = hashlib.sha256()
+        for module_name in sorted(sources):
+            version_hash.update(module_name.encode())
+            version_hash.update(sources[module_name])
+        generator_versions[generator.__name__] = version_hash.hexdigest()
+    return generator_versions[generator.__name__]
+
+def collect_sources(module, sources):
+    if module.__name__ in sources:
+        return
+
+    with open(module.__file__, "rb") as f:
+        sources[module.__name__] = f.read()
+
+    #Generators are packages (<codegen dir>/<generator>/__init__.py); follow imports of sibling generators and of the
+    #   shared helpers only
+    codegen_dir = os.path.dirname(os.path.dirname(module.__file__))
+    for value in vars(module).values():
+        if inspect.ismodule(value) and getattr(value, "__file__", None) != None:
+            if os.path.dirname(os.path.dirname(value.__file__)) == codegen_dir or os.path.dirname(os.path.abspath(value.__file__)) == helpers_dir:
+                collect_sources(value, sources)
+
+def get_inputs_hash(generator, data):
+    inputs = {
+        "Generator": generator.__name__.split(".")[-1],
+        "Generator Version": get_generator_version(generator),
+        "Data": data
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def get_content_hash(content):
+    if type(content) is str:
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+def is_current(manifest, file_path, inputs_hash, project_basedir):
+    #Up to date: same inputs as the last generation, and the file on disk is still what was generated then
+    entry = manifest["Files"].get(file_path)
+    if entry == None or entry["Inputs"] != inputs_hash:
+        return False
+
+    try:
+        with open(project_basedir + file_path, "rb") as f:
+            return get_content_hash(f.read()) == entry["Content"]
+    except FileNotFoundError:
+        return False
+
+def add_generated_file(files_to_commit, file_path, generator, data, manifest, project_basedir, timings):
+    #Runs generator.create(data) and adds the result to files_to_commit, unless the manifest shows file_path is already up to date
+    inputs_hash = get_inputs_hash(generator, data)
+    if is_current(manifest, file_path, inputs_hash, project_basedir):
+        return
+
+    source_code = cg_workers.timed(generator.__name__.split(".")[-1], generator.create, data, timings)
+    if type(source_code) is str:
+        source_code = source_code.encode()
+
+    files_to_commit.append({
+        'filePath': file_path,
+        'fileContent': source_code,
+        'inputsHash': inputs_hash
+    })
+
+def write_files(files_to_commit, manifest, project_basedir):
+    #Writes the generated files and records them in the manifest. Files whose content did not change are left untouched.
+    #Returns the number of files written.
+    written = 0
+    for code in files_to_commit:
+        filename     = project_basedir + code['filePath']
+        content_hash = get_content_hash(code['fileContent'])
+
+        current_hash = None
+        if os.path.isfile(filename):
+            with open(filename, "rb") as f:
+                current_hash = get_content_hash(f.read())
+
+        if current_hash != content_hash:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "wb") as f:
+                f.write(code['fileContent'])
+            written += 1
+
+        manifest["Files"][code['filePath']] = {"Inputs": code['inputsHash'], "Content": content_hash}
+
+    return written
@@ -0,0 +1,107 @@
+#Compiled templates for the STARK code generators (CodeGen Dynamic and Static, and the CLI), shipped in the
+#   STARK_get_relationship layer.
+#   A template is parsed once into literal text and {field} references, then rendered by joining the literal text with
+#   the field values from a context dict. Templates follow the same brace rules as the f-strings they replace
+#   ({{ and }} for literal braces), so an f""" """ block becomes a template by dropping the f and naming its fields in a context.
+#   The margin (the indentation that textwrap.dedent() used to strip from every generated file) is removed from the
+#   template when it is compiled, so rendering never has to dedent the output.
+#   One-line fragments carry no indentation and can stay f-strings.
+
+#Python Standard Library
+import string
+
+#Templates compiled so far by this process: {(template text, margin): render function}
+compiled_templates = {}
+
+def compile_template(template_text, margin=0):
+    #Returns render(context), which fills in the template's fields from the context dict.
+    #The first line of a template may continue the previous template's last line, so it keeps its text if it is blank
+    #   or not indented up to the margin. Every other line must be indented at least `margin` spaces.
+    #   Blank lines are emptied, as textwrap.dedent() does.
+    lines = template_text.split("\n")
+    for index, line in enumerate(lines):
+        indent = len(line) - len(line.lstrip(" "))
+        if index == 0 and (indent < margin or line.strip() == ""):
+            continue
+        elif line.strip() == "":
+            lines[index] = ""
+        elif indent >= margin:
+            lines[index] = line[margin:]
+        else:
+            raise ValueError(f"Template line is indented less than the {margin}-space margin: {line.strip()}")
+
+    parts = []
+    for index, line in enumerate(lines):
+        if index > 0:
+            parts.append(("\n", None, None, None, None))
+
+        line_parts = parse_line(line)
+        if index > 0 and is_field_line(line_parts):
+            #A line of only fields (e.g., `    {html_control_code}`) is blank when its fields render empty,
+            #   and must then be emptied at render time, as textwrap.dedent() would have done
+            parts.append((None, None, None, None, line_parts))
+        else:
+            parts.extend(line_parts)
+
+    #Adjacent literal text is joined once here instead of on every render
+    merged_parts = []
+    for part in parts:
+        if part[0] != None and len(merged_parts) > 0 and merged_parts[-1][0] != None:
+            merged_parts[-1] = (merged_parts[-1][0] + part[0], None, None, None, None)
+        else:
+            merged_parts.append(part)
+
+    def render(context):
+        return render_parts(merged_parts, context)
+
+    return render
+
+def parse_line(line):
+    line_parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(line):
+        if literal != "":
+            line_parts.append((literal, None, None, None, None))
+        if field_name != None:
+            if not field_name.isidentifier() or "{" in format_spec:
+                raise ValueError(f"Template fields must be plain names from the context: {{{field_name}}}")
+            line_parts.append((None, field_name, format_spec, conversion, None))
+    return line_parts
+
+def is_field_line(line_parts):
+    has_fields = False
+    for literal, field_name, format_spec, conversion, field_line in line_parts:
+        if field_name != None:
+            has_fields = True
+        elif literal.strip() != "":
+            return False
+    return has_fields
+
+def render_parts(parts, context):
+    rendered = []
+    for literal, field_name, format_spec, conversion, field_line in parts:
+        if literal != None:
+            rendered.append(literal)
+        elif field_name != None:
+            value = context[field_name]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            rendered.append(format(value, format_spec))
+        else:
+            line = render_parts(field_line, context)
+            if line.strip() == "":
+                line = ""
+            elif "\n" in line:
+                line = "\n".join(sub_line if sub_line.strip() != "" else "" for sub_line in line.split("\n"))
+            rendered.append(line)
+    return "".join(rendered)
+
+def render(template_text, context, margin=0):
+    #Compiles template_text the first time it is seen, then renders it with the context
+    key = (template_text, margin)
+    if key not in compiled_templates:
+        compiled_templates[key] = compile_template(template_text, margin)
+    return compiled_templates[key](context)
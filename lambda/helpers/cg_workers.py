@@ -0,0 +1,93 @@
+#Shared by the STARK code generators (CodeGen Dynamic and Static, and the CLI), shipped in the STARK_get_relationship layer.
+#Runs independent per-entity code generation jobs in parallel worker processes, and reports where the time went
+
+#Python Standard Library
+import multiprocessing
+import os
+import random
+import time
+import traceback
+
+def run_jobs(job_func, jobs, max_workers=None):
+    #Runs job_func(job) for every job and returns the results in the same order as `jobs`,
+    #   so the generated file list (and the commits built from it) does not depend on which worker finishes first.
+    #Workers are forked processes that each get a fixed slice of the jobs and send back their results through a Pipe.
+    #   Lambda has no /dev/shm, so multiprocessing.Pool / ProcessPoolExecutor (which need semaphores) cannot be used there;
+    #   Process + Pipe works both in Lambda and in the STARK CLI.
+    #Falls back to running the jobs in this process when forking is unavailable (e.g., Windows) or there is nothing to parallelize.
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    worker_count = min(max_workers, len(jobs))
+
+    if worker_count < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [job_func(job) for job in jobs]
+
+    context = multiprocessing.get_context('fork')
+    workers = []
+    try:
+        for worker_index in range(worker_count):
+            job_indexes = list(range(worker_index, len(jobs), worker_count))
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_worker, args=(job_func, jobs, job_indexes, sender))
+            process.start()
+            sender.close()
+            workers.append((process, receiver))
+    except OSError as error:
+        print(f"Could not start code generation workers, generating serially instead: {error}")
+        for process, receiver in workers:
+            process.terminate()
+        return [job_func(job) for job in jobs]
+
+    results = [None] * len(jobs)
+    errors  = []
+    for process, receiver in workers:
+        #Receive before joining: a worker blocks on send until its (possibly large) results are read
+        try:
+            worker_results = receiver.recv()
+        except EOFError:
+            worker_results = {'error': f"Code generation worker exited with code {process.exitcode} without sending results"}
+        process.join()
+
+        if 'error' in worker_results:
+            errors.append(worker_results['error'])
+        else:
+            for job_index, result in worker_results['results']:
+                results[job_index] = result
+
+    if len(errors) > 0:
+        raise RuntimeError("Code generation failed:\n" + "\n".join(errors))
+
+    return results
+
+def run_worker(job_func, jobs, job_indexes, sender):
+    #Forked workers start with the parent's random state; reseed so they don't all draw the same sample data
+    random.seed()
+    try:
+        worker_results = {'results': [(job_index, job_func(jobs[job_index])) for job_index in job_indexes]}
+    except Exception:
+        worker_results = {'error': traceback.format_exc()}
+    sender.send(worker_results)
+    sender.close()
+
+def timed(generator_name, generator_func, data, timings):
+    #Calls generator_func(data), adding the time it took to timings[generator_name]
+    start = time.perf_counter()
+    source_code = generator_func(data)
+    timings.setdefault(generator_name, []).append(time.perf_counter() - start)
+    return source_code
+
+def merge_timings(all_timings):
+    merged = {}
+    for timings in all_timings:
+        for generator_name, durations in timings.items():
+            merged.setdefault(generator_name, []).extend(durations)
+    return merged
+
+def print_timing_report(timings, wall_time):
+    #Per generator: number of calls, total (summed across workers), mean and slowest call, in milliseconds
+    print(f"Code generation timing report (wall time: {wall_time * 1000:.1f} ms)")
+    print(f"{'Generator':<32}{'Calls':>7}{'Total ms':>12}{'Mean ms':>10}{'Max ms':>10}")
+    ordered = sorted(timings.items(), key=lambda item: sum(item[1]), reverse=True)
+    for generator_name, durations in ordered:
+        total = sum(durations) * 1000
+        print(f"{generator_name:<32}{len(durations):>7}{total:>12.1f}{total / len(durations):>10.1f}{max(durations) * 1000:>10.1f}")
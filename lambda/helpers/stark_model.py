@@ -0,0 +1,223 @@
+#Precompiled data model for the STARK components that consume a project's cloud resources document
+#   (code generators, pre-launch and the CLI). The document is parsed and its per-entity structures derived once,
+#   when the Parser's CFWriter saves it, into a versioned JSON artifact with a content hash. Consumers load the artifact
+#   instead of the YAML document, caching it in the temp folder (/tmp in Lambda) by hash across warm invocations.
+
+#Python Standard Library
+import hashlib
+import json
+import os
+import tempfile
+
+#Private modules
+import convert_friendly_to_system as converter
+import get_relationship as get_rel
+
+artifact_version = 1
+
+def get_key(project_varname):
+    return f'codegen_dynamic/{project_varname}/{project_varname}_model.json'
+
+def get_yaml_key(project_varname):
+    return f'codegen_dynamic/{project_varname}/{project_varname}.yaml'
+
+def get_hash(cloud_resources):
+    #Entity order is significant (it is the order of generated menus, tables, etc.), so keys are not sorted
+    content = json.dumps(cloud_resources, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{artifact_version}|{content}".encode()).hexdigest()
+
+def build(cloud_resources):
+    #Validates the data model and derives what every consumer needs per entity:
+    #   "Relationships":     get_relationship(models, entity), as the static code generator uses it
+    #   "All Relationships": get_relationship(models, entity, entity), which adds "belongs_to" entries for has_many parents
+    #   "Rel Model":         entities shown as repeaters in this entity's forms
+    #   "Sequence":          sequence settings, {} if the entity has none
+    models = cloud_resources.get("Data Model")
+    if not isinstance(models, dict):
+        raise ValueError("Cloud resources document has no Data Model")
+
+    entities = {}
+    for entity, attributes in models.items():
+        if not isinstance(attributes, dict) or "pk" not in attributes or not isinstance(attributes.get("data"), dict):
+            raise ValueError(f"Entity {entity} in the Data Model needs a pk and a data dictionary")
+
+        all_relationships = get_rel.get_relationship(models, entity, entity)
+        rel_model = []
+        for relationship in all_relationships.get('has_many', []):
+            if relationship.get('type') == 'repeater':
+                rel_model.append(relationship.get('entity'))
+
+        entities[entity] = {
+            "Relationships": get_rel.get_relationship(models, entity),
+            "All Relationships": all_relationships,
+            "Rel Model": rel_model,
+            "Sequence": attributes.get("sequence") or {}
+        }
+
+    return {
+        "Version": artifact_version,
+        "Hash": get_hash(cloud_resources),
+        "Cloud Resources": cloud_resources,
+        "Entities": entities
+    }
+
+def get_dynamic_entity_data(models, model_entity, entity):
+    #Data model part of the data dict the dynamic code generators get for an entity. Shared by STARK_CodeGen_Dynamic
+    #   and the STARK CLI, so `stark --update` generates the same code (sk shards, sort index numbers, lookups) as a deploy.
+    #   The caller adds the project's table, bucket and analytics settings.
+    relationships = model_entity["All Relationships"]
+    for index, items in relationships.items():
+        for key in items:
+            for value in key:
+                key[value] = converter.convert_to_system_name(key[value])
+
+    rel_model = {}
+    for rel_entity in model_entity["Rel Model"]:
+        rel_model.update({rel_entity : models.get(rel_entity, '')})
+
+    return {
+        "Entity": entity,
+        "Sequence": model_entity["Sequence"],
+        "Columns": models[entity]["data"],
+        "PK": models[entity]["pk"],
+        "Relationships": relationships,
+        "Rel Model": rel_model,
+        "List View": models[entity].get("list_view", []),
+        "Lookup": models[entity].get("lookup", []),
+        "Lookup References": get_lookup_references(models, entity),
+        "List View Shards": models[entity].get("list_view_shards", 1),
+        "Sortable": models[entity].get("sortable", [])
+    }
+
+def get_static_entity_data(models, model_entity, entity):
+    #Data model part of the data dict the static code generators get for an entity (STARK_CodeGen_Static and the STARK CLI)
+    rel_model = {}
+    for rel_entity in model_entity["Rel Model"]:
+        rel_model.update({rel_entity : models.get(rel_entity, '')})
+
+    return {
+        "Entity": entity,
+        "PK": models[entity]["pk"],
+        "Columns": models[entity]["data"],
+        "Relationships": model_entity["Relationships"],
+        "Rel Model": rel_model,
+        "List View": models[entity].get("list_view", []),
+        "Sequence": model_entity["Sequence"]
+    }
+
+def get_analytics_data(cloud_resources, entities, project_varname):
+    #Data dict of the STARK_Analytics code generator, for STARK_CodeGen_Dynamic and the STARK CLI
+    return {
+        "Entities": entities,
+        "S3 Bucket Athena": converter.convert_to_system_name(project_varname + '-stark-analytics-athena', 's3'),
+        "Project_Name": project_varname,
+        "Incremental Export": cloud_resources.get("Analytics", {}).get("incremental", False)
+    }
+
+def get_lookup_references(models, entity):
+    #Columns of `entity` that the relationship dropdowns of other entities read through its lookup (get_fields): the
+    #   `display` and `value` columns of every has_one, or non-repeater has_many, column that points to it
+    entity_varname = converter.convert_to_system_name(entity)
+    references = []
+    for attributes in models.values():
+        if not isinstance(attributes, dict):
+            continue
+        for col_type in attributes.get('data', {}).values():
+            if not isinstance(col_type, dict) or col_type.get('type') != 'relationship':
+                continue
+            foreign_entity = col_type.get('has_one', '')
+            if foreign_entity == '' and col_type.get('has_many_ux', '') != 'repeater':
+                foreign_entity = col_type.get('has_many', '')
+            if foreign_entity == '' or converter.convert_to_system_name(foreign_entity) != entity_varname:
+                continue
+            display = col_type.get('display', [])
+            if isinstance(display, str):
+                display = [display]
+            for col in list(display) + [col_type.get('value', foreign_entity)]:
+                if col not in references:
+                    references.append(col)
+    return references
+
+def dumps(artifact):
+    return json.dumps(artifact, separators=(',', ':'), default=str).encode()
+
+def loads(content):
+    artifact = json.loads(content)
+    if artifact.get("Version") != artifact_version:
+        raise ValueError(f"Data model artifact version {artifact.get('Version')} is not supported (expected {artifact_version})")
+    return artifact
+
+def get_cache_filename(model_hash):
+    return os.path.join(tempfile.gettempdir(), f"stark_model_{model_hash}.json")
+
+def read_cache(model_hash):
+    try:
+        with open(get_cache_filename(model_hash), "rb") as f:
+            return loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_cache(artifact, content=None):
+    #Written to a temporary name first, so a concurrent reader never sees a partial file
+    if content == None:
+        content = dumps(artifact)
+    filename      = get_cache_filename(artifact["Hash"])
+    temp_filename = f"{filename}.{os.getpid()}"
+    try:
+        with open(temp_filename, "wb") as f:
+            f.write(content)
+        os.replace(temp_filename, filename)
+    except OSError as error:
+        print(f"Could not cache the data model artifact: {error}")
+
+def save(s3, bucket_name, project_varname, cloud_resources):
+    #Builds the artifact and writes it next to the project's cloud resources document. Returns the artifact.
+    artifact = build(cloud_resources)
+    content  = dumps(artifact)
+    s3.put_object(
+        Body=content,
+        Bucket=bucket_name,
+        Key=get_key(project_varname),
+        Metadata={
+            'STARK_Description': 'Precompiled data model for this project, as determined by the STARK Parser',
+            'STARK_Model_Hash': artifact["Hash"]
+        }
+    )
+    write_cache(artifact, content)
+    return artifact
+
+def load(s3, bucket_name, project_varname):
+    #Returns the project's artifact, from the temp folder cache if the one in the bucket has not changed since it was cached.
+    #Projects parsed before artifacts existed only have the YAML document; their artifact is built here (and cached).
+    try:
+        response = s3.head_object(Bucket=bucket_name, Key=get_key(project_varname))
+    except s3.exceptions.ClientError as error:
+        if error.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        return load_from_yaml(s3, bucket_name, project_varname)
+
+    model_hash = response['Metadata'].get('stark_model_hash', '')
+    artifact   = read_cache(model_hash) if model_hash != '' else None
+    if artifact == None:
+        response = s3.get_object(Bucket=bucket_name, Key=get_key(project_varname))
+        content  = response['Body'].read()
+        artifact = loads(content)
+        write_cache(artifact, content)
+    return artifact
+
+def load_from_yaml(s3, bucket_name, project_varname):
+    import yaml
+
+    response = s3.get_object(Bucket=bucket_name, Key=get_yaml_key(project_varname))
+    return from_cloud_resources(yaml.safe_load(response['Body'].read().decode('utf-8')))
+
+def from_cloud_resources(cloud_resources):
+    #Artifact for an already-loaded cloud resources document (e.g., in the STARK CLI), built only if it is not cached yet
+    artifact = read_cache(get_hash(cloud_resources))
+    if artifact == None:
+        artifact = build(cloud_resources)
+        write_cache(artifact)
+    else:
+        #The cached copy went through JSON; hand back the caller's own document
+        artifact["Cloud Resources"] = cloud_resources
+    return artifact